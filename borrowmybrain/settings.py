@@ -42,6 +42,11 @@ INSTALLED_APPS = [
 ]
 
 MIDDLEWARE = [
+    'skills.middleware.TracingMiddleware',  # only active with TRACING_ENABLED = True
+    'skills.middleware.MetricsMiddleware',
+    'skills.middleware.QueryProfileMiddleware',  # only active with SQL_PROFILE = True
+    'skills.middleware.ProfilingMiddleware',  # only active with PROFILING_ENABLED = True
+    'skills.middleware.AdmissionControlMiddleware',  # only active with RATELIMIT_ENABLED = True
     'django.middleware.security.SecurityMiddleware',
     'django.contrib.sessions.middleware.SessionMiddleware',
     'django.middleware.common.CommonMiddleware',
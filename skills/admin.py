@@ -1,5 +1,6 @@
 from django.contrib import admin
-from .models import UserProfile, Skill, TeachableSkill, Certification, SkillRequest
+from .models import UserProfile, Skill, TeachableSkill, Certification, SkillRequest, Review, Booking
+from .transitions import complete_skill_request
 
 
 @admin.register(UserProfile)
@@ -35,3 +36,23 @@ class SkillRequestAdmin(admin.ModelAdmin):
     list_display = ['learner', 'educator', 'requested_skill', 'status', 'is_payment_offer']
     list_filter = ['status', 'is_payment_offer', 'created_at']
     search_fields = ['learner__username', 'educator__username']
+    actions = ['mark_completed']
+
+    @admin.action(description='Mark selected accepted requests as completed')
+    def mark_completed(self, request, queryset):
+        completed = sum(complete_skill_request(skill_request) for skill_request in queryset.filter(status='accepted'))
+        self.message_user(request, f'{completed} request(s) marked as completed.')
+
+
+@admin.register(Review)
+class ReviewAdmin(admin.ModelAdmin):
+    list_display = ['reviewer', 'educator', 'rating', 'skill_request', 'session', 'created_at']
+    list_filter = ['rating', 'created_at']
+    search_fields = ['reviewer__username', 'educator__username', 'comment']
+
+
+@admin.register(Booking)
+class BookingAdmin(admin.ModelAdmin):
+    list_display = ['educator', 'learner', 'start_at', 'end_at', 'status']
+    list_filter = ['status', 'start_at']
+    search_fields = ['educator__username', 'learner__username']
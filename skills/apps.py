@@ -4,3 +4,7 @@ from django.apps import AppConfig
 class SkillsConfig(AppConfig):
     default_auto_field = 'django.db.models.BigAutoField'
     name = 'skills'
+
+    def ready(self):
+        # Register signal handlers that maintain denormalized data
+        from . import signals  # noqa: F401
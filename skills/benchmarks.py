@@ -0,0 +1,279 @@
+import asyncio
+import json
+import math
+import platform
+import random
+import threading
+import time
+
+import django
+from django.conf import settings
+from django.contrib.auth.models import User
+from django.db import connection
+from django.test import AsyncClient, Client
+from django.test.utils import CaptureQueriesContext
+from django.urls import reverse
+
+from .models import EducatorSearchDoc, Skill, TeachableSkill
+from .rooms import join_room
+
+
+class Target:
+    """One benchmarked endpoint: ``build(ctx, worker, rng)`` returns (method, path, data)"""
+
+    def __init__(self, name, build, ok=(200,)):
+        self.name = name
+        self.build = build
+        self.ok = ok
+
+
+def _json(data):
+    return {'data': json.dumps(data), 'content_type': 'application/json'}
+
+
+TRANSCRIPT = '\n'.join(f'Teacher: Step {i}, remember to practise every day.\nStudent: Understood, thanks.'
+                       for i in range(20))
+
+TARGETS = [
+    Target('home', lambda ctx, w, rng: ('get', reverse('home'), {})),
+    Target('search_results', lambda ctx, w, rng: ('get', reverse('search_results'), {
+        'data': {'q': rng.choice(ctx['skills']), 'rate': rng.choice(['', 'low', 'mid', 'high'])},
+    })),
+    Target('view_profile', lambda ctx, w, rng: (
+        'get', reverse('view_profile', args=[rng.choice(ctx['educators'])]), {},
+    )),
+    Target('make_skill_request', lambda ctx, w, rng: ('post', reverse('make_skill_request', args=[rng.choice(ctx['teachables'])]), {
+        'data': {'request_type': 'payment', 'offered_amount': '500', 'message': 'Benchmark request'},
+    }), ok=(302,)),
+    Target('session_create', lambda ctx, w, rng: ('post', reverse('join_session_submit'), {'data': {'code': ''}})),
+    Target('session_join', lambda ctx, w, rng: (
+        'get', reverse('start_session_by_code', args=[ctx['rooms'][w]['name']]), {},
+    )),
+    Target('session_heartbeat', lambda ctx, w, rng: (
+        'post', reverse('session_heartbeat_api'), _json({'session_id': ctx['rooms'][w]['id']}),
+    )),
+    Target('save_session_notes', lambda ctx, w, rng: ('post', reverse('save_session_notes_api'), _json({
+        'session_id': ctx['rooms'][w]['id'], 'notes': f'Notes revision {rng.random()}',
+    }))),
+    Target('generate_summary', lambda ctx, w, rng: ('post', reverse('generate_summary_api'), _json({
+        'session_id': ctx['rooms'][w]['id'], 'transcript': TRANSCRIPT, 'language': 'english',
+    }))),
+    Target('session_export', lambda ctx, w, rng: (
+        'get', reverse('export_session', args=[ctx['rooms'][w]['id'], 'txt']), {},
+    )),
+]
+TARGETS_BY_NAME = {target.name: target for target in TARGETS}
+
+
+def prepare_context(concurrency, seed):
+    """Ids the targets pick from, plus one logged-in learner and one live room per worker"""
+    rng = random.Random(seed)
+    learners = list(User.objects.filter(userprofile__teachable_skills__isnull=True)
+                    .order_by('pk').values_list('pk', flat=True)[:concurrency])
+    if len(learners) < concurrency:
+        raise ValueError(f'Need at least {concurrency} learners in the dataset')
+    users = {user.pk: user for user in User.objects.filter(pk__in=learners)}
+    rooms = []
+    for worker, user_id in enumerate(learners):
+        name = f'bench-{seed}-{worker}'
+        rooms.append({'name': name, **join_room(name, f'https://{settings.DAILY_DOMAIN}/{name}', users[user_id])})
+    teachables = list(TeachableSkill.objects.values_list('pk', flat=True))
+    return {
+        'users': [users[user_id] for user_id in learners],
+        'rooms': rooms,
+        'skills': list(Skill.objects.values_list('name', flat=True)),
+        'educators': rng.sample(list(EducatorSearchDoc.objects.values_list('user_id', flat=True)),
+                                min(500, EducatorSearchDoc.objects.count())),
+        'teachables': rng.sample(teachables, min(2000, len(teachables))),
+    }
+
+
+def _percentile(ordered, fraction):
+    # Nearest-rank percentile of an already sorted list
+    return ordered[max(0, math.ceil(fraction * len(ordered)) - 1)]
+
+
+def summarize(samples, wall):
+    """Latency percentiles (ms), throughput and query counts for one endpoint"""
+    latencies = sorted(ms for ms, _status, _queries, _ok in samples)
+    queries = [q for _ms, _status, q, _ok in samples if q is not None]
+    return {
+        'requests': len(samples),
+        'errors': sum(1 for *_rest, ok in samples if not ok),
+        'p50_ms': round(_percentile(latencies, 0.50), 2),
+        'p95_ms': round(_percentile(latencies, 0.95), 2),
+        'p99_ms': round(_percentile(latencies, 0.99), 2),
+        'mean_ms': round(sum(latencies) / len(latencies), 2),
+        'throughput_rps': round(len(samples) / wall, 1) if wall else None,
+        'queries_mean': round(sum(queries) / len(queries), 2) if queries else None,
+        'queries_max': max(queries) if queries else None,
+    }
+
+
+def _run_wsgi(target, ctx, concurrency, total, warmup, seed):
+    """``total`` requests shared by ``concurrency`` threads, each with its own Client and DB connection.
+
+    Every thread sends ``warmup`` unmeasured requests first; the clock starts
+    once all of them are done.
+    """
+    remaining = [total]
+    lock = threading.Lock()
+    started = []
+    barrier = threading.Barrier(concurrency, action=lambda: started.append(time.perf_counter()))
+    samples = []
+    errors = []
+    # Logging in writes to the database; doing it up front keeps the threads'
+    # only writes inside requests
+    clients = []
+    for index in range(concurrency):
+        client = Client(raise_request_exception=False)
+        client.force_login(ctx['users'][index])
+        clients.append(client)
+
+    def worker(index):
+        rng = random.Random(seed * 1000 + index)
+        client = clients[index]
+
+        def send():
+            method, path, kwargs = target.build(ctx, index, rng)
+            with CaptureQueriesContext(connection) as captured:
+                began = time.perf_counter()
+                response = getattr(client, method)(path, **kwargs)
+                if response.streaming:
+                    for _chunk in response.streaming_content:
+                        pass
+                elapsed = (time.perf_counter() - began) * 1000
+            return elapsed, response.status_code, len(captured), response.status_code in target.ok
+
+        try:
+            for _ in range(warmup):
+                send()
+            barrier.wait()
+            while True:
+                with lock:
+                    if remaining[0] <= 0:
+                        return
+                    remaining[0] -= 1
+                sample = send()
+                with lock:
+                    samples.append(sample)
+        except threading.BrokenBarrierError:
+            pass  # another thread failed; its error is the one reported
+        except BaseException as e:
+            errors.append(e)
+            barrier.abort()  # don't leave the other threads waiting for this one
+        finally:
+            connection.close()
+
+    threads = [threading.Thread(target=worker, args=(i,)) for i in range(concurrency)]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+    if errors:
+        raise errors[0]
+    return samples, time.perf_counter() - started[0]
+
+
+def _run_asgi(target, ctx, concurrency, total, warmup, seed):
+    """The same load through Django's ASGI handler; query counts aren't available there"""
+    clients = []
+    for index in range(concurrency):
+        client = AsyncClient(raise_request_exception=False)
+        client.force_login(ctx['users'][index])
+        clients.append(client)
+    rngs = [random.Random(seed * 1000 + index) for index in range(concurrency)]
+    remaining = [total]
+    samples = []
+
+    async def send(index):
+        method, path, kwargs = target.build(ctx, index, rngs[index])
+        began = time.perf_counter()
+        response = await getattr(clients[index], method)(path, **kwargs)
+        if response.streaming and hasattr(response.streaming_content, '__aiter__'):
+            async for _chunk in response.streaming_content:
+                pass
+        elif response.streaming:
+            for _chunk in response.streaming_content:
+                pass
+        elapsed = (time.perf_counter() - began) * 1000
+        return elapsed, response.status_code, None, response.status_code in target.ok
+
+    async def warm(index):
+        for _ in range(warmup):
+            await send(index)
+
+    async def worker(index):
+        while remaining[0] > 0:
+            remaining[0] -= 1
+            samples.append(await send(index))
+
+    async def main():
+        await asyncio.gather(*(warm(i) for i in range(concurrency)))
+        began = time.perf_counter()
+        await asyncio.gather(*(worker(i) for i in range(concurrency)))
+        return time.perf_counter() - began
+
+    wall = asyncio.run(main())
+    return samples, wall
+
+
+def run_benchmarks(ctx, names, concurrency=8, requests=200, warmup=5, interface='wsgi', seed=42, stdout=None):
+    """Run each named target in turn; returns {name: summary}"""
+    run = _run_asgi if interface == 'asgi' else _run_wsgi
+    results = {}
+    for name in names:
+        samples, wall = run(TARGETS_BY_NAME[name], ctx, concurrency, requests, warmup, seed)
+        results[name] = summarize(samples, wall)
+        if stdout:
+            stdout.write(format_row(name, results[name]))
+    return results
+
+
+def format_row(name, stats):
+    queries = '-' if stats['queries_mean'] is None else f"{stats['queries_mean']:.1f}"
+    return (f"{name:<20} {stats['requests']:>6} {stats['errors']:>5} {stats['p50_ms']:>9.1f} {stats['p95_ms']:>9.1f} "
+            f"{stats['p99_ms']:>9.1f} {stats['throughput_rps'] or 0:>9.1f} {queries:>8}")
+
+
+HEADER = f"{'endpoint':<20} {'reqs':>6} {'errs':>5} {'p50 ms':>9} {'p95 ms':>9} {'p99 ms':>9} {'req/s':>9} {'queries':>8}"
+
+
+def environment(**options):
+    return {
+        'python': platform.python_version(),
+        'django': django.get_version(),
+        'database': connection.vendor,
+        'machine': platform.machine(),
+        **options,
+    }
+
+
+def compare(results, baseline, tolerance=0.5, min_delta_ms=10.0):
+    """Regressions against a baseline's endpoints, as human-readable lines.
+
+    Latency only counts as a regression when p95 is both ``tolerance`` slower
+    and ``min_delta_ms`` slower, so sub-millisecond noise on fast endpoints
+    doesn't fail the run. Query counts are compared strictly (rounded); the
+    error rate gets the same relative tolerance plus one percentage point,
+    since SQLite lock timeouts on the write endpoints vary between runs.
+    """
+    problems = []
+    for name, current in results.items():
+        base = baseline.get('endpoints', {}).get(name)
+        if base is None:
+            continue
+        if current['p95_ms'] > base['p95_ms'] * (1 + tolerance) and current['p95_ms'] - base['p95_ms'] > min_delta_ms:
+            problems.append(f"{name}: p95 {current['p95_ms']}ms vs baseline {base['p95_ms']}ms")
+        if current['throughput_rps'] and base.get('throughput_rps') and \
+                current['throughput_rps'] < base['throughput_rps'] * (1 - tolerance):
+            problems.append(f"{name}: {current['throughput_rps']} req/s vs baseline {base['throughput_rps']} req/s")
+        if current['queries_mean'] is not None and base.get('queries_mean') is not None and \
+                round(current['queries_mean']) > round(base['queries_mean']):
+            problems.append(f"{name}: {current['queries_mean']} queries/request vs baseline {base['queries_mean']}")
+        error_rate = current['errors'] / current['requests']
+        base_rate = base.get('errors', 0) / base['requests']
+        if error_rate > base_rate * (1 + tolerance) + 0.01:
+            problems.append(f"{name}: {current['errors']}/{current['requests']} errors "
+                            f"vs baseline {base.get('errors', 0)}/{base['requests']}")
+    return problems
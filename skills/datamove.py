@@ -0,0 +1,312 @@
+import json
+import os
+import sqlite3
+from contextlib import contextmanager
+
+from django.contrib.auth.models import User
+from django.core.serializers.json import DjangoJSONEncoder
+from django.db import IntegrityError, models, transaction
+
+from .models import (Booking, Certification, Review, Session, SessionNotes, SessionParticipant, SessionSummary,
+                     Skill, SkillRequest, TeachableSkill, UserProfile)
+
+
+FORMAT = 'borrowmybrain-ndjson'
+FORMAT_VERSION = 1
+
+# Dependency order: every model comes after the models it points at
+EXPORT_MODELS = [
+    User, Skill, UserProfile, TeachableSkill, Certification, SkillRequest, Booking,
+    Session, SessionParticipant, SessionSummary, SessionNotes, Review,
+]
+
+# An imported row whose key (after remapping) matches an existing row is
+# mapped onto that row instead of inserted, so users, skills and rooms that
+# already exist in the target database are reused.
+NATURAL_KEYS = {
+    User: ('username',),
+    Skill: ('name',),
+    UserProfile: ('user_id',),
+    TeachableSkill: ('user_profile_id', 'skill_id'),
+    Session: ('room_name',),
+    SessionParticipant: ('session_id', 'user_id'),
+    SessionSummary: ('session_id',),
+    SessionNotes: ('session_id',),
+}
+
+
+def _data_fields(model):
+    return [f for f in model._meta.concrete_fields if not f.primary_key]
+
+
+def _value(field, obj):
+    value = field.value_from_object(obj)
+    if isinstance(field, models.FileField):
+        return value.name or None
+    return value
+
+
+def _write_state(state_path, state):
+    tmp = f'{state_path}.tmp'
+    with open(tmp, 'w') as f:
+        json.dump(state, f)
+    os.replace(tmp, state_path)
+
+
+def export_data(path, chunk_size=2000, state_path=None, stdout=None):
+    """Write every EXPORT_MODELS row to ``path`` as NDJSON; returns {model label: rows written}.
+
+    Rows are read with iterator(chunk_size) in primary key order. After each
+    chunk the output is flushed and (pk, file offset) saved to ``state_path``,
+    so an interrupted export picks up where it stopped when run again.
+    """
+    state = None
+    if state_path and os.path.exists(state_path):
+        with open(state_path) as f:
+            state = json.load(f)
+    counts = {}
+
+    with open(path, 'r+b' if state else 'wb') as out:
+        if state:
+            out.seek(state['offset'])
+            out.truncate()
+            if stdout:
+                stdout.write(f'Resuming export at byte {state["offset"]}')
+        else:
+            header = {'format': FORMAT, 'version': FORMAT_VERSION,
+                      'models': [m._meta.label_lower for m in EXPORT_MODELS]}
+            out.write(json.dumps(header).encode('utf-8') + b'\n')
+            state = {'offset': out.tell(), 'done': [], 'last_pk': {}}
+
+        def checkpoint(label, last_pk):
+            out.flush()
+            state['offset'] = out.tell()
+            state['last_pk'][label] = last_pk
+            if state_path:
+                _write_state(state_path, state)
+
+        for model in EXPORT_MODELS:
+            label = model._meta.label_lower
+            if label in state['done']:
+                continue
+            fields = _data_fields(model)
+            last_pk = state['last_pk'].get(label)
+            queryset = model._default_manager.order_by('pk')
+            if last_pk is not None:
+                queryset = queryset.filter(pk__gt=last_pk)
+
+            written = 0
+            for obj in queryset.iterator(chunk_size=chunk_size):
+                record = {'model': label, 'pk': obj.pk, 'fields': {f.attname: _value(f, obj) for f in fields}}
+                out.write(json.dumps(record, cls=DjangoJSONEncoder, ensure_ascii=False).encode('utf-8') + b'\n')
+                written += 1
+                last_pk = obj.pk
+                if written % chunk_size == 0:
+                    checkpoint(label, last_pk)
+                    if stdout:
+                        stdout.write(f'  {label}: {written} rows')
+            state['done'].append(label)
+            checkpoint(label, last_pk)
+            counts[label] = written
+            if stdout:
+                stdout.write(f'  {label}: {written} rows')
+
+    if state_path and os.path.exists(state_path):
+        os.remove(state_path)
+    return counts
+
+
+@contextmanager
+def keep_timestamps(*model_classes):
+    """Let bulk_create write the given created_at/updated_at values instead of now()"""
+    saved = [(f, f.auto_now, f.auto_now_add) for model in model_classes for f in model._meta.concrete_fields
+             if getattr(f, 'auto_now', False) or getattr(f, 'auto_now_add', False)]
+    for f, _auto_now, _auto_now_add in saved:
+        f.auto_now = f.auto_now_add = False
+    try:
+        yield
+    finally:
+        for f, auto_now, auto_now_add in saved:
+            f.auto_now, f.auto_now_add = auto_now, auto_now_add
+
+
+class _ImportState:
+    """Old -> new primary keys and the last committed line, kept in a SQLite side file"""
+
+    def __init__(self, path):
+        self.db = sqlite3.connect(path or ':memory:')
+        self.db.executescript("""
+            CREATE TABLE IF NOT EXISTS mapping (model TEXT, old INTEGER, new INTEGER, PRIMARY KEY (model, old));
+            CREATE TABLE IF NOT EXISTS progress (name TEXT PRIMARY KEY, value INTEGER);
+            CREATE TABLE IF NOT EXISTS rejected (model TEXT, old INTEGER, line INTEGER, error TEXT,
+                                                 PRIMARY KEY (model, old));
+        """)
+
+    @property
+    def line(self):
+        row = self.db.execute("SELECT value FROM progress WHERE name = 'line'").fetchone()
+        return row[0] if row else 0
+
+    def lookup(self, label, old_ids):
+        found = {}
+        old_ids = list(old_ids)
+        for start in range(0, len(old_ids), 500):
+            chunk = old_ids[start:start + 500]
+            found.update(self.db.execute(
+                f"SELECT old, new FROM mapping WHERE model = ? AND old IN ({','.join('?' * len(chunk))})",
+                [label, *chunk],
+            ))
+        return found
+
+    def commit(self, label, pairs, line, rejected=()):
+        self.db.executemany('INSERT OR REPLACE INTO mapping VALUES (?, ?, ?)',
+                            [(label, old, new) for old, new in pairs])
+        self.db.executemany('INSERT OR REPLACE INTO rejected VALUES (?, ?, ?, ?)',
+                            [(label, old, line, error) for old, error in rejected])
+        self.db.execute("INSERT OR REPLACE INTO progress VALUES ('line', ?)", [line])
+        self.db.commit()
+
+    def rejected(self):
+        return self.db.execute('SELECT model, old, line, error FROM rejected ORDER BY line, old').fetchall()
+
+    def close(self):
+        self.db.close()
+
+
+def _create(model, objs, olds):
+    """bulk_create ``objs``; returns the (old pk, error) of rows a constraint rejected.
+
+    When the batch violates a constraint (say a second pending request for
+    the same skill) it is retried row by row, each in its own savepoint, so
+    only the offending rows are left out.
+    """
+    try:
+        with transaction.atomic(), keep_timestamps(model):
+            model._default_manager.bulk_create(objs)
+        return []
+    except IntegrityError:
+        for obj in objs:
+            obj.pk = None  # ids given to rows of the rolled-back insert
+    rejected = []
+    with keep_timestamps(model):
+        for old, obj in zip(olds, objs):
+            try:
+                with transaction.atomic():
+                    model._default_manager.bulk_create([obj])
+            except IntegrityError as e:
+                obj.pk = None
+                rejected.append((old, str(e)))
+    return rejected
+
+
+def _import_batch(model, records, state):
+    """Insert one batch of same-model records.
+
+    Returns (old/new pk pairs, inserted, matched, skipped, rejected), where
+    rejected lists the (old pk, error) of rows a constraint turned away.
+    """
+    fields = {f.attname: f for f in _data_fields(model)}
+
+    # Point foreign keys at the rows they were imported as
+    for field in fields.values():
+        if not field.is_relation:
+            continue
+        target = field.related_model._meta.label_lower
+        olds = {r['fields'][field.attname] for r in records if r['fields'].get(field.attname) is not None}
+        mapping = state.lookup(target, olds)
+        for record in records:
+            old = record['fields'].get(field.attname)
+            if old is None:
+                continue
+            if old in mapping:
+                record['fields'][field.attname] = mapping[old]
+            elif field.null:
+                record['fields'][field.attname] = None
+            else:
+                record['orphan'] = True
+
+    kept = [r for r in records if not r.get('orphan')]
+    objs = [model(**{name: fields[name].to_python(value) for name, value in r['fields'].items() if name in fields})
+            for r in kept]
+
+    existing = {}
+    key = NATURAL_KEYS.get(model)
+    if key:
+        values = {getattr(obj, key[0]) for obj in objs}
+        for row in model._default_manager.filter(**{f'{key[0]}__in': values}).values_list(*key, 'pk'):
+            existing[row[:-1]] = row[-1]
+
+    pairs, to_create, created_from = [], [], []
+    for record, obj in zip(kept, objs):
+        match = existing.get(tuple(getattr(obj, name) for name in key)) if key else None
+        if match is not None:
+            pairs.append((record['pk'], match))
+        else:
+            to_create.append(obj)
+            created_from.append(record['pk'])
+
+    rejected = _create(model, to_create, created_from)
+    created = [(old, obj.pk) for old, obj in zip(created_from, to_create) if obj.pk is not None]
+    return pairs + created, len(created), len(kept) - len(to_create), len(records) - len(kept), rejected
+
+
+def import_data(path, batch_size=1000, state_path=None, stdout=None):
+    """Load an export_data file, remapping primary and foreign keys; returns {model label: rows inserted}.
+
+    Records are inserted with bulk_create in batches of ``batch_size``. The
+    key mapping and the last imported line live in ``state_path`` (SQLite),
+    so memory stays flat and a rerun after a failure resumes from the last
+    committed batch. A crash between the database commit and the state
+    commit can repeat that one batch. Rows a database constraint rejects
+    are recorded in the state and reported at the end instead of stopping
+    the import; rows that point at them are skipped.
+    """
+    by_label = {m._meta.label_lower: m for m in EXPORT_MODELS}
+    state = _ImportState(state_path)
+    done = state.line
+    counts = {}
+    if done and stdout:
+        stdout.write(f'Resuming import after line {done}')
+
+    def flush(model, batch, line):
+        pairs, inserted, matched, skipped, rejected = _import_batch(model, batch, state)
+        state.commit(model._meta.label_lower, pairs, line, rejected)
+        label = model._meta.label_lower
+        counts[label] = counts.get(label, 0) + inserted
+        if stdout:
+            stdout.write(f'  {label}: +{inserted} inserted, {matched} matched, {skipped} skipped, '
+                         f'{len(rejected)} rejected (line {line})')
+
+    try:
+        with open(path, 'rb') as src:
+            header = json.loads(src.readline())
+            if header.get('format') != FORMAT or header.get('version') != FORMAT_VERSION:
+                raise ValueError(f'{path} is not a {FORMAT} v{FORMAT_VERSION} export')
+
+            model, batch, last = None, [], 1
+            for line, raw in enumerate(src, 2):
+                if line <= done or not raw.strip():
+                    continue
+                record = json.loads(raw)
+                record_model = by_label.get(record['model'])
+                if record_model is None:
+                    raise ValueError(f"line {line}: unknown model {record['model']}")
+                if batch and (record_model is not model or len(batch) >= batch_size):
+                    flush(model, batch, last)
+                    batch = []
+                model, last = record_model, line
+                batch.append(record)
+            if batch:
+                flush(model, batch, last)
+        rejected = state.rejected()
+    finally:
+        state.close()
+
+    if rejected and stdout:
+        stdout.write(f'{len(rejected)} rows were rejected by database constraints:')
+        for label, old, line, error in rejected:
+            stdout.write(f'  {label} {old} (batch ending at line {line}): {error}')
+
+    if state_path and os.path.exists(state_path):
+        os.remove(state_path)
+    return counts
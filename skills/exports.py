@@ -0,0 +1,262 @@
+import hashlib
+import json
+import re
+import textwrap
+
+from asgiref.sync import sync_to_async
+from django.conf import settings
+from django.core.cache import cache
+
+from .fields import iter_text
+from .models import SessionNotes, SessionSummary
+
+
+# Bump when the layout of any format changes so old ETags stop matching
+EXPORT_VERSION = 1
+
+EXPORT_FORMATS = {
+    'txt': 'text/plain; charset=utf-8',
+    'md': 'text/markdown; charset=utf-8',
+    'ndjson': 'application/x-ndjson',
+    'pdf': 'application/pdf',
+}
+
+SPEAKER = re.compile(r'^(?P<speaker>[^:\n]{1,100}):\s(?P<text>.*)$')
+
+
+def _chunk_size():
+    return getattr(settings, 'EXPORT_CHUNK_SIZE', 64 * 1024)
+
+
+def export_source(session):
+    """What an export is built from; the text columns stay compressed until streamed"""
+    summary = (SessionSummary.objects.filter(session=session)
+               .values_list('transcript', 'summary', 'language', 'generated_at').first())
+    notes = SessionNotes.objects.filter(session=session).values_list('notes', 'version', 'updated_at').first()
+    transcript, summary_text, language, generated_at = summary or (None, None, None, None)
+    notes_text, notes_version, notes_updated_at = notes or (None, 0, None)
+    return {
+        'session': session,
+        'transcript': transcript,
+        'summary': summary_text,
+        'language': language,
+        'generated_at': generated_at,
+        'notes': notes_text,
+        'notes_version': notes_version,
+        'notes_updated_at': notes_updated_at,
+    }
+
+
+def export_etag(source, fmt):
+    session = source['session']
+    state = ':'.join(str(part) for part in (
+        EXPORT_VERSION, fmt, session.pk, session.room_name, session.status, session.ended_at,
+        source['generated_at'], source['notes_version'], source['notes_updated_at'],
+    ))
+    return '"%s"' % hashlib.sha1(state.encode('utf-8')).hexdigest()
+
+
+def iter_lines(chunks):
+    """Split a stream of text chunks into lines, holding at most one partial line"""
+    pending = ''
+    for chunk in chunks:
+        pending += chunk
+        *lines, pending = pending.split('\n')
+        yield from lines
+    if pending:
+        yield pending
+
+
+def _when(value):
+    return value.strftime('%Y-%m-%d %H:%M') if value else '-'
+
+
+def _sections(source):
+    size = _chunk_size()
+    return [
+        ('Transcript', iter_text(source['transcript'], size)),
+        ('Summary', iter_text(source['summary'], size)),
+        ('Notes', iter_text(source['notes'], size)),
+    ]
+
+
+def _text(source):
+    session = source['session']
+    yield f'Session {session.room_name}\nStarted: {_when(session.started_at)}\nEnded: {_when(session.ended_at)}\n'
+    for title, chunks in _sections(source):
+        yield f'\n== {title} ==\n'
+        yield from chunks
+        yield '\n'
+
+
+def _markdown(source):
+    session = source['session']
+    yield f'# Session {session.room_name}\n\n- Started: {_when(session.started_at)}\n- Ended: {_when(session.ended_at)}\n'
+    for title, chunks in _sections(source):
+        yield f'\n## {title}\n\n'
+        yield from chunks
+        yield '\n'
+
+
+def _ndjson(source):
+    session = source['session']
+    yield json.dumps({
+        'type': 'session', 'id': session.pk, 'room_name': session.room_name, 'status': session.status,
+        'started_at': session.started_at.isoformat() if session.started_at else None,
+        'ended_at': session.ended_at.isoformat() if session.ended_at else None,
+        'language': source['language'],
+    }) + '\n'
+    for title, chunks in _sections(source):
+        kind = title.lower()
+        for number, line in enumerate(iter_lines(chunks), 1):
+            record = {'type': kind, 'line': number, 'text': line}
+            match = SPEAKER.match(line) if kind == 'transcript' else None
+            if match:
+                record.update(speaker=match['speaker'], text=match['text'])
+            yield json.dumps(record, ensure_ascii=False) + '\n'
+
+
+# PDF layout: A4 in points, one built-in font, so nothing has to be embedded
+PAGE_WIDTH, PAGE_HEIGHT = 595, 842
+MARGIN = 50
+FONT_SIZE = 10
+LEADING = 14
+LINES_PER_PAGE = (PAGE_HEIGHT - 2 * MARGIN) // LEADING
+CHARS_PER_LINE = 95
+
+
+def _pdf_string(line):
+    # Helvetica only covers Latin-1; anything else prints as '?'
+    text = line.encode('latin-1', 'replace').decode('latin-1')
+    return text.replace('\\', '\\\\').replace('(', '\\(').replace(')', '\\)')
+
+
+def _pdf_pages(lines):
+    page = []
+    for line in lines:
+        for piece in textwrap.wrap(line.expandtabs(4), CHARS_PER_LINE) or ['']:
+            page.append(piece)
+            if len(page) == LINES_PER_PAGE:
+                yield page
+                page = []
+    if page:
+        yield page
+
+
+class _PdfWriter:
+    """Keeps the byte offset of every object for the cross-reference table"""
+
+    def __init__(self):
+        self.position = 0
+        self.offsets = {}
+
+    def raw(self, data):
+        self.position += len(data)
+        return data
+
+    def obj(self, number, body):
+        self.offsets[number] = self.position
+        return self.raw(b'%d 0 obj\n' % number + body + b'\nendobj\n')
+
+    def trailer(self, root):
+        count = max(self.offsets) + 1
+        xref = [b'xref\n0 %d\n' % count, b'0000000000 65535 f \n']
+        xref += [b'%010d 00000 n \n' % self.offsets[n] for n in range(1, count)]
+        start = self.position
+        return self.raw(b''.join(xref) + b'trailer\n<< /Size %d /Root %d 0 R >>\nstartxref\n%d\n%%%%EOF\n'
+                        % (count, root, start))
+
+
+def _pdf(source):
+    """A paginated PDF written one page at a time.
+
+    Object 1 is the catalog, 2 the page tree and 3 the font. The page tree
+    lists every page, so it is written last, once the count is known.
+    """
+    writer = _PdfWriter()
+    yield writer.raw(b'%PDF-1.4\n%\xe2\xe3\xcf\xd3\n')
+    yield writer.obj(1, b'<< /Type /Catalog /Pages 2 0 R >>')
+    yield writer.obj(3, b'<< /Type /Font /Subtype /Type1 /BaseFont /Helvetica /Encoding /WinAnsiEncoding >>')
+
+    kids = []
+    number = 4
+    for page in _pdf_pages(iter_lines(_text(source))):
+        ops = [b'BT /F1 %d Tf %d TL %d %d Td' % (FONT_SIZE, LEADING, MARGIN, PAGE_HEIGHT - MARGIN)]
+        ops += [b'(%s) Tj T*' % _pdf_string(line).encode('latin-1') for line in page]
+        ops.append(b'ET')
+        content = b'\n'.join(ops)
+        yield writer.obj(number, b'<< /Length %d >>\nstream\n%s\nendstream' % (len(content), content))
+        yield writer.obj(number + 1, b'<< /Type /Page /Parent 2 0 R /MediaBox [0 0 %d %d] '
+                                     b'/Resources << /Font << /F1 3 0 R >> >> /Contents %d 0 R >>'
+                         % (PAGE_WIDTH, PAGE_HEIGHT, number))
+        kids.append(b'%d 0 R' % (number + 1))
+        number += 2
+
+    yield writer.obj(2, b'<< /Type /Pages /Kids [%s] /Count %d >>' % (b' '.join(kids), len(kids)))
+    yield writer.trailer(root=1)
+
+
+def export_chunks(source, fmt):
+    """The export as a stream of bytes; the same source always gives the same bytes"""
+    if fmt == 'pdf':
+        yield from _pdf(source)
+        return
+    render = {'txt': _text, 'md': _markdown, 'ndjson': _ndjson}[fmt]
+    for chunk in render(source):
+        yield chunk.encode('utf-8')
+
+
+def export_size(source, fmt, etag):
+    """Total length in bytes, counted by streaming once and then cached under the ETag"""
+    key = f'export:size:{etag}'
+    size = cache.get(key)
+    if size is None:
+        size = sum(len(chunk) for chunk in export_chunks(source, fmt))
+        cache.set(key, size, getattr(settings, 'EXPORT_SIZE_CACHE_TIMEOUT', 24 * 3600))
+    return size
+
+
+def parse_range(header, size):
+    """(start, end) for a single 'bytes=' range, None to send everything, or False if unsatisfiable"""
+    match = re.fullmatch(r'bytes=(\d*)-(\d*)', (header or '').strip())
+    if not match or match.group(1) == match.group(2) == '':
+        return None  # absent, malformed or multi-range: ignore it and send the whole export
+    first, last = match.groups()
+    if first == '':
+        start, end = max(size - int(last), 0), size - 1
+    else:
+        start, end = int(first), min(int(last), size - 1) if last else size - 1
+    if start >= size or start > end:
+        return False
+    return start, end
+
+
+def slice_chunks(chunks, start, end):
+    """Only bytes ``start``..``end`` (inclusive) of a byte stream"""
+    position = 0
+    for chunk in chunks:
+        following = position + len(chunk)
+        if following > start:
+            yield chunk[max(start - position, 0):end + 1 - position]
+        if following > end:
+            return
+        position = following
+
+
+_END = object()
+
+
+async def aiter_chunks(chunks):
+    """A byte stream as an async iterator, for StreamingHttpResponse under ASGI.
+
+    Django 4.2 reads a sync iterator to the end before an ASGI server sends
+    any of it; this renders one chunk at a time in a worker thread instead,
+    so memory stays at a chunk and the event loop is never blocked.
+    """
+    chunks = iter(chunks)
+    pull = sync_to_async(next, thread_sensitive=False)
+    while True:
+        chunk = await pull(chunks, _END)
+        if chunk is _END:
+            return
+        yield chunk
@@ -0,0 +1,208 @@
+import codecs
+import zlib
+
+from django import forms
+from django.conf import settings
+from django.db import models
+from django.db.models.query_utils import DeferredAttribute
+
+
+# Stored values start with MARKER and a one-byte format: RAW for UTF-8 that
+# did not get smaller when compressed, otherwise the id of the preset
+# dictionary in DICTIONARIES that the zlib stream was compressed with.
+# Plain text never starts with a NUL, so anything else is a row written
+# before the column was compressed and is read back as UTF-8 unchanged.
+MARKER = b'\x00'
+RAW = 0
+
+# Preset dictionary built from what sessions actually store: speaker
+# prefixes from transcripts and the headings and phrasing of the English and
+# Hindi summaries. zlib matches against its tail first, so the most common
+# strings come last. Never edit a published dictionary; add a new id and
+# point CURRENT_DICTIONARY at it, then run recompress_text.
+_DICTIONARY_V1 = '\n'.join([
+    'Action Items:', 'Questions and Answers:', 'Important Highlights:', 'Learning Outcomes:',
+    'Key Topics Discussed:', 'Session Summary', 'This is an AI-generated summary',
+    '**प्रश्न और उत्तर:**', '**आगे की कार्य योजना:**', '**महत्वपूर्ण बातें:**',
+    '**सीखने के परिणाम:**', '**मुख्य विषय:**', '**सत्र का सारांश**',
+    'यह एक AI-generated सारांश है', 'के बारे में', 'के साथ', 'करते हैं', 'कर सकते हैं', 'की समझ',
+    'Practice coding regularly', 'real-world projects', 'practical examples', 'implementation',
+    'programming', 'fundamentals', 'understanding', 'concepts', 'function', 'variable', 'example',
+    'Can you explain', 'Could you show me', 'That makes sense', "Let's start with", 'For example',
+    'Thank you', 'I see', 'So you mean', 'What about', 'How do I', "That's great", 'Exactly!',
+    'Participant: ', 'Educator: ', 'Learner: ', 'Student: ', 'Teacher: ',
+    ' the ', ' and ', ' you ', ' to ', ' is ', ' of ', ' in ', ' that ', ' it ', ' this ',
+    '\n- ', '**\n- ', ':**\n- ', '\n\n**',
+]).encode('utf-8')
+
+DICTIONARIES = {1: _DICTIONARY_V1}
+CURRENT_DICTIONARY = 1
+
+
+def _level():
+    return getattr(settings, 'TEXT_COMPRESSION_LEVEL', 6)
+
+
+def compress_text(text):
+    """Encode ``text`` in the stored format, compressed whenever that saves space"""
+    data = text.encode('utf-8')
+    compressor = zlib.compressobj(_level(), zdict=DICTIONARIES[CURRENT_DICTIONARY])
+    packed = compressor.compress(data) + compressor.flush()
+    if len(packed) < len(data):
+        return MARKER + bytes([CURRENT_DICTIONARY]) + packed
+    return MARKER + bytes([RAW]) + data
+
+
+def decompress_text(raw):
+    """Text for a stored value: compressed, raw or legacy plain text"""
+    if raw is None or isinstance(raw, str):
+        return raw
+    raw = bytes(raw)
+    if not raw.startswith(MARKER):
+        return raw.decode('utf-8')
+    kind, payload = raw[1], raw[2:]
+    if kind == RAW:
+        return payload.decode('utf-8')
+    decompressor = zlib.decompressobj(zdict=DICTIONARIES[kind])
+    return (decompressor.decompress(payload) + decompressor.flush()).decode('utf-8')
+
+
+def iter_text(raw, chunk_size=64 * 1024):
+    """Yield a stored value's text in pieces, inflating at most ``chunk_size`` bytes at a time"""
+    if isinstance(raw, CompressedValue):
+        raw = raw.raw
+    if raw is None:
+        return
+    if isinstance(raw, str):
+        for start in range(0, len(raw), chunk_size):
+            yield raw[start:start + chunk_size]
+        return
+
+    payload = memoryview(bytes(raw))
+    decompressor = None
+    if payload[:1] == MARKER:
+        if payload[1] != RAW:
+            decompressor = zlib.decompressobj(zdict=DICTIONARIES[payload[1]])
+        payload = payload[2:]
+    decoder = codecs.getincrementaldecoder('utf-8')()
+    for start in range(0, len(payload), chunk_size):
+        data = payload[start:start + chunk_size]
+        while data:
+            if decompressor is None:
+                out, data = bytes(data), b''
+            else:
+                out = decompressor.decompress(data, chunk_size)
+                data = decompressor.unconsumed_tail
+            text = decoder.decode(out)
+            if text:
+                yield text
+    tail = decoder.decode(decompressor.flush() if decompressor else b'', final=True)
+    if tail:
+        yield tail
+
+
+class CompressedValue:
+    """A value as loaded from the database, decompressed only when ``text`` is read"""
+
+    __slots__ = ('raw',)
+
+    def __init__(self, raw):
+        self.raw = raw if isinstance(raw, str) else bytes(raw)
+
+    @property
+    def text(self):
+        return decompress_text(self.raw)
+
+    @property
+    def is_current(self):
+        """Stored in the format compress_text would write today"""
+        if isinstance(self.raw, str) or not self.raw.startswith(MARKER):
+            return False
+        return self.raw[1] in (RAW, CURRENT_DICTIONARY)
+
+    def __str__(self):
+        return self.text
+
+    def __repr__(self):
+        return f'<CompressedValue: {len(self.raw)} bytes>'
+
+
+class CompressedTextDescriptor(DeferredAttribute):
+    """Decompresses on first attribute access and keeps the text on the instance"""
+
+    def __get__(self, instance, cls=None):
+        value = super().__get__(instance, cls)
+        if isinstance(value, CompressedValue):
+            value = value.text
+            instance.__dict__[self.field.attname] = value
+        return value
+
+    def __set__(self, instance, value):
+        # Defining __set__ makes this a data descriptor, so __get__ runs even
+        # once the loaded value is in the instance __dict__
+        instance.__dict__[self.field.attname] = value
+
+
+class CompressedTextField(models.BinaryField):
+    """Text stored zlib-compressed in a binary column.
+
+    Model instances decompress lazily, on first access to the attribute, and
+    saving an instance whose text was never read writes the stored bytes back
+    untouched. values() and values_list() return CompressedValue objects;
+    use str() or ``.text`` on them.
+    """
+
+    descriptor_class = CompressedTextDescriptor
+
+    def __init__(self, *args, **kwargs):
+        kwargs.setdefault('editable', True)
+        super().__init__(*args, **kwargs)
+
+    def deconstruct(self):
+        name, path, args, kwargs = super().deconstruct()
+        if kwargs.get('editable') is True:
+            del kwargs['editable']
+        else:
+            kwargs['editable'] = False
+        return name, path, args, kwargs
+
+    def from_db_value(self, value, expression, connection):
+        if value is None:
+            return value
+        return CompressedValue(value)
+
+    def to_python(self, value):
+        if value is None or isinstance(value, str):
+            return value
+        if isinstance(value, CompressedValue):
+            return value.text
+        return decompress_text(value)
+
+    def pre_save(self, model_instance, add):
+        # Skip the descriptor so untouched text is not decompressed just to be recompressed
+        if self.attname in model_instance.__dict__:
+            return model_instance.__dict__[self.attname]
+        return super().pre_save(model_instance, add)
+
+    def get_prep_value(self, value):
+        if value is None:
+            return None
+        if isinstance(value, CompressedValue):
+            return value.raw if isinstance(value.raw, bytes) else compress_text(value.raw)
+        if isinstance(value, (bytes, memoryview)):
+            return bytes(value)
+        return compress_text(str(value))
+
+    def get_default(self):
+        default = super().get_default()
+        return '' if default == b'' else default
+
+    def value_to_string(self, obj):
+        return self.to_python(self.value_from_object(obj))
+
+    def formfield(self, **kwargs):
+        return super(models.BinaryField, self).formfield(**{
+            'form_class': forms.CharField,
+            'widget': forms.Textarea,
+            **kwargs,
+        })
@@ -0,0 +1,105 @@
+import base64
+from datetime import datetime, timedelta, timezone as dt_timezone
+
+from django.conf import settings
+from django.core.cache import cache
+from django.db.models import Count, Q
+
+from .models import SkillRequest
+
+
+STATUSES = [value for value, _label in SkillRequest._meta.get_field('status').choices]
+
+# box -> (SkillRequest field holding the inbox owner, field holding the other party)
+BOXES = {
+    'received': ('educator', 'learner'),
+    'sent': ('learner', 'educator'),
+}
+
+EPOCH = datetime(1970, 1, 1, tzinfo=dt_timezone.utc)
+DEFAULT_PAGE_SIZE = 20
+MAX_PAGE_SIZE = 100
+
+
+def encode_cursor(skill_request):
+    """Opaque keyset cursor for the (created_at, id) position of a row"""
+    micros = (skill_request.created_at - EPOCH) // timedelta(microseconds=1)
+    return base64.urlsafe_b64encode(f'{micros}:{skill_request.pk}'.encode()).decode().rstrip('=')
+
+
+def decode_cursor(cursor):
+    """Inverse of encode_cursor; returns None for a missing or malformed cursor"""
+    if not cursor:
+        return None
+    try:
+        padded = cursor + '=' * (-len(cursor) % 4)
+        micros, pk = base64.urlsafe_b64decode(padded.encode()).decode().split(':')
+        created_at = EPOCH + timedelta(microseconds=int(micros))
+        pk = int(pk)
+    except (ValueError, UnicodeDecodeError, OverflowError):
+        return None
+    if not 0 < pk < 2 ** 63:  # larger ids don't fit the database's integer column
+        return None
+    return created_at, pk
+
+
+def inbox_page(user, box='received', status='pending', cursor=None, limit=DEFAULT_PAGE_SIZE):
+    """One page of a user's inbox, newest first, using keyset pagination.
+
+    The filter and ordering match the (owner, status, -created_at, -id)
+    index, so each page is an index range scan regardless of depth.
+    Returns (requests, next_cursor).
+    """
+    owner_field, other_field = BOXES[box]
+    limit = max(1, min(int(limit), MAX_PAGE_SIZE))
+
+    requests = SkillRequest.objects.select_related(other_field, 'requested_skill__skill').filter(
+        **{owner_field: user}, status=status
+    )
+    position = decode_cursor(cursor)
+    if position:
+        created_at, pk = position
+        requests = requests.filter(Q(created_at__lt=created_at) | Q(created_at=created_at, pk__lt=pk))
+
+    page = list(requests.order_by('-created_at', '-id')[:limit + 1])
+    next_cursor = encode_cursor(page[limit - 1]) if len(page) > limit else None
+    return page[:limit], next_cursor
+
+
+def _counts_key(box, user_id):
+    return f'inbox_counts:{box}:{user_id}'
+
+
+def inbox_counts(user, box='received'):
+    """Per-status counts plus unread count for a box, cached until the box changes"""
+    key = _counts_key(box, user.pk)
+    counts = cache.get(key)
+    if counts is None:
+        owner_field, _other = BOXES[box]
+        rows = (
+            SkillRequest.objects.filter(**{owner_field: user})
+            .values('status')
+            .annotate(total=Count('id'), unread=Count('id', filter=Q(is_read=False)))
+        )
+        counts = {status: 0 for status in STATUSES}
+        counts['unread'] = 0
+        for row in rows:
+            counts[row['status']] = row['total']
+            if box == 'received':
+                counts['unread'] += row['unread']
+        cache.set(key, counts, getattr(settings, 'INBOX_COUNTS_CACHE_TIMEOUT', 600))
+    return counts
+
+
+def invalidate_inbox_counts(*user_ids):
+    """Drop cached counts for everyone on either side of a changed request"""
+    cache.delete_many([_counts_key(box, user_id) for user_id in user_ids for box in BOXES])
+
+
+def mark_read(user, skill_requests):
+    """Mark received requests as read by the educator"""
+    ids = [r.pk for r in skill_requests if r.educator_id == user.pk and not r.is_read]
+    if ids:
+        SkillRequest.objects.filter(pk__in=ids).update(is_read=True)
+        invalidate_inbox_counts(user.pk)
+    return ids
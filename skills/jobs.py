@@ -0,0 +1,239 @@
+import asyncio
+import hashlib
+import json
+import logging
+import threading
+import time
+import uuid
+from concurrent.futures import ThreadPoolExecutor
+from datetime import timedelta
+
+from asgiref.sync import sync_to_async
+from django.conf import settings
+from django.db import IntegrityError, close_old_connections, transaction
+from django.utils import timezone
+
+from . import profiling, tracing
+from .models import BackgroundJob
+
+
+# Job state lives in the database so every worker process can report on a
+# job, whichever one is running it; the work itself runs in a thread pool in
+# the process that accepted the request.
+
+logger = logging.getLogger('skills.jobs')
+
+FIELDS = ('id', 'kind', 'session_id', 'status', 'stage', 'progress', 'events', 'result', 'error', 'dedupe_key',
+          'traceparent', 'profile')
+FINISHED = ('done', 'failed')
+
+_executor = None
+_executor_lock = threading.Lock()
+
+
+def _setting(name, default):
+    return getattr(settings, name, default)
+
+
+def _timeout():
+    return _setting('JOBS_RESULT_TIMEOUT', 3600)
+
+
+def _get_executor():
+    global _executor
+    with _executor_lock:
+        if _executor is None:
+            _executor = ThreadPoolExecutor(max_workers=_setting('JOBS_MAX_WORKERS', 2),
+                                           thread_name_prefix='bmb-job')
+        return _executor
+
+
+def _live():
+    """Jobs not yet expired: kept for JOBS_RESULT_TIMEOUT seconds after their last update"""
+    return BackgroundJob.objects.filter(updated_at__gte=timezone.now() - timedelta(seconds=_timeout()))
+
+
+def get_job(job_id):
+    if not job_id:
+        return None
+    return _live().filter(pk=job_id).values(*FIELDS).first()
+
+
+def latest_job_for_session(session_id):
+    return _live().filter(session_id=session_id).order_by('-created_at').values(*FIELDS).first()
+
+
+def _record(job_id, event, **fields):
+    """Append ``event`` to the job's log and apply ``fields``; only the job's own thread writes a job"""
+    job = get_job(job_id)
+    if job is None:
+        return
+    job.update(fields)
+    event = {'seq': len(job['events']) + 1, **(event(job) if callable(event) else event)}
+    BackgroundJob.objects.filter(pk=job_id).update(events=job['events'] + [event], updated_at=timezone.now(),
+                                                   **fields)
+
+
+class Progress:
+    """Callable handed to a job: progress(stage, percent, **extra) records one event"""
+
+    def __init__(self, job_id):
+        self.job_id = job_id
+
+    def __call__(self, stage, percent=None, **extra):
+        fields = {'stage': stage} if percent is None else {'stage': stage, 'progress': percent}
+        _record(self.job_id, {'stage': stage, 'progress': percent, **extra}, **fields)
+
+
+def _finish(job_id, **fields):
+    # The last event is named after the outcome, so streams know to stop
+    _record(job_id, lambda job: {'stage': job['status'], 'progress': job['progress']}, **fields)
+
+
+def _run(job_id, func, args):
+    job = get_job(job_id)
+    if job is None:
+        return
+    BackgroundJob.objects.filter(pk=job_id).update(status='running', updated_at=timezone.now())
+    profile = job.get('profile') or profiling.should_profile(None, _setting('PROFILING_JOB_SAMPLE_RATE', 0))
+    try:
+        # Continued from the traceparent stored at submit time, so it works in any thread or process
+        with tracing.span(f"job {job['kind']}", 'consumer', parent=job.get('traceparent'), **{'job.id': job_id}), \
+                tracing.db_spans(), profiling.maybe_profile(f"job {job['kind']}", profile, job_id=job_id):
+            result = func(Progress(job_id), *args)
+    except Exception as e:
+        logger.exception('Job %s (%s) failed', job_id, job['kind'])
+        _finish(job_id, status='failed', error=str(e))
+    else:
+        _finish(job_id, status='done', progress=100, result=result)
+    finally:
+        close_old_connections()
+
+
+def _dedupe_key(kind, dedupe):
+    key = f'{kind}:{dedupe}'
+    return key if len(key) <= 255 else f'{kind}:sha1:{hashlib.sha1(key.encode()).hexdigest()}'
+
+
+def start_job(kind, func, *args, session_id=None, dedupe=None):
+    """Run ``func(progress, *args)`` in the background and return the job dict.
+
+    If ``dedupe`` is given and an identical job is still queued or running,
+    that job is returned instead of starting the work twice, so a client
+    that times out and retries just re-attaches to the same progress stream.
+    """
+    dedupe_key = _dedupe_key(kind, dedupe) if dedupe is not None else None
+    if dedupe_key:
+        existing = _live().filter(dedupe_key=dedupe_key, status__in=('queued', 'running')).values(*FIELDS).first()
+        if existing:
+            return existing
+
+    job = BackgroundJob(
+        id=uuid.uuid4().hex, kind=kind, session_id=session_id, dedupe_key=dedupe_key,
+        # Jobs started while a request is being profiled are profiled too
+        profile=profiling.active_label(),
+    )
+    with tracing.span(f'enqueue {kind}', 'producer', **{'job.id': job.id}) as span:
+        job.traceparent = span.traceparent
+    try:
+        with transaction.atomic():
+            job.save(force_insert=True)
+    except IntegrityError:
+        # Another request started the same work a moment ago
+        existing = get_job(BackgroundJob.objects.filter(dedupe_key=dedupe_key, status__in=('queued', 'running'))
+                           .values_list('pk', flat=True).first())
+        if existing:
+            return existing
+        raise
+    BackgroundJob.objects.filter(updated_at__lt=timezone.now() - timedelta(seconds=_timeout())).delete()
+
+    if _setting('JOBS_RUN_INLINE', False):
+        _run(job.id, func, args)
+    else:
+        # The pool's thread must see the committed row
+        transaction.on_commit(lambda: _get_executor().submit(_run, job.id, func, args))
+    return get_job(job.id)
+
+
+def public_job(job):
+    """The parts of a job that are safe to send to the browser"""
+    return {name: job[name] for name in ('id', 'kind', 'status', 'stage', 'progress', 'result', 'error')}
+
+
+def _frame(event, data, event_id=None):
+    lines = []
+    if event_id is not None:
+        lines.append(f'id: {event_id}')
+    lines.append(f'event: {event}')
+    lines.append(f'data: {json.dumps(data)}')
+    return '\n'.join(lines) + '\n\n'
+
+
+def _new_frames(job, sent):
+    """Frames for the events after ``sent``: (frames, last seq sent, whether the stream is over)"""
+    if job is None:
+        return [_frame('failed', {'error': 'Job not found or expired'})], sent, True
+    frames = []
+    for event in job['events'][sent:]:
+        if event['stage'] in FINISHED:
+            frames.append(_frame(event['stage'], public_job(job), event['seq']))
+            return frames, event['seq'], True
+        frames.append(_frame('progress', event, event['seq']))
+        sent = event['seq']
+    if job['status'] in FINISHED:
+        # Finished before (or while) we reconnected
+        frames.append(_frame(job['status'], public_job(job)))
+        return frames, sent, True
+    return frames, sent, False
+
+
+def event_stream(job_id, last_event_id=0, timeout=None):
+    """Server-Sent Events for a job: one 'progress' frame per stage, then 'done' or 'failed'.
+
+    Reads the job every JOBS_POLL_INTERVAL seconds and sends a comment line
+    as keep-alive. Resumes after ``last_event_id`` so a reconnecting
+    EventSource only gets what it missed. The stream ends when the job does,
+    or after ``timeout`` seconds (the browser reconnects). This one blocks
+    its thread while it waits; under ASGI use aevent_stream.
+    """
+    poll = _setting('JOBS_POLL_INTERVAL', 0.5)
+    keepalive = _setting('JOBS_KEEPALIVE_INTERVAL', 15)
+    deadline = time.monotonic() + (timeout or _setting('JOBS_STREAM_TIMEOUT', 600))
+    sent = last_event_id
+    last_write = time.monotonic()
+
+    yield f'retry: {int(poll * 2000)}\n\n'
+    while time.monotonic() < deadline:
+        frames, sent, over = _new_frames(get_job(job_id), sent)
+        yield from frames
+        if over:
+            return
+        if frames:
+            last_write = time.monotonic()
+        elif time.monotonic() - last_write >= keepalive:
+            yield ': keep-alive\n\n'
+            last_write = time.monotonic()
+        time.sleep(poll)
+
+
+async def aevent_stream(job_id, last_event_id=0, timeout=None):
+    """event_stream for ASGI: waits with asyncio.sleep, so a stream holds no thread while idle"""
+    poll = _setting('JOBS_POLL_INTERVAL', 0.5)
+    keepalive = _setting('JOBS_KEEPALIVE_INTERVAL', 15)
+    deadline = time.monotonic() + (timeout or _setting('JOBS_STREAM_TIMEOUT', 600))
+    sent = last_event_id
+    last_write = time.monotonic()
+
+    yield f'retry: {int(poll * 2000)}\n\n'
+    while time.monotonic() < deadline:
+        frames, sent, over = _new_frames(await sync_to_async(get_job)(job_id), sent)
+        for frame in frames:
+            yield frame
+        if over:
+            return
+        if frames:
+            last_write = time.monotonic()
+        elif time.monotonic() - last_write >= keepalive:
+            yield ': keep-alive\n\n'
+            last_write = time.monotonic()
+        await asyncio.sleep(poll)
@@ -0,0 +1,281 @@
+# Live session channel: a plain ASGI WebSocket app mounted next to Django in
+# borrowmybrain/asgi.py at /ws/session/<session_id>/.
+#
+# Frames are JSON objects with a "type":
+#   client -> server: transcript {segments: [{speaker, text, ts}]},
+#                     notes {base_version, diffs}, summary {language, summary?}, ping
+#   server -> client: transcript, notes, notes_saved, notes_conflict, summary,
+#                     ack, pong, error, or batch {messages: [...]}
+#
+# Only the session's host and its participants may connect, from a page
+# served by one of our hosts (ALLOWED_HOSTS or CSRF_TRUSTED_ORIGINS); anyone
+# else is closed with 4403 before the socket is accepted.
+#
+# Every connection has a bounded outgoing queue drained by its own sender
+# task. The sender coalesces whatever is queued into one "batch" frame, and a
+# client that falls so far behind that its queue fills is closed with 1013
+# instead of holding up everyone else in the room. Rooms live in this process,
+# so run one worker per live session (or put a shared broker in front).
+import asyncio
+import json
+import logging
+import re
+from http.cookies import SimpleCookie
+from importlib import import_module
+from types import SimpleNamespace
+from urllib.parse import urlsplit
+
+from asgiref.sync import sync_to_async
+from django.conf import settings
+from django.contrib.auth import get_user
+from django.http.request import split_domain_port, validate_host
+
+from .models import Session, SessionParticipant
+from .notes_buffer import NotesConflict, update_notes
+
+PATH = re.compile(r'^/ws/session/(?P<session_id>\d+)/?$')
+
+# Close codes
+TRY_AGAIN_LATER = 1013
+FORBIDDEN = 4403
+NOT_FOUND = 4404
+
+logger = logging.getLogger('skills.live')
+
+
+def _setting(name, default):
+    return getattr(settings, name, default)
+
+
+class Connection:
+    """One socket's outgoing side"""
+
+    def __init__(self, user_id):
+        self.user_id = user_id
+        self.queue = asyncio.Queue(maxsize=_setting('LIVE_QUEUE_SIZE', 200))
+        self.overflowed = False
+
+    def push(self, message):
+        if self.overflowed:
+            return
+        try:
+            self.queue.put_nowait(message)
+        except asyncio.QueueFull:
+            self.overflowed = True
+
+
+class Room:
+    """Everyone connected to one session, plus the transcript streamed so far"""
+
+    def __init__(self, session_id):
+        self.session_id = session_id
+        self.connections = set()
+        self.transcript = []
+        self.segments_since_summary = 0
+        self.summarizing = False
+
+    def broadcast(self, message, exclude=None):
+        for conn in self.connections:
+            if conn is not exclude:
+                conn.push(message)
+
+    def transcript_text(self):
+        return '\n'.join(f"{s['speaker']}: {s['text']}" for s in self.transcript)
+
+
+ROOMS = {}
+
+
+def _header(scope, name):
+    for key, value in scope.get('headers', []):
+        if key == name:
+            return value.decode('latin-1')
+    return None
+
+
+def _user_id(scope):
+    """Authenticated user id from the Django session cookie, or None"""
+    cookies = SimpleCookie()
+    for name, value in scope.get('headers', []):
+        if name == b'cookie':
+            cookies.load(value.decode('latin-1'))
+    morsel = cookies.get(settings.SESSION_COOKIE_NAME)
+    if morsel is None:
+        return None
+    store = import_module(settings.SESSION_ENGINE).SessionStore(morsel.value)
+    # get_user also checks the session's auth hash, so a changed password logs sockets out too
+    return get_user(SimpleNamespace(session=store)).pk
+
+
+def _origin_allowed(scope):
+    """Whether the page that opened the socket is one of ours.
+
+    Browsers always send Origin on WebSocket handshakes; clients that don't
+    send one still need a session cookie.
+    """
+    origin = _header(scope, b'origin')
+    if origin is None:
+        return True
+    if origin in settings.CSRF_TRUSTED_ORIGINS:
+        return True
+    allowed_hosts = settings.ALLOWED_HOSTS
+    if settings.DEBUG and not allowed_hosts:
+        allowed_hosts = ['.localhost', '127.0.0.1', '[::1]']
+    domain, _port = split_domain_port(urlsplit(origin).netloc)
+    return bool(domain) and validate_host(domain, allowed_hosts)
+
+
+def _session_exists(session_id):
+    return Session.objects.filter(pk=session_id).exists()
+
+
+def _may_join(session_id, user_id):
+    """The host and the participants of a session may use its channel"""
+    if user_id is None:
+        return False
+    return (Session.objects.filter(pk=session_id, user_id=user_id).exists()
+            or SessionParticipant.objects.filter(session_id=session_id, user_id=user_id).exists())
+
+
+def _summarize(session_id, transcript, language, summary=None):
+    """Generate (unless the client sent one) and store a summary"""
+    from .session_views_production import AISummaryService, store_summary
+
+    is_mock = False
+    if not summary:
+        service = AISummaryService()
+        summary = service.generate_summary(transcript, language)
+        is_mock = not service.use_real_ai
+    store_summary(session_id, transcript, summary, language)
+    return summary, is_mock
+
+
+async def _sender(conn, send):
+    """Drain the queue, batching whatever piled up within the batch window"""
+    window = _setting('LIVE_BATCH_WINDOW', 0.05)
+    batch_max = _setting('LIVE_BATCH_MAX', 50)
+    while True:
+        messages = [await conn.queue.get()]
+        if window:
+            await asyncio.sleep(window)
+        while len(messages) < batch_max and not conn.queue.empty():
+            messages.append(conn.queue.get_nowait())
+        if conn.overflowed:
+            await send({'type': 'websocket.close', 'code': TRY_AGAIN_LATER})
+            return
+        payload = messages[0] if len(messages) == 1 else {'type': 'batch', 'messages': messages}
+        await send({'type': 'websocket.send', 'text': json.dumps(payload)})
+
+
+async def _run_summary(room, language, summary=None):
+    room.summarizing = True
+    try:
+        summary, is_mock = await sync_to_async(_summarize, thread_sensitive=False)(
+            room.session_id, room.transcript_text(), language, summary
+        )
+        room.broadcast({'type': 'summary', 'summary': summary, 'is_mock': is_mock})
+    except Exception:
+        logger.exception('Live summary failed for session %s', room.session_id)
+        room.broadcast({'type': 'error', 'error': 'Failed to generate summary'})
+    finally:
+        room.summarizing = False
+        if not room.connections:
+            ROOMS.pop(room.session_id, None)
+
+
+async def _handle(room, conn, message):
+    kind = message.get('type')
+
+    if kind == 'transcript':
+        limit = _setting('LIVE_MAX_SEGMENTS_PER_FRAME', 100)
+        segments = [
+            {'speaker': str(s.get('speaker') or 'Participant')[:100], 'text': str(s.get('text', '')).strip(),
+             'ts': s.get('ts')}
+            for s in message.get('segments', [])[:limit] if isinstance(s, dict)
+        ]
+        segments = [s for s in segments if s['text']]
+        room.transcript.extend(segments)
+        del room.transcript[:-_setting('LIVE_TRANSCRIPT_MAX_SEGMENTS', 5000)]
+        room.broadcast({'type': 'transcript', 'segments': segments}, exclude=conn)
+        conn.push({'type': 'ack', 'received': len(segments), 'total': len(room.transcript)})
+
+        room.segments_since_summary += len(segments)
+        every = _setting('LIVE_SUMMARY_EVERY', 0)
+        if every and room.segments_since_summary >= every and not room.summarizing:
+            room.segments_since_summary = 0
+            asyncio.ensure_future(_run_summary(room, message.get('language', 'hindi')))
+
+    elif kind == 'notes':
+        try:
+            entry = await sync_to_async(update_notes)(room.session_id, message.get('base_version', 0),
+                                                      message.get('diffs', []))
+        except NotesConflict as conflict:
+            conn.push({'type': 'notes_conflict', 'version': conflict.entry['version'],
+                       'notes': conflict.entry['text']})
+            return
+        except (KeyError, TypeError, ValueError) as e:
+            conn.push({'type': 'error', 'error': f'Invalid diff: {e}'})
+            return
+        conn.push({'type': 'notes_saved', 'version': entry['version']})
+        room.broadcast({'type': 'notes', 'version': entry['version'], 'diffs': message.get('diffs', [])},
+                       exclude=conn)
+
+    elif kind == 'summary':
+        if not room.transcript:
+            conn.push({'type': 'error', 'error': 'No transcript provided'})
+        elif not room.summarizing:
+            room.segments_since_summary = 0
+            asyncio.ensure_future(_run_summary(room, message.get('language', 'hindi'), message.get('summary')))
+
+    elif kind == 'ping':
+        conn.push({'type': 'pong'})
+
+    else:
+        conn.push({'type': 'error', 'error': f'Unknown message type: {kind}'})
+
+
+async def live_application(scope, receive, send):
+    """ASGI entry point for /ws/session/<id>/ WebSocket connections"""
+    match = PATH.match(scope.get('path', ''))
+    event = await receive()
+    if event['type'] != 'websocket.connect':
+        return
+    if not match or not await sync_to_async(_session_exists)(int(match['session_id'])):
+        await send({'type': 'websocket.close', 'code': NOT_FOUND})
+        return
+
+    session_id = int(match['session_id'])
+    user_id = await sync_to_async(_user_id)(scope)
+    if not _origin_allowed(scope) or not await sync_to_async(_may_join)(session_id, user_id):
+        await send({'type': 'websocket.close', 'code': FORBIDDEN})
+        return
+    conn = Connection(user_id)
+    await send({'type': 'websocket.accept'})
+
+    room = ROOMS.setdefault(session_id, Room(session_id))
+    room.connections.add(conn)
+    sender = asyncio.ensure_future(_sender(conn, send))
+    max_frame = _setting('LIVE_MAX_FRAME_BYTES', 64 * 1024)
+    try:
+        while True:
+            event = await receive()
+            if event['type'] == 'websocket.disconnect':
+                break
+            if event['type'] != 'websocket.receive':
+                continue
+            text = event.get('text') or (event.get('bytes') or b'').decode('utf-8', 'replace')
+            if len(text) > max_frame:
+                conn.push({'type': 'error', 'error': 'Frame too large'})
+                continue
+            try:
+                message = json.loads(text)
+            except ValueError:
+                conn.push({'type': 'error', 'error': 'Invalid JSON'})
+                continue
+            if isinstance(message, dict):
+                await _handle(room, conn, message)
+    finally:
+        room.connections.discard(conn)
+        if not room.connections and not room.summarizing:
+            ROOMS.pop(session_id, None)
+        sender.cancel()
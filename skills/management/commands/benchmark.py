@@ -0,0 +1,111 @@
+import json
+import os
+import tempfile
+
+from django.conf import settings
+from django.core.management.base import BaseCommand, CommandError
+from django.db import connection
+from django.test.utils import override_settings
+
+from skills.benchmarks import HEADER, TARGETS, compare, environment, prepare_context, run_benchmarks
+from skills.search import rebuild_search_docs
+from skills.standins import (DAILY_BEHAVIOUR, GEMINI_BEHAVIOUR, GEMINI_CHUNK_MS, Behaviour, DailyStandIn,
+                             GeminiStandIn, standin_settings)
+from skills.synthetic import generate
+
+
+class Command(BaseCommand):
+    help = ('Load-test the main pages and session APIs against a throwaway synthetic database '
+            'and compare with a stored baseline')
+
+    def add_arguments(self, parser):
+        parser.add_argument('--users', type=int, default=2000, help='Synthetic users to generate')
+        parser.add_argument('--seed', type=int, default=42)
+        parser.add_argument('--concurrency', type=int, default=8, help='Simultaneous clients')
+        parser.add_argument('--requests', type=int, default=200, help='Measured requests per endpoint')
+        parser.add_argument('--warmup', type=int, default=5, help='Unmeasured requests per client first')
+        parser.add_argument('--interface', choices=['wsgi', 'asgi'], default='wsgi')
+        parser.add_argument('--endpoints', help='Comma-separated subset of: ' + ', '.join(t.name for t in TARGETS))
+        parser.add_argument('--baseline', default=os.path.join(settings.BASE_DIR, 'benchmarks', 'baselines', 'default.json'),
+                            help='Baseline file to compare against (or write with --save-baseline)')
+        parser.add_argument('--save-baseline', action='store_true', help='Write the results as the new baseline')
+        parser.add_argument('--standins', action='store_true',
+                            help='Route Daily and Gemini calls to local stand-ins with realistic latency and errors')
+        parser.add_argument('--standin-latency-scale', type=float, default=1.0,
+                            help='Multiply the stand-ins\' typical latencies (0 for instant replies)')
+        parser.add_argument('--tolerance', type=float, default=0.5,
+                            help='Allowed relative slowdown of p95 and throughput before flagging')
+
+    def handle(self, *args, **options):
+        names = [t.name for t in TARGETS]
+        if options['endpoints']:
+            names = [name.strip() for name in options['endpoints'].split(',')]
+            unknown = set(names) - {t.name for t in TARGETS}
+            if unknown:
+                raise CommandError(f"Unknown endpoints: {', '.join(sorted(unknown))}")
+
+        # A file-backed throwaway database so worker threads share it like real processes would
+        workdir = tempfile.mkdtemp(prefix='bmb-bench-')
+        if connection.vendor == 'sqlite':
+            connection.settings_dict['TEST']['NAME'] = os.path.join(workdir, 'bench.sqlite3')
+            self.stdout.write(self.style.WARNING(
+                'SQLite allows one writer at a time, so the write endpoints queue behind each other '
+                'under concurrency; use PostgreSQL for numbers that match production.'))
+        external = {'DAILY_API_KEY': None, 'GEMINI_API_KEY': None}
+        standins = []
+        if options['standins']:
+            scale = options['standin_latency_scale']
+            daily = DailyStandIn(Behaviour(**{**DAILY_BEHAVIOUR, 'latency_ms': DAILY_BEHAVIOUR['latency_ms'] * scale},
+                                           seed=options['seed']))
+            gemini = GeminiStandIn(Behaviour(**{**GEMINI_BEHAVIOUR, 'latency_ms': GEMINI_BEHAVIOUR['latency_ms'] * scale},
+                                             seed=options['seed']), chunk_ms=GEMINI_CHUNK_MS * scale)
+            standins = [daily.start(), gemini.start()]
+            external = standin_settings(daily, gemini)
+            self.stdout.write(f'Daily stand-in at {daily.url}, Gemini stand-in at {gemini.url}')
+
+        old_name = connection.creation.create_test_db(verbosity=0, autoclobber=True, serialize=False)
+        try:
+            with override_settings(DEBUG=False, ALLOWED_HOSTS=[*settings.ALLOWED_HOSTS, 'testserver'], **external):
+                self.stdout.write(f"Generating {options['users']} synthetic users...")
+                generate(options['users'], seed=options['seed'])
+                rebuild_search_docs()
+                ctx = prepare_context(options['concurrency'], options['seed'])
+
+                self.stdout.write(f"{options['interface'].upper()}, {options['concurrency']} clients, "
+                                  f"{options['requests']} requests per endpoint\n{HEADER}")
+                results = run_benchmarks(ctx, names, concurrency=options['concurrency'],
+                                         requests=options['requests'], warmup=options['warmup'],
+                                         interface=options['interface'], seed=options['seed'], stdout=self.stdout)
+        finally:
+            connection.creation.destroy_test_db(old_name, verbosity=0)
+            for standin in standins:
+                standin.stop()
+        for standin in standins:
+            self.stdout.write(f'{type(standin).__name__} responses: '
+                              + (', '.join(f'{status}: {n}' for status, n in sorted(standin.counts.items())) or 'none'))
+
+        meta = environment(users=options['users'], seed=options['seed'], concurrency=options['concurrency'],
+                           requests=options['requests'], interface=options['interface'],
+                           standins=options['standins'] and options['standin_latency_scale'])
+        path = options['baseline']
+        if options['save_baseline']:
+            os.makedirs(os.path.dirname(path), exist_ok=True)
+            with open(path, 'w') as f:
+                json.dump({'meta': meta, 'endpoints': results}, f, indent=2, sort_keys=True)
+                f.write('\n')
+            self.stdout.write(self.style.SUCCESS(f'Saved baseline to {path}'))
+            return
+
+        if not os.path.exists(path):
+            self.stdout.write(self.style.WARNING(f'No baseline at {path}; run with --save-baseline to create one.'))
+            return
+        with open(path) as f:
+            baseline = json.load(f)
+        compared = ('users', 'concurrency', 'interface', 'standins')
+        if {k: baseline['meta'].get(k, False) for k in compared} != {k: meta[k] for k in compared}:
+            self.stdout.write(self.style.WARNING(
+                'Baseline was recorded with different --users/--concurrency/--interface/--standins.'))
+        problems = compare(results, baseline, tolerance=options['tolerance'])
+        if problems:
+            raise CommandError('Regressions against baseline:\n  ' + '\n  '.join(problems))
+        self.stdout.write(self.style.SUCCESS(f'No regressions against {path}.'))
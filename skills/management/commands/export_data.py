@@ -0,0 +1,20 @@
+from django.core.management.base import BaseCommand
+
+from skills.datamove import export_data
+
+
+class Command(BaseCommand):
+    help = 'Stream users, profiles, skills, requests and session data to an NDJSON file'
+
+    def add_arguments(self, parser):
+        parser.add_argument('path', help='File to write')
+        parser.add_argument('--chunk-size', type=int, default=2000,
+                            help='Rows fetched per query and written between checkpoints')
+        parser.add_argument('--state', help='Checkpoint file used to resume (default: <path>.state)')
+
+    def handle(self, *args, **options):
+        path = options['path']
+        self.stdout.write(f'Exporting to {path}...')
+        counts = export_data(path, chunk_size=options['chunk_size'],
+                             state_path=options['state'] or f'{path}.state', stdout=self.stdout)
+        self.stdout.write(self.style.SUCCESS(f'Exported {sum(counts.values())} rows.'))
@@ -0,0 +1,18 @@
+from django.core.management.base import BaseCommand
+
+from skills.matching import find_all_cycles
+
+
+class Command(BaseCommand):
+    help = 'Find 2- and 3-way skill exchange cycles and cache them as suggestions'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--budget', type=float, default=None,
+                            help='Seconds to spend searching (default: BARTER_SWEEP_BUDGET)')
+
+    def handle(self, *args, **options):
+        self.stdout.write('Finding barter cycles...')
+        found, complete = find_all_cycles(budget=options['budget'], stdout=self.stdout)
+        if not complete:
+            self.stdout.write(self.style.WARNING('Time budget reached; the search stopped early.'))
+        self.stdout.write(self.style.SUCCESS(f'Cached {found} barter cycles.'))
@@ -0,0 +1,11 @@
+from django.core.management.base import BaseCommand
+
+from skills.notes_buffer import flush_notes
+
+
+class Command(BaseCommand):
+    help = 'Write buffered session notes to the database'
+
+    def handle(self, *args, **options):
+        written = flush_notes()
+        self.stdout.write(self.style.SUCCESS(f'Flushed notes for {written} sessions.'))
@@ -0,0 +1,54 @@
+import time
+
+from django.contrib.auth.models import User
+from django.core.management.base import BaseCommand, CommandError
+
+from skills.ranking import rebuild_ranking_scores
+from skills.search import rebuild_search_docs
+from skills.synthetic import SHARED_PASSWORD, generate
+from skills.transitions import reconcile_counters
+
+
+class Command(BaseCommand):
+    help = 'Generate a reproducible synthetic dataset (users, educators, requests, sessions) for load testing'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--users', type=int, default=1000, help='Number of users to create')
+        parser.add_argument('--seed', type=int, default=42, help='Random seed; the same seed gives the same data')
+        parser.add_argument('--prefix', default='synth', help='Username and room name prefix')
+        parser.add_argument('--educator-share', type=float, default=0.4,
+                            help='Fraction of users who teach at least one skill')
+        parser.add_argument('--requests-per-user', type=float, default=1.5,
+                            help='Average number of skill requests each user sends')
+        parser.add_argument('--batch-size', type=int, default=5000,
+                            help='Rows per bulk_create and per transaction')
+        parser.add_argument('--no-rebuild', action='store_true',
+                            help='Skip rebuilding counters, the search index and ranking scores')
+
+    def handle(self, *args, **options):
+        prefix = options['prefix']
+        if User.objects.filter(username__startswith=prefix).exists():
+            raise CommandError(f'Users named {prefix}* already exist; pick another --prefix.')
+
+        started = time.monotonic()
+        self.stdout.write(f"Generating {options['users']} users (seed {options['seed']})...")
+        totals = generate(
+            options['users'],
+            seed=options['seed'],
+            prefix=prefix,
+            educator_share=options['educator_share'],
+            requests_per_user=options['requests_per_user'],
+            batch_size=options['batch_size'],
+            stdout=self.stdout,
+        )
+
+        # bulk_create bypasses the signals that keep these in step
+        if not options['no_rebuild']:
+            rebuild_search_docs(stdout=self.stdout)
+            reconcile_counters(stdout=self.stdout)
+            rebuild_ranking_scores(stdout=self.stdout)
+
+        summary = ', '.join(f'{count} {name.replace("_", " ")}' for name, count in totals.items())
+        self.stdout.write(self.style.SUCCESS(
+            f'Created {summary} in {time.monotonic() - started:.1f}s. Password for every user: {SHARED_PASSWORD}'
+        ))
@@ -0,0 +1,37 @@
+from django.core.management.base import BaseCommand, CommandError
+
+from skills.datamove import import_data
+from skills.ranking import rebuild_ranking_scores
+from skills.reviews import reconcile_review_aggregates
+from skills.search import rebuild_search_docs
+from skills.transitions import reconcile_counters
+
+
+class Command(BaseCommand):
+    help = 'Load an export_data NDJSON file, remapping ids onto this database'
+
+    def add_arguments(self, parser):
+        parser.add_argument('path', help='File written by export_data')
+        parser.add_argument('--batch-size', type=int, default=1000,
+                            help='Rows inserted per bulk_create')
+        parser.add_argument('--state', help='Key mapping and progress file used to resume (default: <path>.import-state)')
+        parser.add_argument('--no-rebuild', action='store_true',
+                            help='Skip rebuilding the search index and ranking scores afterwards '
+                                 '(counters and review aggregates are always reconciled)')
+
+    def handle(self, *args, **options):
+        path = options['path']
+        self.stdout.write(f'Importing {path}...')
+        try:
+            counts = import_data(path, batch_size=options['batch_size'],
+                                 state_path=options['state'] or f'{path}.import-state', stdout=self.stdout)
+        except (OSError, ValueError) as e:
+            raise CommandError(str(e))
+        self.stdout.write(self.style.SUCCESS(f'Imported {sum(counts.values())} rows.'))
+
+        # bulk_create skips the signals that keep these counters and projections current
+        reconcile_counters(stdout=self.stdout)
+        reconcile_review_aggregates(stdout=self.stdout)
+        if not options['no_rebuild']:
+            rebuild_search_docs(stdout=self.stdout)
+            rebuild_ranking_scores(stdout=self.stdout)
@@ -0,0 +1,13 @@
+from django.core.management.base import BaseCommand
+
+from skills.profiling import HEADER, sign_token
+
+
+class Command(BaseCommand):
+    help = 'Print a signed X-Profile header value that makes the server profile a request (needs PROFILING_ENABLED)'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--label', default='manual', help='Shown on the profile index, e.g. who asked and why')
+
+    def handle(self, *args, **options):
+        self.stdout.write(f"{HEADER}: {sign_token(options['label'])}")
@@ -0,0 +1,25 @@
+from datetime import timedelta
+
+from django.conf import settings
+from django.core.management.base import BaseCommand
+
+from skills.transitions import reap_idle_sessions
+
+
+class Command(BaseCommand):
+    help = 'Close active sessions that have been idle longer than the TTL'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--ttl-minutes', type=int, default=getattr(settings, 'SESSION_IDLE_TTL_MINUTES', 120),
+                            help='Minutes without activity before a session is closed')
+        parser.add_argument('--batch-size', type=int, default=500,
+                            help='Number of sessions to close per transaction')
+
+    def handle(self, *args, **options):
+        self.stdout.write('Reaping idle sessions...')
+        closed = reap_idle_sessions(
+            timedelta(minutes=options['ttl_minutes']),
+            batch_size=options['batch_size'],
+            stdout=self.stdout,
+        )
+        self.stdout.write(self.style.SUCCESS(f'Closed {closed} sessions.'))
@@ -0,0 +1,16 @@
+from django.core.management.base import BaseCommand
+
+from skills.ranking import rebuild_ranking_scores
+
+
+class Command(BaseCommand):
+    help = 'Recompute every educator ranking score (schedule nightly so recency decays)'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--batch-size', type=int, default=1000,
+                            help='Number of profiles to update per transaction')
+
+    def handle(self, *args, **options):
+        self.stdout.write('Recomputing educator ranking scores...')
+        total = rebuild_ranking_scores(batch_size=options['batch_size'], stdout=self.stdout)
+        self.stdout.write(self.style.SUCCESS(f'Scored {total} educators.'))
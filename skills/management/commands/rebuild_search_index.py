@@ -0,0 +1,16 @@
+from django.core.management.base import BaseCommand
+
+from skills.search import rebuild_search_docs
+
+
+class Command(BaseCommand):
+    help = 'Rebuild the EducatorSearchDoc projection used by home and search'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--batch-size', type=int, default=500,
+                            help='Number of educators to index per transaction')
+
+    def handle(self, *args, **options):
+        self.stdout.write('Rebuilding educator search index...')
+        total = rebuild_search_docs(batch_size=options['batch_size'], stdout=self.stdout)
+        self.stdout.write(self.style.SUCCESS(f'Indexed {total} educators.'))
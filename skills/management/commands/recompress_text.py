@@ -0,0 +1,47 @@
+from django.core.management.base import BaseCommand
+from django.db import transaction
+
+from skills.fields import CompressedValue, compress_text
+from skills.models import SessionNotes, SessionSummary
+
+
+TARGETS = [
+    (SessionSummary, ('transcript', 'summary')),
+    (SessionNotes, ('notes',)),
+]
+
+
+class Command(BaseCommand):
+    help = 'Rewrite stored transcripts, summaries and notes in the current compressed format'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--batch-size', type=int, default=500,
+                            help='Number of rows to rewrite per transaction')
+
+    def handle(self, *args, **options):
+        batch_size = options['batch_size']
+        for model, fields in TARGETS:
+            rewritten = 0
+            last_pk = 0
+            while True:
+                with transaction.atomic():
+                    # Locked so a concurrent save (e.g. a notes flush) can't be undone by the rewrite
+                    rows = list(
+                        model.objects.select_for_update()
+                        .filter(pk__gt=last_pk).order_by('pk')
+                        .values_list('pk', *fields)[:batch_size]
+                    )
+                    if not rows:
+                        break
+                    for pk, *values in rows:
+                        changes = {
+                            name: compress_text(value.text)
+                            for name, value in zip(fields, values)
+                            if isinstance(value, CompressedValue) and not value.is_current
+                        }
+                        if changes:
+                            model.objects.filter(pk=pk).update(**changes)
+                            rewritten += 1
+                last_pk = rows[-1][0]
+                self.stdout.write(f'  {model.__name__}: up to id {last_pk}')
+            self.stdout.write(self.style.SUCCESS(f'Recompressed {rewritten} {model._meta.verbose_name_plural}.'))
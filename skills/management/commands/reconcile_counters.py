@@ -0,0 +1,16 @@
+from django.core.management.base import BaseCommand
+
+from skills.transitions import reconcile_counters
+
+
+class Command(BaseCommand):
+    help = 'Recompute UserProfile.total_students and total_lessons from requests and sessions'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--batch-size', type=int, default=1000,
+                            help='Number of profiles to check per batch')
+
+    def handle(self, *args, **options):
+        self.stdout.write('Reconciling educator counters...')
+        fixed = reconcile_counters(batch_size=options['batch_size'], stdout=self.stdout)
+        self.stdout.write(self.style.SUCCESS(f'Corrected {fixed} profiles.'))
@@ -0,0 +1,61 @@
+import threading
+
+from django.core.management.base import BaseCommand
+
+from skills.standins import (DAILY_BEHAVIOUR, GEMINI_BEHAVIOUR, GEMINI_CHUNK_MS, Behaviour, CollectorStandIn, DailyStandIn,
+                             GeminiStandIn)
+
+
+class Command(BaseCommand):
+    help = ('Serve local stand-ins for the Daily and Gemini APIs with configurable latency, errors and 429s, '
+            'and an OTLP trace collector. Point DAILY_API_BASE_URL, GEMINI_API_BASE_URL and '
+            'TRACING_OTLP_ENDPOINT at the printed URLs and set both API keys to any non-empty value.')
+
+    def add_arguments(self, parser):
+        parser.add_argument('--host', default='127.0.0.1')
+        parser.add_argument('--daily-port', type=int, default=8701)
+        parser.add_argument('--gemini-port', type=int, default=8702)
+        parser.add_argument('--collector-port', type=int, default=4318)
+        parser.add_argument('--collector-file', default='traces.jsonl',
+                            help='Where the collector appends received spans (read it with show_traces)')
+        parser.add_argument('--daily-latency-ms', type=float, default=DAILY_BEHAVIOUR['latency_ms'],
+                            help='Median latency of Daily responses')
+        parser.add_argument('--gemini-latency-ms', type=float, default=GEMINI_BEHAVIOUR['latency_ms'],
+                            help='Median time to the first streamed Gemini chunk')
+        parser.add_argument('--gemini-chunk-ms', type=float, default=GEMINI_CHUNK_MS,
+                            help='Median gap between streamed Gemini chunks')
+        parser.add_argument('--jitter', type=float, default=0.4, help='Lognormal shape of the latencies (0 = fixed)')
+        parser.add_argument('--error-rate', type=float, default=0.0, help='Share of requests answered with 503')
+        parser.add_argument('--throttle-rate', type=float, default=0.0, help='Share of requests answered with 429')
+        parser.add_argument('--retry-after', type=int, default=1, help='Retry-After seconds sent with 429s')
+        parser.add_argument('--hang-rate', type=float, default=0.0,
+                            help='Share of requests that stall for --hang-seconds before answering')
+        parser.add_argument('--hang-seconds', type=float, default=30)
+        parser.add_argument('--seed', type=int, default=None)
+
+    def handle(self, *args, **options):
+        def behaviour(latency_ms):
+            return Behaviour(latency_ms=latency_ms, jitter=options['jitter'], error_rate=options['error_rate'],
+                             throttle_rate=options['throttle_rate'], retry_after=options['retry_after'],
+                             hang_rate=options['hang_rate'], hang_seconds=options['hang_seconds'],
+                             seed=options['seed'])
+
+        daily = DailyStandIn(behaviour(options['daily_latency_ms']), host=options['host'], port=options['daily_port'])
+        gemini = GeminiStandIn(behaviour(options['gemini_latency_ms']), chunk_ms=options['gemini_chunk_ms'],
+                               host=options['host'], port=options['gemini_port'])
+        collector = CollectorStandIn(path=options['collector_file'], host=options['host'], port=options['collector_port'])
+        for stand_in in (daily, gemini, collector):
+            stand_in.start()
+        self.stdout.write(self.style.SUCCESS(f'DAILY_API_BASE_URL = {daily.url!r}\nGEMINI_API_BASE_URL = {gemini.url!r}\n'
+                                             f'TRACING_OTLP_ENDPOINT = {collector.url!r}'))
+        self.stdout.write('Press Ctrl-C to stop.')
+        try:
+            threading.Event().wait()
+        except KeyboardInterrupt:
+            pass
+        finally:
+            for stand_in in (daily, gemini, collector):
+                stand_in.stop()
+            for stand_in in (daily, gemini, collector):
+                self.stdout.write(f'{type(stand_in).__name__} responses: '
+                                  + (', '.join(f'{status}: {n}' for status, n in sorted(stand_in.counts.items())) or 'none'))
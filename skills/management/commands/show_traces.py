@@ -0,0 +1,45 @@
+import json
+
+from django.core.management.base import BaseCommand, CommandError
+
+from skills.tracing import breakdown
+
+
+class Command(BaseCommand):
+    help = ('Print latency breakdowns of recorded traces (a TRACING_FILE or the collector stand-in\'s file): '
+            'total and self time of every span, slowest traces first')
+
+    def add_arguments(self, parser):
+        parser.add_argument('path', help='JSON lines file of spans')
+        parser.add_argument('--trace', help='Only this trace id (e.g. from an X-Trace-Id header)')
+        parser.add_argument('--name', help='Only traces whose root span name contains this')
+        parser.add_argument('--slowest', type=int, default=5, help='How many traces to print')
+
+    def handle(self, *args, **options):
+        traces = {}
+        try:
+            with open(options['path'], encoding='utf-8') as f:
+                for line in f:
+                    if line.strip():
+                        span = json.loads(line)
+                        traces.setdefault(span['trace_id'], []).append(span)
+        except OSError as e:
+            raise CommandError(f"Can't read {options['path']}: {e}")
+
+        def root(spans):
+            ids = {s['span_id'] for s in spans}
+            return max((s for s in spans if s['parent_id'] not in ids), key=lambda s: s['duration_ms'])
+
+        chosen = [(trace_id, spans) for trace_id, spans in traces.items()
+                  if (not options['trace'] or trace_id == options['trace'])
+                  and (not options['name'] or options['name'] in root(spans)['name'])]
+        chosen.sort(key=lambda item: -root(item[1])['duration_ms'])
+        if not chosen:
+            self.stdout.write('No matching traces.')
+            return
+        for trace_id, spans in chosen[:options['slowest']]:
+            self.stdout.write(self.style.SUCCESS(f'Trace {trace_id} ({len(spans)} spans)'))
+            self.stdout.write(f"{'total':>13} {'self':>13}  span")
+            for line in breakdown(spans):
+                self.stdout.write(line)
+            self.stdout.write('')
@@ -0,0 +1,239 @@
+import time
+from array import array
+from bisect import bisect_left
+from collections import defaultdict
+
+from django.conf import settings
+from django.core.cache import cache
+
+from .models import TeachableSkill, SkillRequest
+
+
+GENERATION_KEY = 'barter:generation'
+
+# Check the clock once every this many edge visits
+CLOCK_INTERVAL = 1024
+
+
+def _wanting():
+    """Open skill-for-skill requests; each one is a learner wanting a skill"""
+    return SkillRequest.objects.filter(status='pending', is_payment_offer=False)
+
+
+class BarterGraph:
+    """Directed "learner wants a skill the educator teaches" graph.
+
+    Users are renumbered to dense indexes and the edges are kept in CSR
+    form: ``targets[offsets[i]:offsets[i + 1]]`` are the sorted successors
+    of node ``i`` and ``skills`` holds the skill id behind each edge. A
+    cycle A -> B -> A (or A -> B -> C -> A) is a barter where everybody
+    teaches the next person and learns from the previous one.
+    """
+
+    def __init__(self, wants, teaches):
+        teachers = defaultdict(set)
+        for user_id, skill_id in teaches:
+            teachers[skill_id].add(user_id)
+
+        successors = defaultdict(dict)
+        for learner_id, skill_id in sorted(set(wants)):
+            for educator_id in teachers.get(skill_id, ()):
+                if educator_id != learner_id:
+                    successors[learner_id].setdefault(educator_id, skill_id)
+
+        user_ids = sorted(set(successors) | {e for edges in successors.values() for e in edges})
+        self.user_ids = array('q', user_ids)
+        self.index = {user_id: i for i, user_id in enumerate(user_ids)}
+
+        self.offsets = array('q', [0])
+        self.targets = array('q')
+        self.skills = array('q')
+        for user_id in user_ids:
+            edges = sorted((self.index[e], skill_id) for e, skill_id in successors.get(user_id, {}).items())
+            self.targets.extend(target for target, _skill in edges)
+            self.skills.extend(skill_id for _target, skill_id in edges)
+            self.offsets.append(len(self.targets))
+
+    def __len__(self):
+        return len(self.user_ids)
+
+    @property
+    def edge_count(self):
+        return len(self.targets)
+
+    def successors(self, i):
+        return self.targets[self.offsets[i]:self.offsets[i + 1]]
+
+    def _edge(self, i, j):
+        """Position of edge i -> j in ``targets``, or -1"""
+        lo, hi = self.offsets[i], self.offsets[i + 1]
+        pos = bisect_left(self.targets, j, lo, hi)
+        return pos if pos < hi and self.targets[pos] == j else -1
+
+    def has_edge(self, i, j):
+        return self._edge(i, j) >= 0
+
+    def _cycle(self, nodes):
+        """Turn node indexes into (learner_id, educator_id, skill_id) steps"""
+        steps = []
+        for pos, i in enumerate(nodes):
+            j = nodes[(pos + 1) % len(nodes)]
+            steps.append((self.user_ids[i], self.user_ids[j], self.skills[self._edge(i, j)]))
+        return tuple(steps)
+
+    def _search(self, starts, deadline, canonical):
+        """2- and 3-cycles starting at each node in ``starts``.
+
+        With ``canonical`` only cycles whose smallest node is the start are
+        reported, so a full sweep lists each cycle once. Returns
+        (cycles, complete) where complete is False if the deadline hit.
+        """
+        cycles = []
+        visits = 0
+        for i in starts:
+            for j in self.successors(i):
+                if canonical and j < i:
+                    continue
+                if self.has_edge(j, i):
+                    cycles.append(self._cycle((i, j)))
+                for k in self.successors(j):
+                    visits += 1
+                    if visits % CLOCK_INTERVAL == 0 and time.monotonic() > deadline:
+                        return cycles, False
+                    if k == i or (canonical and k < i):
+                        continue
+                    if self.has_edge(k, i):
+                        cycles.append(self._cycle((i, j, k)))
+        return cycles, True
+
+    def cycles(self, budget):
+        """Every 2- and 3-cycle in the graph, within ``budget`` seconds"""
+        return self._search(range(len(self)), time.monotonic() + budget, canonical=True)
+
+    def cycles_through(self, user_id, budget):
+        """Cycles that include ``user_id``, within ``budget`` seconds"""
+        if user_id not in self.index:
+            return [], True
+        return self._search([self.index[user_id]], time.monotonic() + budget, canonical=False)
+
+
+def load_graph():
+    """Graph of every open skill-for-skill request.
+
+    Only users with an open request can sit on a cycle, so teachable
+    skills of anyone else (or of skills nobody wants) are never loaded.
+    """
+    wanting = _wanting()
+    wants = list(wanting.values_list('learner_id', 'requested_skill__skill_id').distinct())
+    teaches = TeachableSkill.objects.filter(
+        user_profile__user_id__in=wanting.values('learner_id'),
+        skill_id__in=wanting.values('requested_skill__skill_id'),
+    ).values_list('user_profile__user_id', 'skill_id')
+    return BarterGraph(wants, teaches)
+
+
+def load_neighbourhood(user_id):
+    """The part of the graph that any 2- or 3-cycle through ``user_id`` can use.
+
+    For a cycle L -> T -> X -> L, T teaches something L wants and X wants
+    something L teaches, so loading those users' wants and skills is enough.
+    """
+    fanout = getattr(settings, 'BARTER_MAX_FANOUT', 500)
+    wanting = _wanting()
+    wanted = wanting.filter(learner_id=user_id).values('requested_skill__skill_id')
+    taught = TeachableSkill.objects.filter(user_profile__user_id=user_id).values('skill_id')
+
+    teachers = TeachableSkill.objects.filter(
+        skill_id__in=wanted, user_profile__user_id__in=wanting.values('learner_id')
+    ).values_list('user_profile__user_id', flat=True).distinct()[:fanout]
+    learners = wanting.filter(requested_skill__skill_id__in=taught).values_list(
+        'learner_id', flat=True
+    ).distinct()[:fanout]
+
+    users = {user_id} | set(teachers) | set(learners)
+    wants = wanting.filter(learner_id__in=users).values_list('learner_id', 'requested_skill__skill_id').distinct()
+    teaches = TeachableSkill.objects.filter(user_profile__user_id__in=users).values_list(
+        'user_profile__user_id', 'skill_id'
+    )
+    return BarterGraph(wants, teaches)
+
+
+def _key(user_id):
+    return f'barter:{cache.get(GENERATION_KEY, 0)}:{user_id}'
+
+
+def _canonical(cycle):
+    """Same cycle regardless of which participant it starts from"""
+    start = min(range(len(cycle)), key=lambda pos: cycle[pos][0])
+    return tuple(tuple(step) for step in cycle[start:] + cycle[:start])
+
+
+def _by_participant(cycles):
+    suggestions = defaultdict(list)
+    for cycle in cycles:
+        for learner_id, _educator_id, _skill_id in cycle:
+            suggestions[learner_id].append(_canonical(cycle))
+    return suggestions
+
+
+def _timeout():
+    return getattr(settings, 'BARTER_SUGGESTION_TIMEOUT', 3600)
+
+
+def find_all_cycles(budget=None, stdout=None):
+    """Full sweep: replace every user's cached suggestions.
+
+    Returns (number of cycles, whether the sweep finished in budget).
+    """
+    budget = budget if budget is not None else getattr(settings, 'BARTER_SWEEP_BUDGET', 30.0)
+    graph = load_graph()
+    if stdout:
+        stdout.write(f'Searching {len(graph)} users and {graph.edge_count} edges...')
+    cycles, complete = graph.cycles(budget)
+
+    limit = getattr(settings, 'BARTER_MAX_SUGGESTIONS', 10)
+    try:
+        generation = cache.incr(GENERATION_KEY)
+    except ValueError:
+        generation = 1
+        cache.set(GENERATION_KEY, generation, None)
+    cache.set_many(
+        {f'barter:{generation}:{user_id}': user_cycles[:limit]
+         for user_id, user_cycles in _by_participant(cycles).items()},
+        _timeout(),
+    )
+    return len(cycles), complete
+
+
+def match_new_request(skill_request):
+    """Incremental pass for one new skill-for-skill request.
+
+    Only cycles through the learner can be new, so search their
+    neighbourhood and merge the results into each participant's cache.
+    """
+    budget = getattr(settings, 'BARTER_MATCH_BUDGET', 0.05)
+    cycles, _complete = load_neighbourhood(skill_request.learner_id).cycles_through(
+        skill_request.learner_id, budget
+    )
+    limit = getattr(settings, 'BARTER_MAX_SUGGESTIONS', 10)
+    for user_id, found in _by_participant(cycles).items():
+        key = _key(user_id)
+        existing = [tuple(tuple(step) for step in cycle) for cycle in cache.get(key, [])]
+        merged = existing + [cycle for cycle in dict.fromkeys(found) if cycle not in existing]
+        cache.set(key, merged[:limit], _timeout())
+    return cycles
+
+
+def barter_suggestions(user):
+    """Cached barter cycles for a user, minus any whose requests were resolved"""
+    cycles = cache.get(_key(user.pk), [])
+    if not cycles:
+        return []
+    learners = {learner_id for cycle in cycles for learner_id, _e, _s in cycle}
+    open_wants = set(
+        _wanting().filter(learner_id__in=learners).values_list('learner_id', 'requested_skill__skill_id')
+    )
+    return [
+        cycle for cycle in cycles
+        if all((learner_id, skill_id) in open_wants for learner_id, _e, skill_id in cycle)
+    ]
@@ -0,0 +1,371 @@
+import atexit
+import glob
+import json
+import logging
+import math
+import os
+import threading
+import time
+import uuid
+from contextlib import contextmanager
+from functools import wraps
+
+from django.conf import settings
+
+from .tracing import span
+
+
+logger = logging.getLogger('skills.metrics')
+
+# Seconds; covers fast local calls up to slow transcription jobs
+DEFAULT_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10, 30, 60, 300)
+
+
+def _setting(name, default):
+    return getattr(settings, name, default)
+
+
+class _Metric:
+    kind = None
+
+    def __init__(self, name, help, labels=()):
+        self.name = name
+        self.help = help
+        self.labels = tuple(labels)
+        self._values = {}
+        self._lock = threading.Lock()
+
+    def _key(self, labels):
+        if set(labels) != set(self.labels):
+            raise ValueError(f'{self.name} takes labels {self.labels}, got {tuple(labels)}')
+        return tuple(str(labels[name]) for name in self.labels)
+
+    def reset(self):
+        with self._lock:
+            self._values = {}
+
+    def snapshot(self):
+        with self._lock:
+            return [[list(key), self._export(value)] for key, value in self._values.items()]
+
+    def _export(self, value):
+        return value
+
+
+class Counter(_Metric):
+    """Only goes up; summed across processes"""
+
+    kind = 'counter'
+
+    def inc(self, amount=1, **labels):
+        key = self._key(labels)
+        with self._lock:
+            self._values[key] = self._values.get(key, 0) + amount
+        _changed()
+
+
+class Gauge(_Metric):
+    """A value that goes up and down.
+
+    Across processes the values of live processes are summed ('livesum'),
+    or each process is reported separately with a ``pid`` label ('all').
+    """
+
+    kind = 'gauge'
+
+    def __init__(self, name, help, labels=(), multiprocess_mode='livesum'):
+        super().__init__(name, help, labels)
+        self.multiprocess_mode = multiprocess_mode
+
+    def set(self, value, **labels):
+        key = self._key(labels)
+        with self._lock:
+            self._values[key] = value
+        _changed()
+
+    def inc(self, amount=1, **labels):
+        key = self._key(labels)
+        with self._lock:
+            self._values[key] = self._values.get(key, 0) + amount
+        _changed()
+
+    def dec(self, amount=1, **labels):
+        self.inc(-amount, **labels)
+
+
+class Histogram(_Metric):
+    """Observations counted into cumulative ``le`` buckets, plus their sum and count"""
+
+    kind = 'histogram'
+
+    def __init__(self, name, help, labels=(), buckets=DEFAULT_BUCKETS):
+        super().__init__(name, help, labels)
+        self.buckets = tuple(sorted(buckets))
+
+    def observe(self, value, **labels):
+        key = self._key(labels)
+        index = next((i for i, bound in enumerate(self.buckets) if value <= bound), len(self.buckets))
+        with self._lock:
+            entry = self._values.get(key)
+            if entry is None:
+                entry = self._values[key] = [[0] * (len(self.buckets) + 1), 0.0]
+            entry[0][index] += 1
+            entry[1] += value
+        _changed()
+
+    def _export(self, value):
+        return [list(value[0]), value[1]]
+
+    @contextmanager
+    def time(self, **labels):
+        began = time.perf_counter()
+        try:
+            yield
+        finally:
+            self.observe(time.perf_counter() - began, **labels)
+
+
+class Registry:
+    def __init__(self):
+        self.metrics = {}
+        self._lock = threading.Lock()
+
+    def register(self, metric):
+        """The metric registered under this name, so re-imports don't create duplicates"""
+        with self._lock:
+            existing = self.metrics.get(metric.name)
+            if existing is not None:
+                if type(existing) is not type(metric) or existing.labels != metric.labels:
+                    raise ValueError(f'{metric.name} is already registered differently')
+                return existing
+            self.metrics[metric.name] = metric
+            return metric
+
+    def reset(self):
+        for metric in self.metrics.values():
+            metric.reset()
+
+
+REGISTRY = Registry()
+
+
+def counter(name, help, labels=()):
+    return REGISTRY.register(Counter(name, help, labels))
+
+
+def gauge(name, help, labels=(), multiprocess_mode='livesum'):
+    return REGISTRY.register(Gauge(name, help, labels, multiprocess_mode))
+
+
+def histogram(name, help, labels=(), buckets=DEFAULT_BUCKETS):
+    return REGISTRY.register(Histogram(name, help, labels, buckets))
+
+
+# Multiprocess support: with METRICS_MULTIPROC_DIR set, every process writes
+# its own values to a file there (at most every METRICS_FLUSH_INTERVAL
+# seconds, on scrape and at exit), and a scrape merges the files of all
+# processes. A background thread writes changes that came in since the last
+# write, so a worker that goes idle still reports its final values (an
+# in-progress gauge would otherwise stay at 1). Clear the directory when the
+# server is restarted.
+
+_process = {'pid': None, 'token': None, 'flushed': 0.0, 'dirty': False}
+_flush_lock = threading.Lock()
+_flusher = {'pid': None}
+_flusher_lock = threading.Lock()
+
+
+def _multiproc_dir():
+    return _setting('METRICS_MULTIPROC_DIR', None)
+
+
+def _snapshot_path(directory):
+    if _process['pid'] != os.getpid():
+        _process.update(pid=os.getpid(), token=uuid.uuid4().hex[:8], flushed=0.0)
+    return os.path.join(directory, f"metrics-{_process['pid']}-{_process['token']}.json")
+
+
+def flush():
+    """Write this process's values to its snapshot file"""
+    directory = _multiproc_dir()
+    if not directory:
+        return
+    with _flush_lock:
+        os.makedirs(directory, exist_ok=True)
+        path = _snapshot_path(directory)
+        data = {'pid': os.getpid(), 'metrics': {name: metric.snapshot() for name, metric in REGISTRY.metrics.items()}}
+        tmp = f'{path}.tmp'
+        with open(tmp, 'w') as f:
+            json.dump(data, f)
+        os.replace(tmp, path)
+        _process.update(flushed=time.monotonic(), dirty=False)
+
+
+def _changed():
+    if not _multiproc_dir():
+        return
+    _process['dirty'] = True
+    if time.monotonic() - _process['flushed'] >= _setting('METRICS_FLUSH_INTERVAL', 5):
+        flush()
+    else:
+        _start_flusher()
+
+
+def _flush_loop():
+    while True:
+        time.sleep(_setting('METRICS_FLUSH_INTERVAL', 5))
+        if _process['dirty']:
+            try:
+                flush()
+            except Exception:
+                logger.exception('Writing the metrics snapshot failed')
+
+
+def _start_flusher():
+    # Checked by pid so a forked worker starts its own thread
+    if _flusher['pid'] == os.getpid():
+        return
+    with _flusher_lock:
+        if _flusher['pid'] != os.getpid():
+            threading.Thread(target=_flush_loop, daemon=True, name='bmb-metrics-flush').start()
+            _flusher['pid'] = os.getpid()
+
+
+def _after_fork():
+    # A forked worker starts from zero; the parent's values are in the parent's file
+    REGISTRY.reset()
+    _process.update(pid=None, token=None, flushed=0.0, dirty=False)
+
+
+os.register_at_fork(after_in_child=_after_fork)
+atexit.register(flush)
+
+
+def _alive(pid):
+    try:
+        os.kill(pid, 0)
+    except ProcessLookupError:
+        return False
+    except PermissionError:
+        pass
+    return True
+
+
+def _merge(merged, metric, key, value):
+    if metric.kind == 'histogram':
+        entry = merged.setdefault(key, [[0] * (len(metric.buckets) + 1), 0.0])
+        for i, count in enumerate(value[0]):
+            entry[0][i] += count
+        entry[1] += value[1]
+    else:
+        merged[key] = merged.get(key, 0) + value
+
+
+def collect():
+    """{metric: {label values: value}} for this process, or merged over every process's snapshot"""
+    directory = _multiproc_dir()
+    if not directory:
+        return {name: {tuple(key): value for key, value in metric.snapshot()}
+                for name, metric in REGISTRY.metrics.items()}
+
+    flush()
+    merged = {name: {} for name in REGISTRY.metrics}
+    for path in glob.glob(os.path.join(directory, 'metrics-*.json')):
+        try:
+            with open(path) as f:
+                data = json.load(f)
+        except (OSError, ValueError):
+            continue  # being replaced right now, or removed
+        alive = None
+        for name, samples in data['metrics'].items():
+            metric = REGISTRY.metrics.get(name)
+            if metric is None:
+                continue
+            if metric.kind == 'gauge':
+                alive = _alive(data['pid']) if alive is None else alive
+                if not alive:
+                    continue
+            for key, value in samples:
+                key = tuple(key)
+                if metric.kind == 'gauge' and metric.multiprocess_mode == 'all':
+                    key += (str(data['pid']),)
+                _merge(merged[name], metric, key, value)
+    return merged
+
+
+def _escape(value):
+    return value.replace('\\', '\\\\').replace('\n', '\\n').replace('"', '\\"')
+
+
+def _labels(names, values, extra=()):
+    pairs = [f'{name}="{_escape(value)}"' for name, value in zip(names, values)] + list(extra)
+    return '{' + ','.join(pairs) + '}' if pairs else ''
+
+
+def _number(value):
+    if value == math.inf:
+        return '+Inf'
+    return repr(float(value)) if isinstance(value, float) else str(value)
+
+
+def render():
+    """Everything collected, in the Prometheus text exposition format (0.0.4)"""
+    values = collect()
+    lines = []
+    for name, metric in sorted(REGISTRY.metrics.items()):
+        lines.append(f'# HELP {name} {_escape(metric.help)}')
+        lines.append(f'# TYPE {name} {metric.kind}')
+        names = metric.labels
+        if metric.kind == 'gauge' and metric.multiprocess_mode == 'all' and _multiproc_dir():
+            names += ('pid',)
+        for key, value in sorted(values.get(name, {}).items()):
+            if metric.kind != 'histogram':
+                lines.append(f'{name}{_labels(names, key)} {_number(value)}')
+                continue
+            counts, total = value
+            cumulative = 0
+            for bound, count in zip(metric.buckets + (math.inf,), counts):
+                cumulative += count
+                le = f'le="{_number(bound)}"'
+                lines.append(f'{name}_bucket{_labels(names, key, [le])} {cumulative}')
+            lines.append(f'{name}_sum{_labels(names, key)} {_number(total)}')
+            lines.append(f'{name}_count{_labels(names, key)} {cumulative}')
+    return '\n'.join(lines) + '\n'
+
+
+# What the app records
+
+HTTP_REQUESTS = counter('bmb_http_requests_total', 'HTTP requests by URL name, method and status',
+                        ('view', 'method', 'status'))
+HTTP_LATENCY = histogram('bmb_http_request_duration_seconds', 'Time to produce a response, by URL name',
+                         ('view', 'method'))
+HTTP_IN_PROGRESS = gauge('bmb_http_requests_in_progress', 'Requests being handled right now')
+EXTERNAL_CALLS = counter('bmb_external_calls_total', 'Calls to external services and tools by outcome',
+                         ('service', 'operation', 'outcome'))
+EXTERNAL_LATENCY = histogram('bmb_external_call_duration_seconds', 'Time spent in external services and tools',
+                             ('service', 'operation'))
+
+
+@contextmanager
+def track_call(service, operation):
+    """Time an external call and count it as 'ok', or as 'error' if it raises; also a client span when tracing"""
+    began = time.perf_counter()
+    outcome = 'error'
+    try:
+        with span(f'{service}.{operation}', 'client', **{'peer.service': service}):
+            yield
+        outcome = 'ok'
+    finally:
+        EXTERNAL_LATENCY.observe(time.perf_counter() - began, service=service, operation=operation)
+        EXTERNAL_CALLS.inc(service=service, operation=operation, outcome=outcome)
+
+
+def tracked(service, operation):
+    """Decorator form of track_call"""
+    def decorator(func):
+        @wraps(func)
+        def wrapper(*args, **kwargs):
+            with track_call(service, operation):
+                return func(*args, **kwargs)
+        return wrapper
+    return decorator
@@ -0,0 +1,303 @@
+import json
+import logging
+import os
+import re
+import sys
+import sysconfig
+import time
+from contextlib import ExitStack
+from logging.handlers import RotatingFileHandler
+
+from django.conf import settings
+from django.core.exceptions import MiddlewareNotUsed
+from django.db import connections
+from django.http import JsonResponse
+
+from . import profiling, ratelimit, tracing
+from .metrics import HTTP_IN_PROGRESS, HTTP_LATENCY, HTTP_REQUESTS
+
+
+slow_log = logging.getLogger('skills.slow_requests')
+
+_STRING = re.compile(r"'(?:[^']|'')*'")
+_NUMBER = re.compile(r'\b\d+(?:\.\d+)?\b')
+_IN_LIST = re.compile(r'\bIN \((?:\s*%s\s*,)*\s*%s\s*\)', re.IGNORECASE)
+_SPACE = re.compile(r'\s+')
+
+_THIS_FILE = __file__.rstrip('c')
+# Frames from these are skipped when looking for the code that ran a query
+_LIBRARY_DIRS = tuple({os.path.dirname(sys.modules['django'].__file__), sysconfig.get_paths()['stdlib'],
+                       sysconfig.get_paths()['purelib'], sysconfig.get_paths()['platlib']})
+
+
+def _setting(name, default):
+    return getattr(settings, name, default)
+
+
+def normalize_sql(sql):
+    """The shape of a query: literals and IN-list lengths stripped, whitespace collapsed"""
+    sql = _STRING.sub('?', sql)
+    sql = _NUMBER.sub('?', sql)
+    sql = _IN_LIST.sub('IN (...)', sql)
+    return _SPACE.sub(' ', sql).strip()
+
+
+def query_origin():
+    """Where the current query came from: the innermost project frame and template line, if any"""
+    frame = sys._getframe(1)
+    code = template = None
+    while frame is not None:
+        filename = frame.f_code.co_filename
+        if template is None and frame.f_code.co_name == 'render_annotated':
+            node = frame.f_locals.get('self')
+            origin = getattr(node, 'origin', None)
+            token = getattr(node, 'token', None)
+            if origin is not None and token is not None:
+                template = f'{origin.template_name}:{token.lineno}'
+        if code is None and filename != _THIS_FILE and not filename.startswith(_LIBRARY_DIRS) \
+                and not filename.startswith('<'):
+            code = f'{os.path.relpath(filename, settings.BASE_DIR)}:{frame.f_lineno} in {frame.f_code.co_name}'
+        if code and template:
+            break
+        frame = frame.f_back
+    return ' / '.join(part for part in (code, template) if part) or 'unknown'
+
+
+class QueryProfile:
+    """A connection execute wrapper that times every query and groups them by shape.
+
+    The stack is only walked the first time a shape is seen, so the cost per
+    query is one regex pass and a dict update.
+    """
+
+    def __init__(self):
+        self.count = 0
+        self.duration = 0.0
+        self.shapes = {}
+
+    def __call__(self, execute, sql, params, many, context):
+        began = time.perf_counter()
+        try:
+            return execute(sql, params, many, context)
+        finally:
+            elapsed = time.perf_counter() - began
+            self.count += 1
+            self.duration += elapsed
+            shape = normalize_sql(sql)
+            entry = self.shapes.get(shape)
+            if entry is None:
+                entry = self.shapes[shape] = {'count': 0, 'ms': 0.0, 'origin': query_origin()}
+            entry['count'] += 1
+            entry['ms'] += elapsed * 1000
+
+    @property
+    def duplicated(self):
+        """Repeated query shapes, most repeated first"""
+        return sorted(((shape, entry) for shape, entry in self.shapes.items() if entry['count'] > 1),
+                      key=lambda item: -item[1]['count'])
+
+    def report(self, limit=10):
+        return {
+            'queries': self.count,
+            'db_ms': round(self.duration * 1000, 2),
+            'duplicated': [{'sql': shape, **entry, 'ms': round(entry['ms'], 2)}
+                           for shape, entry in self.duplicated[:limit]],
+            'slowest': [{'sql': shape, **entry, 'ms': round(entry['ms'], 2)}
+                        for shape, entry in sorted(self.shapes.items(), key=lambda item: -item[1]['ms'])[:limit]],
+        }
+
+
+def _configure_slow_log():
+    path = _setting('SQL_SLOW_LOG', None)
+    if not path or any(getattr(h, 'baseFilename', None) == os.path.abspath(path) for h in slow_log.handlers):
+        return
+    os.makedirs(os.path.dirname(os.path.abspath(path)), exist_ok=True)
+    handler = RotatingFileHandler(path, maxBytes=_setting('SQL_SLOW_LOG_MAX_BYTES', 10 * 1024 * 1024),
+                                  backupCount=_setting('SQL_SLOW_LOG_BACKUPS', 5), encoding='utf-8')
+    handler.setFormatter(logging.Formatter('%(message)s'))
+    slow_log.addHandler(handler)
+    slow_log.setLevel(logging.INFO)
+    slow_log.propagate = False
+
+
+class QueryProfileMiddleware:
+    """Per-request query count, database time and duplicated query shapes.
+
+    Enabled with SQL_PROFILE = True; otherwise Django drops it from the
+    middleware chain at startup and it costs nothing. Results go out as a
+    Server-Timing header, and requests slower than SQL_SLOW_REQUEST_MS or
+    with more than SQL_SLOW_REQUEST_QUERIES queries are written as one JSON
+    line each to the SQL_SLOW_LOG file (rotated at SQL_SLOW_LOG_MAX_BYTES).
+    Queries run while a streaming response is consumed are not counted.
+    """
+
+    def __init__(self, get_response):
+        if not _setting('SQL_PROFILE', False):
+            raise MiddlewareNotUsed
+        self.get_response = get_response
+        self.header = _setting('SQL_PROFILE_HEADER', True)
+        self.slow_ms = _setting('SQL_SLOW_REQUEST_MS', 500)
+        self.slow_queries = _setting('SQL_SLOW_REQUEST_QUERIES', 100)
+        _configure_slow_log()
+
+    def __call__(self, request):
+        profile = QueryProfile()
+        began = time.perf_counter()
+        with ExitStack() as stack:
+            for conn in connections.all():
+                stack.enter_context(conn.execute_wrapper(profile))
+            response = self.get_response(request)
+        total_ms = (time.perf_counter() - began) * 1000
+        db_ms = profile.duration * 1000
+
+        if self.header:
+            metrics = [f'db;dur={db_ms:.1f};desc="{profile.count} queries"',
+                       f'app;dur={total_ms - db_ms:.1f}']
+            duplicates = sum(entry['count'] - 1 for _shape, entry in profile.duplicated)
+            if duplicates:
+                metrics.append(f'dup;desc="{duplicates} duplicated in {len(profile.duplicated)} shapes"')
+            existing = response.get('Server-Timing')
+            response['Server-Timing'] = ', '.join(([existing] if existing else []) + metrics)
+
+        if total_ms >= self.slow_ms or profile.count > self.slow_queries:
+            slow_log.info(json.dumps({
+                'at': time.strftime('%Y-%m-%dT%H:%M:%S'),
+                'method': request.method,
+                'path': request.get_full_path(),
+                'status': response.status_code,
+                'total_ms': round(total_ms, 2),
+                **profile.report(),
+            }))
+        return response
+
+
+class MetricsMiddleware:
+    """Request count, latency and concurrency per URL name for the /metrics endpoint.
+
+    On unless METRICS_ENABLED = False. Requests that don't resolve to a
+    URL pattern are grouped under '<unresolved>' to keep label counts bounded.
+    """
+
+    def __init__(self, get_response):
+        if not _setting('METRICS_ENABLED', True):
+            raise MiddlewareNotUsed
+        self.get_response = get_response
+
+    def __call__(self, request):
+        HTTP_IN_PROGRESS.inc()
+        began = time.perf_counter()
+        try:
+            response = self.get_response(request)
+        finally:
+            HTTP_IN_PROGRESS.dec()
+        match = request.resolver_match
+        view = match.view_name if match else '<unresolved>'
+        HTTP_LATENCY.observe(time.perf_counter() - began, view=view, method=request.method)
+        HTTP_REQUESTS.inc(view=view, method=request.method, status=response.status_code)
+        return response
+
+
+class TracingMiddleware:
+    """A server span per request, continuing the caller's traceparent, with a span per SQL statement.
+
+    Enabled with TRACING_ENABLED = True. The span is named after the URL
+    name once the view has resolved, and the trace id is returned in
+    X-Trace-Id so a slow response can be looked up.
+    """
+
+    def __init__(self, get_response):
+        if not tracing.enabled():
+            raise MiddlewareNotUsed
+        self.get_response = get_response
+
+    def __call__(self, request):
+        with tracing.span(f'{request.method} {request.path}', 'server', parent=request.headers.get('traceparent'),
+                          **{'http.method': request.method, 'http.target': request.get_full_path()}) as span:
+            with tracing.db_spans():
+                response = self.get_response(request)
+            match = request.resolver_match
+            if match:
+                span.name = f'{request.method} {match.view_name}'
+                span.set_attribute('http.route', match.route)
+            span.set_attribute('http.status_code', response.status_code)
+            if response.status_code >= 500:
+                span.status = 'error'
+        if span is not tracing.NOOP:
+            response['X-Trace-Id'] = span.trace_id
+        return response
+
+
+class ProfilingMiddleware:
+    """Runs the sampling profiler around requests that carry a valid signed X-Profile header
+    (see the profile_token command) or are picked at PROFILING_SAMPLE_RATE.
+
+    Enabled with PROFILING_ENABLED = True. Results are saved under
+    PROFILING_DIR and the response names them in X-Profile-Id.
+    """
+
+    def __init__(self, get_response):
+        if not profiling.enabled():
+            raise MiddlewareNotUsed
+        self.get_response = get_response
+        self.sample_rate = _setting('PROFILING_SAMPLE_RATE', 0)
+
+    def __call__(self, request):
+        label = profiling.should_profile(request.headers.get(profiling.HEADER), self.sample_rate)
+        if not label:
+            return self.get_response(request)
+        with profiling.profile(f'{request.method} {request.path}', label, path=request.get_full_path()) as profile_id:
+            response = self.get_response(request)
+        if profile_id:
+            response['X-Profile-Id'] = profile_id
+        return response
+
+
+class AdmissionControlMiddleware:
+    """Token-bucket rate limits, an in-flight cap and load shedding for the AI and recording endpoints.
+
+    Enabled with RATELIMIT_ENABLED = True; only the URL names in
+    RATELIMIT_VIEWS are affected. Each client (user, or IP when anonymous)
+    gets RATELIMIT_USER_PER_MINUTE requests with bursts of
+    RATELIMIT_USER_BURST, all clients together RATELIMIT_GLOBAL_PER_MINUTE
+    and RATELIMIT_GLOBAL_BURST, and at most RATELIMIT_MAX_IN_FLIGHT run at
+    once. When a request has already queued longer than
+    RATELIMIT_SHED_QUEUE_MS behind the proxy the workers are saturated, so
+    these endpoints are refused to keep the interactive pages responsive.
+    Refusals are 429 (this client) or 503 (capacity) with Retry-After.
+    State lives in the cache, so use a shared cache with several processes.
+    """
+
+    def __init__(self, get_response):
+        if not ratelimit.enabled():
+            raise MiddlewareNotUsed
+        self.get_response = get_response
+        self.views = ratelimit.limited_views()
+        self.max_in_flight = _setting('RATELIMIT_MAX_IN_FLIGHT', 4)
+
+    def __call__(self, request):
+        response = self.get_response(request)
+        slot = getattr(request, '_admission_slot', None)
+        if slot:
+            ratelimit.release_slot(slot)
+        return response
+
+    def process_view(self, request, view_func, view_args, view_kwargs):
+        # Runs after AuthenticationMiddleware, so the bucket can be per user
+        view = request.resolver_match.url_name
+        if view not in self.views:
+            return None
+        refused = ratelimit.check(request)
+        if refused is None and self.max_in_flight:
+            request._admission_slot = ratelimit.acquire_slot('ai', self.max_in_flight)
+            if request._admission_slot is None:
+                ratelimit.refund(request)
+                refused = 'in_flight', _setting('RATELIMIT_RETRY_AFTER', 5)
+        if refused is None:
+            return None
+        reason, retry_after = refused
+        ratelimit.ADMISSION_REJECTED.inc(view=view, reason=reason)
+        response = JsonResponse({'error': 'Too many requests, try again later' if reason == 'user'
+                                 else 'Server busy, try again later', 'retry_after': retry_after},
+                                status=429 if reason == 'user' else 503)
+        response['Retry-After'] = str(retry_after)
+        return response
@@ -0,0 +1,14 @@
+# Generated by Django 4.2.7 on 2026-10-19 12:29
+
+from django.db import migrations
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('skills', '0002_session_sessionsummary_sessionrecording_sessionnotes'),
+        ('skills', '0002_userprofile_available_days_and_more'),
+    ]
+
+    operations = [
+    ]
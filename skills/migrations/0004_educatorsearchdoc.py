@@ -0,0 +1,65 @@
+# Generated by Django 4.2.7 on 2026-10-19 12:29
+
+from django.conf import settings
+from django.db import migrations, models
+import django.db.models.deletion
+
+
+def backfill_search_docs(apps, schema_editor):
+    """Index the educators that already exist; search reads nothing else"""
+    from skills.search import build_search_doc
+
+    UserProfile = apps.get_model('skills', 'UserProfile')
+    EducatorSearchDoc = apps.get_model('skills', 'EducatorSearchDoc')
+    profiles = UserProfile.objects.select_related('user').prefetch_related('teachable_skills__skill').order_by('pk')
+    docs = []
+    for profile in profiles:
+        # Reviews and ranking scores come in later migrations; 0005 fills in the scores
+        profile.review_count = profile.ranking_score = 0
+        docs.append(build_search_doc(profile, model=EducatorSearchDoc))
+    EducatorSearchDoc.objects.bulk_create(docs, batch_size=500)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+        ('skills', '0003_merge_20261019_1229'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='EducatorSearchDoc',
+            fields=[
+                ('user_profile', models.OneToOneField(on_delete=django.db.models.deletion.CASCADE, primary_key=True, related_name='search_doc', serialize=False, to='skills.userprofile')),
+                ('username', models.CharField(max_length=150)),
+                ('display_name', models.CharField(max_length=301)),
+                ('bio', models.TextField(blank=True)),
+                ('profile_picture', models.ImageField(blank=True, null=True, upload_to='profile_pics/')),
+                ('location', models.CharField(blank=True, max_length=100)),
+                ('search_text', models.TextField(blank=True)),
+                ('skill_names', models.TextField(blank=True)),
+                ('categories', models.CharField(blank=True, max_length=500)),
+                ('proficiency_levels', models.CharField(blank=True, max_length=200)),
+                ('skill_ids', models.JSONField(blank=True, default=list)),
+                ('skills', models.JSONField(blank=True, default=list, help_text='[{id, name, proficiency_level}] for display')),
+                ('skill_count', models.IntegerField(default=0)),
+                ('hourly_rate', models.DecimalField(blank=True, decimal_places=2, max_digits=10, null=True)),
+                ('hourly_rate_range', models.CharField(blank=True, max_length=20)),
+                ('rating', models.DecimalField(decimal_places=2, default=0.0, max_digits=3)),
+                ('total_students', models.IntegerField(default=0)),
+                ('teaching_mode', models.CharField(blank=True, max_length=20)),
+                ('experience_level', models.CharField(blank=True, max_length=20)),
+                ('experience_rank', models.SmallIntegerField(default=0)),
+                ('available_days', models.JSONField(blank=True, default=list)),
+                ('preferred_time', models.CharField(blank=True, max_length=20)),
+                ('created_at', models.DateTimeField()),
+                ('updated_at', models.DateTimeField(auto_now=True)),
+                ('user', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='+', to=settings.AUTH_USER_MODEL)),
+            ],
+            options={
+                'indexes': [models.Index(fields=['skill_count', '-created_at'], name='skills_educ_skill_c_52e08e_idx'), models.Index(fields=['rating'], name='skills_educ_rating_fd2221_idx'), models.Index(fields=['hourly_rate'], name='skills_educ_hourly__bacd6c_idx'), models.Index(fields=['experience_rank'], name='skills_educ_experie_9ff2cd_idx'), models.Index(fields=['teaching_mode'], name='skills_educ_teachin_b17aaa_idx'), models.Index(fields=['experience_level'], name='skills_educ_experie_033246_idx'), models.Index(fields=['hourly_rate_range'], name='skills_educ_hourly__a5160b_idx')],
+            },
+        ),
+        migrations.RunPython(backfill_search_docs, migrations.RunPython.noop),
+    ]
@@ -0,0 +1,47 @@
+# Generated by Django 4.2.7 on 2026-10-19 12:30
+
+from django.conf import settings
+from django.db import migrations, models
+
+
+def backfill_ranking_scores(apps, schema_editor):
+    """Score the existing educators, then copy the scores into their search docs"""
+    from skills.ranking import score_profile
+
+    UserProfile = apps.get_model('skills', 'UserProfile')
+    EducatorSearchDoc = apps.get_model('skills', 'EducatorSearchDoc')
+    prior = getattr(settings, 'RANKING_DEFAULT_PRIOR', 4.0)  # there are no reviews to average yet
+    profiles = list(UserProfile.objects.all())
+    for profile in profiles:
+        profile.review_count = 0
+        profile.ranking_score = score_profile(profile, prior=prior)
+    UserProfile.objects.bulk_update(profiles, ['ranking_score'], batch_size=500)
+    EducatorSearchDoc.objects.bulk_update(
+        [EducatorSearchDoc(pk=profile.pk, ranking_score=profile.ranking_score) for profile in profiles],
+        ['ranking_score'], batch_size=500,
+    )
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('skills', '0004_educatorsearchdoc'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='educatorsearchdoc',
+            name='ranking_score',
+            field=models.FloatField(default=0),
+        ),
+        migrations.AddField(
+            model_name='userprofile',
+            name='ranking_score',
+            field=models.FloatField(db_index=True, default=0),
+        ),
+        migrations.AddIndex(
+            model_name='educatorsearchdoc',
+            index=models.Index(fields=['-ranking_score'], name='skills_educ_ranking_6f1ddf_idx'),
+        ),
+        migrations.RunPython(backfill_ranking_scores, migrations.RunPython.noop),
+    ]
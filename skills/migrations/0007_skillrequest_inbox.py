@@ -0,0 +1,26 @@
+# Generated by Django 4.2.7 on 2026-10-19 12:34
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('skills', '0006_review'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='skillrequest',
+            name='is_read',
+            field=models.BooleanField(default=False, help_text='Seen by the educator in their inbox'),
+        ),
+        migrations.AddIndex(
+            model_name='skillrequest',
+            index=models.Index(fields=['educator', 'status', '-created_at', '-id'], name='skillreq_educator_inbox_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='skillrequest',
+            index=models.Index(fields=['learner', 'status', '-created_at', '-id'], name='skillreq_learner_inbox_idx'),
+        ),
+    ]
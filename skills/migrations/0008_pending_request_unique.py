@@ -0,0 +1,32 @@
+# Generated by Django 4.2.7 on 2026-10-19 12:35
+
+from django.db import migrations, models
+
+
+def reject_duplicate_pending(apps, schema_editor):
+    """Keep the newest pending request per (learner, skill) so the constraint can be added"""
+    SkillRequest = apps.get_model('skills', 'SkillRequest')
+    seen = set()
+    duplicates = []
+    pending = SkillRequest.objects.filter(status='pending').order_by('-created_at', '-id')
+    for pk, learner_id, skill_id in pending.values_list('pk', 'learner_id', 'requested_skill_id').iterator():
+        if (learner_id, skill_id) in seen:
+            duplicates.append(pk)
+        seen.add((learner_id, skill_id))
+    if duplicates:
+        SkillRequest.objects.filter(pk__in=duplicates).update(status='rejected')
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('skills', '0007_skillrequest_inbox'),
+    ]
+
+    operations = [
+        migrations.RunPython(reject_duplicate_pending, migrations.RunPython.noop),
+        migrations.AddConstraint(
+            model_name='skillrequest',
+            constraint=models.UniqueConstraint(condition=models.Q(('status', 'pending')), fields=('learner', 'requested_skill'), name='one_pending_request_per_skill'),
+        ),
+    ]
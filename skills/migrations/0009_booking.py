@@ -0,0 +1,37 @@
+# Generated by Django 4.2.7 on 2026-10-19 12:40
+
+from django.conf import settings
+from django.db import migrations, models
+import django.db.models.deletion
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+        ('skills', '0008_pending_request_unique'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='Booking',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('start_at', models.DateTimeField()),
+                ('end_at', models.DateTimeField()),
+                ('status', models.CharField(choices=[('confirmed', 'Confirmed'), ('cancelled', 'Cancelled')], default='confirmed', max_length=20)),
+                ('created_at', models.DateTimeField(auto_now_add=True)),
+                ('educator', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='bookings_as_educator', to=settings.AUTH_USER_MODEL)),
+                ('learner', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='bookings_as_learner', to=settings.AUTH_USER_MODEL)),
+                ('skill_request', models.ForeignKey(blank=True, null=True, on_delete=django.db.models.deletion.SET_NULL, related_name='bookings', to='skills.skillrequest')),
+            ],
+            options={
+                'ordering': ['start_at'],
+                'indexes': [models.Index(fields=['educator', 'status', 'start_at'], name='booking_educator_idx'), models.Index(fields=['learner', 'status', 'start_at'], name='booking_learner_idx')],
+            },
+        ),
+        migrations.AddConstraint(
+            model_name='booking',
+            constraint=models.CheckConstraint(check=models.Q(('end_at__gt', models.F('start_at'))), name='booking_ends_after_start'),
+        ),
+    ]
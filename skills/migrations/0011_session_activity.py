@@ -0,0 +1,44 @@
+# Generated by Django 4.2.7 on 2026-10-19 12:43
+
+from django.db import migrations, models
+from django.db.models import ExpressionWrapper, F
+from django.db.models.functions import Coalesce
+import django.utils.timezone
+
+
+def backfill_activity(apps, schema_editor):
+    """Existing sessions were last active when they started (or ended)"""
+    Session = apps.get_model('skills', 'Session')
+    Session.objects.update(last_activity_at=Coalesce('ended_at', 'started_at'))
+    Session.objects.filter(ended_at__isnull=False).update(
+        duration=ExpressionWrapper(F('ended_at') - F('started_at'), output_field=models.DurationField())
+    )
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('skills', '0010_sessionparticipant'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='session',
+            name='duration',
+            field=models.DurationField(blank=True, null=True),
+        ),
+        migrations.AddField(
+            model_name='session',
+            name='last_activity_at',
+            field=models.DateTimeField(default=django.utils.timezone.now),
+        ),
+        migrations.RunPython(backfill_activity, migrations.RunPython.noop),
+        migrations.AddIndex(
+            model_name='session',
+            index=models.Index(condition=models.Q(('status', 'active')), fields=['last_activity_at'], name='session_active_idle_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='session',
+            index=models.Index(condition=models.Q(('status', 'active')), fields=['user'], name='session_active_user_idx'),
+        ),
+    ]
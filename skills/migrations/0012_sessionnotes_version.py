@@ -0,0 +1,18 @@
+# Generated by Django 4.2.7 on 2026-10-19 12:45
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('skills', '0011_session_activity'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='sessionnotes',
+            name='version',
+            field=models.PositiveIntegerField(default=0),
+        ),
+    ]
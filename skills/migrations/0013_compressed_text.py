@@ -0,0 +1,29 @@
+# Generated by Django 4.2.7 on 2026-10-19 12:53
+
+from django.db import migrations
+import skills.fields
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('skills', '0012_sessionnotes_version'),
+    ]
+
+    operations = [
+        migrations.AlterField(
+            model_name='sessionnotes',
+            name='notes',
+            field=skills.fields.CompressedTextField(),
+        ),
+        migrations.AlterField(
+            model_name='sessionsummary',
+            name='summary',
+            field=skills.fields.CompressedTextField(),
+        ),
+        migrations.AlterField(
+            model_name='sessionsummary',
+            name='transcript',
+            field=skills.fields.CompressedTextField(),
+        ),
+    ]
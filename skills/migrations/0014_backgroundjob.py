@@ -0,0 +1,39 @@
+# Generated by Django 4.2.7 on 2026-10-19 14:06
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('skills', '0013_compressed_text'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='BackgroundJob',
+            fields=[
+                ('id', models.CharField(max_length=32, primary_key=True, serialize=False)),
+                ('kind', models.CharField(max_length=50)),
+                ('session_id', models.BigIntegerField(blank=True, null=True)),
+                ('status', models.CharField(choices=[('queued', 'Queued'), ('running', 'Running'), ('done', 'Done'), ('failed', 'Failed')], default='queued', max_length=20)),
+                ('stage', models.CharField(default='queued', max_length=100)),
+                ('progress', models.IntegerField(default=0)),
+                ('events', models.JSONField(default=list)),
+                ('result', models.JSONField(blank=True, null=True)),
+                ('error', models.TextField(blank=True, null=True)),
+                ('dedupe_key', models.CharField(blank=True, max_length=255, null=True)),
+                ('traceparent', models.CharField(blank=True, max_length=64, null=True)),
+                ('profile', models.CharField(blank=True, max_length=200, null=True)),
+                ('created_at', models.DateTimeField(auto_now_add=True)),
+                ('updated_at', models.DateTimeField(auto_now=True)),
+            ],
+            options={
+                'indexes': [models.Index(fields=['session_id', '-created_at'], name='job_session_idx'), models.Index(fields=['updated_at'], name='job_updated_idx')],
+            },
+        ),
+        migrations.AddConstraint(
+            model_name='backgroundjob',
+            constraint=models.UniqueConstraint(condition=models.Q(('status__in', ['queued', 'running'])), fields=('dedupe_key',), name='one_unfinished_job_per_dedupe_key'),
+        ),
+    ]
@@ -1,6 +1,9 @@
-from django.db import models
+from django.db import models, transaction
+from django.utils import timezone
 from django.contrib.auth.models import User
 
+from .fields import CompressedTextField
+
 
 class UserProfile(models.Model):
     """Extended user profile for skill sharing"""
@@ -46,12 +49,34 @@ class UserProfile(models.Model):
     rating = models.DecimalField(max_digits=3, decimal_places=2, default=0.00)
     total_students = models.IntegerField(default=0)
     total_lessons = models.IntegerField(default=0)
+    
+    # Review aggregates, maintained incrementally by skills.reviews
+    review_count = models.IntegerField(default=0)
+    review_sum = models.IntegerField(default=0)
+    rating_1_count = models.IntegerField(default=0)
+    rating_2_count = models.IntegerField(default=0)
+    rating_3_count = models.IntegerField(default=0)
+    rating_4_count = models.IntegerField(default=0)
+    rating_5_count = models.IntegerField(default=0)
+    
+    # Composite of smoothed rating, activity, experience and recency (see skills.ranking)
+    ranking_score = models.FloatField(default=0, db_index=True)
     created_at = models.DateTimeField(auto_now_add=True)
     updated_at = models.DateTimeField(auto_now=True)
 
     def __str__(self):
         return f"{self.user.username}'s Profile"
 
+    @property
+    def rating_histogram(self):
+        """[(stars, count, percent)] from five stars down to one"""
+        histogram = []
+        for stars in range(5, 0, -1):
+            count = getattr(self, f'rating_{stars}_count')
+            percent = round(100 * count / self.review_count) if self.review_count else 0
+            histogram.append((stars, count, percent))
+        return histogram
+
 
 class Skill(models.Model):
     """Available skills in the platform"""
@@ -127,13 +152,102 @@ class SkillRequest(models.Model):
         ('rejected', 'Rejected'),
         ('completed', 'Completed'),
     ], default='pending')
+    is_read = models.BooleanField(default=False, help_text="Seen by the educator in their inbox")
     created_at = models.DateTimeField(auto_now_add=True)
     updated_at = models.DateTimeField(auto_now=True)
 
+    class Meta:
+        indexes = [
+            # Inbox pages: WHERE educator/learner = ? AND status = ? ORDER BY created_at DESC, id DESC
+            models.Index(fields=['educator', 'status', '-created_at', '-id'], name='skillreq_educator_inbox_idx'),
+            models.Index(fields=['learner', 'status', '-created_at', '-id'], name='skillreq_learner_inbox_idx'),
+        ]
+        constraints = [
+            models.UniqueConstraint(fields=['learner', 'requested_skill'], condition=models.Q(status='pending'),
+                                    name='one_pending_request_per_skill'),
+        ]
+
     def __str__(self):
         return f"{self.learner.username} -> {self.educator.username} ({self.requested_skill.skill.name})"
 
 
+class Review(models.Model):
+    """A learner's rating of an educator after a completed request or session"""
+    reviewer = models.ForeignKey(User, on_delete=models.CASCADE, related_name='reviews_given')
+    educator = models.ForeignKey(User, on_delete=models.CASCADE, related_name='reviews_received')
+    skill_request = models.ForeignKey(SkillRequest, on_delete=models.CASCADE, blank=True, null=True, related_name='reviews')
+    session = models.ForeignKey('Session', on_delete=models.CASCADE, blank=True, null=True, related_name='reviews')
+    rating = models.PositiveSmallIntegerField(choices=[(i, f'{i} star{"s" if i > 1 else ""}') for i in range(1, 6)])
+    comment = models.TextField(blank=True)
+    created_at = models.DateTimeField(auto_now_add=True)
+    updated_at = models.DateTimeField(auto_now=True)
+
+    class Meta:
+        constraints = [
+            models.CheckConstraint(check=models.Q(rating__gte=1, rating__lte=5), name='review_rating_1_to_5'),
+            models.CheckConstraint(
+                check=(models.Q(skill_request__isnull=False, session__isnull=True) |
+                       models.Q(skill_request__isnull=True, session__isnull=False)),
+                name='review_for_request_xor_session',
+            ),
+            models.UniqueConstraint(fields=['reviewer', 'skill_request'], condition=models.Q(skill_request__isnull=False),
+                                    name='one_review_per_request'),
+            models.UniqueConstraint(fields=['reviewer', 'session'], condition=models.Q(session__isnull=False),
+                                    name='one_review_per_session'),
+        ]
+        indexes = [
+            models.Index(fields=['educator', '-created_at']),
+        ]
+
+    @classmethod
+    def from_db(cls, db, field_names, values):
+        instance = super().from_db(db, field_names, values)
+        # Remember what the aggregates currently account for
+        instance._counted = (instance.__dict__.get('educator_id'), instance.__dict__.get('rating'))
+        return instance
+
+    def save(self, *args, **kwargs):
+        # Row write and aggregate update commit or roll back together
+        with transaction.atomic():
+            super().save(*args, **kwargs)
+            self._counted = (self.educator_id, self.rating)
+
+    def delete(self, *args, **kwargs):
+        with transaction.atomic():
+            return super().delete(*args, **kwargs)
+
+    def __str__(self):
+        return f"{self.reviewer.username} -> {self.educator.username}: {self.rating}/5"
+
+
+class Booking(models.Model):
+    """Reserved micro-session slot with an educator"""
+    educator = models.ForeignKey(User, on_delete=models.CASCADE, related_name='bookings_as_educator')
+    learner = models.ForeignKey(User, on_delete=models.CASCADE, related_name='bookings_as_learner')
+    skill_request = models.ForeignKey(SkillRequest, on_delete=models.SET_NULL, blank=True, null=True,
+                                      related_name='bookings')
+    start_at = models.DateTimeField()
+    end_at = models.DateTimeField()
+    status = models.CharField(max_length=20, choices=[
+        ('confirmed', 'Confirmed'),
+        ('cancelled', 'Cancelled'),
+    ], default='confirmed')
+    created_at = models.DateTimeField(auto_now_add=True)
+
+    class Meta:
+        ordering = ['start_at']
+        indexes = [
+            models.Index(fields=['educator', 'status', 'start_at'], name='booking_educator_idx'),
+            models.Index(fields=['learner', 'status', 'start_at'], name='booking_learner_idx'),
+        ]
+        constraints = [
+            models.CheckConstraint(check=models.Q(end_at__gt=models.F('start_at')), name='booking_ends_after_start'),
+        ]
+
+    def __str__(self):
+        return f"{self.learner.username} with {self.educator.username} at {self.start_at:%Y-%m-%d %H:%M}"
+
+
 class Session(models.Model):
     """Learning session between users"""
     user = models.ForeignKey(User, on_delete=models.CASCADE, related_name='sessions')
@@ -147,12 +261,42 @@ class Session(models.Model):
     ], default='active')
     started_at = models.DateTimeField(auto_now_add=True)
     ended_at = models.DateTimeField(blank=True, null=True)
+    last_activity_at = models.DateTimeField(default=timezone.now)
+    duration = models.DurationField(blank=True, null=True)
     created_at = models.DateTimeField(auto_now_add=True)
 
+    class Meta:
+        indexes = [
+            # Only live sessions are indexed, so these stay as small as current traffic
+            models.Index(fields=['last_activity_at'], name='session_active_idle_idx',
+                         condition=models.Q(status='active')),
+            models.Index(fields=['user'], name='session_active_user_idx',
+                         condition=models.Q(status='active')),
+        ]
+
     def __str__(self):
         return f"Session {self.room_name} - {self.user.username}"
 
 
+class SessionParticipant(models.Model):
+    """A user who has joined a session's room"""
+    session = models.ForeignKey(Session, on_delete=models.CASCADE, related_name='participants')
+    user = models.ForeignKey(User, on_delete=models.CASCADE, related_name='session_participations')
+    role = models.CharField(max_length=20, choices=[
+        ('host', 'Host'),
+        ('participant', 'Participant'),
+    ], default='participant')
+    joined_at = models.DateTimeField(auto_now_add=True)
+
+    class Meta:
+        constraints = [
+            models.UniqueConstraint(fields=['session', 'user'], name='one_participant_row_per_user'),
+        ]
+
+    def __str__(self):
+        return f"{self.user.username} in {self.session.room_name}"
+
+
 class SessionRecording(models.Model):
     """Recording information for sessions"""
     session = models.OneToOneField(Session, on_delete=models.CASCADE, related_name='recording')
@@ -170,8 +314,8 @@ class SessionRecording(models.Model):
 class SessionSummary(models.Model):
     """AI-generated session summaries"""
     session = models.OneToOneField(Session, on_delete=models.CASCADE, related_name='summary')
-    transcript = models.TextField()
-    summary = models.TextField()
+    transcript = CompressedTextField()
+    summary = CompressedTextField()
     language = models.CharField(max_length=10, default='hi', choices=[
         ('hi', 'Hindi'),
         ('en', 'English'),
@@ -185,9 +329,99 @@ class SessionSummary(models.Model):
 class SessionNotes(models.Model):
     """User notes during sessions"""
     session = models.OneToOneField(Session, on_delete=models.CASCADE, related_name='notes')
-    notes = models.TextField()
+    notes = CompressedTextField()
+    version = models.PositiveIntegerField(default=0)
     created_at = models.DateTimeField(auto_now_add=True)
     updated_at = models.DateTimeField(auto_now=True)
 
     def __str__(self):
         return f"Notes for {self.session.room_name}"
+
+
+class BackgroundJob(models.Model):
+    """State and progress events of a background job, shared by every worker process"""
+    id = models.CharField(max_length=32, primary_key=True)
+    kind = models.CharField(max_length=50)
+    # A plain id: jobs may be started for sessions that don't exist (yet)
+    session_id = models.BigIntegerField(blank=True, null=True)
+    status = models.CharField(max_length=20, choices=[
+        ('queued', 'Queued'),
+        ('running', 'Running'),
+        ('done', 'Done'),
+        ('failed', 'Failed'),
+    ], default='queued')
+    stage = models.CharField(max_length=100, default='queued')
+    progress = models.IntegerField(default=0)
+    events = models.JSONField(default=list)
+    result = models.JSONField(blank=True, null=True)
+    error = models.TextField(blank=True, null=True)
+    dedupe_key = models.CharField(max_length=255, blank=True, null=True)
+    traceparent = models.CharField(max_length=64, blank=True, null=True)
+    profile = models.CharField(max_length=200, blank=True, null=True)
+    created_at = models.DateTimeField(auto_now_add=True)
+    updated_at = models.DateTimeField(auto_now=True)
+
+    class Meta:
+        indexes = [
+            models.Index(fields=['session_id', '-created_at'], name='job_session_idx'),
+            models.Index(fields=['updated_at'], name='job_updated_idx'),
+        ]
+        constraints = [
+            # At most one unfinished job per dedupe key, so concurrent retries attach to the same one
+            models.UniqueConstraint(fields=['dedupe_key'], name='one_unfinished_job_per_dedupe_key',
+                                    condition=models.Q(status__in=['queued', 'running'])),
+        ]
+
+    def __str__(self):
+        return f"{self.kind} job {self.id} ({self.status})"
+
+
+class EducatorSearchDoc(models.Model):
+    """Flattened one-row-per-educator projection used by the listing pages"""
+    user_profile = models.OneToOneField(UserProfile, on_delete=models.CASCADE, primary_key=True, related_name='search_doc')
+    user = models.ForeignKey(User, on_delete=models.CASCADE, related_name='+')
+    username = models.CharField(max_length=150)
+    display_name = models.CharField(max_length=301)
+    bio = models.TextField(blank=True)
+    profile_picture = models.ImageField(upload_to='profile_pics/', blank=True, null=True)
+    location = models.CharField(max_length=100, blank=True)
+
+    # Lower-cased names, skill names and bio for free-text matching
+    search_text = models.TextField(blank=True)
+    # Pipe-delimited ("|python|guitar|") so one LIKE matches a whole token
+    skill_names = models.TextField(blank=True)
+    categories = models.CharField(max_length=500, blank=True)
+    proficiency_levels = models.CharField(max_length=200, blank=True)
+    skill_ids = models.JSONField(default=list, blank=True)
+    skills = models.JSONField(default=list, blank=True, help_text="[{id, name, proficiency_level}] for display")
+    skill_count = models.IntegerField(default=0)
+
+    hourly_rate = models.DecimalField(max_digits=10, decimal_places=2, blank=True, null=True)
+    hourly_rate_range = models.CharField(max_length=20, blank=True)
+    rating = models.DecimalField(max_digits=3, decimal_places=2, default=0.00)
+    review_count = models.IntegerField(default=0)
+    total_students = models.IntegerField(default=0)
+    ranking_score = models.FloatField(default=0)
+    teaching_mode = models.CharField(max_length=20, blank=True)
+    experience_level = models.CharField(max_length=20, blank=True)
+    experience_rank = models.SmallIntegerField(default=0)
+    available_days = models.JSONField(default=list, blank=True)
+    preferred_time = models.CharField(max_length=20, blank=True)
+
+    created_at = models.DateTimeField()
+    updated_at = models.DateTimeField(auto_now=True)
+
+    class Meta:
+        indexes = [
+            models.Index(fields=['skill_count', '-created_at']),
+            models.Index(fields=['-ranking_score']),
+            models.Index(fields=['rating']),
+            models.Index(fields=['hourly_rate']),
+            models.Index(fields=['experience_rank']),
+            models.Index(fields=['teaching_mode']),
+            models.Index(fields=['experience_level']),
+            models.Index(fields=['hourly_rate_range']),
+        ]
+
+    def __str__(self):
+        return f"Search doc for {self.username}"
@@ -0,0 +1,233 @@
+import logging
+import os
+import threading
+import time
+
+from django.conf import settings
+from django.core.cache import cache, caches
+from django.core.cache.backends.dummy import DummyCache
+from django.core.cache.backends.locmem import LocMemCache
+from django.db import IntegrityError, close_old_connections, transaction
+from django.utils import timezone
+
+from .models import SessionNotes
+
+
+DIRTY_KEY = 'notes:dirty'
+
+logger = logging.getLogger('skills.notes')
+
+
+class NotesConflict(Exception):
+    """The client's base version is behind the buffered copy"""
+
+    def __init__(self, entry):
+        super().__init__(f"notes are at version {entry['version']}")
+        self.entry = entry
+
+
+def _key(session_id):
+    return f'notes:{session_id}'
+
+
+def _timeout():
+    return getattr(settings, 'NOTES_BUFFER_TIMEOUT', 24 * 3600)
+
+
+def buffered():
+    """Whether edits are buffered in the cache or written straight to the database.
+
+    NOTES_BUFFER decides; by default edits are only buffered when the cache
+    is shared by every process (Redis, Memcached, database or file cache).
+    With a per-process cache the flush command, the reaper and the other
+    workers couldn't see the buffer, so every edit is written through.
+    Set NOTES_BUFFER = True to buffer in a per-process cache anyway, which
+    is only safe when a single process serves and ends sessions.
+    """
+    setting = getattr(settings, 'NOTES_BUFFER', None)
+    if setting is not None:
+        return setting
+    return not isinstance(caches['default'], (LocMemCache, DummyCache))
+
+
+class _locked:
+    """Short cache-based lock around one session's read-modify-write"""
+
+    def __init__(self, session_id):
+        self.key = f'notes:lock:{session_id}'
+
+    def __enter__(self):
+        deadline = time.monotonic() + 2
+        self.held = cache.add(self.key, 1, 5)
+        while not self.held:
+            if time.monotonic() > deadline:
+                break  # a crashed holder; its lock expires anyway
+            time.sleep(0.01)
+            self.held = cache.add(self.key, 1, 5)
+
+    def __exit__(self, *exc):
+        if self.held:
+            cache.delete(self.key)
+
+
+def _stored(session_id):
+    row = SessionNotes.objects.filter(session_id=session_id).values_list('notes', 'version').first()
+    text, version = row or ('', 0)
+    return {'text': str(text), 'version': version, 'flushed_version': version, 'flushed_at': time.time()}
+
+
+def load_notes(session_id):
+    """Buffered {text, version, flushed_version, flushed_at} for a session, seeded from the DB"""
+    if not buffered():
+        return _stored(session_id)
+    entry = cache.get(_key(session_id))
+    if entry is None:
+        entry = _stored(session_id)
+        cache.set(_key(session_id), entry, _timeout())
+    return entry
+
+
+def apply_diffs(text, diffs):
+    """Apply [{start, end, text}] replacements in order; offsets refer to the text so far"""
+    for diff in diffs:
+        start, end, insert = int(diff['start']), int(diff['end']), str(diff.get('text', ''))
+        if not 0 <= start <= end <= len(text):
+            raise ValueError(f'diff {start}-{end} is outside the notes ({len(text)} characters)')
+        text = text[:start] + insert + text[end:]
+    return text
+
+
+def _mark_dirty(session_id):
+    with _locked('dirty'):
+        dirty = cache.get(DIRTY_KEY, set())
+        dirty.add(session_id)
+        cache.set(DIRTY_KEY, dirty, None)
+
+
+def _write_through(session_id, base_version, diffs, entry=None):
+    """update_notes without the buffer: a version-checked write to the database.
+
+    One read and one conditional UPDATE; only the very first save of a
+    session needs the INSERT (in a savepoint, as it can race another).
+    """
+    entry = entry or _stored(session_id)
+    if base_version != entry['version']:
+        raise NotesConflict(entry)
+    text = apply_diffs(entry['text'], diffs)
+    version = entry['version'] + 1
+    updated = SessionNotes.objects.filter(session_id=session_id, version=entry['version']).update(
+        notes=text, version=version, updated_at=timezone.now()
+    )
+    if not updated and entry['version'] == 0:
+        try:
+            with transaction.atomic():
+                SessionNotes.objects.create(session_id=session_id, notes=text, version=version)
+            updated = 1
+        except IntegrityError:
+            pass  # created concurrently
+    if not updated:
+        raise NotesConflict(_stored(session_id))
+    return {'text': text, 'version': version, 'flushed_version': version, 'flushed_at': time.time()}
+
+
+def update_notes(session_id, base_version, diffs):
+    """Apply a client's diffs made against ``base_version``.
+
+    When buffered() the copy in the cache is updated and the session marked
+    dirty; the database is written when the buffer is flushed: here or by a
+    background thread at most NOTES_FLUSH_INTERVAL seconds later, and when
+    the session ends. Otherwise the database is written straight away.
+    Raises NotesConflict if another client saved a newer version first.
+    """
+    if not buffered():
+        return _write_through(session_id, base_version, diffs)
+    with _locked(session_id):
+        entry = load_notes(session_id)
+        if base_version != entry['version']:
+            raise NotesConflict(entry)
+        entry['text'] = apply_diffs(entry['text'], diffs)
+        entry['version'] += 1
+        cache.set(_key(session_id), entry, _timeout())
+    _mark_dirty(session_id)
+    _start_flusher()
+
+    if time.time() - entry['flushed_at'] >= getattr(settings, 'NOTES_FLUSH_INTERVAL', 30):
+        flush_notes([session_id])
+    return entry
+
+
+def replace_notes(session_id, text):
+    """Replace the whole text, on top of whatever version is current"""
+    current = load_notes(session_id)
+    diffs = [{'start': 0, 'end': len(current['text']), 'text': text}]
+    if not buffered():
+        return _write_through(session_id, current['version'], diffs, current)
+    return update_notes(session_id, current['version'], diffs)
+
+
+def flush_notes(session_ids=None):
+    """Write buffered notes newer than the stored copy; returns the number of rows written.
+
+    With no ids, flushes every dirty session. The UPDATE is conditional on
+    the stored version being older, so a late flush never overwrites a
+    newer one.
+    """
+    dirty = cache.get(DIRTY_KEY, set())
+    session_ids = set(dirty if session_ids is None else session_ids)
+    written = 0
+    for session_id in session_ids:
+        entry = cache.get(_key(session_id))
+        if entry is None or entry['version'] <= entry['flushed_version']:
+            continue
+        updated = SessionNotes.objects.filter(session_id=session_id, version__lt=entry['version']).update(
+            notes=entry['text'], version=entry['version'], updated_at=timezone.now()
+        )
+        if not updated and not SessionNotes.objects.filter(session_id=session_id).exists():
+            SessionNotes.objects.create(session_id=session_id, notes=entry['text'], version=entry['version'])
+            updated = 1
+        written += updated
+
+        with _locked(session_id):
+            current = cache.get(_key(session_id)) or entry
+            current['flushed_version'] = max(current['flushed_version'], entry['version'])
+            current['flushed_at'] = time.time()
+            cache.set(_key(session_id), current, _timeout())
+
+    # Keep anything that was edited again while we were writing
+    with _locked('dirty'):
+        remaining = set()
+        for session_id in cache.get(DIRTY_KEY, set()):
+            entry = cache.get(_key(session_id))
+            if session_id not in session_ids or (entry and entry['version'] > entry['flushed_version']):
+                remaining.add(session_id)
+        cache.set(DIRTY_KEY, remaining, None)
+    return written
+
+
+# Sessions that go quiet are flushed by a background thread in each process
+# that has buffered an edit, so the last edits before everyone leaves don't
+# wait for the session to be ended or reaped.
+
+_flusher = {'pid': None}
+_flusher_lock = threading.Lock()
+
+
+def _flush_loop():
+    while True:
+        time.sleep(getattr(settings, 'NOTES_FLUSH_INTERVAL', 30))
+        try:
+            flush_notes()
+        except Exception:
+            logger.exception('Flushing buffered notes failed')
+        finally:
+            close_old_connections()
+
+
+def _start_flusher():
+    # Checked by pid so a forked worker starts its own thread
+    if _flusher['pid'] == os.getpid():
+        return
+    with _flusher_lock:
+        if _flusher['pid'] != os.getpid():
+            threading.Thread(target=_flush_loop, daemon=True, name='bmb-notes-flush').start()
+            _flusher['pid'] = os.getpid()
@@ -0,0 +1,261 @@
+import glob
+import html
+import json
+import os
+import random
+import re
+import sys
+import threading
+import time
+import uuid
+import zlib
+from collections import Counter
+from contextlib import contextmanager
+from contextvars import ContextVar
+
+from django.conf import settings
+from django.core.signing import BadSignature, SignatureExpired, TimestampSigner
+
+
+SALT = 'skills.profiling'
+HEADER = 'X-Profile'
+
+_active = ContextVar('bmb_profile', default=None)
+_slots = {'semaphore': None, 'size': None}
+_slots_lock = threading.Lock()
+_THIS_FILE = __file__.rstrip('c')
+
+
+def _setting(name, default):
+    return getattr(settings, name, default)
+
+
+def enabled():
+    return _setting('PROFILING_ENABLED', False)
+
+
+def profiles_dir():
+    return str(_setting('PROFILING_DIR', os.path.join(settings.BASE_DIR, 'profiles')))
+
+
+def sign_token(label='manual'):
+    """Value for the X-Profile header that profiles a request; valid for PROFILING_TOKEN_MAX_AGE seconds"""
+    return TimestampSigner(salt=SALT).sign(label)
+
+
+def verify_token(value):
+    """The label inside a valid, unexpired token, or None"""
+    try:
+        return TimestampSigner(salt=SALT).unsign(value, max_age=_setting('PROFILING_TOKEN_MAX_AGE', 300))
+    except (BadSignature, SignatureExpired):
+        return None
+
+
+def _frame_label(code):
+    filename = code.co_filename
+    base = str(settings.BASE_DIR)
+    if filename.startswith(base):
+        filename = os.path.relpath(filename, base)
+    elif 'site-packages' in filename:
+        filename = filename.split('site-packages' + os.sep, 1)[1]
+    else:
+        filename = os.path.basename(filename)
+    return f'{code.co_name} ({filename}:{code.co_firstlineno})'
+
+
+class Sampler:
+    """Samples one thread's stack every ``interval`` seconds from a background thread.
+
+    Only code objects are looked at, so the profiled thread does no extra
+    work; the cost is the sampling thread waking up. ``stacks`` counts
+    collapsed stacks, outermost frame first.
+    """
+
+    def __init__(self, thread_id, interval):
+        self.thread_id = thread_id
+        self.interval = interval
+        self.stacks = Counter()
+        self.samples = 0
+        self._stop = threading.Event()
+        self._thread = threading.Thread(target=self._run, daemon=True, name='bmb-profiler')
+        self._labels = {}
+
+    def _label(self, code):
+        label = self._labels.get(code)
+        if label is None:
+            label = self._labels[code] = _frame_label(code)
+        return label
+
+    def _run(self):
+        while not self._stop.wait(self.interval):
+            frame = sys._current_frames().get(self.thread_id)
+            codes = []
+            while frame is not None:
+                if frame.f_code.co_filename != _THIS_FILE:
+                    codes.append(frame.f_code)
+                frame = frame.f_back
+            if codes:
+                self.stacks[';'.join(self._label(code) for code in reversed(codes))] += 1
+                self.samples += 1
+
+    def start(self):
+        self._thread.start()
+        return self
+
+    def stop(self):
+        self._stop.set()
+        self._thread.join()
+        return self.stacks
+
+
+def _semaphore():
+    size = _setting('PROFILING_MAX_CONCURRENT', 2)
+    with _slots_lock:
+        if _slots['size'] != size:
+            _slots.update(semaphore=threading.BoundedSemaphore(size), size=size)
+        return _slots['semaphore']
+
+
+def active_label():
+    """Label of the profile running in this context, so background jobs can be profiled along with it"""
+    return _active.get()
+
+
+@contextmanager
+def profile(name, label='sampled', **meta):
+    """Sample the current thread for the duration of the block and save the result.
+
+    Yields the profile id, or None when PROFILING_MAX_CONCURRENT profiles
+    are already running (then nothing is recorded).
+    """
+    semaphore = _semaphore()
+    if not semaphore.acquire(blocking=False):
+        yield None
+        return
+    profile_id = f"{time.strftime('%Y%m%d-%H%M%S')}-{re.sub(r'[^A-Za-z0-9_.-]+', '-', name)[:60]}-{uuid.uuid4().hex[:6]}"
+    sampler = Sampler(threading.get_ident(), _setting('PROFILING_INTERVAL_MS', 5) / 1000).start()
+    token = _active.set(label)
+    began = time.perf_counter()
+    try:
+        yield profile_id
+    finally:
+        duration = time.perf_counter() - began
+        _active.reset(token)
+        stacks = sampler.stop()
+        semaphore.release()
+        save_profile(profile_id, stacks, {
+            'name': name, 'label': label, 'duration_ms': round(duration * 1000, 1), 'samples': sampler.samples,
+            'interval_ms': sampler.interval * 1000, 'pid': os.getpid(), 'at': time.strftime('%Y-%m-%d %H:%M:%S'),
+            **meta,
+        })
+
+
+@contextmanager
+def maybe_profile(name, label, **meta):
+    """profile() when profiling is enabled and ``label`` is set, otherwise nothing"""
+    if not label or not enabled():
+        yield None
+        return
+    with profile(name, label, **meta) as profile_id:
+        yield profile_id
+
+
+def should_profile(header_value, sample_rate):
+    """The label to profile under: from a valid signed header, 'sampled' at ``sample_rate``, else None"""
+    if header_value:
+        label = verify_token(header_value)
+        if label:
+            return label
+    if sample_rate and random.random() < sample_rate:
+        return 'sampled'
+    return None
+
+
+def top_frames(stacks, limit=10):
+    """Frames with the most samples at the top of the stack (self time)"""
+    leaves = Counter()
+    for stack, count in stacks.items():
+        leaves[stack.rsplit(';', 1)[-1]] += count
+    return leaves.most_common(limit)
+
+
+def flamegraph_svg(stacks, width=1200, row=16):
+    """A static flame graph: one box per frame, as wide as its share of samples"""
+    tree = {}
+    for stack, count in stacks.items():
+        node = tree
+        for frame in stack.split(';'):
+            child = node.setdefault(frame, {'count': 0, 'children': {}})
+            child['count'] += count
+            node = child['children']
+    total = sum(stacks.values()) or 1
+    depth = max((stack.count(';') + 1 for stack in stacks), default=0)
+    height = (depth + 1) * row
+    boxes = []
+
+    def draw(node, x, level):
+        for frame, child in sorted(node.items()):
+            w = child['count'] / total * width
+            if w >= 0.5:
+                y = height - (level + 1) * row
+                hue = 20 + zlib.crc32(frame.split(' (')[0].encode()) % 40
+                title = html.escape(f"{frame}: {child['count']} samples ({child['count'] / total:.1%})")
+                text = html.escape(frame[:int(w / 7)]) if w > 30 else ''
+                boxes.append(f'<g><title>{title}</title><rect x="{x:.1f}" y="{y}" width="{w:.1f}" height="{row - 1}" '
+                             f'fill="hsl({hue},85%,60%)"/><text x="{x + 3:.1f}" y="{y + row - 4}">{text}</text></g>')
+                draw(child['children'], x, level + 1)
+            x += w
+
+    draw(tree, 0, 0)
+    return (f'<svg xmlns="http://www.w3.org/2000/svg" width="{width}" height="{height}" '
+            f'font-family="monospace" font-size="11">{"".join(boxes)}</svg>')
+
+
+def save_profile(profile_id, stacks, meta):
+    """Write <id>.collapsed (for flamegraph.pl or speedscope), <id>.svg and <id>.json, then the index"""
+    directory = profiles_dir()
+    os.makedirs(directory, exist_ok=True)
+    base = os.path.join(directory, profile_id)
+    with open(f'{base}.collapsed', 'w', encoding='utf-8') as f:
+        f.writelines(f'{stack} {count}\n' for stack, count in stacks.most_common())
+    with open(f'{base}.svg', 'w', encoding='utf-8') as f:
+        f.write(flamegraph_svg(stacks))
+    with open(f'{base}.json', 'w', encoding='utf-8') as f:
+        json.dump({'id': profile_id, **meta, 'top': top_frames(stacks)}, f)
+    write_index(directory)
+
+
+def write_index(directory):
+    """Rebuild index.html from the profiles' metadata, dropping all but the newest PROFILING_KEEP"""
+    entries = []
+    for path in glob.glob(os.path.join(directory, '*.json')):
+        try:
+            with open(path, encoding='utf-8') as f:
+                entries.append(json.load(f))
+        except (OSError, ValueError):
+            continue
+    entries.sort(key=lambda e: e['id'], reverse=True)
+    keep = _setting('PROFILING_KEEP', 200)
+    for old in entries[keep:]:
+        for ext in ('json', 'collapsed', 'svg'):
+            try:
+                os.remove(os.path.join(directory, f"{old['id']}.{ext}"))
+            except FileNotFoundError:
+                pass
+    rows = []
+    for e in entries[:keep]:
+        hot = '<br>'.join(html.escape(f'{count} {frame}') for frame, count in e['top'][:3])
+        rows.append(
+            f"<tr><td>{html.escape(e['at'])}</td><td>{html.escape(e['name'])}</td><td>{html.escape(e['label'])}</td>"
+            f"<td>{e['duration_ms']}</td><td>{e['samples']}</td><td><small>{hot}</small></td>"
+            f"<td><a href=\"{e['id']}.svg\">flame graph</a> · <a href=\"{e['id']}.collapsed\">collapsed</a></td></tr>"
+        )
+    page = ('<!DOCTYPE html><html><head><meta charset="utf-8"><title>Profiles</title>'
+            '<style>body{font-family:sans-serif}td,th{padding:4px 8px;text-align:left;vertical-align:top}'
+            'tr:nth-child(even){background:#f4f4f4}</style></head><body>'
+            f'<h1>Profiles</h1><table><tr><th>When</th><th>What</th><th>Trigger</th><th>ms</th><th>Samples</th>'
+            f'<th>Hottest frames</th><th></th></tr>{"".join(rows)}</table></body></html>')
+    tmp = os.path.join(directory, f'.index-{os.getpid()}.html')
+    with open(tmp, 'w', encoding='utf-8') as f:
+        f.write(page)
+    os.replace(tmp, os.path.join(directory, 'index.html'))
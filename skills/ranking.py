@@ -0,0 +1,127 @@
+import math
+
+from django.conf import settings
+from django.core.cache import cache
+from django.db import transaction
+from django.db.models import Sum
+from django.utils import timezone
+
+from .models import UserProfile, EducatorSearchDoc
+from .search import EXPERIENCE_RANKS, invalidate_search_cache
+
+
+PRIOR_MEAN_KEY = 'ranking:prior_mean'
+
+# Weights of the score components; they sum to 1 so scores stay in [0, 1]
+RATING_WEIGHT = 0.6
+ACTIVITY_WEIGHT = 0.2
+EXPERIENCE_WEIGHT = 0.1
+RECENCY_WEIGHT = 0.1
+
+# Lesson count at which the activity component saturates
+ACTIVITY_SATURATION = 500
+
+
+def prior_mean_rating():
+    """Platform-wide mean rating used as the Bayesian prior"""
+    prior = cache.get(PRIOR_MEAN_KEY)
+    if prior is None:
+        prior = getattr(settings, 'RANKING_DEFAULT_PRIOR', 4.0)
+    return prior
+
+
+def compute_prior_mean_rating():
+    """Recompute and cache the mean of all review ratings on the platform"""
+    totals = UserProfile.objects.aggregate(count=Sum('review_count'), total=Sum('review_sum'))
+    if totals['count']:
+        prior = totals['total'] / totals['count']
+    else:
+        prior = getattr(settings, 'RANKING_DEFAULT_PRIOR', 4.0)
+    cache.set(PRIOR_MEAN_KEY, prior, None)
+    return prior
+
+
+def compute_ranking_score(rating, votes, total_lessons, experience_level, created_at, prior=None, now=None):
+    """Composite ranking score in [0, 1].
+
+    The rating is Bayesian-smoothed towards the platform mean so a single
+    five-star review can't outrank a long track record; activity grows
+    logarithmically with lessons taught; new educators get a boost that
+    decays with a configurable half-life.
+    """
+    if prior is None:
+        prior = prior_mean_rating()
+    now = now or timezone.now()
+    prior_weight = getattr(settings, 'RANKING_PRIOR_WEIGHT', 10)
+    half_life = getattr(settings, 'RANKING_RECENCY_HALF_LIFE_DAYS', 30)
+
+    votes = max(votes or 0, 0)
+    smoothed = (prior_weight * prior + votes * float(rating or 0)) / (prior_weight + votes)
+    activity = min(1.0, math.log1p(max(total_lessons or 0, 0)) / math.log1p(ACTIVITY_SATURATION))
+    experience = EXPERIENCE_RANKS.get(experience_level, 0) / max(EXPERIENCE_RANKS.values())
+    age_days = max((now - created_at).total_seconds() / 86400, 0) if created_at else 0
+    recency = 0.5 ** (age_days / half_life)
+
+    return (RATING_WEIGHT * smoothed / 5
+            + ACTIVITY_WEIGHT * activity
+            + EXPERIENCE_WEIGHT * experience
+            + RECENCY_WEIGHT * recency)
+
+
+def score_profile(profile, prior=None, now=None):
+    """Ranking score for a UserProfile instance"""
+    return compute_ranking_score(
+        profile.rating, profile.review_count, profile.total_lessons,
+        profile.experience_level, profile.created_at, prior=prior, now=now,
+    )
+
+
+def refresh_ranking_scores(profile_ids):
+    """Recompute scores for profiles whose inputs changed via queryset updates"""
+    profiles = list(UserProfile.objects.filter(pk__in=set(profile_ids)))
+    prior = prior_mean_rating()
+    for profile in profiles:
+        profile.ranking_score = score_profile(profile, prior=prior)
+    UserProfile.objects.bulk_update(profiles, ['ranking_score'])
+    EducatorSearchDoc.objects.bulk_update(
+        [EducatorSearchDoc(pk=profile.pk, ranking_score=profile.ranking_score) for profile in profiles],
+        ['ranking_score'],
+    )
+    invalidate_search_cache()
+
+
+def rebuild_ranking_scores(batch_size=1000, stdout=None):
+    """Batch rebuild of every score; meant to run nightly so recency decays"""
+    prior = compute_prior_mean_rating()
+    now = timezone.now()
+    total = 0
+    batch = []
+    fields = ('pk', 'rating', 'review_count', 'total_lessons', 'experience_level', 'created_at')
+
+    def flush(batch):
+        with transaction.atomic():
+            UserProfile.objects.bulk_update(
+                [UserProfile(pk=pk, ranking_score=score) for pk, score in batch],
+                ['ranking_score'], batch_size=batch_size,
+            )
+            EducatorSearchDoc.objects.bulk_update(
+                [EducatorSearchDoc(pk=pk, ranking_score=score) for pk, score in batch],
+                ['ranking_score'], batch_size=batch_size,
+            )
+
+    rows = UserProfile.objects.order_by('pk').values_list(*fields)
+    for pk, rating, votes, lessons, experience_level, created_at in rows.iterator(chunk_size=batch_size):
+        score = compute_ranking_score(rating, votes, lessons, experience_level, created_at, prior=prior, now=now)
+        batch.append((pk, score))
+        if len(batch) >= batch_size:
+            flush(batch)
+            total += len(batch)
+            batch = []
+            if stdout:
+                stdout.write(f'Scored {total} educators...')
+    if batch:
+        flush(batch)
+        total += len(batch)
+
+    invalidate_search_cache()
+    return total
@@ -0,0 +1,160 @@
+import math
+import threading
+import time
+import uuid
+from contextlib import contextmanager
+
+from django.conf import settings
+from django.core.cache import cache
+
+from .metrics import counter
+
+
+ADMISSION_REJECTED = counter('bmb_admission_rejected_total', 'Requests turned away by admission control',
+                             ('view', 'reason'))
+
+# Endpoints that call the model or transcribe recordings
+DEFAULT_VIEWS = ('generate_summary_api', 'process_recording_api')
+
+_local_lock = threading.Lock()
+
+
+def _setting(name, default):
+    return getattr(settings, name, default)
+
+
+def enabled():
+    return _setting('RATELIMIT_ENABLED', False)
+
+
+def limited_views():
+    return frozenset(_setting('RATELIMIT_VIEWS', DEFAULT_VIEWS))
+
+
+@contextmanager
+def _locked(key):
+    """Serialise read-modify-write of ``key``: a thread lock here, an add()-based lock in the cache for
+    other processes. If the cache lock can't be had within ~20ms the update goes ahead anyway, since
+    letting a request through beats making it wait on the limiter."""
+    lock_key = f'{key}:lock'
+    with _local_lock:
+        held = False
+        for _ in range(10):
+            held = cache.add(lock_key, 1, 1)
+            if held:
+                break
+            time.sleep(0.002)
+        try:
+            yield
+        finally:
+            if held:
+                cache.delete(lock_key)
+
+
+def take_token(key, per_minute, burst):
+    """Take one token from the bucket at ``key``, which holds up to ``burst`` and refills at ``per_minute``.
+
+    Returns 0 when the token was taken, otherwise the seconds until one
+    will be available. A bucket nobody uses expires from the cache full.
+    """
+    rate = per_minute / 60
+    now = time.time()
+    with _locked(key):
+        tokens, stamp = cache.get(key) or (burst, now)
+        tokens = min(burst, tokens + max(now - stamp, 0) * rate)
+        if tokens < 1:
+            return (1 - tokens) / rate
+        cache.set(key, (tokens - 1, now), math.ceil(burst / rate) + 1)
+    return 0
+
+
+def refund_token(key, per_minute, burst):
+    """Put back a token taken from the bucket at ``key`` for a request that was refused anyway"""
+    rate = per_minute / 60
+    with _locked(key):
+        bucket = cache.get(key)
+        if bucket is None:
+            return  # expired, so full again
+        tokens, stamp = bucket
+        cache.set(key, (min(burst, tokens + 1), stamp), math.ceil(burst / rate) + 1)
+
+
+def acquire_slot(name, limit):
+    """Claim one of ``limit`` in-flight slots shared by every process; returns the slot, or None if all are taken.
+
+    Slots are cache keys claimed with add(), so a process that dies while
+    holding one only blocks it for RATELIMIT_IN_FLIGHT_TIMEOUT seconds.
+    """
+    token = uuid.uuid4().hex
+    timeout = _setting('RATELIMIT_IN_FLIGHT_TIMEOUT', 600)
+    for index in range(limit):
+        key = f'ratelimit:inflight:{name}:{index}'
+        if cache.add(key, token, timeout):
+            return key, token
+    return None
+
+
+def release_slot(slot):
+    key, token = slot
+    if cache.get(key) == token:
+        cache.delete(key)
+
+
+def queue_time_ms(request):
+    """How long the request waited in front of Django, from the proxy's X-Request-Start header.
+
+    Accepts 't=<seconds>' (nginx's $msec) and bare seconds, milliseconds or
+    microseconds since the epoch (Heroku, Apache). None without the header.
+    """
+    value = request.headers.get(_setting('RATELIMIT_QUEUE_HEADER', 'X-Request-Start'), '')
+    try:
+        started = float(value.strip().removeprefix('t='))
+    except ValueError:
+        return None
+    if started > 1e14:
+        started /= 1e6
+    elif started > 1e11:
+        started /= 1e3
+    return max((time.time() - started) * 1000, 0.0)
+
+
+def _client_key(request):
+    user = getattr(request, 'user', None)
+    if user is not None and user.is_authenticated:
+        return f'user:{user.pk}'
+    return f"ip:{request.META.get('REMOTE_ADDR', 'unknown')}"
+
+
+def _client_bucket(request):
+    return (f'ratelimit:bucket:{_client_key(request)}', _setting('RATELIMIT_USER_PER_MINUTE', 10),
+            _setting('RATELIMIT_USER_BURST', 5))
+
+
+def check(request):
+    """Why a request for a limited view should be turned away, as (reason, retry_after_seconds), or None.
+
+    Checked in order: time spent queued in front of Django, the client's
+    bucket (per user, or per IP when anonymous), then the global bucket.
+    A request refused by the global bucket gets its client token back, so
+    a busy server doesn't later answer the same client with 429.
+    """
+    shed_ms = _setting('RATELIMIT_SHED_QUEUE_MS', 1000)
+    if shed_ms:
+        waited = queue_time_ms(request)
+        if waited is not None and waited > shed_ms:
+            return 'queue', _setting('RATELIMIT_RETRY_AFTER', 5)
+
+    wait = take_token(*_client_bucket(request))
+    if wait:
+        return 'user', math.ceil(wait)
+    wait = take_token('ratelimit:bucket:global', _setting('RATELIMIT_GLOBAL_PER_MINUTE', 120),
+                      _setting('RATELIMIT_GLOBAL_BURST', 30))
+    if wait:
+        refund(request)
+        return 'global', math.ceil(wait)
+    return None
+
+
+def refund(request):
+    """Give back the client token check() took, for a request then refused for lack of capacity"""
+    refund_token(*_client_bucket(request))
@@ -0,0 +1,137 @@
+from decimal import Decimal
+
+from django.core.exceptions import ValidationError
+from django.db import transaction
+from django.db.models import Case, Count, DecimalField, F, FloatField, When
+from django.db.models.functions import Cast
+
+from .models import EducatorSearchDoc, Review, SessionParticipant, UserProfile
+from .ranking import refresh_ranking_scores
+
+AGGREGATE_FIELDS = ['review_count', 'review_sum', 'rating'] + [f'rating_{i}_count' for i in range(1, 6)]
+
+
+def _adjust_aggregates(educator_id, rating, step):
+    """Add (step=1) or remove (step=-1) one rating from an educator's aggregates.
+
+    Everything happens in a single ``UPDATE`` built from ``F()`` expressions,
+    so concurrent reviews for the same educator never lose an increment and
+    the average is derived from the post-update count and sum.
+    """
+    new_count = F('review_count') + step
+    new_sum = F('review_sum') + step * rating
+    UserProfile.objects.filter(user_id=educator_id).update(
+        review_count=new_count,
+        review_sum=new_sum,
+        **{f'rating_{rating}_count': F(f'rating_{rating}_count') + step},
+        rating=Case(
+            When(review_count__gt=-step, then=Cast(
+                Cast(new_sum, FloatField()) / new_count,
+                DecimalField(max_digits=3, decimal_places=2),
+            )),
+            default=0,
+            output_field=DecimalField(max_digits=3, decimal_places=2),
+        ),
+    )
+
+
+def apply_review_change(previous, current):
+    """Move aggregates from ``previous`` to ``current`` (educator_id, rating) pairs.
+
+    Either side may be ``None`` for an insert or a delete. Returns the
+    educator ids whose aggregates changed.
+    """
+    if previous == current:
+        return set()
+    changed = set()
+    if previous and previous[0]:
+        _adjust_aggregates(previous[0], previous[1], -1)
+        changed.add(previous[0])
+    if current and current[0]:
+        _adjust_aggregates(current[0], current[1], 1)
+        changed.add(current[0])
+    return changed
+
+
+def reconcile_review_aggregates(batch_size=1000, stdout=None):
+    """Recompute every educator's review aggregates from the reviews, in batches.
+
+    For reviews written without their signals, e.g. by bulk_create in an
+    import. Returns the number of profiles whose aggregates were corrected.
+    """
+    fixed = 0
+    rows = UserProfile.objects.order_by('pk').values_list('pk', 'user_id', *AGGREGATE_FIELDS)
+    last_pk = 0
+    while True:
+        chunk = list(rows.filter(pk__gt=last_pk)[:batch_size])
+        if not chunk:
+            break
+        last_pk = chunk[-1][0]
+
+        counts = {}
+        tally = (Review.objects.filter(educator_id__in=[row[1] for row in chunk])
+                 .values('educator_id', 'rating').annotate(n=Count('id')).values_list('educator_id', 'rating', 'n'))
+        for educator_id, rating, n in tally:
+            counts.setdefault(educator_id, [0] * 5)[rating - 1] = n
+        stale = []
+        for pk, user_id, *current in chunk:
+            by_rating = counts.get(user_id, [0] * 5)
+            total, votes = sum(i * n for i, n in enumerate(by_rating, 1)), sum(by_rating)
+            rating = (Decimal(total) / votes).quantize(Decimal('0.01')) if votes else Decimal(0)
+            values = [votes, total, rating, *by_rating]
+            if current != values:
+                stale.append(UserProfile(pk=pk, **dict(zip(AGGREGATE_FIELDS, values))))
+        if stale:
+            with transaction.atomic():
+                UserProfile.objects.bulk_update(stale, AGGREGATE_FIELDS)
+                EducatorSearchDoc.objects.bulk_update(
+                    [EducatorSearchDoc(pk=p.pk, rating=p.rating, review_count=p.review_count) for p in stale],
+                    ['rating', 'review_count'],
+                )
+                refresh_ranking_scores([p.pk for p in stale])
+            fixed += len(stale)
+        if stdout:
+            stdout.write(f'Checked review aggregates up to profile {last_pk}, corrected {fixed} so far...')
+    return fixed
+
+
+def validate_review_target(review):
+    """Reviews are only allowed for completed requests or sessions, with a rating from 1 to 5"""
+    if review.rating not in range(1, 6):
+        raise ValidationError('Please choose a rating from 1 to 5.')
+    if review.skill_request_id:
+        skill_request = review.skill_request
+        if skill_request.status != 'completed':
+            raise ValidationError('You can only review a completed request.')
+        if skill_request.learner_id != review.reviewer_id:
+            raise ValidationError('Only the learner can review this request.')
+        if skill_request.educator_id != review.educator_id:
+            raise ValidationError('The review must be for the educator of this request.')
+    elif review.session_id:
+        session = review.session
+        if session.status != 'completed':
+            raise ValidationError('You can only review a completed session.')
+        if review.educator_id != session.user_id:
+            raise ValidationError('The review must be for the host of this session.')
+        if review.reviewer_id == session.user_id or not SessionParticipant.objects.filter(
+                session=session, user_id=review.reviewer_id).exists():
+            raise ValidationError('Only participants can review this session.')
+    else:
+        raise ValidationError('A review must belong to a request or a session.')
+
+
+def submit_review(reviewer, rating, comment='', skill_request=None, session=None, educator=None):
+    """Create or edit the reviewer's review for a completed request or session"""
+    if skill_request is not None:
+        educator = skill_request.educator
+        lookup = {'reviewer': reviewer, 'skill_request': skill_request}
+    else:
+        lookup = {'reviewer': reviewer, 'session': session}
+
+    review = Review.objects.filter(**lookup).first() or Review(**lookup)
+    review.educator = educator
+    review.rating = int(rating)
+    review.comment = comment
+    validate_review_target(review)
+    review.save()
+    return review
@@ -0,0 +1,84 @@
+from django.conf import settings
+from django.core.cache import cache
+from django.db import IntegrityError, transaction
+from django.db.models import Q
+from django.utils import timezone
+
+from .models import Session, SessionParticipant
+
+
+def _key(room_name):
+    return f'room:{room_name}'
+
+
+def _remember(session):
+    entry = {'id': session.id, 'room_url': session.room_url, 'host_id': session.user_id}
+    cache.set(_key(session.room_name), entry, getattr(settings, 'ROOM_CACHE_TIMEOUT', 3600))
+    return entry
+
+
+def forget_room(room_name):
+    """Drop the cached entry, e.g. when the session ends"""
+    cache.delete(_key(room_name))
+
+
+def lookup_room(room_name):
+    """Cached {id, room_url, host_id} for the active session in a room, or None"""
+    entry = cache.get(_key(room_name))
+    if entry is None:
+        session = Session.objects.filter(room_name=room_name, status='active').first()
+        if session is not None:
+            entry = _remember(session)
+    return entry
+
+
+def _open_session(room_name, room_url, user, skill_id=None):
+    """Active session for a room, creating it (hosted by ``user``) or reopening an ended one"""
+    try:
+        with transaction.atomic():
+            return Session.objects.create(user=user, skill_id=skill_id, room_name=room_name,
+                                          room_url=room_url, status='active')
+    except IntegrityError:
+        pass
+
+    # Someone else created it first, or the code is being reused after the
+    # call ended; only one reopening caller moves it back to active.
+    session = Session.objects.get(room_name=room_name)
+    if session.status != 'active':
+        now = timezone.now()
+        # A fresh call: the reaper must not see the old call's last activity
+        Session.objects.filter(pk=session.pk, status=session.status).update(
+            status='active', started_at=now, ended_at=None, last_activity_at=now, duration=None
+        )
+        session.refresh_from_db()
+    return session
+
+
+def join_room(room_name, room_url, user, skill_id=None):
+    """Get-or-join: the Session for ``room_name`` with ``user`` registered as a participant.
+
+    In the common case the room is cached and the user has joined before,
+    so this is a single indexed read on the participants table. Returns
+    the cached room entry ({id, room_url, host_id}).
+    """
+    entry = lookup_room(room_name)
+    if entry is None:
+        entry = _remember(_open_session(room_name, room_url, user, skill_id))
+
+    if not SessionParticipant.objects.filter(session_id=entry['id'], user=user).exists():
+        role = 'host' if entry['host_id'] == user.pk else 'participant'
+        try:
+            with transaction.atomic():
+                SessionParticipant.objects.create(session_id=entry['id'], user=user, role=role)
+        except IntegrityError:
+            pass  # joined concurrently from another tab
+        touch_session(entry['id'])
+    return entry
+
+
+def touch_session(session_id, user=None):
+    """Record activity so the reaper leaves the session open; with ``user``, only if they host or joined it"""
+    sessions = Session.objects.filter(pk=session_id, status='active')
+    if user is not None:
+        sessions = sessions.filter(Q(user=user) | Q(participants__user=user))
+    return bool(sessions.update(last_activity_at=timezone.now()))
@@ -0,0 +1,158 @@
+from bisect import bisect_left
+from datetime import datetime, time, timedelta
+
+from django.conf import settings
+from django.core.exceptions import ValidationError
+from django.db import IntegrityError, OperationalError, connection, transaction
+from django.db.models import F
+from django.utils import timezone
+
+from .models import UserProfile, Booking
+
+
+# preferred_time -> (first hour, last hour) of the educator's daily window
+TIME_WINDOWS = {
+    'early_morning': (6, 9),
+    'morning': (9, 12),
+    'afternoon': (12, 17),
+    'evening': (17, 20),
+    'night': (20, 23),
+}
+FLEXIBLE_WINDOW = (9, 20)
+
+WEEKDAYS = ['monday', 'tuesday', 'wednesday', 'thursday', 'friday', 'saturday', 'sunday']
+
+
+def _setting(name, default):
+    return getattr(settings, name, default)
+
+
+def available_weekdays(profile):
+    """Weekday numbers from available_days; accepts 'Monday', 'mon', ... and treats none as every day"""
+    days = set()
+    for day in profile.available_days or []:
+        prefix = str(day).strip().lower()[:3]
+        days.update(i for i, name in enumerate(WEEKDAYS) if prefix and name.startswith(prefix))
+    return days or set(range(7))
+
+
+def availability_window(profile, day):
+    """Aware (start, end) of the educator's window on ``day``, or None if they're not available"""
+    if day.weekday() not in available_weekdays(profile):
+        return None
+    first, last = TIME_WINDOWS.get(profile.preferred_time, FLEXIBLE_WINDOW)
+    tz = timezone.get_current_timezone()
+    return (
+        timezone.make_aware(datetime.combine(day, time(first)), tz),
+        timezone.make_aware(datetime.combine(day, time(last)), tz),
+    )
+
+
+class IntervalIndex:
+    """Sorted index of non-overlapping [start, end) intervals.
+
+    Because confirmed bookings for one educator never overlap, sorting by
+    start also sorts by end, so the only booking that can clash with a
+    candidate slot is the last one starting before the slot ends. That
+    makes each conflict check a single bisect: O(log n).
+    """
+
+    def __init__(self, intervals=()):
+        intervals = sorted(intervals)
+        self.starts = [start for start, _end in intervals]
+        self.ends = [end for _start, end in intervals]
+
+    def __len__(self):
+        return len(self.starts)
+
+    def overlaps(self, start, end):
+        pos = bisect_left(self.starts, end)
+        return pos > 0 and self.ends[pos - 1] > start
+
+
+def _check_duration(duration):
+    low, high = _setting('BOOKING_MIN_MINUTES', 15), _setting('BOOKING_MAX_MINUTES', 60)
+    if not low <= duration <= high:
+        raise ValidationError(f'Sessions must be between {low} and {high} minutes long.')
+    return timedelta(minutes=duration)
+
+
+def _confirmed(start, end, **filters):
+    return Booking.objects.filter(status='confirmed', start_at__lt=end, end_at__gt=start, **filters)
+
+
+def available_slots(profile, days=7, duration=30, now=None):
+    """Free slots of ``duration`` minutes in the educator's windows over the next ``days`` days.
+
+    Loads the period's bookings with one indexed query, then checks each
+    candidate slot against the interval index.
+    """
+    length = _check_duration(duration)
+    step = timedelta(minutes=_setting('BOOKING_SLOT_STEP_MINUTES', 15))
+    now = now or timezone.now()
+    today = timezone.localtime(now).date()
+    days = max(1, min(days, _setting('BOOKING_MAX_DAYS', 30)))
+
+    windows = [w for w in (availability_window(profile, today + timedelta(d)) for d in range(days)) if w]
+    if not windows:
+        return []
+    booked = IntervalIndex(
+        _confirmed(windows[0][0], windows[-1][1], educator_id=profile.user_id).values_list('start_at', 'end_at')
+    )
+
+    slots = []
+    for window_start, window_end in windows:
+        start = window_start
+        while start + length <= window_end:
+            if start >= now and not booked.overlaps(start, start + length):
+                slots.append((start, start + length))
+            start += step
+    return slots
+
+
+def reserve_slot(educator, learner, start, duration=30, skill_request=None, now=None):
+    """Book a slot, failing with ValidationError if it is unavailable or taken.
+
+    The educator's profile row is locked for the duration of the check and
+    insert, so two learners racing for the same slot are serialised and
+    the second one sees the first booking. SQLite ignores SELECT ... FOR
+    UPDATE, so there a no-op UPDATE takes the database write lock first;
+    a lock that can't be had in time is reported as the slot being taken.
+    """
+    length = _check_duration(duration)
+    end = start + length
+    if educator.pk == learner.pk:
+        raise ValidationError('You cannot book a session with yourself.')
+    if start < (now or timezone.now()):
+        raise ValidationError('That time has already passed.')
+    if skill_request is not None and (skill_request.educator_id, skill_request.learner_id) != (educator.pk, learner.pk):
+        raise ValidationError('That request is not between you and this educator.')
+
+    try:
+        with transaction.atomic():
+            if connection.vendor == 'sqlite':
+                UserProfile.objects.filter(user=educator).update(user_id=F('user_id'))
+            profile = UserProfile.objects.select_for_update().filter(user=educator).first()
+            if profile is None:
+                raise ValidationError('This user is not accepting bookings.')
+            window = availability_window(profile, timezone.localtime(start).date())
+            if window is None or start < window[0] or end > window[1]:
+                raise ValidationError('The educator is not available at that time.')
+            if _confirmed(start, end, educator=educator).exists():
+                raise ValidationError('That slot has just been booked.')
+            if _confirmed(start, end, learner=learner).exists():
+                raise ValidationError('You already have a session at that time.')
+
+            return Booking.objects.create(
+                educator=educator, learner=learner, skill_request=skill_request, start_at=start, end_at=end,
+            )
+    except (OperationalError, IntegrityError):
+        raise ValidationError('That slot has just been booked.')
+
+
+def cancel_booking(booking):
+    """Release a confirmed booking; returns False if it was already cancelled"""
+    updated = Booking.objects.filter(pk=booking.pk, status='confirmed').update(status='cancelled')
+    if updated:
+        booking.status = 'cancelled'
+    return bool(updated)
@@ -0,0 +1,264 @@
+import hashlib
+
+from django.conf import settings
+from django.core.cache import cache
+from django.db import transaction
+from django.db.models import Count, F, Q
+
+from .models import UserProfile, Skill, TeachableSkill, EducatorSearchDoc
+
+
+# Query-string parameters that change the educator result set
+FILTER_PARAMS = ('q', 'skill', 'rate', 'location', 'category', 'method',
+                 'experience', 'price_band', 'proficiency')
+
+# facet name -> (query param, EducatorSearchDoc field, is pipe-delimited, label, choices)
+FACETS = [
+    ('category', 'category', 'categories', True, 'Category',
+     Skill._meta.get_field('category').choices),
+    ('teaching_mode', 'method', 'teaching_mode', False, 'Teaching Method',
+     UserProfile._meta.get_field('teaching_mode').choices),
+    ('experience_level', 'experience', 'experience_level', False, 'Teaching Experience',
+     UserProfile._meta.get_field('experience_level').choices),
+    ('hourly_rate_range', 'price_band', 'hourly_rate_range', False, 'Price Band',
+     UserProfile._meta.get_field('hourly_rate_range').choices),
+    ('proficiency_level', 'proficiency', 'proficiency_levels', True, 'Skill Level',
+     TeachableSkill._meta.get_field('proficiency_level').choices),
+]
+
+EXPERIENCE_RANKS = {
+    'beginner': 1,
+    'intermediate': 2,
+    'experienced': 3,
+    'expert': 4,
+}
+
+SORT_ORDERS = {
+    'rating': ['-rating'],
+    'price_low': [F('hourly_rate').asc(nulls_last=True)],
+    'price_high': [F('hourly_rate').desc(nulls_last=True)],
+    'experience': ['-experience_rank'],
+}
+DEFAULT_ORDER = ['-ranking_score']
+
+GENERATION_KEY = 'search_docs:generation'
+
+
+def _tokens(values):
+    """Pipe-delimit values so a single LIKE '%|value|%' matches a whole token"""
+    values = sorted(set(v for v in values if v))
+    return f"|{'|'.join(values)}|" if values else ''
+
+
+def _token_q(field, value):
+    return Q(**{f'{field}__contains': f'|{value}|'})
+
+
+def build_search_doc(profile, model=EducatorSearchDoc):
+    """Build (but don't save) the search projection for a profile.
+
+    Expects ``profile.user`` and ``profile.teachable_skills`` (with their
+    skills) to be loaded or cheap to load. A data migration passes its
+    historical ``model``; fields that model doesn't have yet are left out.
+    """
+    user = profile.user
+    teachable_skills = sorted(profile.teachable_skills.all(), key=lambda ts: ts.pk)
+    skill_names = [ts.skill.name for ts in teachable_skills]
+
+    fields = dict(
+        user_profile=profile,
+        user_id=user.pk,
+        username=user.username,
+        # get_full_name(), spelled out since historical models have no methods
+        display_name=f'{user.first_name} {user.last_name}'.strip() or user.username,
+        bio=profile.bio,
+        profile_picture=profile.profile_picture.name if profile.profile_picture else None,
+        location=profile.location,
+        search_text=' '.join([user.first_name, user.last_name, profile.bio] + skill_names).lower(),
+        skill_names=_tokens(name.lower() for name in skill_names),
+        categories=_tokens(ts.skill.category for ts in teachable_skills),
+        proficiency_levels=_tokens(ts.proficiency_level for ts in teachable_skills),
+        skill_ids=[ts.skill_id for ts in teachable_skills],
+        skills=[
+            {'id': ts.pk, 'name': ts.skill.name, 'proficiency_level': ts.proficiency_level}
+            for ts in teachable_skills
+        ],
+        skill_count=len(teachable_skills),
+        hourly_rate=profile.hourly_rate,
+        hourly_rate_range=profile.hourly_rate_range,
+        rating=profile.rating,
+        review_count=profile.review_count,
+        total_students=profile.total_students,
+        ranking_score=profile.ranking_score,
+        teaching_mode=profile.teaching_mode,
+        experience_level=profile.experience_level,
+        experience_rank=EXPERIENCE_RANKS.get(profile.experience_level, 0),
+        available_days=profile.available_days,
+        preferred_time=profile.preferred_time,
+        created_at=profile.created_at,
+    )
+    names = {field.name for field in model._meta.concrete_fields} | {'user_id'}
+    return model(**{name: value for name, value in fields.items() if name in names})
+
+
+def invalidate_search_cache():
+    """Bump the generation so cached facet counts are recomputed"""
+    try:
+        cache.incr(GENERATION_KEY)
+    except ValueError:
+        cache.set(GENERATION_KEY, 1, None)
+
+
+def refresh_search_docs(profile_ids):
+    """Rebuild the search docs for the given profiles in the current transaction"""
+    profile_ids = set(profile_ids)
+    if not profile_ids:
+        return
+    profiles = list(
+        UserProfile.objects.select_related('user')
+        .prefetch_related('teachable_skills__skill')
+        .filter(pk__in=profile_ids)
+    )
+    for profile in profiles:
+        build_search_doc(profile).save()
+    # Profiles that no longer exist drop out via the cascade; nothing to do.
+    invalidate_search_cache()
+
+
+def rebuild_search_docs(batch_size=500, stdout=None):
+    """Rebuild the whole projection from scratch in batches"""
+    profiles = (
+        UserProfile.objects.select_related('user')
+        .prefetch_related('teachable_skills__skill')
+        .order_by('pk')
+    )
+    total = 0
+    batch = []
+
+    def flush(batch):
+        with transaction.atomic():
+            EducatorSearchDoc.objects.filter(pk__in=[doc.pk for doc in batch]).delete()
+            EducatorSearchDoc.objects.bulk_create(batch)
+
+    for profile in profiles.iterator(chunk_size=batch_size):
+        batch.append(build_search_doc(profile))
+        if len(batch) >= batch_size:
+            flush(batch)
+            total += len(batch)
+            batch = []
+            if stdout:
+                stdout.write(f'Indexed {total} educators...')
+    if batch:
+        flush(batch)
+        total += len(batch)
+
+    EducatorSearchDoc.objects.exclude(user_profile__in=UserProfile.objects.all()).delete()
+    invalidate_search_cache()
+    return total
+
+
+def filter_educators(params):
+    """Apply the search_results filters from a QueryDict to the search docs"""
+    educators = EducatorSearchDoc.objects.all()
+
+    query = params.get('q', '')
+    if query:
+        educators = educators.filter(search_text__contains=query.lower())
+
+    skill_filter = params.get('skill', '')
+    if skill_filter:
+        educators = educators.filter(skill_names__contains=skill_filter.lower())
+
+    # Filter by rate range
+    rate_filter = params.get('rate', '')
+    if rate_filter == 'low':
+        educators = educators.filter(hourly_rate__lte=30)
+    elif rate_filter == 'mid':
+        educators = educators.filter(hourly_rate__gt=30, hourly_rate__lte=60)
+    elif rate_filter == 'high':
+        educators = educators.filter(hourly_rate__gt=60)
+
+    location = params.get('location', '')
+    if location:
+        educators = educators.filter(location__icontains=location)
+
+    category = params.get('category', '')
+    if category:
+        educators = educators.filter(_token_q('categories', category))
+
+    # "Both" educators match either teaching method
+    methods = [m for m in params.getlist('method') if m]
+    if methods:
+        educators = educators.filter(teaching_mode__in=methods + ['both'])
+
+    experience = params.get('experience', '')
+    if experience:
+        educators = educators.filter(experience_level=experience)
+
+    price_band = params.get('price_band', '')
+    if price_band:
+        educators = educators.filter(hourly_rate_range=price_band)
+
+    proficiency = params.get('proficiency', '')
+    if proficiency:
+        educators = educators.filter(_token_q('proficiency_levels', proficiency))
+
+    return educators.order_by(*SORT_ORDERS.get(params.get('sort', ''), DEFAULT_ORDER))
+
+
+def query_signature(params):
+    """Stable cache key fragment for the filter set in a QueryDict"""
+    parts = []
+    for name in FILTER_PARAMS:
+        values = sorted(v for v in params.getlist(name) if v)
+        if values:
+            parts.append(f"{name}={','.join(values)}")
+    return hashlib.md5('&'.join(parts).encode('utf-8')).hexdigest()
+
+
+def compute_facet_counts(educators):
+    """Count matching educators per facet value in a single aggregate query"""
+    aggregates = {}
+    aliases = {}
+    for facet, _param, field, delimited, _label, choices in FACETS:
+        for value, _choice_label in choices:
+            alias = f"{facet}_{len(aliases)}"
+            aliases[(facet, value)] = alias
+            condition = _token_q(field, value) if delimited else Q(**{field: value})
+            aggregates[alias] = Count('pk', filter=condition)
+
+    # One row per educator, so no DISTINCT is needed
+    totals = educators.aggregate(**aggregates)
+    return {
+        facet: {value: totals[aliases[(facet, value)]] or 0 for value, _ in choices}
+        for facet, _param, _field, _delimited, _label, choices in FACETS
+    }
+
+
+def get_facets(params, educators):
+    """Facet counts for the current filter set, cached per query signature"""
+    generation = cache.get(GENERATION_KEY, 0)
+    cache_key = f"search_facets:{generation}:{query_signature(params)}"
+    counts = cache.get(cache_key)
+    if counts is None:
+        counts = compute_facet_counts(educators)
+        cache.set(cache_key, counts, getattr(settings, 'SEARCH_FACET_CACHE_TIMEOUT', 300))
+
+    facets = []
+    for facet, param, _field, _delimited, label, choices in FACETS:
+        selected = params.getlist(param)
+        facets.append({
+            'name': facet,
+            'param': param,
+            'label': label,
+            'options': [
+                {
+                    'value': value,
+                    'label': choice_label,
+                    'count': counts[facet].get(value, 0),
+                    'selected': value in selected,
+                }
+                for value, choice_label in choices
+            ],
+        })
+    return facets
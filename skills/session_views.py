@@ -19,6 +19,7 @@ import google.generativeai as genai
 
 # Session models (you'll need to add these to your models.py)
 from .models import Session, SessionRecording, SessionSummary, SessionNotes
+from .metrics import track_call, tracked
 
 
 class DailyAPI:
@@ -32,6 +33,7 @@ class DailyAPI:
         if not self.api_key:
             raise ValueError("DAILY_API_KEY not set in settings")
     
+    @tracked('daily', 'create_room')
     def create_room(self, room_name=None, exp_time=None):
         """Create a Daily room for the session"""
         if not room_name:
@@ -63,6 +65,7 @@ class DailyAPI:
         else:
             raise Exception(f"Failed to create room: {response.text}")
     
+    @tracked('daily', 'get_recordings')
     def get_recordings(self, room_name):
         """Get recordings for a room"""
         headers = {'Authorization': f'Bearer {self.api_key}'}
@@ -76,6 +79,7 @@ class DailyAPI:
         else:
             raise Exception(f"Failed to get recordings: {response.text}")
     
+    @tracked('daily', 'get_recording_access_link')
     def get_recording_access_link(self, recording_id):
         """Get download link for a recording"""
         headers = {'Authorization': f'Bearer {self.api_key}'}
@@ -113,12 +117,14 @@ class CloudTranscriptionService:
                 audio_path
             ]
             
-            subprocess.run(cmd, check=True, capture_output=True)
+            with track_call('ffmpeg', 'extract_audio'):
+                subprocess.run(cmd, check=True, capture_output=True)
             return True
         except subprocess.CalledProcessError as e:
             print(f"FFmpeg error: {e}")
             return False
     
+    @tracked('gcs', 'upload')
     def upload_to_gcs(self, file_path, blob_name):
         """Upload file to Google Cloud Storage"""
         bucket = self.storage_client.bucket(self.bucket_name)
@@ -129,6 +135,7 @@ class CloudTranscriptionService:
         
         return f"gs://{self.bucket_name}/{blob_name}"
     
+    @tracked('speech', 'transcribe')
     def transcribe_audio(self, gcs_uri, language_code='hi-IN'):
         """Transcribe audio using Google Speech-to-Text"""
         audio = types.RecognitionAudio(uri=gcs_uri)
@@ -211,7 +218,8 @@ class AISummaryService:
             """
         
         try:
-            response = self.model.generate_content(prompt)
+            with track_call('gemini', 'generate_summary'):
+                response = self.model.generate_content(prompt)
             return response.text
         except Exception as e:
             print(f"Gemini API error: {e}")
@@ -1,19 +1,32 @@
 import os
 import json
+import hashlib
 import requests
 import uuid
-from datetime import datetime, timedelta
+from datetime import timedelta
 from django.shortcuts import render, redirect, get_object_or_404
 from django.contrib.auth.decorators import login_required
-from django.http import JsonResponse
+from django.core.handlers.asgi import ASGIRequest
+from django.http import HttpResponseNotModified, JsonResponse, StreamingHttpResponse
+from django.urls import reverse
 from django.views.decorators.csrf import csrf_exempt
 from django.views.decorators.http import require_http_methods
 from django.conf import settings
+from django.db import IntegrityError, transaction
+from django.db.models import Q
 from django.contrib import messages
+from django.utils import timezone
 from django.utils.crypto import get_random_string
 
 # Import session models
-from .models import Session, SessionSummary, SessionNotes
+from .exports import EXPORT_FORMATS, aiter_chunks, export_chunks, export_etag, export_size, export_source, parse_range, slice_chunks
+from .jobs import aevent_stream, event_stream, get_job, latest_job_for_session, public_job, start_job
+from .metrics import track_call
+from .models import Session, SessionSummary
+from .notes_buffer import NotesConflict, buffered, flush_notes, replace_notes, update_notes
+from .rooms import join_room, touch_session
+from .tracing import inject, traced
+from .transitions import end_session
 
 # Try to import Google Generative AI, fallback to mock if not available
 try:
@@ -29,8 +42,16 @@ class DailyAPI:
     def __init__(self):
         self.api_key = getattr(settings, 'DAILY_API_KEY', None)
         self.domain = getattr(settings, 'DAILY_DOMAIN', 'test-domain.daily.co')
-        self.base_url = "https://api.daily.co/v1"
+        self.base_url = getattr(settings, 'DAILY_API_BASE_URL', 'https://api.daily.co/v1')
+        self.timeout = getattr(settings, 'DAILY_API_TIMEOUT', 10)
     
+    def _mock_room(self, room_name):
+        return {
+            'name': room_name,
+            'url': f"https://{self.domain}/{room_name}",
+            'id': str(uuid.uuid4())
+        }
+
     def create_room(self, room_name=None, exp_time=None):
         """Create a Daily room for the session"""
         if not room_name:
@@ -38,24 +59,16 @@ class DailyAPI:
         
         # For testing purposes, return a mock room if no API key
         if not self.api_key:
-            return {
-                'name': room_name,
-                'url': f"https://{self.domain}/{room_name}",
-                'id': str(uuid.uuid4())
-            }
+            return self._mock_room(room_name)
 
-    def room_url_for(self, room_name: str):
-        """Return a room URL for an existing/fixed room name (no API call)."""
-        return f"https://{self.domain}/{room_name}"
-        
         # Real Daily.co integration (when API key is available)
         if not exp_time:
-            exp_time = datetime.now() + timedelta(hours=2)
+            exp_time = timezone.now() + timedelta(hours=2)
         
-        headers = {
+        headers = inject({
             'Authorization': f'Bearer {self.api_key}',
             'Content-Type': 'application/json'
-        }
+        })
         
         data = {
             'name': room_name,
@@ -68,21 +81,22 @@ class DailyAPI:
         }
         
         try:
-            response = requests.post(f"{self.base_url}/rooms", 
-                                   headers=headers, json=data, timeout=10)
-            
-            if response.status_code == 200:
-                return response.json()
-            else:
-                raise Exception(f"Failed to create room: {response.text}")
+            with track_call('daily', 'create_room'):
+                response = requests.post(f"{self.base_url}/rooms", 
+                                       headers=headers, json=data, timeout=self.timeout)
+                
+                if response.status_code == 200:
+                    return response.json()
+                else:
+                    raise Exception(f"Failed to create room ({response.status_code}): {response.text}")
         except Exception as e:
             print(f"Daily API error: {e}")
             # Return mock room as fallback
-            return {
-                'name': room_name,
-                'url': f"https://{self.domain}/{room_name}",
-                'id': str(uuid.uuid4())
-            }
+            return self._mock_room(room_name)
+
+    def room_url_for(self, room_name: str):
+        """Return a room URL for an existing/fixed room name (no API call)."""
+        return f"https://{self.domain}/{room_name}"
 
 
 class AISummaryService:
@@ -90,13 +104,20 @@ class AISummaryService:
     
     def __init__(self):
         self.api_key = getattr(settings, 'GEMINI_API_KEY', None)
-        if GEMINI_AVAILABLE and self.api_key:
+        # Set to call the REST API directly (e.g. a local stand-in) instead of the SDK
+        self.base_url = getattr(settings, 'GEMINI_API_BASE_URL', None)
+        self.model_name = getattr(settings, 'GEMINI_MODEL', 'gemini-1.5-pro')
+        self.timeout = getattr(settings, 'GEMINI_API_TIMEOUT', 60)
+        if self.base_url and self.api_key:
+            self.use_real_ai = True
+        elif GEMINI_AVAILABLE and self.api_key:
             genai.configure(api_key=self.api_key)
-            self.model = genai.GenerativeModel('gemini-1.5-pro')
+            self.model = genai.GenerativeModel(self.model_name)
             self.use_real_ai = True
         else:
             self.use_real_ai = False
     
+    @traced('summary.generate')
     def generate_summary(self, transcript, language='hindi'):
         """Generate AI summary from transcript"""
         if self.use_real_ai:
@@ -160,14 +181,39 @@ Please provide a summary in the following format:
 - [Important question and answer session points]
                 """
             
-            response = self.model.generate_content(prompt)
-            return response.text
+            with track_call('gemini', 'generate_summary'):
+                if self.base_url:
+                    return self._stream_rest(prompt)
+                response = self.model.generate_content(prompt)
+                return response.text
             
         except Exception as e:
             print(f"Gemini AI error: {e}")
             # Fallback to mock summary
             return self._generate_mock_summary(transcript, language)
     
+    def _stream_rest(self, prompt):
+        """Call streamGenerateContent over SSE and join the streamed text"""
+        response = requests.post(
+            f"{self.base_url}/models/{self.model_name}:streamGenerateContent",
+            params={'alt': 'sse'},
+            headers=inject({'x-goog-api-key': self.api_key}),
+            json={'contents': [{'role': 'user', 'parts': [{'text': prompt}]}]},
+            stream=True,
+            timeout=self.timeout,
+        )
+        with response:
+            if response.status_code != 200:
+                raise Exception(f"Gemini API returned {response.status_code}: {response.text[:200]}")
+            parts = []
+            for line in response.iter_lines(decode_unicode=True):
+                if not line or not line.startswith('data:'):
+                    continue
+                chunk = json.loads(line[5:])
+                for candidate in chunk.get('candidates', [])[:1]:
+                    parts.extend(part.get('text', '') for part in candidate.get('content', {}).get('parts', []))
+        return ''.join(parts)
+
     def _generate_mock_summary(self, transcript, language):
         """Generate mock summary for testing"""
         if language.lower() == 'hindi':
@@ -242,6 +288,94 @@ Please provide a summary in the following format:
             """
 
 
+@traced('summary.store')
+def store_summary(session_id, transcript, summary, language):
+    """Save (or replace) a session's summary; ignored if the session is gone.
+
+    An UPDATE, then an INSERT only for the first summary, rather than
+    update_or_create: on SQLite a transaction that reads before it writes
+    can't wait for the write lock and fails with "database is locked"
+    whenever another request is writing.
+    """
+    if not Session.objects.filter(id=session_id).exists():
+        return
+    fields = {'transcript': transcript, 'summary': summary, 'language': language, 'generated_at': timezone.now()}
+    if SessionSummary.objects.filter(session_id=session_id).update(**fields):
+        return
+    try:
+        with transaction.atomic():
+            SessionSummary.objects.create(session_id=session_id, **fields)
+    except IntegrityError:
+        SessionSummary.objects.filter(session_id=session_id).update(**fields)  # created concurrently
+
+
+MOCK_RECORDING_TRANSCRIPT = """
+Teacher: Welcome to this learning session! Today we'll be covering Python programming fundamentals.
+Student: That sounds great! I'm excited to learn about variables and functions in Python.
+Teacher: Let's start with variables. In Python, you can create a variable by simply assigning a value to it. For example: name = 'John'
+Student: I see! So Python automatically determines the data type? That's different from Java.
+Teacher: Exactly! Python is dynamically typed. Now let's talk about functions. Functions in Python are defined using the 'def' keyword.
+Student: Can you show me an example of a simple function?
+Teacher: Sure! Here's a simple function: def greet(name): return f'Hello, {name}!' This function takes a name parameter and returns a greeting.
+Student: That's really helpful! How do I call this function?
+Teacher: You simply call it like this: greet('Alice') and it will return 'Hello, Alice!'
+"""
+
+
+def _no_progress(stage, percent=None, **extra):
+    pass
+
+
+def _job_accepted(job):
+    return JsonResponse({
+        'success': True,
+        'job_id': job['id'],
+        'status': job['status'],
+        'status_url': reverse('job_status_api', args=[job['id']]),
+        'events_url': reverse('job_events', args=[job['id']]),
+    }, status=202)
+
+
+def summary_pipeline(progress, session_id, transcript, language, client_summary=None):
+    """Generate (unless the client already has one) and store a summary, reporting stages"""
+    if client_summary:
+        summary, is_mock = client_summary, False
+    else:
+        progress('summarizing', 10)
+        ai_service = AISummaryService()
+        summary = ai_service.generate_summary(transcript, language)
+        is_mock = not ai_service.use_real_ai
+    if summary and session_id:
+        progress('saving', 90)
+        store_summary(session_id, transcript, summary, language)
+    return {'summary': summary, 'is_mock': is_mock}
+
+
+def recording_pipeline(progress, room_name, session_id):
+    """Download, transcode, transcribe and summarise a recording (mocked), reporting stages"""
+    progress('downloaded', 20)
+    progress('transcoded', 40)
+
+    # Mock processing for testing
+    lines = [line for line in MOCK_RECORDING_TRANSCRIPT.strip().splitlines() if line.strip()]
+    for done in range(1, len(lines) + 1):
+        percent = done * 100 // len(lines)
+        progress('transcribing', 40 + percent * 40 // 100, transcribed=percent)
+    transcript = MOCK_RECORDING_TRANSCRIPT
+
+    progress('summarizing', 85)
+    ai_service = AISummaryService()
+    summary = ai_service.generate_summary(transcript)
+    if session_id:
+        store_summary(session_id, transcript, summary, 'hi')
+
+    return {
+        'transcript': transcript,
+        'summary': summary,
+        'note': 'This is a mock response for testing. Real implementation requires Google Cloud setup.'
+    }
+
+
 # Django Views
 def start_session(request, skill_id=None):
     """Start a new learning session - temporarily without login requirement"""
@@ -257,14 +391,7 @@ def start_session(request, skill_id=None):
         
         # Create session record
         if request.user.is_authenticated:
-            session = Session.objects.create(
-                user=request.user,
-                skill_id=skill_id,
-                room_name=room_name,
-                room_url=room_data['url'],
-                status='active'
-            )
-            session_id = session.id
+            session_id = join_room(room_name, room_data['url'], request.user, skill_id=skill_id)['id']
             user_name = request.user.get_full_name() or request.user.username
             print(f"DEBUG: Created session for authenticated user: {session_id}")
         else:
@@ -279,7 +406,8 @@ def start_session(request, skill_id=None):
             'daily_room_url': room_data['url'],
             'session_title': f"Learning Session - {room_name}",
             'user_name': user_name,
-            'gemini_api_key': getattr(settings, 'GEMINI_API_KEY', None)
+            'gemini_api_key': getattr(settings, 'GEMINI_API_KEY', None),
+            'notes_autosave': buffered(),
         }
         
         print(f"DEBUG: Rendering session template with context: {context}")
@@ -293,38 +421,6 @@ def start_session(request, skill_id=None):
         return redirect('search_results')
 
 
-def start_demo_session(request):
-    """Join a fixed demo room so any click connects to the same call."""
-    try:
-        demo_room = getattr(settings, 'DAILY_DEMO_ROOM', 'demo-room')
-        daily_api = DailyAPI()
-        room_url = daily_api.room_url_for(demo_room)
-
-        # Optional: create a temporary session record for authenticated users
-        session_id = None
-        if request.user.is_authenticated:
-            session = Session.objects.create(
-                user=request.user,
-                room_name=demo_room,
-                room_url=room_url,
-                status='active'
-            )
-            session_id = session.id
-
-        context = {
-            'session_id': session_id,
-            'room_name': demo_room,
-            'daily_room_url': room_url,
-            'session_title': f"Demo Session - {demo_room}",
-            'user_name': request.user.get_full_name() if request.user.is_authenticated else 'Guest User',
-            'gemini_api_key': getattr(settings, 'GEMINI_API_KEY', None)
-        }
-        return render(request, 'skills/session.html', context)
-    except Exception as e:
-        messages.error(request, f"Failed to join demo session: {str(e)}")
-        return redirect('search_results')
-
-
 def start_session_by_code(request, room_code: str):
     """Join a session by entering a shared room code (both users enter same code)."""
     try:
@@ -336,15 +432,11 @@ def start_session_by_code(request, room_code: str):
 
         room_url = daily_api.room_url_for(room_name)
 
+        # Everyone entering the same code shares one session row
         session_id = None
         if request.user.is_authenticated:
-            session = Session.objects.create(
-                user=request.user,
-                room_name=room_name,
-                room_url=room_url,
-                status='active'
-            )
-            session_id = session.id
+            room = join_room(room_name, room_url, request.user)
+            session_id, room_url = room['id'], room['room_url']
 
         context = {
             'session_id': session_id,
@@ -352,7 +444,8 @@ def start_session_by_code(request, room_code: str):
             'daily_room_url': room_url,
             'session_title': f"Session - {room_name}",
             'user_name': request.user.get_full_name() if request.user.is_authenticated else 'Guest User',
-            'gemini_api_key': getattr(settings, 'GEMINI_API_KEY', None)
+            'gemini_api_key': getattr(settings, 'GEMINI_API_KEY', None),
+            'notes_autosave': buffered(),
         }
         return render(request, 'skills/session.html', context)
     except Exception as e:
@@ -374,6 +467,8 @@ def start_demo_session(request):
 
         room_name = demo_room
         session_id = None
+        if request.user.is_authenticated:
+            session_id = join_room(room_name, room_data['url'], request.user)['id']
         user_name = request.user.get_full_name() or request.user.username if request.user.is_authenticated else 'Guest User'
 
         context = {
@@ -382,7 +477,8 @@ def start_demo_session(request):
             'daily_room_url': room_data['url'],
             'session_title': f"Demo Session - {room_name}",
             'user_name': user_name,
-            'gemini_api_key': getattr(settings, 'GEMINI_API_KEY', None)
+            'gemini_api_key': getattr(settings, 'GEMINI_API_KEY', None),
+            'notes_autosave': buffered(),
         }
         return render(request, 'skills/session.html', context)
     except Exception as e:
@@ -416,16 +512,11 @@ def join_session_submit(request):
             room = daily_api.create_room(room_name)
             room_url = room['url']
 
-        # Create session record for authenticated users only
+        # Join (or open) the room's session for authenticated users only
         session_id = None
         if request.user.is_authenticated:
-            session = Session.objects.create(
-                user=request.user,
-                room_name=room_name,
-                room_url=room_url,
-                status='active'
-            )
-            session_id = session.id
+            room = join_room(room_name, room_url, request.user)
+            session_id, room_url = room['id'], room['room_url']
 
         context = {
             'session_id': session_id,
@@ -433,7 +524,8 @@ def join_session_submit(request):
             'daily_room_url': room_url,
             'session_title': f"Learning Session - {room_name}",
             'user_name': request.user.get_full_name() or request.user.username if request.user.is_authenticated else 'Guest User',
-            'gemini_api_key': getattr(settings, 'GEMINI_API_KEY', None)
+            'gemini_api_key': getattr(settings, 'GEMINI_API_KEY', None),
+            'notes_autosave': buffered(),
         }
         return render(request, 'skills/session.html', context)
     except Exception as e:
@@ -443,54 +535,38 @@ def join_session_submit(request):
 @require_http_methods(["POST"])
 @csrf_exempt
 def generate_summary_api(request):
-    """API endpoint to generate AI summary from transcript"""
+    """API endpoint to generate AI summary from transcript.
+
+    With {"async": true} the work runs as a background job and the response
+    is 202 with URLs for the job's status and its progress event stream.
+    """
     try:
         data = json.loads(request.body)
         transcript = data.get('transcript', '')
         session_id = data.get('session_id')
         language = data.get('language', 'hindi')
         client_summary = data.get('summary')
+        if not isinstance(client_summary, str):
+            client_summary = None
         
         if not transcript:
             return JsonResponse({'error': 'No transcript provided'}, status=400)
         
-        # If client already has a summary (preferred path), just save it
-        if client_summary and isinstance(client_summary, str):
-            summary = client_summary
-            is_mock = False
-        else:
-            # Server-side generation fallback
-            if len(transcript.strip()) < 50:
-                return JsonResponse({
-                    'error': 'Transcript too short for meaningful summary'
-                }, status=400)
-
-            ai_service = AISummaryService()
-            summary = ai_service.generate_summary(transcript, language)
-            is_mock = not ai_service.use_real_ai
-        
-        if summary:
-            # Save summary to database
-            if session_id:
-                try:
-                    session = Session.objects.get(id=session_id)
-                    SessionSummary.objects.update_or_create(
-                        session=session,
-                        defaults={
-                            'transcript': transcript,
-                            'summary': summary,
-                            'language': language,
-                            'generated_at': datetime.now()
-                        }
-                    )
-                except Session.DoesNotExist:
-                    pass
-            
+        # Server-side generation fallback needs something to work with
+        if not client_summary and len(transcript.strip()) < 50:
             return JsonResponse({
-                'success': True,
-                'summary': summary,
-                'is_mock': is_mock
-            })
+                'error': 'Transcript too short for meaningful summary'
+            }, status=400)
+        
+        if data.get('async'):
+            fingerprint = hashlib.sha1(f'{session_id}:{language}:{transcript}'.encode('utf-8')).hexdigest()
+            job = start_job('summary', summary_pipeline, session_id, transcript, language, client_summary,
+                            session_id=session_id, dedupe=fingerprint)
+            return _job_accepted(job)
+        
+        result = summary_pipeline(_no_progress, session_id, transcript, language, client_summary)
+        if result['summary']:
+            return JsonResponse({'success': True, **result})
         else:
             return JsonResponse({'error': 'Failed to generate summary'}, status=500)
             
@@ -502,7 +578,10 @@ def generate_summary_api(request):
 @require_http_methods(["POST"])
 @csrf_exempt
 def process_recording_api(request):
-    """API endpoint to process Daily recording (mock for testing)"""
+    """API endpoint to process Daily recording (mock for testing).
+
+    Accepts {"async": true} like generate_summary_api.
+    """
     try:
         data = json.loads(request.body)
         room_name = data.get('room_name')
@@ -511,73 +590,213 @@ def process_recording_api(request):
         if not room_name:
             return JsonResponse({'error': 'Room name required'}, status=400)
         
-        # Mock processing for testing
-        mock_transcript = """
-Teacher: Welcome to this learning session! Today we'll be covering Python programming fundamentals.
-Student: That sounds great! I'm excited to learn about variables and functions in Python.
-Teacher: Let's start with variables. In Python, you can create a variable by simply assigning a value to it. For example: name = 'John'
-Student: I see! So Python automatically determines the data type? That's different from Java.
-Teacher: Exactly! Python is dynamically typed. Now let's talk about functions. Functions in Python are defined using the 'def' keyword.
-Student: Can you show me an example of a simple function?
-Teacher: Sure! Here's a simple function: def greet(name): return f'Hello, {name}!' This function takes a name parameter and returns a greeting.
-Student: That's really helpful! How do I call this function?
-Teacher: You simply call it like this: greet('Alice') and it will return 'Hello, Alice!'
-        """
-        
-        # Generate summary using AI service
-        ai_service = AISummaryService()
-        summary = ai_service.generate_summary(mock_transcript)
-        
-        # Save to database
-        if session_id:
-            try:
-                session = Session.objects.get(id=session_id)
-                
-                SessionSummary.objects.update_or_create(
-                    session=session,
-                    defaults={
-                        'transcript': mock_transcript,
-                        'summary': summary,
-                        'generated_at': datetime.now()
-                    }
-                )
-                
-            except Session.DoesNotExist:
-                pass
+        if data.get('async'):
+            job = start_job('recording', recording_pipeline, room_name, session_id,
+                            session_id=session_id, dedupe=f'{room_name}:{session_id}')
+            return _job_accepted(job)
         
-        return JsonResponse({
-            'success': True,
-            'transcript': mock_transcript,
-            'summary': summary,
-            'note': 'This is a mock response for testing. Real implementation requires Google Cloud setup.'
-        })
+        return JsonResponse({'success': True, **recording_pipeline(_no_progress, room_name, session_id)})
         
     except Exception as e:
         print(f"Recording processing error: {e}")
         return JsonResponse({'error': str(e)}, status=500)
 
 
+def _is_member(user, session_id):
+    """Whether ``user`` hosts the session or has joined it"""
+    return Session.objects.filter(Q(user=user) | Q(participants__user=user), pk=session_id).exists()
+
+
+def _job_refused(request, job):
+    # A job's result holds the session's transcript and summary
+    if job is None:
+        return JsonResponse({'error': 'Job not found'}, status=404)
+    if job['session_id'] is None or not _is_member(request.user, job['session_id']):
+        return JsonResponse({'error': 'Not a member of this session'}, status=403)
+    return None
+
+
+@login_required
+def job_status_api(request, job_id):
+    """Current state of a background job"""
+    job = get_job(job_id)
+    refused = _job_refused(request, job)
+    if refused:
+        return refused
+    return JsonResponse(public_job(job))
+
+
+def _event_stream_response(job, request):
+    try:
+        last_event_id = int(request.headers.get('Last-Event-ID') or request.GET.get('last_event_id') or 0)
+    except ValueError:
+        last_event_id = 0
+    if isinstance(request, ASGIRequest):
+        # Served from the event loop: waiting between polls holds no thread
+        stream = aevent_stream(job['id'], last_event_id)
+    else:
+        # Each WSGI stream occupies a worker thread, so end it early; EventSource reconnects with Last-Event-ID
+        stream = event_stream(job['id'], last_event_id, timeout=getattr(settings, 'JOBS_WSGI_STREAM_TIMEOUT', 30))
+    response = StreamingHttpResponse(stream, content_type='text/event-stream')
+    response['Cache-Control'] = 'no-cache'
+    response['X-Accel-Buffering'] = 'no'  # let nginx pass events straight through
+    return response
+
+
+@login_required
+def job_events(request, job_id):
+    """Server-Sent Events stream of a job's progress"""
+    job = get_job(job_id)
+    refused = _job_refused(request, job)
+    if refused:
+        return refused
+    return _event_stream_response(job, request)
+
+
+@login_required
+def session_job_events(request, session_id):
+    """Server-Sent Events stream for the most recent job of a session"""
+    if not _is_member(request.user, session_id):
+        return JsonResponse({'error': 'Not a member of this session'}, status=403)
+    job = latest_job_for_session(session_id)
+    if job is None:
+        return JsonResponse({'error': 'No job for this session'}, status=404)
+    return _event_stream_response(job, request)
+
+
+@login_required
+def export_session(request, session_id, fmt):
+    """Download a session's transcript, summary and notes as txt, md, ndjson or pdf.
+
+    The body is streamed chunk by chunk from the compressed columns. Clients
+    can revalidate with If-None-Match and resume with Range / If-Range.
+    """
+    session = Session.objects.filter(pk=session_id).first()
+    allowed = session is not None and (session.user_id == request.user.pk or _is_member(request.user, session.pk))
+    if fmt not in EXPORT_FORMATS or not allowed:
+        return JsonResponse({'error': 'Export not found'}, status=404)
+
+    flush_notes([session.id])
+    source = export_source(session)
+    etag = export_etag(source, fmt)
+    if etag in request.headers.get('If-None-Match', '') or request.headers.get('If-None-Match') == '*':
+        response = HttpResponseNotModified()
+        response['ETag'] = etag
+        return response
+
+    byte_range = None
+    if request.headers.get('Range') and request.headers.get('If-Range', etag) == etag:
+        size = export_size(source, fmt, etag)
+        byte_range = parse_range(request.headers['Range'], size)
+        if byte_range is False:
+            response = JsonResponse({'error': 'Range not satisfiable'}, status=416)
+            response['Content-Range'] = f'bytes */{size}'
+            return response
+
+    chunks = export_chunks(source, fmt)
+    if byte_range:
+        chunks = slice_chunks(chunks, *byte_range)
+    if isinstance(request, ASGIRequest):
+        chunks = aiter_chunks(chunks)  # a sync iterator would be buffered whole before sending
+    if byte_range:
+        start, end = byte_range
+        response = StreamingHttpResponse(chunks, status=206, content_type=EXPORT_FORMATS[fmt])
+        response['Content-Range'] = f'bytes {start}-{end}/{size}'
+        response['Content-Length'] = end - start + 1
+    else:
+        response = StreamingHttpResponse(chunks, content_type=EXPORT_FORMATS[fmt])
+    response['ETag'] = etag
+    response['Accept-Ranges'] = 'bytes'
+    response['Cache-Control'] = 'private, no-cache'
+    response['Content-Disposition'] = f'attachment; filename="session-{session.room_name}.{fmt}"'
+    return response
+
+
 @require_http_methods(["POST"])
 @csrf_exempt
 def save_session_notes_api(request):
-    """API endpoint to save session notes"""
+    """API endpoint to save session notes as versioned diffs.
+
+    Expects {session_id, base_version, diffs: [{start, end, text}]}; a plain
+    {session_id, notes} body replaces the whole text. Edits go to the notes
+    buffer when there is a shared cache (see notes_buffer.buffered), else
+    straight to the database.
+    """
     try:
         data = json.loads(request.body)
         session_id = data.get('session_id')
-        notes = data.get('notes', '')
         
-        if not session_id or not notes:
+        if not session_id or ('diffs' not in data and not data.get('notes')):
             return JsonResponse({'error': 'Session ID and notes required'}, status=400)
+        session_id = int(session_id)
+        # Touching first saves a query: only a session that isn't active needs the existence check
+        if not touch_session(session_id) and not Session.objects.filter(id=session_id).exists():
+            return JsonResponse({'error': 'Session not found'}, status=404)
+        
+        try:
+            if 'diffs' in data:
+                entry = update_notes(session_id, data.get('base_version', 0), data['diffs'])
+            else:
+                entry = replace_notes(session_id, data['notes'])
+        except NotesConflict as conflict:
+            return JsonResponse({
+                'error': 'Notes were changed elsewhere',
+                'version': conflict.entry['version'],
+                'notes': conflict.entry['text'],
+            }, status=409)
+        except (KeyError, TypeError, ValueError) as e:
+            return JsonResponse({'error': f'Invalid diff: {e}'}, status=400)
+        
+        return JsonResponse({'success': True, 'version': entry['version']})
+            
+    except Exception as e:
+        return JsonResponse({'error': str(e)}, status=500)
+
+
+@require_http_methods(["POST"])
+@csrf_exempt
+def session_heartbeat_api(request):
+    """Periodic ping from the call page so idle-session reaping skips live calls"""
+    if not request.user.is_authenticated:
+        return JsonResponse({'error': 'Authentication required'}, status=403)
+    try:
+        data = json.loads(request.body or '{}')
+        session_id = data.get('session_id')
+        
+        if not session_id:
+            return JsonResponse({'error': 'Session ID required'}, status=400)
+        
+        if touch_session(session_id, request.user):
+            return JsonResponse({'success': True, 'active': True})
+        # Nothing touched: either the session is over or the caller is not in it
+        if not _is_member(request.user, session_id):
+            return JsonResponse({'error': 'Not a member of this session'}, status=403)
+        return JsonResponse({'success': True, 'active': False})
+            
+    except Exception as e:
+        return JsonResponse({'error': str(e)}, status=500)
+
+
+@require_http_methods(["POST"])
+@csrf_exempt
+def end_session_api(request):
+    """API endpoint to end a session when the host leaves"""
+    try:
+        data = json.loads(request.body or '{}')
+        session_id = data.get('session_id')
+        
+        if not session_id:
+            return JsonResponse({'error': 'Session ID required'}, status=400)
+        if not request.user.is_authenticated:
+            return JsonResponse({'error': 'Authentication required'}, status=403)
         
         try:
-            session = Session.objects.get(id=session_id)
-            SessionNotes.objects.update_or_create(
-                session=session,
-                defaults={'notes': notes, 'updated_at': datetime.now()}
-            )
-            return JsonResponse({'success': True})
+            session = Session.objects.get(id=session_id, user=request.user)
         except Session.DoesNotExist:
             return JsonResponse({'error': 'Session not found'}, status=404)
+        
+        ended = end_session(session)
+        return JsonResponse({'success': True, 'ended': ended})
             
     except Exception as e:
         return JsonResponse({'error': str(e)}, status=500)
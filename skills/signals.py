@@ -0,0 +1,107 @@
+from django.contrib.auth.models import User
+from django.db import transaction
+from django.db.models.signals import pre_save, post_save, post_delete
+from django.dispatch import receiver
+
+from .inbox import invalidate_inbox_counts
+from .matching import match_new_request
+from .models import UserProfile, Skill, TeachableSkill, SkillRequest, Review
+from .ranking import score_profile
+from .reviews import apply_review_change
+from .search import refresh_search_docs
+from .transitions import refresh_educators
+
+# Saves that don't touch anything shown in search results
+IGNORED_USER_FIELDS = {'last_login', 'password'}
+
+
+@receiver(pre_save, sender=UserProfile)
+def score_profile_before_save(sender, instance, raw=False, **kwargs):
+    """Recompute the ranking score as part of the same write"""
+    if raw:
+        return
+    instance.ranking_score = score_profile(instance)
+
+
+@receiver(post_save, sender=UserProfile)
+def profile_saved(sender, instance, raw=False, **kwargs):
+    """Keep the educator's search doc in step with their profile"""
+    if raw:
+        return
+    refresh_search_docs([instance.pk])
+
+
+@receiver(post_save, sender=User)
+def user_saved(sender, instance, raw=False, update_fields=None, **kwargs):
+    """Names live on User, so renames must reach the search doc too"""
+    if raw or (update_fields and set(update_fields) <= IGNORED_USER_FIELDS):
+        return
+    refresh_search_docs(UserProfile.objects.filter(user=instance).values_list('pk', flat=True))
+
+
+@receiver(post_save, sender=TeachableSkill)
+def teachable_skill_saved(sender, instance, raw=False, **kwargs):
+    if raw:
+        return
+    refresh_search_docs([instance.user_profile_id])
+
+
+def deleting_profiles(origin):
+    """True while a profile (or user) delete cascades to related rows.
+
+    The search doc goes with the profile; rebuilding it from a cascaded
+    post_delete would resurrect a row pointing at a deleted profile.
+    """
+    origin_model = getattr(origin, 'model', type(origin))
+    return origin_model in (UserProfile, User)
+
+
+@receiver(post_delete, sender=TeachableSkill)
+def teachable_skill_deleted(sender, instance, origin=None, **kwargs):
+    if deleting_profiles(origin):
+        return
+    refresh_search_docs([instance.user_profile_id])
+
+
+@receiver(post_save, sender=Skill)
+def skill_saved(sender, instance, created=False, raw=False, **kwargs):
+    """A renamed or recategorised skill changes every doc that lists it"""
+    if raw or created:
+        return
+    refresh_search_docs(
+        TeachableSkill.objects.filter(skill=instance).values_list('user_profile_id', flat=True)
+    )
+
+
+@receiver(post_save, sender=Review)
+def review_saved(sender, instance, raw=False, **kwargs):
+    if raw:
+        return
+    previous = getattr(instance, '_counted', None)
+    changed = apply_review_change(previous, (instance.educator_id, instance.rating))
+    if changed:
+        refresh_educators(changed)
+
+
+@receiver(post_delete, sender=Review)
+def review_deleted(sender, instance, origin=None, **kwargs):
+    previous = getattr(instance, '_counted', (instance.educator_id, instance.rating))
+    changed = apply_review_change(previous, None)
+    if changed and not deleting_profiles(origin):
+        refresh_educators(changed)
+
+
+@receiver(post_save, sender=SkillRequest)
+@receiver(post_delete, sender=SkillRequest)
+def skill_request_changed(sender, instance, raw=False, **kwargs):
+    if raw:
+        return
+    invalidate_inbox_counts(instance.educator_id, instance.learner_id)
+
+
+@receiver(post_save, sender=SkillRequest)
+def skill_request_created(sender, instance, created=False, raw=False, **kwargs):
+    """Look for barter cycles through a new skill-for-skill request once it is committed"""
+    if raw or not created or instance.is_payment_offer:
+        return
+    transaction.on_commit(lambda: match_new_request(instance))
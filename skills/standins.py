@@ -0,0 +1,332 @@
+import json
+import random
+import re
+import threading
+import time
+import uuid
+from collections import Counter
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+from django.conf import settings
+
+
+class Behaviour:
+    """How a stand-in misbehaves: latency, failures and throttling.
+
+    Latency is lognormal around ``latency_ms`` (the median) with shape
+    ``jitter``; 0 gives a fixed delay. Each request independently gets a 429
+    with Retry-After (``throttle_rate``), a 503 (``error_rate``) or, with
+    ``hang_rate``, no answer for ``hang_seconds`` so client timeouts fire.
+    """
+
+    def __init__(self, latency_ms=0, jitter=0.0, error_rate=0.0, throttle_rate=0.0, retry_after=1,
+                 hang_rate=0.0, hang_seconds=30, seed=None):
+        self.latency_ms = latency_ms
+        self.jitter = jitter
+        self.error_rate = error_rate
+        self.throttle_rate = throttle_rate
+        self.retry_after = retry_after
+        self.hang_rate = hang_rate
+        self.hang_seconds = hang_seconds
+        self._rng = random.Random(seed)
+        self._lock = threading.Lock()
+
+    def delay(self, median_ms=None):
+        """Seconds to wait, drawn around ``median_ms`` (default ``latency_ms``)"""
+        median_ms = self.latency_ms if median_ms is None else median_ms
+        if not median_ms:
+            return 0.0
+        with self._lock:
+            factor = self._rng.lognormvariate(0, self.jitter) if self.jitter else 1.0
+        return median_ms * factor / 1000
+
+    def outcome(self):
+        """'hang', 'throttle', 'error' or 'ok' for the next request"""
+        with self._lock:
+            roll = self._rng.random()
+        for name, rate in (('hang', self.hang_rate), ('throttle', self.throttle_rate), ('error', self.error_rate)):
+            if roll < rate:
+                return name
+            roll -= rate
+        return 'ok'
+
+
+class _Handler(BaseHTTPRequestHandler):
+    protocol_version = 'HTTP/1.1'
+
+    def log_message(self, format, *args):
+        pass
+
+    def _read_json(self):
+        length = int(self.headers.get('Content-Length') or 0)
+        body = self.rfile.read(length) if length else b''
+        try:
+            return json.loads(body or b'{}')
+        except ValueError:
+            return None
+
+    def send_json(self, status, payload, headers=()):
+        body = json.dumps(payload).encode('utf-8')
+        self.send_response(status)
+        self.send_header('Content-Type', 'application/json')
+        self.send_header('Content-Length', str(len(body)))
+        for name, value in headers:
+            self.send_header(name, value)
+        self.end_headers()
+        self.wfile.write(body)
+        self.server.stand_in.record(status)
+
+    def _dispatch(self, method):
+        stand_in = self.server.stand_in
+        behaviour = stand_in.behaviour
+        outcome = behaviour.outcome()
+        if outcome == 'hang':
+            time.sleep(behaviour.hang_seconds)
+        elif outcome == 'throttle':
+            self._read_json()
+            return self.send_json(429, stand_in.error_body(429, 'Rate limit exceeded'),
+                                  headers=[('Retry-After', str(behaviour.retry_after))])
+        elif outcome == 'error':
+            self._read_json()
+            return self.send_json(503, stand_in.error_body(503, 'Service unavailable'))
+        try:
+            stand_in.handle(self, method)
+        except (BrokenPipeError, ConnectionResetError):
+            pass  # the client gave up, e.g. after a hang
+
+    def do_GET(self):
+        self._dispatch('GET')
+
+    def do_POST(self):
+        self._dispatch('POST')
+
+    def do_DELETE(self):
+        self._dispatch('DELETE')
+
+
+class StandIn:
+    """A local HTTP server imitating an external API, run on a background thread.
+
+    ``port=0`` picks a free port; ``url`` is the base URL to put in settings.
+    Usable as a context manager. ``counts`` tallies responses by status.
+    """
+
+    prefix = ''
+
+    def __init__(self, behaviour=None, host='127.0.0.1', port=0):
+        self.behaviour = behaviour or Behaviour()
+        self.counts = Counter()
+        self._counts_lock = threading.Lock()
+        self._server = ThreadingHTTPServer((host, port), _Handler)
+        self._server.daemon_threads = True
+        self._server.stand_in = self
+        self._thread = None
+
+    @property
+    def url(self):
+        host, port = self._server.server_address[:2]
+        return f'http://{host}:{port}{self.prefix}'
+
+    def record(self, status):
+        with self._counts_lock:
+            self.counts[status] += 1
+
+    def start(self):
+        self._thread = threading.Thread(target=self._server.serve_forever, daemon=True, name=type(self).__name__)
+        self._thread.start()
+        return self
+
+    def stop(self):
+        self._server.shutdown()
+        self._server.server_close()
+        if self._thread:
+            self._thread.join()
+
+    def __enter__(self):
+        return self.start()
+
+    def __exit__(self, *exc):
+        self.stop()
+
+    def error_body(self, status, message):
+        return {'error': message}
+
+    def handle(self, request, method):
+        raise NotImplementedError
+
+
+class DailyStandIn(StandIn):
+    """The parts of Daily's REST API we call: create, fetch and delete rooms"""
+
+    prefix = '/v1'
+    ROOM = re.compile(r'^/v1/rooms/(?P<name>[A-Za-z0-9_-]+)$')
+
+    def __init__(self, behaviour=None, domain=None, **kwargs):
+        super().__init__(behaviour, **kwargs)
+        self.domain = domain or getattr(settings, 'DAILY_DOMAIN', 'test-domain.daily.co')
+        self.rooms = {}
+        self._rooms_lock = threading.Lock()
+
+    def error_body(self, status, message):
+        kind = 'rate-limit-error' if status == 429 else 'server-error'
+        return {'error': kind, 'info': message}
+
+    def handle(self, request, method):
+        if request.headers.get('Authorization', '').split(' ')[0] != 'Bearer':
+            return request.send_json(401, {'error': 'authentication-error', 'info': 'No API key'})
+        time.sleep(self.behaviour.delay())
+        path = request.path.split('?')[0]
+        if method == 'POST' and path == '/v1/rooms':
+            return self._create(request)
+        match = self.ROOM.match(path)
+        if match and method in ('GET', 'DELETE'):
+            with self._rooms_lock:
+                room = self.rooms.get(match['name']) if method == 'GET' else self.rooms.pop(match['name'], None)
+            if room is None:
+                return request.send_json(404, {'error': 'not-found', 'info': f"room {match['name']} not found"})
+            return request.send_json(200, room if method == 'GET' else {'deleted': True, 'name': room['name']})
+        request.send_json(404, {'error': 'not-found', 'info': 'Unknown endpoint'})
+
+    def _create(self, request):
+        data = request._read_json()
+        if data is None:
+            return request.send_json(400, {'error': 'invalid-request-error', 'info': 'Malformed JSON'})
+        name = data.get('name') or uuid.uuid4().hex[:12]
+        room = {
+            'id': str(uuid.uuid4()),
+            'name': name,
+            'api_created': True,
+            'privacy': data.get('privacy', 'public'),
+            'url': f'https://{self.domain}/{name}',
+            'created_at': time.strftime('%Y-%m-%dT%H:%M:%S.000Z', time.gmtime()),
+            'config': data.get('properties', {}),
+        }
+        with self._rooms_lock:
+            if name in self.rooms:
+                room = None
+            else:
+                self.rooms[name] = room
+        if room is None:
+            return request.send_json(400, {'error': 'invalid-request-error',
+                                           'info': f'a room named {name} already exists'})
+        request.send_json(200, room)
+
+
+class GeminiStandIn(StandIn):
+    """Gemini's generateContent and streamGenerateContent (SSE) endpoints.
+
+    The reply is the canned summary in the prompt's language, sent in
+    ``chunks`` pieces when streamed; ``latency_ms`` is the time to the first
+    piece and ``chunk_ms`` the gap between pieces.
+    """
+
+    prefix = '/v1beta'
+    GENERATE = re.compile(r'^/v1beta/models/(?P<model>[\w.-]+):(?P<method>generateContent|streamGenerateContent)$')
+
+    def __init__(self, behaviour=None, chunks=8, chunk_ms=0, **kwargs):
+        super().__init__(behaviour, **kwargs)
+        self.chunks = chunks
+        self.chunk_ms = chunk_ms
+
+    def error_body(self, status, message):
+        state = 'RESOURCE_EXHAUSTED' if status == 429 else 'UNAVAILABLE'
+        return {'error': {'code': status, 'message': message, 'status': state}}
+
+    def _reply(self, prompt):
+        from .session_views_production import AISummaryService
+
+        language = 'hindi' if re.search('[\u0900-\u097f]', prompt) else 'english'
+        return AISummaryService()._generate_mock_summary(prompt, language).strip()
+
+    @staticmethod
+    def _candidate(text, finished):
+        chunk = {
+            'candidates': [{
+                'content': {'role': 'model', 'parts': [{'text': text}]},
+                'index': 0,
+            }],
+        }
+        if finished:
+            chunk['candidates'][0]['finishReason'] = 'STOP'
+        return chunk
+
+    def handle(self, request, method):
+        path, _, query = request.path.partition('?')
+        match = self.GENERATE.match(path)
+        if method != 'POST' or not match:
+            return request.send_json(404, {'error': {'code': 404, 'message': 'Not found', 'status': 'NOT_FOUND'}})
+        if not (request.headers.get('x-goog-api-key') or 'key=' in query):
+            return request.send_json(403, {'error': {'code': 403, 'message': 'API key missing',
+                                                     'status': 'PERMISSION_DENIED'}})
+        data = request._read_json()
+        try:
+            prompt = ''.join(part.get('text', '') for content in data['contents'] for part in content['parts'])
+        except (KeyError, TypeError):
+            return request.send_json(400, {'error': {'code': 400, 'message': 'Invalid contents',
+                                                     'status': 'INVALID_ARGUMENT'}})
+        text = self._reply(prompt)
+        time.sleep(self.behaviour.delay())
+        if match['method'] == 'generateContent':
+            return request.send_json(200, self._candidate(text, True))
+
+        # Server-sent events, one candidate chunk per event
+        size = -(-len(text) // max(self.chunks, 1))
+        pieces = [text[i:i + size] for i in range(0, len(text), size)] or ['']
+        request.send_response(200)
+        request.send_header('Content-Type', 'text/event-stream')
+        request.send_header('Transfer-Encoding', 'chunked')
+        request.end_headers()
+        for number, piece in enumerate(pieces, 1):
+            if number > 1:
+                time.sleep(self.behaviour.delay(self.chunk_ms))
+            event = f'data: {json.dumps(self._candidate(piece, number == len(pieces)))}\r\n\r\n'.encode('utf-8')
+            request.wfile.write(b'%x\r\n%s\r\n' % (len(event), event))
+            request.wfile.flush()
+        request.wfile.write(b'0\r\n\r\n')
+        self.record(200)
+
+
+class CollectorStandIn(StandIn):
+    """An OTLP/HTTP JSON trace collector: keeps received spans in ``spans`` and appends them to ``path``"""
+
+    prefix = '/v1/traces'
+
+    def __init__(self, behaviour=None, path=None, **kwargs):
+        super().__init__(behaviour, **kwargs)
+        self.path = path
+        self.spans = []
+        self._spans_lock = threading.Lock()
+
+    def handle(self, request, method):
+        from .tracing import spans_from_otlp
+
+        if method != 'POST' or request.path.split('?')[0] != self.prefix:
+            return request.send_json(404, {'code': 5, 'message': 'Not found'})
+        data = request._read_json()
+        try:
+            spans = spans_from_otlp(data)
+        except (KeyError, TypeError, ValueError):
+            return request.send_json(400, {'code': 3, 'message': 'Invalid OTLP payload'})
+        time.sleep(self.behaviour.delay())
+        with self._spans_lock:
+            self.spans.extend(spans)
+            if self.path:
+                with open(self.path, 'a', encoding='utf-8') as f:
+                    f.writelines(json.dumps(span) + '\n' for span in spans)
+        request.send_json(200, {'partialSuccess': {}})
+
+
+# Typical provider latencies, for benchmarks that want something realistic
+DAILY_BEHAVIOUR = dict(latency_ms=150, jitter=0.3, throttle_rate=0.01)
+GEMINI_BEHAVIOUR = dict(latency_ms=800, jitter=0.4, throttle_rate=0.02, error_rate=0.01)
+GEMINI_CHUNK_MS = 120
+
+
+def standin_settings(daily, gemini):
+    """Settings that point DailyAPI and AISummaryService at running stand-ins"""
+    return {
+        'DAILY_API_KEY': 'stand-in',
+        'DAILY_API_BASE_URL': daily.url,
+        'GEMINI_API_KEY': 'stand-in',
+        'GEMINI_API_BASE_URL': gemini.url,
+    }
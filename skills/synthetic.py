@@ -0,0 +1,266 @@
+import math
+import random
+from array import array
+from itertools import accumulate
+from datetime import date, timedelta
+from decimal import Decimal
+
+from django.contrib.auth.hashers import make_password
+from django.contrib.auth.models import User
+from django.db import transaction
+from django.utils import timezone
+
+from .datamove import keep_timestamps
+from .models import (Certification, Session, SessionParticipant, Skill, SkillRequest, TeachableSkill,
+                     UserProfile)
+
+
+SKILLS = [
+    ('Python Programming', 'technology'), ('JavaScript', 'technology'), ('React', 'technology'),
+    ('Django', 'technology'), ('Machine Learning', 'technology'), ('Data Science', 'technology'),
+    ('SQL', 'technology'), ('Excel', 'business'), ('English Language', 'language'),
+    ('Hindi Language', 'language'), ('Spanish Language', 'language'), ('French Language', 'language'),
+    ('Guitar', 'music'), ('Piano', 'music'), ('Singing', 'music'), ('Tabla', 'music'),
+    ('Photography', 'arts'), ('Drawing', 'arts'), ('Painting', 'arts'), ('Graphic Design', 'arts'),
+    ('Cooking', 'cooking'), ('Baking', 'cooking'), ('Yoga', 'sports'), ('Chess', 'sports'),
+    ('Cricket Coaching', 'sports'), ('Public Speaking', 'business'), ('Accounting', 'business'),
+    ('Digital Marketing', 'business'), ('Mathematics', 'other'), ('Physics', 'other'),
+]
+
+# (location, relative share of users)
+CITIES = [
+    ('Mumbai, India', 18), ('Delhi, India', 17), ('Bengaluru, India', 14), ('Hyderabad, India', 9),
+    ('Chennai, India', 8), ('Pune, India', 8), ('Kolkata, India', 7), ('Ahmedabad, India', 5),
+    ('Jaipur, India', 4), ('Lucknow, India', 3), ('Kochi, India', 2), ('Indore, India', 2), ('', 3),
+]
+
+FIRST_NAMES = ['Aarav', 'Aditi', 'Arjun', 'Diya', 'Ishaan', 'Kavya', 'Rohan', 'Sneha', 'Vikram', 'Priya',
+               'Rahul', 'Ananya', 'Karan', 'Meera', 'Sahil', 'Nisha', 'John', 'Sarah', 'Maria', 'David']
+LAST_NAMES = ['Sharma', 'Verma', 'Patel', 'Iyer', 'Reddy', 'Nair', 'Gupta', 'Singh', 'Das', 'Khan',
+              'Menon', 'Joshi', 'Rao', 'Bose', 'Doe', 'Wilson', 'Garcia', 'Smith']
+
+WEEKDAY_NAMES = ['Monday', 'Tuesday', 'Wednesday', 'Thursday', 'Friday', 'Saturday', 'Sunday']
+PREFERRED_TIMES = ['early_morning', 'morning', 'afternoon', 'evening', 'night', 'flexible']
+PREFERRED_TIME_WEIGHTS = [5, 12, 10, 35, 20, 18]
+PROFICIENCY = ['beginner', 'intermediate', 'advanced', 'expert']
+PROFICIENCY_WEIGHTS = [10, 35, 35, 20]
+REQUEST_STATUSES = ['pending', 'accepted', 'rejected', 'completed']
+REQUEST_STATUS_WEIGHTS = [30, 15, 15, 40]
+RATE_RANGES = [(20, '10-20'), (35, '20-35'), (50, '35-50'), (75, '50-75'), (100, '75-100')]
+OFFERED_SKILLS = ['Guitar', 'Cooking', 'English Language', 'Photography', 'Yoga', 'Python Programming']
+
+SHARED_PASSWORD = 'synthetic-password'
+
+
+def _poisson(rng, mean):
+    # Knuth's method; the means used here are small
+    limit, k, p = math.exp(-mean), 0, rng.random()
+    while p > limit:
+        k += 1
+        p *= rng.random()
+    return k
+
+
+class _Generator:
+    """State shared by the phases; only flat arrays of ids are kept across batches"""
+
+    def __init__(self, seed, prefix, educator_share, requests_per_user, batch_size, stdout, until):
+        self.rng = random.Random(seed)
+        self.prefix = prefix
+        self.educator_share = educator_share
+        self.requests_per_user = requests_per_user
+        self.batch_size = batch_size
+        self.stdout = stdout
+        self.until = until
+        self.password = make_password(SHARED_PASSWORD)  # hashing once instead of per user
+        self.skills = []
+        self.skill_weights = []
+        self.user_ids = array('q')
+        self.teachable_ids = array('q')
+        self.teachable_owners = array('q')
+        self.teachable_skills = array('q')
+        self.teachable_weights = array('d')
+        self.popularity = {}
+        self.requests = 0
+        self.sessions = 0
+
+    def log(self, message):
+        if self.stdout:
+            self.stdout.write(message)
+
+    def _moment(self, days_back):
+        return self.until - timedelta(days=self.rng.random() * days_back)
+
+    def create_skills(self):
+        existing = dict(Skill.objects.values_list('name', 'pk'))
+        Skill.objects.bulk_create([Skill(name=name, category=category, description=f'{name} lessons')
+                                   for name, category in SKILLS if name not in existing])
+        ids = dict(Skill.objects.filter(name__in=[name for name, _ in SKILLS]).values_list('name', 'pk'))
+        self.skills = [ids[name] for name, _ in SKILLS]
+        # Zipf-like popularity: a few skills get most of the educators and requests
+        self.skill_weights = [1 / (rank + 1) for rank in range(len(self.skills))]
+        self.popularity = dict(zip(self.skills, self.skill_weights))
+
+    def _profile(self, user_id, is_educator):
+        rng = self.rng
+        location = rng.choices([c for c, _ in CITIES], [w for _, w in CITIES])[0]
+        days = [day for i, day in enumerate(WEEKDAY_NAMES) if rng.random() < (0.75 if i >= 5 else 0.45)]
+        profile = UserProfile(
+            user_id=user_id,
+            location=location,
+            available_days=days,
+            preferred_time=rng.choices(PREFERRED_TIMES, PREFERRED_TIME_WEIGHTS)[0],
+            teaching_mode=rng.choice(['online', 'online', 'in_person', 'both']),
+        )
+        if not is_educator:
+            return profile
+
+        rate = min(round(math.exp(rng.gauss(6.7, 0.5)) / 50) * 50, 10000)  # lognormal around Rs 800
+        dollars = rate / 80
+        profile.hourly_rate = Decimal(rate)
+        profile.hourly_rate_range = next((label for limit, label in RATE_RANGES if dollars < limit), '100+')
+        profile.bio = f'I teach {rng.choice(SKILLS)[0].lower()} and love helping people get started.'
+        profile.general_teaching_hours = rng.choice(['Weekdays 6-9 PM', 'Weekends 10 AM - 6 PM', 'Flexible'])
+        profile.experience_level = rng.choices(['beginner', 'intermediate', 'experienced', 'expert'],
+                                               [20, 40, 25, 15])[0]
+
+        # Review aggregates: most educators have a handful of mostly good ratings
+        reviews = _poisson(rng, 4) if rng.random() < 0.7 else 0
+        counts = [0] * 5
+        for _ in range(reviews):
+            counts[rng.choices(range(5), [2, 3, 10, 35, 50])[0]] += 1
+        profile.review_count = reviews
+        profile.review_sum = sum((i + 1) * n for i, n in enumerate(counts))
+        for i, n in enumerate(counts):
+            setattr(profile, f'rating_{i + 1}_count', n)
+        profile.rating = Decimal(profile.review_sum / reviews).quantize(Decimal('0.01')) if reviews else Decimal(0)
+        return profile
+
+    def create_users(self, total):
+        rng = self.rng
+        for start in range(0, total, self.batch_size):
+            count = min(self.batch_size, total - start)
+            with transaction.atomic(), keep_timestamps(User, TeachableSkill):
+                users = []
+                for n in range(start, start + count):
+                    first, last = rng.choice(FIRST_NAMES), rng.choice(LAST_NAMES)
+                    users.append(User(username=f'{self.prefix}{n}', first_name=first, last_name=last,
+                                      email=f'{self.prefix}{n}@example.com', password=self.password,
+                                      date_joined=self._moment(730)))
+                User.objects.bulk_create(users)
+                self.user_ids.extend(user.pk for user in users)
+
+                educators = [rng.random() < self.educator_share for _ in users]
+                profiles = [self._profile(user.pk, is_educator) for user, is_educator in zip(users, educators)]
+                UserProfile.objects.bulk_create(profiles)
+
+                teachables, certifications = [], []
+                for profile, user, is_educator in zip(profiles, users, educators):
+                    if not is_educator:
+                        continue
+                    k = min(1 + _poisson(rng, 0.8), len(self.skills))
+                    for skill_id in set(rng.choices(self.skills, self.skill_weights, k=k)):
+                        teachables.append(TeachableSkill(
+                            user_profile_id=profile.pk, skill_id=skill_id,
+                            proficiency_level=rng.choices(PROFICIENCY, PROFICIENCY_WEIGHTS)[0],
+                            experience_years=min(_poisson(rng, 4), 30),
+                            created_at=user.date_joined,
+                        ))
+                    if rng.random() < 0.25:
+                        issued = date(2015, 1, 1) + timedelta(days=rng.randrange(3650))
+                        certifications.append(Certification(
+                            user_profile_id=profile.pk, title=f'Certified {rng.choice(SKILLS)[0]} Instructor',
+                            issuing_organization=rng.choice(['Coursera', 'NPTEL', 'Trinity College', 'Udemy']),
+                            issue_date=issued,
+                        ))
+                TeachableSkill.objects.bulk_create(teachables)
+                Certification.objects.bulk_create(certifications)
+
+            owners = {profile.pk: profile.user_id for profile in profiles}
+            for teachable in teachables:
+                self.teachable_ids.append(teachable.pk)
+                self.teachable_owners.append(owners[teachable.user_profile_id])
+                self.teachable_skills.append(teachable.skill_id)
+                self.teachable_weights.append(self.popularity[teachable.skill_id])
+            self.log(f'  users: {start + count}/{total}')
+
+    def create_requests(self):
+        """Requests from every user, aimed at popular skills more often; completed ones get a session"""
+        rng = self.rng
+        if not self.teachable_ids:
+            return
+        cumulative = array('d', accumulate(self.teachable_weights))
+        picks = range(len(self.teachable_ids))
+        for start in range(0, len(self.user_ids), self.batch_size):
+            requests, request_skills = [], []
+            for learner_id in self.user_ids[start:start + self.batch_size]:
+                chosen = set(rng.choices(picks, cum_weights=cumulative, k=_poisson(rng, self.requests_per_user)))
+                for i in sorted(chosen):
+                    if self.teachable_owners[i] == learner_id:
+                        continue
+                    status = rng.choices(REQUEST_STATUSES, REQUEST_STATUS_WEIGHTS)[0]
+                    created = self._moment(365)
+                    is_payment = rng.random() < 0.7
+                    requests.append(SkillRequest(
+                        learner_id=learner_id, educator_id=self.teachable_owners[i],
+                        requested_skill_id=self.teachable_ids[i],
+                        is_payment_offer=is_payment,
+                        offered_amount=Decimal(rng.randrange(200, 3000, 50)) if is_payment else None,
+                        offered_skill='' if is_payment else rng.choice(OFFERED_SKILLS),
+                        message='Hi! I would like to learn this.',
+                        status=status,
+                        is_read=status != 'pending' or rng.random() < 0.5,
+                        created_at=created,
+                        updated_at=created + timedelta(hours=rng.randrange(1, 96)) if status != 'pending' else created,
+                    ))
+                    request_skills.append(self.teachable_skills[i])
+
+            with transaction.atomic(), keep_timestamps(SkillRequest, Session, SessionParticipant):
+                SkillRequest.objects.bulk_create(requests)
+                sessions, learners = [], []
+                for request, skill_id in zip(requests, request_skills):
+                    if request.status != 'completed':
+                        continue
+                    started = request.updated_at + timedelta(days=rng.randrange(0, 7))
+                    duration = timedelta(minutes=rng.choice([30, 45, 60, 60, 90]))
+                    room_name = f'{self.prefix}-room-{request.pk}'
+                    sessions.append(Session(
+                        user_id=request.educator_id, skill_id=skill_id, room_name=room_name,
+                        room_url=f'https://synthetic.daily.co/{room_name}', status='completed',
+                        started_at=started, ended_at=started + duration, last_activity_at=started + duration,
+                        duration=duration, created_at=started,
+                    ))
+                    learners.append(request.learner_id)
+                Session.objects.bulk_create(sessions)
+                SessionParticipant.objects.bulk_create([
+                    SessionParticipant(session_id=session.pk, user_id=user_id, role=role, joined_at=session.started_at)
+                    for session, learner_id in zip(sessions, learners)
+                    for user_id, role in ((session.user_id, 'host'), (learner_id, 'participant'))
+                ])
+            self.requests += len(requests)
+            self.sessions += len(sessions)
+            done = min(start + self.batch_size, len(self.user_ids))
+            self.log(f'  requests: {done}/{len(self.user_ids)} learners, {self.requests} requests, '
+                     f'{self.sessions} sessions')
+
+
+def generate(users, seed=42, prefix='synth', educator_share=0.4, requests_per_user=1.5, batch_size=5000,
+             stdout=None, until=None):
+    """Create ``users`` synthetic users with profiles, skills, requests and sessions.
+
+    The same seed and prefix produce the same data. Everything is written
+    with bulk_create, one transaction per batch; only id arrays are kept
+    between batches. Counters, search docs and ranking scores are left for
+    the caller to rebuild.
+    """
+    until = until or timezone.now().replace(hour=0, minute=0, second=0, microsecond=0)
+    generator = _Generator(seed, prefix, educator_share, requests_per_user, batch_size, stdout, until)
+    generator.create_skills()
+    generator.create_users(users)
+    generator.create_requests()
+    return {
+        'users': len(generator.user_ids),
+        'teachable_skills': len(generator.teachable_ids),
+        'requests': generator.requests,
+        'sessions': generator.sessions,
+    }
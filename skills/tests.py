@@ -1,7 +1,52 @@
-from django.test import TestCase, Client
+from django.test import AsyncClient, TestCase, TransactionTestCase, Client, override_settings
+from django.conf import settings
 from django.contrib.auth.models import User
 from django.urls import reverse
-from .models import UserProfile, Skill, TeachableSkill, Certification
+from django.core.cache import cache
+from django.core.exceptions import ValidationError
+from django.core.management import call_command
+from django.core.management.base import CommandError
+from django.db import connection
+from django.db.migrations.executor import MigrationExecutor
+from django.db.models import F
+from django.http import QueryDict
+from django.utils import timezone
+import base64
+import glob
+import json
+import os
+import tempfile
+import time
+from datetime import datetime, timedelta
+from decimal import Decimal
+from asgiref.sync import sync_to_async
+from asgiref.testing import ApplicationCommunicator
+from io import StringIO
+from .models import (UserProfile, Skill, TeachableSkill, Certification, SkillRequest, Session,
+                     SessionNotes, SessionSummary, EducatorSearchDoc, Review, Booking, SessionParticipant)
+from .benchmarks import _run_wsgi, compare, prepare_context, run_benchmarks, summarize
+from .datamove import export_data, import_data
+from .fields import CompressedValue
+from .inbox import inbox_counts, inbox_page
+from .jobs import get_job, start_job
+from .live import Connection, live_application, _sender
+from .matching import BarterGraph, barter_suggestions
+from .metrics import EXTERNAL_CALLS, HTTP_IN_PROGRESS, REGISTRY, collect, flush, track_call
+from .middleware import QueryProfile, normalize_sql, slow_log
+from .profiling import profile, sign_token
+from .notes_buffer import DIRTY_KEY, apply_diffs, buffered, flush_notes, update_notes
+from .ranking import compute_ranking_score
+from .ratelimit import acquire_slot, queue_time_ms, release_slot
+from .rooms import join_room
+from .reviews import submit_review
+from .scheduling import IntervalIndex, available_slots, reserve_slot
+from .search import compute_facet_counts, filter_educators, get_facets
+from .session_views_production import AISummaryService, DailyAPI, store_summary
+from .standins import Behaviour, CollectorStandIn, DailyStandIn, GeminiStandIn, standin_settings
+from .tracing import breakdown, flush as flush_traces, span
+from .synthetic import generate
+from .transitions import (complete_skill_request, create_skill_request, end_session, reconcile_counters,
+                          transition_skill_request)
 
 
 class BorrowMyBrainTestCase(TestCase):
@@ -173,3 +218,1565 @@ class ViewPermissionTestCase(TestCase):
         # Should be able to access profile
         response = self.client.get(reverse('profile'))
         self.assertEqual(response.status_code, 200)
+
+
+class SearchFacetTestCase(TestCase):
+    def setUp(self):
+        cache.clear()
+        self.python = Skill.objects.create(name='Python', category='technology')
+        self.guitar = Skill.objects.create(name='Guitar', category='music')
+
+        for username, mode, skills in [
+            ('alice', 'online', [(self.python, 'expert'), (self.guitar, 'beginner')]),
+            ('bob', 'both', [(self.python, 'advanced')]),
+            ('carol', 'in_person', [(self.guitar, 'expert')]),
+        ]:
+            user = User.objects.create_user(username=username, password='testpass123')
+            profile = UserProfile.objects.create(user=user, teaching_mode=mode, hourly_rate_range='20-35')
+            for skill, level in skills:
+                TeachableSkill.objects.create(user_profile=profile, skill=skill, proficiency_level=level)
+
+    def test_facet_counts_for_all_educators(self):
+        """Facet counts count each educator once per value"""
+        counts = compute_facet_counts(filter_educators(QueryDict('')))
+        self.assertEqual(counts['category']['technology'], 2)
+        self.assertEqual(counts['category']['music'], 2)
+        self.assertEqual(counts['proficiency_level']['expert'], 2)
+        self.assertEqual(counts['teaching_mode']['online'], 1)
+        self.assertEqual(counts['hourly_rate_range']['20-35'], 3)
+
+    def test_facet_counts_follow_filters(self):
+        """Facet counts are computed for the current filter set"""
+        counts = compute_facet_counts(filter_educators(QueryDict('category=technology')))
+        self.assertEqual(counts['category']['technology'], 2)
+        self.assertEqual(counts['category']['music'], 1)
+        self.assertEqual(counts['teaching_mode']['in_person'], 0)
+
+    def test_facets_use_one_query_and_are_cached(self):
+        """All facets come from a single aggregate query, then from the cache"""
+        params = QueryDict('q=Python')
+        with self.assertNumQueries(1):
+            get_facets(params, filter_educators(params))
+        with self.assertNumQueries(0):
+            get_facets(params, filter_educators(params))
+
+    def test_search_page_shows_facets(self):
+        """Search page renders facet counts"""
+        response = self.client.get(reverse('search_results'), {'method': 'online'})
+        self.assertEqual(response.status_code, 200)
+        self.assertContains(response, 'facet-count')
+        self.assertEqual(len(response.context['educators']), 2)
+
+
+class EducatorSearchDocTestCase(TestCase):
+    def setUp(self):
+        self.user = User.objects.create_user(username='dana', password='testpass123',
+                                             first_name='Dana', last_name='Scully')
+        self.profile = UserProfile.objects.create(user=self.user, hourly_rate=25, teaching_mode='online')
+        self.skill = Skill.objects.create(name='Piano', category='music')
+        self.teachable = TeachableSkill.objects.create(user_profile=self.profile, skill=self.skill,
+                                                       proficiency_level='expert')
+
+    def test_signals_maintain_doc(self):
+        """Profile, user and skill changes are reflected in the projection"""
+        doc = EducatorSearchDoc.objects.get(pk=self.profile.pk)
+        self.assertEqual(doc.display_name, 'Dana Scully')
+        self.assertEqual(doc.skill_count, 1)
+        self.assertEqual(doc.categories, '|music|')
+
+        self.user.first_name = 'Katherine'
+        self.user.save()
+        self.skill.name = 'Grand Piano'
+        self.skill.save()
+        doc.refresh_from_db()
+        self.assertEqual(doc.display_name, 'Katherine Scully')
+        self.assertEqual(doc.skills[0]['name'], 'Grand Piano')
+
+        self.teachable.delete()
+        doc.refresh_from_db()
+        self.assertEqual(doc.skill_count, 0)
+
+    def test_deleting_user_removes_doc(self):
+        """Cascading deletes don't resurrect the doc"""
+        self.user.delete()
+        self.assertFalse(EducatorSearchDoc.objects.exists())
+
+    def test_rebuild_command(self):
+        """The management command rebuilds a wiped projection"""
+        EducatorSearchDoc.objects.all().delete()
+        call_command('rebuild_search_index', stdout=StringIO())
+        doc = EducatorSearchDoc.objects.get(pk=self.profile.pk)
+        self.assertIn('piano', doc.search_text)
+
+    def test_search_queries_single_table(self):
+        """Listing and sorting read only the projection, without DISTINCT"""
+        educators = filter_educators(QueryDict('q=piano&sort=price_low'))
+        sql = str(educators.query)
+        self.assertNotIn('DISTINCT', sql)
+        self.assertNotIn('JOIN', sql)
+        self.assertEqual([doc.pk for doc in educators], [self.profile.pk])
+
+
+class SearchBackfillMigrationTestCase(TransactionTestCase):
+    # Runs the data migrations against rows created before them
+
+    def migrate(self, target):
+        executor = MigrationExecutor(connection)
+        executor.loader.build_graph()
+        executor.migrate([('skills', target)])
+        return executor.loader.project_state([('skills', target)]).apps
+
+    def tearDown(self):
+        self.migrate(MigrationExecutor(connection).loader.graph.leaf_nodes('skills')[0][1])
+
+    def test_existing_educators_are_indexed(self):
+        """Migrating creates a search doc for every profile that was already there"""
+        apps = self.migrate('0003_merge_20261019_1229')
+        user = apps.get_model('auth', 'User').objects.create(username='early', first_name='Early', last_name='Bird')
+        profile = apps.get_model('skills', 'UserProfile').objects.create(user=user, hourly_rate=30)
+        skill = apps.get_model('skills', 'Skill').objects.create(name='Chess', category='other')
+        apps.get_model('skills', 'TeachableSkill').objects.create(user_profile=profile, skill=skill,
+                                                                  proficiency_level='expert')
+
+        apps = self.migrate('0004_educatorsearchdoc')
+        doc = apps.get_model('skills', 'EducatorSearchDoc').objects.get(pk=profile.pk)
+        self.assertEqual((doc.display_name, doc.skill_count, doc.skill_names), ('Early Bird', 1, '|chess|'))
+
+    def test_existing_educators_are_scored(self):
+        """Ranking scores are computed for existing profiles and copied into their docs"""
+        apps = self.migrate('0003_merge_20261019_1229')
+        User_ = apps.get_model('auth', 'User')
+        Profile = apps.get_model('skills', 'UserProfile')
+        novice = Profile.objects.create(user=User_.objects.create(username='novice'), experience_level='beginner')
+        veteran = Profile.objects.create(user=User_.objects.create(username='veteran'), experience_level='expert',
+                                         total_lessons=300)
+
+        apps = self.migrate('0005_ranking_score')
+        scores = dict(apps.get_model('skills', 'UserProfile').objects.values_list('pk', 'ranking_score'))
+        self.assertGreater(scores[novice.pk], 0)
+        self.assertGreater(scores[veteran.pk], scores[novice.pk])
+        docs = dict(apps.get_model('skills', 'EducatorSearchDoc').objects.values_list('pk', 'ranking_score'))
+        self.assertEqual(docs, scores)
+
+class RankingScoreTestCase(TestCase):
+    def setUp(self):
+        cache.clear()
+
+    def make_educator(self, username, **profile_fields):
+        user = User.objects.create_user(username=username, password='testpass123')
+        profile = UserProfile.objects.create(user=user, **profile_fields)
+        skill, _ = Skill.objects.get_or_create(name='Chess', category='other')
+        TeachableSkill.objects.create(user_profile=profile, skill=skill, proficiency_level='expert')
+        return profile
+
+    def test_rating_is_bayesian_smoothed(self):
+        """A long track record outranks a single perfect rating"""
+        now = timezone.now()
+        newcomer = compute_ranking_score(5.0, 1, 1, 'expert', now, prior=4.0, now=now)
+        veteran = compute_ranking_score(4.8, 200, 1, 'expert', now, prior=4.0, now=now)
+        self.assertGreater(veteran, newcomer)
+
+    def test_score_maintained_on_save_and_used_for_ordering(self):
+        """Saving a profile rescores it and search ranks by the score"""
+        low = self.make_educator('low', rating=3.0, total_students=50)
+        high = self.make_educator('high', rating=4.9, total_students=50, total_lessons=300)
+        self.assertGreater(high.ranking_score, low.ranking_score)
+        self.assertEqual(EducatorSearchDoc.objects.get(pk=high.pk).ranking_score, high.ranking_score)
+
+        educators = filter_educators(QueryDict(''))
+        self.assertEqual([doc.pk for doc in educators], [high.pk, low.pk])
+
+    def test_rebuild_command(self):
+        """The nightly rebuild rescores rows changed behind the ORM's back"""
+        profile = self.make_educator('stale', rating=4.5, total_students=10)
+        UserProfile.objects.filter(pk=profile.pk).update(ranking_score=0)
+        call_command('rebuild_ranking_scores', stdout=StringIO())
+        profile.refresh_from_db()
+        self.assertGreater(profile.ranking_score, 0)
+        self.assertEqual(EducatorSearchDoc.objects.get(pk=profile.pk).ranking_score, profile.ranking_score)
+
+
+class ReviewAggregateTestCase(TestCase):
+    def setUp(self):
+        self.educator = User.objects.create_user(username='teacher', password='testpass123')
+        self.profile = UserProfile.objects.create(user=self.educator)
+        skill = Skill.objects.create(name='Yoga', category='sports')
+        self.teachable = TeachableSkill.objects.create(user_profile=self.profile, skill=skill,
+                                                       proficiency_level='expert')
+        self.learners = [User.objects.create_user(username=f'learner{i}', password='testpass123') for i in range(2)]
+        self.requests = [
+            SkillRequest.objects.create(learner=learner, educator=self.educator,
+                                        requested_skill=self.teachable, status='completed')
+            for learner in self.learners
+        ]
+
+    def test_insert_edit_delete_maintain_aggregates(self):
+        """Count, sum, histogram and average follow every change"""
+        first = submit_review(self.learners[0], 5, skill_request=self.requests[0])
+        submit_review(self.learners[1], 4, skill_request=self.requests[1])
+        self.profile.refresh_from_db()
+        self.assertEqual((self.profile.review_count, self.profile.review_sum), (2, 9))
+        self.assertEqual(self.profile.rating, Decimal('4.50'))
+        self.assertEqual(self.profile.rating_histogram[0], (5, 1, 50))
+
+        submit_review(self.learners[0], 3, skill_request=self.requests[0])
+        self.profile.refresh_from_db()
+        self.assertEqual((self.profile.rating_5_count, self.profile.rating_3_count), (0, 1))
+        self.assertEqual(self.profile.rating, Decimal('3.50'))
+        self.assertEqual(Review.objects.count(), 2)
+
+        Review.objects.get(pk=first.pk).delete()
+        Review.objects.filter(reviewer=self.learners[1]).delete()
+        self.profile.refresh_from_db()
+        self.assertEqual((self.profile.review_count, self.profile.review_sum), (0, 0))
+        self.assertEqual(self.profile.rating, Decimal('0'))
+        self.assertEqual(EducatorSearchDoc.objects.get(pk=self.profile.pk).review_count, 0)
+
+    def test_only_completed_requests_can_be_reviewed(self):
+        """Pending requests are rejected without touching aggregates"""
+        SkillRequest.objects.filter(pk=self.requests[0].pk).update(status='pending')
+        self.requests[0].refresh_from_db()
+        with self.assertRaises(ValidationError):
+            submit_review(self.learners[0], 5, skill_request=self.requests[0])
+        self.profile.refresh_from_db()
+        self.assertEqual(self.profile.review_count, 0)
+
+    def test_rating_range_and_session_membership(self):
+        """Out-of-range ratings and reviews from outside a session are rejected, not left to the database"""
+        for rating in ('0', '7'):
+            with self.assertRaises(ValidationError):
+                submit_review(self.learners[0], rating, skill_request=self.requests[0])
+        self.client.login(username='learner0', password='testpass123')
+        response = self.client.post(reverse('review_skill_request', args=[self.requests[0].pk]), {'comment': 'x'})
+        self.assertRedirects(response, reverse('view_profile', args=[self.educator.pk]))
+
+        session = Session.objects.create(user=self.educator, room_name='yoga-1', room_url='https://x.test/yoga-1',
+                                         status='completed')
+        with self.assertRaises(ValidationError):
+            submit_review(self.learners[0], 5, session=session, educator=self.educator)
+        SessionParticipant.objects.create(session=session, user=self.learners[0])
+        with self.assertRaises(ValidationError):
+            submit_review(self.learners[0], 5, session=session, educator=self.learners[1])
+        submit_review(self.learners[0], 5, session=session, educator=self.educator)
+        self.assertEqual(Review.objects.count(), 1)
+
+    def test_review_view(self):
+        """Learners post reviews from the request and see them on the profile"""
+        self.client.login(username='learner0', password='testpass123')
+        response = self.client.post(reverse('review_skill_request', args=[self.requests[0].pk]),
+                                    {'rating': '4', 'comment': 'Great class'})
+        self.assertRedirects(response, reverse('view_profile', args=[self.educator.pk]))
+        response = self.client.get(reverse('view_profile', args=[self.educator.pk]))
+        self.assertContains(response, 'Great class')
+        self.assertContains(response, '1 review')
+
+
+class ProfileCounterTestCase(TestCase):
+    def setUp(self):
+        self.educator = User.objects.create_user(username='host', password='testpass123')
+        self.profile = UserProfile.objects.create(user=self.educator)
+        skill = Skill.objects.create(name='Baking', category='cooking')
+        self.teachable = TeachableSkill.objects.create(user_profile=self.profile, skill=skill,
+                                                       proficiency_level='expert')
+        self.learner = User.objects.create_user(username='student', password='testpass123')
+
+    def make_request(self):
+        return SkillRequest.objects.create(learner=self.learner, educator=self.educator,
+                                           requested_skill=self.teachable, status='accepted')
+
+    def test_completing_requests_counts_distinct_students_once(self):
+        """Only the first completed request from a learner adds a student"""
+        first, second = self.make_request(), self.make_request()
+        stale = SkillRequest.objects.get(pk=first.pk)
+        self.assertTrue(complete_skill_request(first))
+        self.assertFalse(complete_skill_request(stale))
+        self.assertTrue(complete_skill_request(second))
+        self.profile.refresh_from_db()
+        self.assertEqual(self.profile.total_students, 1)
+        self.assertEqual(EducatorSearchDoc.objects.get(pk=self.profile.pk).total_students, 1)
+
+    def test_ending_session_counts_one_lesson(self):
+        """Ending a session is idempotent and stamps ended_at"""
+        session = Session.objects.create(user=self.educator, room_name='room-1', room_url='https://x.daily.co/room-1')
+        self.assertTrue(end_session(session))
+        self.assertFalse(end_session(session))
+        session.refresh_from_db()
+        self.profile.refresh_from_db()
+        self.assertEqual(session.status, 'completed')
+        self.assertIsNotNone(session.ended_at)
+        self.assertEqual(self.profile.total_lessons, 1)
+
+    def test_end_session_api(self):
+        """The host ends their session from the call page"""
+        session = Session.objects.create(user=self.educator, room_name='room-2', room_url='https://x.daily.co/room-2')
+        self.client.login(username='host', password='testpass123')
+        response = self.client.post(reverse('end_session_api'), data=json.dumps({'session_id': session.id}),
+                                    content_type='application/json')
+        self.assertEqual(response.json(), {'success': True, 'ended': True})
+
+    def test_reconcile_command_fixes_drift(self):
+        """Reconcile recomputes counters from the source rows"""
+        SkillRequest.objects.filter(pk=self.make_request().pk).update(status='completed')
+        UserProfile.objects.filter(pk=self.profile.pk).update(total_students=7, total_lessons=3)
+        call_command('reconcile_counters', stdout=StringIO())
+        self.profile.refresh_from_db()
+        self.assertEqual((self.profile.total_students, self.profile.total_lessons), (1, 0))
+
+
+class InboxTestCase(TestCase):
+    def setUp(self):
+        cache.clear()
+        self.educator = User.objects.create_user(username='busy', password='testpass123')
+        profile = UserProfile.objects.create(user=self.educator)
+        skill = Skill.objects.create(name='Drums', category='music')
+        self.teachable = TeachableSkill.objects.create(user_profile=profile, skill=skill,
+                                                       proficiency_level='expert')
+        self.requests = [
+            SkillRequest.objects.create(learner=User.objects.create_user(username=f'fan{i}'), educator=self.educator,
+                                        requested_skill=self.teachable, message=f'request {i}')
+            for i in range(5)
+        ]
+
+    def test_keyset_pages_cover_every_request_once(self):
+        """Walking the cursor returns all rows newest first without overlap"""
+        seen, cursor = [], None
+        while True:
+            page, cursor = inbox_page(self.educator, 'received', 'pending', cursor, limit=2)
+            seen.extend(r.pk for r in page)
+            if not cursor:
+                break
+        self.assertEqual(seen, [r.pk for r in reversed(self.requests)])
+
+        for forged in (f'{10 ** 30}:1', f'0:{10 ** 30}', 'x:1'):
+            cursor = base64.urlsafe_b64encode(forged.encode()).decode()
+            self.assertEqual(len(inbox_page(self.educator, 'received', 'pending', cursor, limit=2)[0]), 2)
+
+    def test_counts_are_cached_and_invalidated(self):
+        """Counts come from cache until a request changes"""
+        self.assertEqual(inbox_counts(self.educator)['pending'], 5)
+        with self.assertNumQueries(0):
+            self.assertEqual(inbox_counts(self.educator)['unread'], 5)
+        transition_skill_request(self.requests[0], 'accepted')
+        counts = inbox_counts(self.educator)
+        self.assertEqual((counts['pending'], counts['accepted']), (4, 1))
+
+    def test_inbox_views(self):
+        """The HTML inbox marks requests read and the API pages with a cursor"""
+        self.client.login(username='busy', password='testpass123')
+        response = self.client.get(reverse('inbox'))
+        self.assertContains(response, 'request 4')
+        self.assertEqual(inbox_counts(self.educator)['unread'], 0)
+
+        data = self.client.get(reverse('inbox_api'), {'limit': 3}).json()
+        self.assertEqual(len(data['results']), 3)
+        data = self.client.get(reverse('inbox_api'), {'limit': 3, 'cursor': data['next_cursor']}).json()
+        self.assertEqual([r['message'] for r in data['results']], ['request 1', 'request 0'])
+        self.assertIsNone(data['next_cursor'])
+
+
+class SkillRequestServiceTestCase(TestCase):
+    def setUp(self):
+        cache.clear()
+        self.educator = User.objects.create_user(username='tutor', password='testpass123')
+        profile = UserProfile.objects.create(user=self.educator)
+        skill = Skill.objects.create(name='Chess', category='other')
+        self.teachable = TeachableSkill.objects.create(user_profile=profile, skill=skill,
+                                                       proficiency_level='expert')
+        self.learner = User.objects.create_user(username='pupil', password='testpass123')
+
+    def test_create_is_a_single_insert(self):
+        """All offer fields are written by one INSERT"""
+        with self.assertNumQueries(3):  # savepoint, insert, release
+            skill_request = create_skill_request(self.learner, self.teachable, is_payment_offer=False,
+                                                 offered_skill='Guitar', message='Swap?')
+        skill_request.refresh_from_db()
+        self.assertEqual((skill_request.offered_skill, skill_request.offered_amount), ('Guitar', None))
+
+    def test_duplicate_pending_request_is_rejected(self):
+        """A second pending request for the same skill is refused until the first is resolved"""
+        first = create_skill_request(self.learner, self.teachable, offered_amount=20)
+        with self.assertRaises(ValidationError):
+            create_skill_request(self.learner, self.teachable, offered_amount=25)
+        transition_skill_request(first, 'rejected')
+        create_skill_request(self.learner, self.teachable, offered_amount=25)
+        self.assertEqual(SkillRequest.objects.filter(learner=self.learner).count(), 2)
+
+    def test_invalid_and_stale_transitions(self):
+        """Disallowed moves raise and a stale copy loses the race"""
+        skill_request = create_skill_request(self.learner, self.teachable, offered_amount=20)
+        stale = SkillRequest.objects.get(pk=skill_request.pk)
+        with self.assertRaises(ValidationError):
+            transition_skill_request(skill_request, 'completed')
+        self.assertTrue(transition_skill_request(skill_request, 'accepted'))
+        self.assertFalse(transition_skill_request(stale, 'rejected'))
+        self.assertEqual(SkillRequest.objects.get(pk=skill_request.pk).status, 'accepted')
+
+    def test_educator_updates_status_from_inbox(self):
+        """Only the educator can move a received request"""
+        skill_request = create_skill_request(self.learner, self.teachable, offered_amount=20)
+        url = reverse('update_skill_request_status', args=[skill_request.pk])
+        self.client.login(username='pupil', password='testpass123')
+        self.assertEqual(self.client.post(url, {'status': 'accepted'}).status_code, 404)
+        self.client.login(username='tutor', password='testpass123')
+        response = self.client.post(url, {'status': 'accepted'})
+        self.assertRedirects(response, f"{reverse('inbox')}?box=received&status=accepted", fetch_redirect_response=False)
+        self.assertEqual(SkillRequest.objects.get(pk=skill_request.pk).status, 'accepted')
+
+
+class BarterMatchingTestCase(TestCase):
+    def setUp(self):
+        cache.clear()
+        self.users, self.skills = [], []
+        for name in ('ann', 'ben', 'cat'):
+            user = User.objects.create_user(username=name, password='testpass123')
+            skill = Skill.objects.create(name=f'{name} skill', category='other')
+            TeachableSkill.objects.create(user_profile=UserProfile.objects.create(user=user), skill=skill,
+                                          proficiency_level='expert')
+            self.users.append(user)
+            self.skills.append(skill)
+
+    def swap(self, learner, educator):
+        """learner asks educator for their skill, offering a swap"""
+        teachable = TeachableSkill.objects.get(user_profile__user=self.users[educator])
+        with self.captureOnCommitCallbacks(execute=True):
+            return create_skill_request(self.users[learner], teachable, is_payment_offer=False,
+                                        offered_skill=self.skills[learner].name)
+
+    def test_graph_lists_each_cycle_once(self):
+        """A full sweep reports every 2- and 3-cycle exactly once"""
+        graph = BarterGraph(wants=[(1, 20), (2, 10), (2, 30), (3, 10)],
+                            teaches=[(1, 10), (2, 20), (3, 30)])
+        cycles, complete = graph.cycles(budget=1)
+        self.assertTrue(complete)
+        self.assertEqual(sorted(len(c) for c in cycles), [2, 3])
+        self.assertIn(((1, 2, 20), (2, 1, 10)), cycles)
+        self.assertIn(((1, 2, 20), (2, 3, 30), (3, 1, 10)), cycles)
+        self.assertEqual(len(graph.cycles_through(3, budget=1)[0]), 1)
+
+    def test_new_request_completes_three_way_swap(self):
+        """The request that closes a cycle suggests it to all three people"""
+        self.swap(0, 1)
+        self.swap(1, 2)
+        self.assertEqual(barter_suggestions(self.users[0]), [])
+        self.swap(2, 0)
+        for user in self.users:
+            self.assertEqual(len(barter_suggestions(user)), 1)
+
+    def test_resolved_request_drops_suggestion(self):
+        """Once a request in the cycle leaves pending the suggestion disappears"""
+        first = self.swap(0, 1)
+        self.swap(1, 0)
+        self.client.login(username='ann', password='testpass123')
+        data = self.client.get(reverse('barter_suggestions_api')).json()
+        self.assertEqual([step['skill'] for step in data['suggestions'][0]['steps']], ['ben skill', 'ann skill'])
+        transition_skill_request(first, 'rejected')
+        self.assertEqual(self.client.get(reverse('barter_suggestions_api')).json(), {'suggestions': []})
+
+    def test_sweep_command_rebuilds_suggestions(self):
+        """The full sweep finds cycles even when incremental matching never ran"""
+        self.swap(0, 1)
+        self.swap(1, 0)
+        cache.clear()
+        call_command('find_barter_cycles', stdout=StringIO())
+        self.assertEqual(len(barter_suggestions(self.users[1])), 1)
+
+
+class SchedulingTestCase(TestCase):
+    def setUp(self):
+        self.educator = User.objects.create_user(username='mentor', password='testpass123')
+        self.profile = UserProfile.objects.create(user=self.educator, available_days=['Monday'],
+                                                  preferred_time='morning')
+        self.learner = User.objects.create_user(username='mentee', password='testpass123')
+        self.sunday = timezone.make_aware(datetime(2030, 1, 6, 12))
+        self.monday_10 = timezone.make_aware(datetime(2030, 1, 7, 10))
+
+    def test_interval_index_overlaps(self):
+        """Touching intervals don't clash; overlapping ones do"""
+        index = IntervalIndex([(11, 12), (9, 10)])
+        self.assertFalse(index.overlaps(10, 11))
+        self.assertTrue(index.overlaps(9, 10))
+        self.assertTrue(index.overlaps(8, 13))
+        self.assertFalse(index.overlaps(12, 13))
+
+    def test_slots_follow_availability_and_bookings(self):
+        """Only Monday morning is offered and booked time is removed"""
+        slots = available_slots(self.profile, days=2, duration=60, now=self.sunday)
+        self.assertEqual(len(slots), 9)  # 9:00 to 11:00 every 15 minutes
+        reserve_slot(self.educator, self.learner, self.monday_10, duration=60, now=self.sunday)
+        slots = available_slots(self.profile, days=2, duration=60, now=self.sunday)
+        self.assertEqual([start.hour for start, _end in slots], [9, 11])
+
+    def test_reserve_rejects_conflicts(self):
+        """Double bookings, bad durations and out-of-hours slots are refused"""
+        reserve_slot(self.educator, self.learner, self.monday_10, duration=30, now=self.sunday)
+        other = User.objects.create_user(username='late')
+        for start, duration in ((self.monday_10, 30), (self.monday_10 + timedelta(minutes=15), 15),
+                                (self.monday_10, 90), (self.monday_10 + timedelta(hours=2), 30)):
+            with self.assertRaises(ValidationError):
+                reserve_slot(self.educator, other, start, duration=duration, now=self.sunday)
+        others_request = SkillRequest.objects.create(
+            learner=other, educator=self.educator, status='accepted',
+            requested_skill=TeachableSkill.objects.create(user_profile=self.profile, proficiency_level='expert',
+                                                          skill=Skill.objects.create(name='Chess', category='other')))
+        with self.assertRaises(ValidationError):
+            reserve_slot(self.educator, self.learner, self.monday_10 + timedelta(hours=1), skill_request=others_request,
+                         now=self.sunday)
+        self.assertEqual(Booking.objects.count(), 1)
+
+    def test_booking_api(self):
+        """Booking the same slot twice returns a conflict"""
+        self.client.login(username='mentee', password='testpass123')
+        payload = json.dumps({'educator_id': self.educator.id, 'start': self.monday_10.isoformat(), 'duration': 30})
+        response = self.client.post(reverse('book_session_api'), data=payload, content_type='application/json')
+        self.assertEqual(response.status_code, 201)
+        response = self.client.post(reverse('book_session_api'), data=payload, content_type='application/json')
+        self.assertEqual(response.status_code, 409)
+        response = self.client.get(reverse('educator_slots_api', args=[self.educator.id]), {'duration': 45})
+        self.assertEqual(response.json()['duration'], 45)
+
+    def test_booking_api_rejects_malformed_bodies(self):
+        """A body that isn't an object, or a duration that isn't a number, is a 400 rather than a crash"""
+        self.client.login(username='mentee', password='testpass123')
+        start = self.monday_10.isoformat()
+        for body in ([self.educator.id, start], 'book me', 30,
+                     {'educator_id': self.educator.id, 'start': start, 'duration': 'half an hour'},
+                     {'educator_id': self.educator.id, 'start': start, 'duration': [30]}):
+            response = self.client.post(reverse('book_session_api'), data=json.dumps(body),
+                                        content_type='application/json')
+            self.assertEqual(response.status_code, 400, body)
+        self.assertFalse(Booking.objects.exists())
+
+
+class RoomRegistryTestCase(TestCase):
+    def setUp(self):
+        cache.clear()
+        self.host = User.objects.create_user(username='opener', password='testpass123')
+        self.guest = User.objects.create_user(username='joiner', password='testpass123')
+
+    def test_second_joiner_reuses_session(self):
+        """Two people entering the same code share one Session"""
+        for username in ('opener', 'joiner', 'joiner'):
+            self.client.login(username=username, password='testpass123')
+            response = self.client.get(reverse('start_session_by_code', args=['team-sync']))
+            self.assertEqual(response.status_code, 200)
+        session = Session.objects.get(room_name='team-sync')
+        self.assertEqual(session.user, self.host)
+        self.assertEqual(
+            dict(session.participants.values_list('user__username', 'role')),
+            {'opener': 'host', 'joiner': 'participant'},
+        )
+
+    def test_rejoin_is_one_read(self):
+        """A cached room and an existing participant cost a single query"""
+        join_room('standup', 'https://x.daily.co/standup', self.host)
+        with self.assertNumQueries(1):
+            room = join_room('standup', 'https://x.daily.co/standup', self.host)
+        self.assertEqual(room['host_id'], self.host.id)
+
+    def test_code_reused_after_session_ends(self):
+        """Ending a session forgets the room and the next join reopens it"""
+        room = join_room('weekly', 'https://x.daily.co/weekly', self.host)
+        session = Session.objects.get(pk=room['id'])
+        end_session(session)
+        Session.objects.filter(pk=session.pk).update(last_activity_at=timezone.now() - timedelta(days=1))
+        # The host rejoins as an existing participant, so nothing else touches the session
+        self.assertEqual(join_room('weekly', 'https://x.daily.co/weekly', self.host)['id'], session.id)
+        session.refresh_from_db()
+        self.assertEqual((session.status, session.ended_at, session.duration), ('active', None, None))
+        self.assertLess(timezone.now() - session.last_activity_at, timedelta(minutes=1))
+        join_room('weekly', 'https://x.daily.co/weekly', self.guest)
+        self.assertEqual(SessionParticipant.objects.filter(session=session).count(), 2)
+
+
+class SessionReaperTestCase(TestCase):
+    def setUp(self):
+        cache.clear()
+        self.host = User.objects.create_user(username='teacher', password='testpass123')
+        self.profile = UserProfile.objects.create(user=self.host)
+        self.guest = User.objects.create_user(username='visitor', password='testpass123')
+
+    def open_room(self, name, idle_minutes, guest=True):
+        room = join_room(name, f'https://x.daily.co/{name}', self.host)
+        if guest:
+            join_room(name, f'https://x.daily.co/{name}', self.guest)
+        last_activity = timezone.now() - timedelta(minutes=idle_minutes)
+        Session.objects.filter(pk=room['id']).update(
+            started_at=last_activity - timedelta(minutes=30), last_activity_at=last_activity,
+        )
+        return Session.objects.get(pk=room['id'])
+
+    def test_reaper_closes_only_idle_sessions(self):
+        """Attended idle sessions complete, empty ones are cancelled, live ones stay"""
+        attended = self.open_room('attended', 180)
+        empty = self.open_room('empty', 180, guest=False)
+        live = self.open_room('live', 5)
+        call_command('reap_sessions', '--ttl-minutes=120', '--batch-size=1', stdout=StringIO())
+
+        attended.refresh_from_db()
+        self.assertEqual(attended.status, 'completed')
+        self.assertEqual(attended.ended_at, attended.last_activity_at)
+        self.assertEqual(attended.duration, timedelta(minutes=30))
+        self.assertEqual(Session.objects.get(pk=empty.pk).status, 'cancelled')
+        self.assertEqual(Session.objects.get(pk=live.pk).status, 'active')
+        self.profile.refresh_from_db()
+        self.assertEqual(self.profile.total_lessons, 1)
+
+    def test_heartbeat_keeps_session_alive(self):
+        """A heartbeat moves last activity forward so the reaper skips the session"""
+        session = self.open_room('pinged', 180)
+        self.client.force_login(self.guest)
+        response = self.client.post(reverse('session_heartbeat_api'), data=json.dumps({'session_id': session.id}),
+                                    content_type='application/json')
+        self.assertEqual(response.json(), {'success': True, 'active': True})
+        call_command('reap_sessions', stdout=StringIO())
+        self.assertEqual(Session.objects.get(pk=session.pk).status, 'active')
+
+    def test_heartbeat_requires_membership(self):
+        """Anonymous callers and outsiders cannot keep someone else's session alive"""
+        session = self.open_room('guarded', 180)
+        url, body = reverse('session_heartbeat_api'), json.dumps({'session_id': session.id})
+        self.assertEqual(self.client.post(url, data=body, content_type='application/json').status_code, 403)
+        self.client.force_login(User.objects.create_user(username='stranger', password='testpass123'))
+        self.assertEqual(self.client.post(url, data=body, content_type='application/json').status_code, 403)
+        self.assertEqual(Session.objects.get(pk=session.pk).last_activity_at, session.last_activity_at)
+
+    def test_end_session_records_duration(self):
+        """Ending a session stores how long it lasted"""
+        session = self.open_room('short', 0)
+        end_session(session, ended_at=session.started_at + timedelta(minutes=45))
+        session.refresh_from_db()
+        self.assertEqual(session.duration, timedelta(minutes=45))
+
+
+# The buffer needs a shared cache unless forced on; the long interval keeps
+# the background flusher out of the other tests
+@override_settings(NOTES_BUFFER=True, NOTES_FLUSH_INTERVAL=3600)
+class NotesBufferTestCase(TestCase):
+    def setUp(self):
+        cache.clear()
+        self.host = User.objects.create_user(username='scribe', password='testpass123')
+        self.session = Session.objects.create(user=self.host, room_name='notes-room',
+                                              room_url='https://x.daily.co/notes-room')
+
+    def save(self, base_version, *diffs):
+        return self.client.post(reverse('save_session_notes_api'), content_type='application/json', data=json.dumps(
+            {'session_id': self.session.id, 'base_version': base_version, 'diffs': list(diffs)}
+        ))
+
+    def test_apply_diffs(self):
+        """Diffs are applied in order and must stay inside the text"""
+        self.assertEqual(apply_diffs('hello world', [{'start': 0, 'end': 5, 'text': 'goodbye'},
+                                                     {'start': 13, 'end': 13, 'text': '!'}]), 'goodbye world!')
+        with self.assertRaises(ValueError):
+            apply_diffs('short', [{'start': 3, 'end': 9, 'text': ''}])
+
+    def test_diffs_are_buffered_until_flush(self):
+        """Saves update the cached copy; the database sees one write on flush"""
+        self.assertEqual(self.save(0, {'start': 0, 'end': 0, 'text': 'Loops'}).json()['version'], 1)
+        self.assertEqual(self.save(1, {'start': 5, 'end': 5, 'text': ' and lists'}).json()['version'], 2)
+        self.assertFalse(SessionNotes.objects.exists())
+        self.assertEqual(flush_notes(), 1)
+        self.assertEqual(flush_notes(), 0)
+        notes = SessionNotes.objects.get(session=self.session)
+        self.assertEqual((notes.notes, notes.version), ('Loops and lists', 2))
+
+    def test_stale_version_conflicts(self):
+        """A save based on an old version gets 409 with the current text"""
+        self.save(0, {'start': 0, 'end': 0, 'text': 'first'})
+        response = self.save(0, {'start': 0, 'end': 0, 'text': 'second'})
+        self.assertEqual(response.status_code, 409)
+        self.assertEqual((response.json()['notes'], response.json()['version']), ('first', 1))
+
+    def test_session_end_flushes(self):
+        """Ending the session writes whatever is still buffered"""
+        update_notes(self.session.id, 0, [{'start': 0, 'end': 0, 'text': 'wrap up'}])
+        end_session(self.session)
+        self.assertEqual(SessionNotes.objects.get(session=self.session).notes, 'wrap up')
+
+    @override_settings(NOTES_BUFFER=None)
+    def test_per_process_cache_writes_through(self):
+        """Without a shared cache every save goes straight to the database, versioned there"""
+        self.assertFalse(buffered())
+        self.assertEqual(self.save(0, {'start': 0, 'end': 0, 'text': 'Loops'}).json()['version'], 1)
+        notes = SessionNotes.objects.get(session=self.session)
+        self.assertEqual((notes.notes, notes.version), ('Loops', 1))
+        response = self.save(0, {'start': 0, 'end': 0, 'text': 'stale'})
+        self.assertEqual((response.status_code, response.json()['notes']), (409, 'Loops'))
+        self.assertEqual(self.save(1, {'start': 5, 'end': 5, 'text': '!'}).json()['version'], 2)
+        self.assertEqual(SessionNotes.objects.get(session=self.session).notes, 'Loops!')
+        self.assertEqual(cache.get(DIRTY_KEY), None)
+
+    def test_queries_per_save(self):
+        """A buffered save only records activity; a written-through one reads and updates the notes once"""
+        self.save(0, {'start': 0, 'end': 0, 'text': 'Loops'})
+        with self.assertNumQueries(1):
+            self.save(1, {'start': 5, 'end': 5, 'text': '!'})
+        flush_notes()
+        with self.settings(NOTES_BUFFER=False):
+            with self.assertNumQueries(3):
+                self.save(2, {'start': 6, 'end': 6, 'text': '?'})
+            with self.assertNumQueries(3):
+                self.client.post(reverse('save_session_notes_api'), content_type='application/json',
+                                 data=json.dumps({'session_id': self.session.id, 'notes': 'Rewritten'}))
+        notes = SessionNotes.objects.get(session=self.session)
+        self.assertEqual((notes.notes, notes.version), ('Rewritten', 4))
+
+
+@override_settings(LIVE_BATCH_WINDOW=0)
+class LiveChannelTestCase(TestCase):
+    def setUp(self):
+        cache.clear()
+        self.host = User.objects.create_user(username='streamer', password='testpass123')
+        self.session = Session.objects.create(user=self.host, room_name='live-room',
+                                              room_url='https://x.daily.co/live-room')
+        guest = User.objects.create_user(username='listener', password='testpass123')
+        SessionParticipant.objects.create(session=self.session, user=guest)
+        self.outsider = User.objects.create_user(username='lurker', password='testpass123')
+        self.cookies = {}
+        for user in (self.host, guest, self.outsider):
+            client = Client()
+            client.force_login(user)
+            self.cookies[user.username] = client.cookies[settings.SESSION_COOKIE_NAME].value
+
+    async def connect(self, session_id=None, username='streamer', origin='http://testserver'):
+        path = f'/ws/session/{session_id or self.session.id}/'
+        headers = [(b'origin', origin.encode())]
+        if username:
+            headers.append((b'cookie', f'{settings.SESSION_COOKIE_NAME}={self.cookies[username]}'.encode()))
+        socket = ApplicationCommunicator(live_application, {'type': 'websocket', 'path': path, 'headers': headers})
+        await socket.send_input({'type': 'websocket.connect'})
+        return socket, await socket.receive_output(1)
+
+    async def send(self, socket, message):
+        await socket.send_input({'type': 'websocket.receive', 'text': json.dumps(message)})
+
+    async def receive(self, socket):
+        return json.loads((await socket.receive_output(1))['text'])
+
+    async def close(self, *sockets):
+        for socket in sockets:
+            await socket.send_input({'type': 'websocket.disconnect', 'code': 1000})
+            await socket.wait(1)
+
+    async def test_unknown_session_is_refused(self):
+        """Connecting to a session that doesn't exist closes with 4404"""
+        _socket, event = await self.connect(session_id=999999)
+        self.assertEqual(event, {'type': 'websocket.close', 'code': 4404})
+
+    async def test_only_members_from_our_pages_may_connect(self):
+        """Anonymous users, non-participants and cross-site pages are closed with 4403"""
+        for kwargs in ({'username': None}, {'username': 'lurker'},
+                       {'username': 'listener', 'origin': 'https://evil.example'}):
+            _socket, event = await self.connect(**kwargs)
+            self.assertEqual(event, {'type': 'websocket.close', 'code': 4403}, kwargs)
+        socket, event = await self.connect(username='listener')
+        self.assertEqual(event['type'], 'websocket.accept')
+        await self.close(socket)
+
+    async def test_transcript_segments_reach_other_participants(self):
+        """Segments are acked to the sender and relayed to everyone else"""
+        (alice, accepted), (bob, _accepted) = await self.connect(), await self.connect(username='listener')
+        self.assertEqual(accepted['type'], 'websocket.accept')
+        await self.send(alice, {'type': 'transcript', 'segments': [{'speaker': 'Alice', 'text': 'Hi there'},
+                                                                   {'speaker': 'Alice', 'text': ' '}]})
+        self.assertEqual(await self.receive(alice), {'type': 'ack', 'received': 1, 'total': 1})
+        relayed = await self.receive(bob)
+        self.assertEqual(relayed['segments'][0]['text'], 'Hi there')
+        await self.close(alice, bob)
+
+    async def test_notes_diffs_are_versioned(self):
+        """Notes edits are saved, pushed to peers, and stale edits conflict"""
+        (alice, _a), (bob, _b) = await self.connect(), await self.connect(username='listener')
+        diff = {'start': 0, 'end': 0, 'text': 'Agenda'}
+        await self.send(alice, {'type': 'notes', 'base_version': 0, 'diffs': [diff]})
+        self.assertEqual(await self.receive(alice), {'type': 'notes_saved', 'version': 1})
+        self.assertEqual(await self.receive(bob), {'type': 'notes', 'version': 1, 'diffs': [diff]})
+        await self.send(bob, {'type': 'notes', 'base_version': 0, 'diffs': [diff]})
+        self.assertEqual(await self.receive(bob), {'type': 'notes_conflict', 'version': 1, 'notes': 'Agenda'})
+        await self.close(alice, bob)
+
+    @override_settings(LIVE_QUEUE_SIZE=1)
+    async def test_slow_consumer_is_closed(self):
+        """A connection whose queue fills up is closed with 1013 instead of buffering forever"""
+        conn = Connection(None)
+        conn.push({'type': 'pong'})
+        conn.push({'type': 'pong'})
+        self.assertTrue(conn.overflowed)
+        sent = []
+
+        async def send(event):
+            sent.append(event)
+
+        await _sender(conn, send)
+        self.assertEqual(sent, [{'type': 'websocket.close', 'code': 1013}])
+
+
+@override_settings(JOBS_RUN_INLINE=True, JOBS_POLL_INTERVAL=0)
+class BackgroundJobTestCase(TestCase):
+    def setUp(self):
+        cache.clear()
+        self.host = User.objects.create_user(username='recorder', password='testpass123')
+        self.session = Session.objects.create(user=self.host, room_name='rec-room',
+                                              room_url='https://x.daily.co/rec-room')
+        self.client.force_login(self.host)
+
+    def stream(self, url, **headers):
+        response = self.client.get(url, **headers)
+        self.assertEqual(response['Content-Type'], 'text/event-stream')
+        return b''.join(response.streaming_content).decode()
+
+    def test_async_recording_streams_stages(self):
+        """An async request returns 202 and the stream reports each stage then the result"""
+        response = self.client.post(reverse('process_recording_api'), content_type='application/json',
+                                    data=json.dumps({'room_name': 'rec-room', 'session_id': self.session.id,
+                                                     'async': True}))
+        self.assertEqual(response.status_code, 202)
+        body = self.stream(response.json()['events_url'])
+        for stage in ('downloaded', 'transcoded', 'transcribing', 'summarizing'):
+            self.assertIn(f'"stage": "{stage}"', body)
+        self.assertIn('event: done', body)
+        self.assertIn('Teacher: Welcome', body)
+        self.assertTrue(SessionSummary.objects.filter(session=self.session).exists())
+
+    def test_summary_stored_without_reading_first(self):
+        """The first summary is inserted, later ones replace it with one UPDATE; gone sessions are skipped"""
+        store_summary(self.session.id, 'Teacher: one', 'First', 'en')
+        with self.assertNumQueries(2):
+            store_summary(self.session.id, 'Teacher: two', 'Second', 'en')
+        summary = SessionSummary.objects.get(session=self.session)
+        self.assertEqual((str(summary.transcript), str(summary.summary)), ('Teacher: two', 'Second'))
+        store_summary(self.session.id + 1, 'Teacher: lost', 'Lost', 'en')
+        self.assertEqual(SessionSummary.objects.count(), 1)
+
+    def test_stream_resumes_after_last_event_id(self):
+        """A reconnecting client only receives events it has not seen"""
+        def work(progress):
+            for i in range(1, 4):
+                progress(f'step {i}', i * 10)
+            return 'ok'
+
+        job = start_job('demo', work, session_id=self.session.id)
+        body = self.stream(reverse('job_events', args=[job['id']]), HTTP_LAST_EVENT_ID='2')
+        self.assertNotIn('step 1', body)
+        self.assertNotIn('step 2', body)
+        self.assertIn('step 3', body)
+        self.assertIn('"result": "ok"', body)
+
+    def test_retry_reuses_running_job(self):
+        """Starting the same work while it runs attaches to the existing job"""
+        seen = []
+
+        def work(progress):
+            seen.append(start_job('demo', work, dedupe='same')['id'])
+            return 'done once'
+
+        job = start_job('demo', work, dedupe='same')
+        self.assertEqual(seen, [job['id']])
+        self.assertEqual(job['result'], 'done once')
+
+    async def test_asgi_stream_is_async_and_state_is_shared(self):
+        """Under ASGI events come from an async iterator; job state survives without the cache"""
+        job = await sync_to_async(start_job)('demo', lambda progress: progress('halfway', 50) or 'ok',
+                                             session_id=self.session.id)
+        await sync_to_async(cache.clear)()
+        client = AsyncClient()
+        await sync_to_async(client.force_login)(self.host)
+        response = await client.get(reverse('job_events', args=[job['id']]))
+        self.assertTrue(response.is_async)
+        body = ''.join([chunk.decode() async for chunk in response.streaming_content])
+        self.assertIn('"stage": "halfway"', body)
+        self.assertIn('event: done', body)
+
+    def test_failures_and_session_stream(self):
+        """A failing job ends its stream with a failed event"""
+        def broken(progress):
+            raise RuntimeError('transcoder crashed')
+
+        start_job('recording', broken, session_id=self.session.id)
+        body = self.stream(reverse('session_job_events', args=[self.session.id]))
+        self.assertIn('event: failed', body)
+        self.assertIn('transcoder crashed', body)
+
+    def test_only_session_members_see_jobs(self):
+        """Anonymous users and non-members are refused; a participant can follow the job"""
+        job = start_job('summary', lambda progress: {'summary': 'private'}, session_id=self.session.id)
+        urls = [reverse('job_status_api', args=[job['id']]), reverse('job_events', args=[job['id']]),
+                reverse('session_job_events', args=[self.session.id])]
+        for url in urls:
+            self.assertEqual(Client().get(url).status_code, 302)
+        stranger, guest = Client(), Client()
+        stranger.force_login(User.objects.create_user(username='stranger', password='testpass123'))
+        learner = User.objects.create_user(username='guest', password='testpass123')
+        SessionParticipant.objects.create(session=self.session, user=learner)
+        guest.force_login(learner)
+        for url in urls:
+            self.assertEqual(stranger.get(url).status_code, 403)
+            self.assertEqual(guest.get(url).status_code, 200)
+        orphan = start_job('demo', lambda progress: 'ok')
+        self.assertEqual(self.client.get(reverse('job_status_api', args=[orphan['id']])).status_code, 403)
+
+
+class CompressedTextFieldTestCase(TestCase):
+    TRANSCRIPT = '\n'.join(f'Teacher: Let\'s start with example {i}.\nStudent: Can you explain the function?'
+                           for i in range(40))
+
+    def setUp(self):
+        self.host = User.objects.create_user(username='archivist', password='testpass123')
+        self.session = Session.objects.create(user=self.host, room_name='zip-room',
+                                              room_url='https://x.daily.co/zip-room')
+
+    def stored(self, column, table='skills_sessionsummary'):
+        with connection.cursor() as cursor:
+            cursor.execute(f'SELECT {column} FROM {table} WHERE session_id = %s', [self.session.id])
+            return cursor.fetchone()[0]
+
+    def test_text_is_stored_compressed(self):
+        """Long text is written compressed and reads back unchanged"""
+        SessionSummary.objects.create(session=self.session, transcript=self.TRANSCRIPT, summary='Loops')
+        raw = bytes(self.stored('transcript'))
+        self.assertTrue(raw.startswith(b'\x00\x01'))
+        self.assertLess(len(raw), len(self.TRANSCRIPT) // 5)
+        self.assertEqual(bytes(self.stored('summary'))[:2], b'\x00\x00')  # too short to gain
+        summary = SessionSummary.objects.get(session=self.session)
+        self.assertEqual((summary.transcript, summary.summary), (self.TRANSCRIPT, 'Loops'))
+
+    def test_decompression_is_lazy(self):
+        """Loading a row keeps the bytes; saving it untouched writes them back as they were"""
+        SessionSummary.objects.create(session=self.session, transcript=self.TRANSCRIPT, summary='Loops')
+        before = bytes(self.stored('transcript'))
+        summary = SessionSummary.objects.get(session=self.session)
+        self.assertIsInstance(summary.__dict__['transcript'], CompressedValue)
+        summary.language = 'en'
+        summary.save()
+        self.assertEqual(bytes(self.stored('transcript')), before)
+        self.assertEqual(summary.transcript, self.TRANSCRIPT)
+        self.assertEqual(summary.__dict__['transcript'], self.TRANSCRIPT)
+
+    def test_legacy_rows_are_recompressed(self):
+        """Plain-text rows from before the migration still read, and the command rewrites them"""
+        SessionNotes.objects.create(session=self.session, notes='placeholder')
+        with connection.cursor() as cursor:
+            cursor.execute('UPDATE skills_sessionnotes SET notes = %s WHERE session_id = %s',
+                           [self.TRANSCRIPT, self.session.id])
+        self.assertEqual(SessionNotes.objects.get(session=self.session).notes, self.TRANSCRIPT)
+
+        out = StringIO()
+        call_command('recompress_text', batch_size=1, stdout=out)
+        self.assertIn('Recompressed 1 session notess', out.getvalue())
+        self.assertTrue(bytes(self.stored('notes', 'skills_sessionnotes')).startswith(b'\x00\x01'))
+        self.assertEqual(SessionNotes.objects.get(session=self.session).notes, self.TRANSCRIPT)
+        call_command('recompress_text', stdout=out)
+        self.assertIn('Recompressed 0 session notess', out.getvalue())
+
+
+class SessionExportTestCase(TestCase):
+    TRANSCRIPT = '\n'.join(f'Teacher: Step {i} covers loops (and lists).\nStudent: Got it, thanks!' for i in range(60))
+
+    def setUp(self):
+        cache.clear()
+        self.host = User.objects.create_user(username='exporter', password='testpass123')
+        self.session = Session.objects.create(user=self.host, room_name='export-room',
+                                              room_url='https://x.daily.co/export-room')
+        SessionSummary.objects.create(session=self.session, transcript=self.TRANSCRIPT, summary='**Summary**\n- Loops')
+        SessionNotes.objects.create(session=self.session, notes='Practise for loops', version=1)
+        self.client.login(username='exporter', password='testpass123')
+
+    def export(self, fmt, **headers):
+        return self.client.get(reverse('export_session', args=[self.session.id, fmt]), **headers)
+
+    def test_text_export_and_etag(self):
+        """The export streams every section and revalidates with its ETag"""
+        response = self.export('txt')
+        self.assertEqual(response.status_code, 200)
+        body = b''.join(response.streaming_content).decode()
+        self.assertIn('Teacher: Step 59 covers loops (and lists).', body)
+        self.assertIn('== Notes ==\nPractise for loops', body)
+        self.assertEqual(self.export('txt', HTTP_IF_NONE_MATCH=response['ETag']).status_code, 304)
+
+        SessionNotes.objects.filter(session=self.session).update(notes='Changed', version=2)
+        self.assertEqual(self.export('txt', HTTP_IF_NONE_MATCH=response['ETag']).status_code, 200)
+
+    def test_range_requests(self):
+        """Byte ranges return the matching slice; a stale If-Range gets the whole export"""
+        full = b''.join(self.export('md').streaming_content)
+        response = self.export('md', HTTP_RANGE='bytes=100-149')
+        self.assertEqual(response.status_code, 206)
+        self.assertEqual(response['Content-Range'], f'bytes 100-149/{len(full)}')
+        self.assertEqual(b''.join(response.streaming_content), full[100:150])
+        self.assertEqual(b''.join(self.export('md', HTTP_RANGE='bytes=-10').streaming_content), full[-10:])
+
+        self.assertEqual(self.export('md', HTTP_RANGE='bytes=100-', HTTP_IF_RANGE='"stale"').status_code, 200)
+        self.assertEqual(self.export('md', HTTP_RANGE=f'bytes={len(full)}-').status_code, 416)
+
+    async def test_asgi_export_streams_asynchronously(self):
+        """Under ASGI the export is an async stream, byte for byte the same as under WSGI"""
+        client = AsyncClient()
+        await sync_to_async(client.force_login)(self.host)
+        url = reverse('export_session', args=[self.session.id, 'md'])
+        full = await sync_to_async(lambda: b''.join(self.export('md').streaming_content))()
+
+        response = await client.get(url)
+        self.assertTrue(response.is_async)
+        self.assertEqual(b''.join([chunk async for chunk in response.streaming_content]), full)
+        response = await client.get(url, headers={'Range': 'bytes=100-149'})
+        self.assertEqual(response.status_code, 206)
+        self.assertEqual(b''.join([chunk async for chunk in response.streaming_content]), full[100:150])
+
+    def test_ndjson_and_pdf(self):
+        """NDJSON has one record per line; the PDF is paginated with a valid xref table"""
+        lines = b''.join(self.export('ndjson').streaming_content).decode().splitlines()
+        records = [json.loads(line) for line in lines]
+        self.assertEqual(records[0]['type'], 'session')
+        self.assertEqual(records[2], {'type': 'transcript', 'line': 2, 'speaker': 'Student', 'text': 'Got it, thanks!'})
+        self.assertEqual(records[-1], {'type': 'notes', 'line': 1, 'text': 'Practise for loops'})
+
+        pdf = b''.join(self.export('pdf').streaming_content)
+        self.assertTrue(pdf.startswith(b'%PDF-1.4'))
+        self.assertIn(b'/Count 3', pdf)
+        xref_at = int(pdf.rsplit(b'startxref\n', 1)[1].split()[0])
+        self.assertTrue(pdf[xref_at:].startswith(b'xref'))
+        entries = pdf[xref_at:].split(b'\n')[3:]
+        for number in range(1, 4):
+            offset = int(entries[number - 1][:10])
+            self.assertTrue(pdf[offset:].startswith(b'%d 0 obj' % number))
+
+    def test_only_members_can_export(self):
+        """Someone who never joined the session gets 404"""
+        User.objects.create_user(username='stranger', password='testpass123')
+        self.client.login(username='stranger', password='testpass123')
+        self.assertEqual(self.export('txt').status_code, 404)
+        self.client.login(username='exporter', password='testpass123')
+        self.assertEqual(self.export('docx').status_code, 404)
+
+
+class DataMoveTestCase(TestCase):
+    class Interrupt(Exception):
+        pass
+
+    class FailingOutput:
+        """stdout that gives up after a number of progress lines, like a killed process"""
+
+        def __init__(self, lines):
+            self.lines = lines
+
+        def write(self, text):
+            self.lines -= 1
+            if self.lines < 0:
+                raise DataMoveTestCase.Interrupt()
+
+    def setUp(self):
+        self.tmp = tempfile.TemporaryDirectory()
+        self.path = os.path.join(self.tmp.name, 'export.ndjson')
+        self.educator = User.objects.create_user(username='mover', password='testpass123')
+        profile = UserProfile.objects.create(user=self.educator, bio='Moves data')
+        skill = Skill.objects.create(name='Packing', category='other')
+        teachable = TeachableSkill.objects.create(user_profile=profile, skill=skill, proficiency_level='expert')
+        self.learners = [User.objects.create_user(username=f'box{i}', password='testpass123') for i in range(5)]
+        for learner in self.learners:
+            SkillRequest.objects.create(learner=learner, educator=self.educator, requested_skill=teachable,
+                                        offered_amount=Decimal('12.50'))
+        session = Session.objects.create(user=self.educator, room_name='move-room', room_url='https://x.daily.co/m')
+        SessionSummary.objects.create(session=session, transcript='Teacher: Lift with your knees', summary='Knees')
+        SkillRequest.objects.update(created_at=timezone.now() - timedelta(days=30))
+
+    def tearDown(self):
+        self.tmp.cleanup()
+
+    def wipe(self):
+        Session.objects.all().delete()
+        User.objects.all().delete()
+        Skill.objects.all().delete()
+
+    def test_round_trip_remaps_keys(self):
+        """Exported rows come back with new ids, intact relations and their original timestamps"""
+        export_data(self.path, chunk_size=2)
+        self.wipe()
+        counts = import_data(self.path, batch_size=2)
+        self.assertEqual((counts['auth.user'], counts['skills.skillrequest']), (6, 5))
+
+        request = SkillRequest.objects.select_related('educator', 'requested_skill__skill').first()
+        self.assertEqual((request.educator.username, request.requested_skill.skill.name), ('mover', 'Packing'))
+        self.assertEqual(request.offered_amount, Decimal('12.50'))
+        self.assertLess(request.created_at, timezone.now() - timedelta(days=29))
+        summary = SessionSummary.objects.get(session__room_name='move-room')
+        self.assertEqual((summary.session.user.username, summary.transcript), ('mover', 'Teacher: Lift with your knees'))
+        self.assertTrue(User.objects.get(username='box0').check_password('testpass123'))
+
+    def test_existing_rows_are_matched(self):
+        """Users, skills and rooms already present are reused rather than duplicated"""
+        export_data(self.path)
+        SkillRequest.objects.all().delete()
+        counts = import_data(self.path)
+        self.assertEqual(counts['auth.user'], 0)
+        self.assertEqual(counts['skills.session'], 0)
+        self.assertEqual(User.objects.count(), 6)
+        self.assertEqual(SkillRequest.objects.filter(educator=self.educator).count(), 5)
+
+    def test_command_reconciles_counters_and_rejects_conflicts(self):
+        """Imported rows update the educator's counters and aggregates; constraint clashes are reported, not fatal"""
+        completed = SkillRequest.objects.filter(learner=self.learners[0])
+        completed.update(status='completed')
+        Review.objects.create(reviewer=self.learners[0], educator=self.educator, skill_request=completed.get(),
+                              rating=4)
+        export_data(self.path)
+        SkillRequest.objects.filter(learner=self.learners[0]).delete()
+        UserProfile.objects.update(total_students=0)
+        self.assertEqual(UserProfile.objects.get(user=self.educator).review_count, 0)
+
+        out = StringIO()
+        call_command('import_data', self.path, stdout=out)
+        profile = UserProfile.objects.get(user=self.educator)
+        self.assertEqual((profile.total_students, profile.review_count, profile.rating), (1, 1, Decimal('4.00')))
+        self.assertEqual(EducatorSearchDoc.objects.get(pk=profile.pk).review_count, 1)
+        # The four pending requests were still there, so the import clashed with them
+        self.assertEqual(SkillRequest.objects.count(), 5)
+        self.assertIn('4 rows were rejected by database constraints', out.getvalue())
+        self.assertIn('unique', out.getvalue().lower())
+
+    def test_interrupted_runs_resume(self):
+        """Rerunning after a failure continues from the checkpoint without repeating rows"""
+        export_data(os.path.join(self.tmp.name, 'reference.ndjson'))
+        state = self.path + '.state'
+        with self.assertRaises(self.Interrupt):
+            export_data(self.path, chunk_size=1, state_path=state, stdout=self.FailingOutput(3))
+        self.assertTrue(os.path.exists(state))
+        export_data(self.path, chunk_size=1, state_path=state)
+        with open(self.path, 'rb') as resumed, open(os.path.join(self.tmp.name, 'reference.ndjson'), 'rb') as reference:
+            self.assertEqual(resumed.read(), reference.read())
+
+        self.wipe()
+        state = self.path + '.import-state'
+        with self.assertRaises(self.Interrupt):
+            import_data(self.path, batch_size=2, state_path=state, stdout=self.FailingOutput(4))
+        import_data(self.path, batch_size=2, state_path=state)
+        self.assertEqual(User.objects.count(), 6)
+        self.assertEqual(SkillRequest.objects.count(), 5)
+        self.assertFalse(os.path.exists(state))
+
+
+class SyntheticDataTestCase(TestCase):
+    def test_command_builds_consistent_dataset(self):
+        """Profiles, requests and sessions line up, and the projections are rebuilt"""
+        out = StringIO()
+        call_command('generate_synthetic_data', users=200, batch_size=64, stdout=out)
+        self.assertIn('Created 200 users', out.getvalue())
+        self.assertEqual(UserProfile.objects.count(), 200)
+        self.assertFalse(SkillRequest.objects.filter(learner=F('educator')).exists())
+        completed = SkillRequest.objects.filter(status='completed').count()
+        self.assertGreater(completed, 0)
+        self.assertEqual(Session.objects.filter(status='completed').count(), completed)
+        self.assertEqual(SessionParticipant.objects.count(), 2 * completed)
+        self.assertEqual(EducatorSearchDoc.objects.count(), UserProfile.objects.count())
+        self.assertEqual(reconcile_counters(), 0)
+
+    def test_same_seed_same_data(self):
+        """Two runs with one seed differ only in names and ids"""
+        def snapshot(prefix, seed):
+            generate(60, seed=seed, prefix=prefix, batch_size=25)
+            requests = SkillRequest.objects.filter(learner__username__startswith=prefix).order_by('pk')
+            return (
+                list(UserProfile.objects.filter(user__username__startswith=prefix).order_by('pk')
+                     .values_list('location', 'hourly_rate', 'rating', 'available_days')),
+                list(requests.values_list('status', 'offered_amount', 'created_at')),
+            )
+
+        first = snapshot('alpha', 7)
+        self.assertEqual(snapshot('beta', 7), first)
+        self.assertNotEqual(snapshot('gamma', 8), first)
+
+    def test_existing_prefix_is_refused(self):
+        """Running twice with one prefix would collide on usernames"""
+        User.objects.create_user(username='synth0', password='testpass123')
+        with self.assertRaises(CommandError):
+            call_command('generate_synthetic_data', users=5, stdout=StringIO())
+
+
+class BenchmarkTestCase(TransactionTestCase):
+    def test_summary_percentiles(self):
+        """Nearest-rank percentiles, error count and query averages"""
+        samples = [(float(ms), 200, 4, ms != 100) for ms in range(1, 101)]
+        stats = summarize(samples, wall=2.0)
+        self.assertEqual((stats['p50_ms'], stats['p95_ms'], stats['p99_ms']), (50.0, 95.0, 99.0))
+        self.assertEqual((stats['errors'], stats['throughput_rps'], stats['queries_mean']), (1, 50.0, 4.0))
+
+    def test_compare_flags_regressions(self):
+        """Slower p95, extra queries and more errors are flagged; small noise is not"""
+        base = {'requests': 100, 'errors': 0, 'p95_ms': 40.0, 'throughput_rps': 100.0, 'queries_mean': 5.0}
+        baseline = {'endpoints': {'home': base}}
+        self.assertEqual(compare({'home': dict(base, p95_ms=48.0)}, baseline), [])
+        problems = compare({'home': dict(base, p95_ms=90.0, queries_mean=7.0, errors=5)}, baseline)
+        self.assertEqual(len(problems), 3)
+        self.assertIn('home: p95 90.0ms', problems[0])
+
+    @override_settings(ALLOWED_HOSTS=['testserver'], DAILY_API_KEY=None, GEMINI_API_KEY=None)
+    def test_runs_endpoints_concurrently(self):
+        """Each endpoint gets the requested number of measured requests and query counts"""
+        generate(30, seed=3, batch_size=10)
+        call_command('rebuild_search_index', stdout=StringIO())
+        ctx = prepare_context(2, seed=3)
+        results = run_benchmarks(ctx, ['view_profile', 'session_heartbeat'], concurrency=2, requests=6, warmup=1)
+        self.assertEqual(results['view_profile']['requests'], 6)
+        self.assertEqual(results['view_profile']['errors'], 0)
+        self.assertEqual(results['session_heartbeat']['queries_mean'], 3.0)
+
+
+    def test_worker_error_is_raised(self):
+        """A thread that fails during warmup stops the run with its own error"""
+        class Broken:
+            ok = (200,)
+
+            def build(self, ctx, index, rng):
+                if index == 1:
+                    raise RuntimeError('target misconfigured')
+                return 'get', '/', {}
+
+        ctx = {'users': [User.objects.create_user(username=f'bench{i}', password='testpass123') for i in range(2)]}
+        with self.assertRaisesMessage(RuntimeError, 'target misconfigured'):
+            _run_wsgi(Broken(), ctx, concurrency=2, total=4, warmup=1, seed=1)
+
+class StandInTestCase(TestCase):
+    def setUp(self):
+        self.daily = DailyStandIn().start()
+        self.gemini = GeminiStandIn(chunks=4).start()
+        self.addCleanup(self.daily.stop)
+        self.addCleanup(self.gemini.stop)
+
+    def test_daily_rooms_created_through_stand_in(self):
+        """DailyAPI posts to the configured base URL; a duplicate name falls back to a local room"""
+        with override_settings(**standin_settings(self.daily, self.gemini)):
+            room = DailyAPI().create_room('algebra-101')
+            again = DailyAPI().create_room('algebra-101')
+        self.assertTrue(room['api_created'])
+        self.assertEqual(room['config']['max_participants'], 10)
+        self.assertNotIn('api_created', again)
+        self.assertEqual(self.daily.counts, {200: 1, 400: 1})
+
+    def test_gemini_summary_streamed(self):
+        """The REST client joins the streamed chunks into the summary"""
+        with override_settings(**standin_settings(self.daily, self.gemini)):
+            service = AISummaryService()
+            summary = service.generate_summary('Teacher: Loops repeat code.', 'english')
+        self.assertTrue(service.use_real_ai)
+        self.assertTrue(summary.startswith('**Session Summary**'))
+        self.assertIn('**Action Items:**', summary)
+
+    def test_throttling_and_timeouts_fall_back_to_mock(self):
+        """429s and stalled responses end in the mock summary instead of an error"""
+        self.gemini.behaviour = Behaviour(throttle_rate=1.0, retry_after=7)
+        with override_settings(**standin_settings(self.daily, self.gemini)):
+            summary = AISummaryService().generate_summary('Teacher: hi', 'english')
+            self.assertIn('Covered 2 words', summary)
+            self.gemini.behaviour = Behaviour(hang_rate=1.0, hang_seconds=1)
+            with override_settings(GEMINI_API_TIMEOUT=0.2):
+                summary = AISummaryService().generate_summary('Teacher: hi', 'english')
+        self.assertIn('Covered 2 words', summary)
+        self.assertEqual(self.gemini.counts[429], 1)
+
+
+class QueryProfileMiddlewareTestCase(TestCase):
+    def setUp(self):
+        self.user = User.objects.create_user(username='profiled', password='testpass123')
+
+    def test_disabled_by_default(self):
+        """Without SQL_PROFILE the middleware drops out of the chain"""
+        response = Client().get(reverse('home'))
+        self.assertNotIn('Server-Timing', response)
+
+    def test_duplicate_shapes_and_origin(self):
+        """Queries differing only in literals share a shape that points back at the caller"""
+        self.assertEqual(normalize_sql("SELECT 1 FROM t WHERE a = 'x' AND b IN (%s, %s, %s) LIMIT 21"),
+                         'SELECT ? FROM t WHERE a = ? AND b IN (...) LIMIT ?')
+        profile = QueryProfile()
+        with connection.execute_wrapper(profile):
+            for pk in (1, 2, self.user.pk):
+                User.objects.filter(pk=pk).exists()
+        (shape, entry), = profile.duplicated
+        self.assertEqual((profile.count, entry['count']), (3, 3))
+        self.assertIn('skills/tests.py', entry['origin'])
+
+    def test_server_timing_and_slow_log(self):
+        """Enabled, every response gets Server-Timing and slow requests land in the log"""
+        path = os.path.join(tempfile.mkdtemp(), 'slow.log')
+        with override_settings(SQL_PROFILE=True, SQL_SLOW_LOG=path, SQL_SLOW_REQUEST_MS=0):
+            client = Client()
+            client.force_login(self.user)
+            response = client.get(reverse('home'))
+        for handler in slow_log.handlers[:]:
+            slow_log.removeHandler(handler)
+            handler.close()
+        self.assertRegex(response['Server-Timing'], r'^db;dur=[\d.]+;desc="\d+ queries", app;dur=')
+        with open(path) as f:
+            entry = json.loads(f.readline())
+        self.assertEqual((entry['path'], entry['status']), ('/', 200))
+        self.assertGreater(entry['queries'], 0)
+        self.assertTrue(entry['slowest'][0]['origin'])
+
+
+@override_settings(METRICS_ALLOWED_IPS=['127.0.0.1'])
+class MetricsTestCase(TestCase):
+    def setUp(self):
+        REGISTRY.reset()
+        self.addCleanup(REGISTRY.reset)
+
+    def test_external_calls_exposed(self):
+        """track_call records latency and outcome, rendered as Prometheus text"""
+        with track_call('ffmpeg', 'extract_audio'):
+            pass
+        with self.assertRaises(RuntimeError), track_call('ffmpeg', 'extract_audio'):
+            raise RuntimeError('boom')
+        body = Client().get(reverse('metrics')).content.decode()
+        self.assertIn('# TYPE bmb_external_call_duration_seconds histogram', body)
+        self.assertIn('bmb_external_calls_total{service="ffmpeg",operation="extract_audio",outcome="error"} 1', body)
+        self.assertIn('bmb_external_call_duration_seconds_bucket{service="ffmpeg",operation="extract_audio",le="+Inf"} 2',
+                      body)
+        self.assertIn('bmb_external_call_duration_seconds_count{service="ffmpeg",operation="extract_audio"} 2', body)
+
+    def test_request_latency_by_url_name(self):
+        """The middleware labels requests with their URL name; the endpoint can require a token"""
+        Client().get(reverse('home'))
+        Client().get('/no-such-page/')
+        body = Client().get(reverse('metrics')).content.decode()
+        self.assertIn('bmb_http_requests_total{view="home",method="GET",status="200"} 1', body)
+        self.assertIn('bmb_http_requests_total{view="<unresolved>",method="GET",status="404"} 1', body)
+        self.assertIn('bmb_http_request_duration_seconds_count{view="home",method="GET"} 1', body)
+        with override_settings(METRICS_TOKEN='s3cret'):
+            self.assertEqual(Client().get(reverse('metrics')).status_code, 403)
+            self.assertEqual(Client().get(reverse('metrics'), HTTP_AUTHORIZATION='Bearer s3cret').status_code, 200)
+
+    def test_closed_unless_configured(self):
+        """Without a token or an explicit address list, even loopback is refused"""
+        with self.settings():
+            del settings.METRICS_ALLOWED_IPS
+            self.assertEqual(Client().get(reverse('metrics')).status_code, 403)
+        with override_settings(METRICS_ALLOWED_IPS=['10.0.0.5']):
+            self.assertEqual(Client().get(reverse('metrics'), REMOTE_ADDR='10.0.0.5').status_code, 200)
+            self.assertEqual(Client().get(reverse('metrics')).status_code, 403)
+
+    def test_values_merged_across_processes(self):
+        """Counters from every worker's snapshot add up; gauges of exited workers are dropped"""
+        with override_settings(METRICS_MULTIPROC_DIR=tempfile.mkdtemp()):
+            EXTERNAL_CALLS.inc(service='daily', operation='create_room', outcome='ok')
+            pid = os.fork()
+            if pid == 0:
+                EXTERNAL_CALLS.inc(2, service='daily', operation='create_room', outcome='ok')
+                HTTP_IN_PROGRESS.inc(5)
+                flush()
+                os._exit(0)
+            os.waitpid(pid, 0)
+            HTTP_IN_PROGRESS.inc()
+            values = collect()
+        self.assertEqual(values['bmb_external_calls_total'][('daily', 'create_room', 'ok')], 3)
+        self.assertEqual(values['bmb_http_requests_in_progress'][()], 1)
+
+    def test_idle_worker_reports_its_last_change(self):
+        """A change inside the flush interval is written by the background thread, not left for the next one"""
+        directory = tempfile.mkdtemp()
+        with override_settings(METRICS_MULTIPROC_DIR=directory, METRICS_FLUSH_INTERVAL=0.05):
+            flush()
+            HTTP_IN_PROGRESS.inc()
+            HTTP_IN_PROGRESS.dec()  # the request ends; nothing else happens in this worker
+            time.sleep(0.3)
+            [path] = glob.glob(os.path.join(directory, 'metrics-*.json'))
+            with open(path) as f:
+                snapshot = json.load(f)['metrics']
+        self.assertEqual(snapshot['bmb_http_requests_in_progress'], [[[], 0]])
+
+
+class TracingTestCase(TestCase):
+    def setUp(self):
+        self.path = os.path.join(tempfile.mkdtemp(), 'spans.jsonl')
+        self.user = User.objects.create_user(username='traced', password='testpass123')
+
+    def spans(self):
+        with open(self.path) as f:
+            return [json.loads(line) for line in f]
+
+    def test_request_job_and_model_call_in_one_trace(self):
+        """A summary request continues the caller's trace through the job, the Gemini call and the DB writes"""
+        session_id = join_room('trace-room', 'https://example.daily.co/trace-room', self.user)['id']
+        caller = '00-' + 'a' * 32 + '-' + 'b' * 16 + '-01'
+        with GeminiStandIn() as gemini, override_settings(TRACING_ENABLED=True, TRACING_FILE=self.path,
+                                                           JOBS_RUN_INLINE=True, GEMINI_API_KEY='stand-in',
+                                                           GEMINI_API_BASE_URL=gemini.url):
+            response = Client().post(reverse('generate_summary_api'), json.dumps({
+                'session_id': session_id, 'transcript': 'Teacher: ' + 'loops repeat code. ' * 10,
+                'language': 'english', 'async': True,
+            }), content_type='application/json', HTTP_TRACEPARENT=caller)
+        self.assertEqual(response.status_code, 202)
+        self.assertEqual(response['X-Trace-Id'], 'a' * 32)
+        spans = {s['name']: s for s in self.spans()}
+        self.assertEqual({s['trace_id'] for s in spans.values()}, {'a' * 32})
+        self.assertEqual(spans['POST generate_summary_api']['parent_id'], 'b' * 16)
+        self.assertEqual(spans['job summary']['parent_id'], spans['enqueue summary']['span_id'])
+        self.assertEqual(spans['gemini.generate_summary']['parent_id'], spans['summary.generate']['span_id'])
+        writes = [s for s in self.spans() if s['name'].startswith(('INSERT skills_sessionsummary',
+                                                                    'UPDATE skills_sessionsummary'))]
+        self.assertTrue(writes)
+        self.assertEqual({s['parent_id'] for s in writes}, {spans['summary.store']['span_id']})
+
+    def test_otlp_export_and_breakdown(self):
+        """Spans reach an OTLP collector in batches and break down into total and self time"""
+        with CollectorStandIn() as collector, override_settings(TRACING_ENABLED=True,
+                                                                TRACING_OTLP_ENDPOINT=collector.url):
+            with span('outer'):
+                with self.assertRaises(ValueError), span('inner'):
+                    raise ValueError('bad input')
+            flush_traces()
+        self.assertEqual([s['name'] for s in collector.spans], ['inner', 'outer'])
+        self.assertEqual(collector.spans[0]['status'], 'error')
+        lines = breakdown(collector.spans)
+        self.assertTrue(lines[0].endswith('  outer'))
+        self.assertTrue(lines[1].endswith('    inner !'))
+
+    def test_failed_export_is_logged(self):
+        """An unreachable collector drops the batch with a warning"""
+        with override_settings(TRACING_ENABLED=True, TRACING_OTLP_ENDPOINT='http://127.0.0.1:1/v1/traces'), \
+                self.assertLogs('skills.tracing', 'WARNING') as logs:
+            with span('lost'):
+                pass
+            flush_traces()
+        self.assertIn('Trace export failed, dropped 1 spans', logs.output[0])
+
+
+def _spin(seconds):
+    end = time.perf_counter() + seconds
+    while time.perf_counter() < end:
+        pass
+
+
+class JobThreadTracingTestCase(TransactionTestCase):
+    # The pool's thread has its own connection, so the job row must be committed
+
+    def setUp(self):
+        self.path = os.path.join(tempfile.mkdtemp(), 'spans.jsonl')
+
+    def test_job_thread_continues_trace(self):
+        """Jobs on the worker pool pick the trace up from the traceparent stored with the job"""
+        def work(progress):
+            with span('work'):
+                return 'done'
+
+        with override_settings(TRACING_ENABLED=True, TRACING_FILE=self.path):
+            with span('caller') as caller:
+                job = start_job('probe', work)  # not in a transaction, so submitted straight away
+            for _ in range(200):
+                if get_job(job['id'])['status'] == 'done':
+                    break
+                time.sleep(0.01)
+        with open(self.path) as f:
+            spans = {s['name']: s for s in map(json.loads, f)}
+        self.assertEqual({s['trace_id'] for s in spans.values()}, {caller.trace_id})
+        self.assertEqual(spans['work']['parent_id'], spans['job probe']['span_id'])
+
+
+class ProfilingTestCase(TestCase):
+    def setUp(self):
+        self.dir = tempfile.mkdtemp()
+        self.settings = override_settings(PROFILING_ENABLED=True, PROFILING_DIR=self.dir, PROFILING_INTERVAL_MS=1)
+        self.settings.enable()
+        self.addCleanup(self.settings.disable)
+
+    def test_only_signed_requests_profiled(self):
+        """A forged header is ignored; a signed one saves a profile and lists it in the index"""
+        forged = Client().get(reverse('home'), HTTP_X_PROFILE='me:1abc:forged')
+        self.assertNotIn('X-Profile-Id', forged)
+        response = Client().get(reverse('home'), HTTP_X_PROFILE=sign_token('slow home'))
+        profile_id = response['X-Profile-Id']
+        for ext in ('collapsed', 'svg', 'json'):
+            self.assertTrue(os.path.exists(os.path.join(self.dir, f'{profile_id}.{ext}')))
+        with open(os.path.join(self.dir, 'index.html')) as f:
+            index = f.read()
+        self.assertIn(f'{profile_id}.svg', index)
+        self.assertIn('slow home', index)
+
+    def test_samples_hot_function(self):
+        """The sampler attributes time to the function that spent it"""
+        with profile('spin') as profile_id:
+            _spin(0.1)
+        with open(os.path.join(self.dir, f'{profile_id}.json')) as f:
+            meta = json.load(f)
+        self.assertGreater(meta['samples'], 10)
+        self.assertTrue(meta['top'][0][0].startswith('_spin (skills/tests.py:'))
+        with open(os.path.join(self.dir, f'{profile_id}.collapsed')) as f:
+            self.assertRegex(f.readline(), r';_spin \(skills/tests.py:\d+\) \d+$')
+
+    @override_settings(JOBS_RUN_INLINE=True, PROFILING_KEEP=2)
+    def test_jobs_follow_request_profile_and_old_profiles_pruned(self):
+        """A job started inside a profiled block is profiled too; only the newest PROFILING_KEEP are kept"""
+        with profile('request', label='investigating'):
+            start_job('probe', lambda progress: _spin(0.02))
+        with profile('another'):
+            pass
+        names = sorted(f for f in os.listdir(self.dir) if f.endswith('.json'))
+        self.assertEqual(len(names), 2)
+        with open(os.path.join(self.dir, names[0])) as f:
+            self.assertEqual(json.load(f)['label'], 'investigating')
+
+
+@override_settings(RATELIMIT_ENABLED=True, RATELIMIT_USER_PER_MINUTE=1, RATELIMIT_USER_BURST=2,
+                   RATELIMIT_GLOBAL_PER_MINUTE=60, RATELIMIT_GLOBAL_BURST=50, RATELIMIT_MAX_IN_FLIGHT=1)
+class AdmissionControlTestCase(TestCase):
+    def setUp(self):
+        cache.clear()
+        self.alice = User.objects.create_user('alice', password='pw')
+        self.bob = User.objects.create_user('bob', password='pw')
+
+    def summary(self, client, **headers):
+        # An empty transcript is refused by the view itself, so no model call is made
+        return client.post(reverse('generate_summary_api'), json.dumps({'transcript': ''}),
+                           content_type='application/json', **headers)
+
+    def test_per_user_bucket(self):
+        """A user past their burst gets 429 with Retry-After; other users and other pages are unaffected"""
+        alice, bob = Client(), Client()
+        alice.force_login(self.alice)
+        bob.force_login(self.bob)
+        self.assertEqual([self.summary(alice).status_code for _ in range(2)], [400, 400])
+        refused = self.summary(alice)
+        self.assertEqual(refused.status_code, 429)
+        self.assertEqual(refused['Retry-After'], '60')
+        self.assertEqual(refused.json()['retry_after'], 60)
+        self.assertEqual(self.summary(bob).status_code, 400)
+        self.assertEqual(alice.get(reverse('home')).status_code, 200)
+
+    def test_global_bucket_and_in_flight_cap(self):
+        """All clients share the global bucket; a taken in-flight slot refuses with 503 until released"""
+        alice, bob = Client(), Client()
+        alice.force_login(self.alice)
+        bob.force_login(self.bob)
+        with self.settings(RATELIMIT_GLOBAL_PER_MINUTE=1, RATELIMIT_GLOBAL_BURST=1):
+            self.assertEqual(self.summary(alice).status_code, 400)
+            self.assertEqual(self.summary(bob).status_code, 503)
+
+        cache.clear()
+        slot = acquire_slot('ai', 1)
+        busy = self.summary(alice)
+        self.assertEqual((busy.status_code, busy['Retry-After']), (503, '5'))
+        release_slot(slot)
+        self.assertEqual(self.summary(bob).status_code, 400)
+        self.assertIsNotNone(acquire_slot('ai', 1))  # the request gave its slot back
+
+    def test_capacity_refusals_cost_no_user_tokens(self):
+        """503s for a full server or global bucket don't use up the client's own burst"""
+        alice = Client()
+        alice.force_login(self.alice)
+        slot = acquire_slot('ai', 1)
+        self.assertEqual([self.summary(alice).status_code for _ in range(3)], [503] * 3)
+        release_slot(slot)
+        with self.settings(RATELIMIT_GLOBAL_PER_MINUTE=1, RATELIMIT_GLOBAL_BURST=0):
+            self.assertEqual([self.summary(alice).status_code for _ in range(3)], [503] * 3)
+        self.assertEqual([self.summary(alice).status_code for _ in range(2)], [400, 400])
+        self.assertEqual(self.summary(alice).status_code, 429)
+
+    @override_settings(RATELIMIT_SHED_QUEUE_MS=500)
+    def test_sheds_ai_requests_that_queued_too_long(self):
+        """Requests that waited behind the proxy past the limit are shed; interactive pages still served"""
+        queued = {'HTTP_X_REQUEST_START': f't={time.time() - 2:.3f}'}
+        client = Client()
+        shed = self.summary(client, **queued)
+        self.assertEqual(shed.status_code, 503)
+        self.assertEqual(shed['Retry-After'], '5')
+        self.assertEqual(client.get(reverse('home'), **queued).status_code, 200)
+        self.assertEqual(self.summary(client, HTTP_X_REQUEST_START=f't={time.time():.3f}').status_code, 400)
+        request = type('Request', (), {'headers': {'X-Request-Start': str(int((time.time() - 1) * 1000))}})
+        self.assertAlmostEqual(queue_time_ms(request), 1000, delta=200)
@@ -0,0 +1,364 @@
+import atexit
+import json
+import logging
+import os
+import queue
+import random
+import re
+import threading
+import time
+from contextlib import ExitStack, contextmanager
+from contextvars import ContextVar
+from functools import wraps
+
+import requests
+from django.conf import settings
+from django.db import connections
+
+
+logger = logging.getLogger('skills.tracing')
+
+KINDS = {'internal': 1, 'server': 2, 'client': 3, 'producer': 4, 'consumer': 5}
+TRACEPARENT = re.compile(r'^00-(?P<trace>[0-9a-f]{32})-(?P<span>[0-9a-f]{16})-(?P<flags>[0-9a-f]{2})$')
+
+_current = ContextVar('bmb_span', default=None)
+
+
+def _setting(name, default):
+    return getattr(settings, name, default)
+
+
+def enabled():
+    return _setting('TRACING_ENABLED', False)
+
+
+class Span:
+    """One timed operation in a trace"""
+
+    __slots__ = ('trace_id', 'span_id', 'parent_id', 'name', 'kind', 'attributes', 'sampled',
+                 'start_ns', 'end_ns', 'status', 'status_message')
+
+    def __init__(self, name, kind, trace_id, parent_id, sampled, attributes):
+        self.trace_id = trace_id
+        self.span_id = f'{random.getrandbits(64):016x}'
+        self.parent_id = parent_id
+        self.name = name
+        self.kind = kind
+        self.attributes = attributes
+        self.sampled = sampled
+        self.start_ns = time.time_ns()
+        self.end_ns = None
+        self.status = 'unset'
+        self.status_message = None
+
+    def set_attribute(self, key, value):
+        self.attributes[key] = value
+
+    @property
+    def traceparent(self):
+        """The W3C trace context header that makes this span the parent of remote work"""
+        return f"00-{self.trace_id}-{self.span_id}-{'01' if self.sampled else '00'}"
+
+    def to_dict(self):
+        return {
+            'trace_id': self.trace_id,
+            'span_id': self.span_id,
+            'parent_id': self.parent_id,
+            'name': self.name,
+            'kind': self.kind,
+            'start': self.start_ns / 1e9,
+            'duration_ms': round((self.end_ns - self.start_ns) / 1e6, 3),
+            'status': self.status,
+            'attributes': self.attributes,
+        }
+
+
+class _RemoteParent:
+    """A parent from another thread or process, known only by its traceparent"""
+
+    def __init__(self, trace_id, span_id, sampled):
+        self.trace_id = trace_id
+        self.span_id = span_id
+        self.sampled = sampled
+
+
+class _NoopSpan:
+    traceparent = None
+
+    def set_attribute(self, key, value):
+        pass
+
+
+NOOP = _NoopSpan()
+
+
+def parse_traceparent(header):
+    match = TRACEPARENT.match((header or '').strip().lower())
+    if not match or match['trace'] == '0' * 32 or match['span'] == '0' * 16:
+        return None
+    return _RemoteParent(match['trace'], match['span'], int(match['flags'], 16) & 1 == 1)
+
+
+def current_span():
+    return _current.get()
+
+
+def traceparent():
+    """traceparent of the current span, to hand to a job or another service"""
+    span_ = _current.get()
+    return span_.traceparent if span_ else None
+
+
+def inject(headers):
+    """Add the current traceparent to outgoing HTTP ``headers`` and return them"""
+    value = traceparent()
+    if value:
+        headers['traceparent'] = value
+    return headers
+
+
+@contextmanager
+def span(name, kind='internal', parent=None, **attributes):
+    """Time the block as a child of ``parent`` (a traceparent string) or of the current span.
+
+    Without a parent a new trace starts, sampled at TRACING_SAMPLE_RATE.
+    An exception leaving the block marks the span as an error. When tracing
+    is off this yields a no-op span and records nothing.
+    """
+    if not enabled():
+        yield NOOP
+        return
+    if isinstance(parent, str):
+        parent = parse_traceparent(parent)
+    if parent is None:
+        parent = _current.get()
+    if parent is None:
+        trace_id = f'{random.getrandbits(128):032x}'
+        sampled = random.random() < _setting('TRACING_SAMPLE_RATE', 1.0)
+        current = Span(name, kind, trace_id, None, sampled, attributes)
+    else:
+        current = Span(name, kind, parent.trace_id, parent.span_id, parent.sampled, attributes)
+    token = _current.set(current)
+    try:
+        yield current
+    except BaseException as e:
+        current.status = 'error'
+        current.status_message = f'{type(e).__name__}: {e}'
+        current.attributes['exception.type'] = type(e).__name__
+        raise
+    finally:
+        _current.reset(token)
+        current.end_ns = time.time_ns()
+        if current.sampled:
+            export(current)
+
+
+def traced(name=None, kind='internal'):
+    """Decorator form of span(); the name defaults to the function's qualified name"""
+    def decorator(func):
+        @wraps(func)
+        def wrapper(*args, **kwargs):
+            with span(name or func.__qualname__, kind):
+                return func(*args, **kwargs)
+        return wrapper
+    return decorator
+
+
+_QUERY_TABLE = re.compile(r'\b(?:FROM|INTO|UPDATE)\s+"?(\w+)"?', re.IGNORECASE)
+
+
+def _db_span(execute, sql, params, many, context):
+    verb = sql.lstrip().split(None, 1)[0].upper() if sql.strip() else 'SQL'
+    table = _QUERY_TABLE.search(sql)
+    name = f'{verb} {table.group(1)}' if table else verb
+    with span(name, 'client', **{'db.system': context['connection'].vendor, 'db.statement': sql[:2000],
+                                 'db.many': many}):
+        return execute(sql, params, many, context)
+
+
+@contextmanager
+def db_spans():
+    """One client span per SQL statement run on any connection inside the block (executemany is one)"""
+    if not enabled():
+        yield
+        return
+    with ExitStack() as stack:
+        for conn in connections.all():
+            if _db_span not in conn.execute_wrappers:  # nested, e.g. a job run inline in a request
+                stack.enter_context(conn.execute_wrapper(_db_span))
+        yield
+
+
+# Exporters: TRACING_FILE appends one JSON line per span; TRACING_OTLP_ENDPOINT
+# (e.g. http://127.0.0.1:4318/v1/traces) receives OTLP/HTTP JSON in batches
+# from a background thread. Spans are dropped, never waited for, when the
+# export queue is full.
+
+_file_lock = threading.Lock()
+
+
+def _write_file(path, spans):
+    lines = ''.join(json.dumps(s.to_dict(), default=str) + '\n' for s in spans)
+    with _file_lock, open(path, 'a', encoding='utf-8') as f:
+        f.write(lines)
+
+
+def _otlp_value(value):
+    if isinstance(value, bool):
+        return {'boolValue': value}
+    if isinstance(value, int):
+        return {'intValue': str(value)}
+    if isinstance(value, float):
+        return {'doubleValue': value}
+    return {'stringValue': str(value)}
+
+
+def otlp_payload(spans):
+    """OTLP/HTTP JSON for a batch of spans"""
+    return {'resourceSpans': [{
+        'resource': {'attributes': [
+            {'key': 'service.name', 'value': {'stringValue': _setting('TRACING_SERVICE_NAME', 'borrowmybrain')}},
+            {'key': 'process.pid', 'value': {'intValue': str(os.getpid())}},
+        ]},
+        'scopeSpans': [{
+            'scope': {'name': 'skills.tracing'},
+            'spans': [{
+                'traceId': s.trace_id,
+                'spanId': s.span_id,
+                **({'parentSpanId': s.parent_id} if s.parent_id else {}),
+                'name': s.name,
+                'kind': KINDS[s.kind],
+                'startTimeUnixNano': str(s.start_ns),
+                'endTimeUnixNano': str(s.end_ns),
+                'attributes': [{'key': k, 'value': _otlp_value(v)} for k, v in s.attributes.items() if v is not None],
+                'status': {'code': 2, 'message': s.status_message or ''} if s.status == 'error' else {'code': 0},
+            } for s in spans],
+        }],
+    }]}
+
+
+def _from_otlp_value(value):
+    kind, raw = next(iter(value.items()))
+    return int(raw) if kind == 'intValue' else raw
+
+
+def spans_from_otlp(payload):
+    """The spans in an OTLP/HTTP JSON payload, in the same shape as the TRACING_FILE lines"""
+    kinds = {number: name for name, number in KINDS.items()}
+    spans = []
+    for resource in payload['resourceSpans']:
+        for scope in resource['scopeSpans']:
+            for s in scope['spans']:
+                start, end = int(s['startTimeUnixNano']), int(s['endTimeUnixNano'])
+                spans.append({
+                    'trace_id': s['traceId'],
+                    'span_id': s['spanId'],
+                    'parent_id': s.get('parentSpanId') or None,
+                    'name': s['name'],
+                    'kind': kinds.get(s.get('kind'), 'internal'),
+                    'start': start / 1e9,
+                    'duration_ms': round((end - start) / 1e6, 3),
+                    'status': 'error' if s.get('status', {}).get('code') == 2 else 'unset',
+                    'attributes': {a['key']: _from_otlp_value(a['value']) for a in s.get('attributes', [])},
+                })
+    return spans
+
+
+def breakdown(spans):
+    """Lines describing one trace as an indented tree: duration, self time and name of every span"""
+    children = {}
+    for s in spans:
+        children.setdefault(s['parent_id'], []).append(s)
+    ids = {s['span_id'] for s in spans}
+    roots = [s for s in spans if s['parent_id'] not in ids]
+    lines = []
+
+    def walk(node, depth):
+        kids = sorted(children.get(node['span_id'], []), key=lambda s: s['start'])
+        own = node['duration_ms'] - sum(k['duration_ms'] for k in kids)
+        flag = ' !' if node['status'] == 'error' else ''
+        lines.append(f"{node['duration_ms']:>10.1f} ms {max(own, 0):>10.1f} ms  {'  ' * depth}{node['name']}{flag}")
+        for kid in kids:
+            walk(kid, depth + 1)
+
+    for root in sorted(roots, key=lambda s: s['start']):
+        walk(root, 0)
+    return lines
+
+
+class _BatchExporter:
+    def __init__(self, endpoint):
+        self.endpoint = endpoint
+        self.queue = queue.Queue(maxsize=_setting('TRACING_QUEUE_SIZE', 2048))
+        self.dropped = 0
+        self._send_lock = threading.Lock()
+        self._thread = threading.Thread(target=self._loop, daemon=True, name='bmb-trace-export')
+        self._thread.start()
+
+    def add(self, span_):
+        try:
+            self.queue.put_nowait(span_)
+        except queue.Full:
+            self.dropped += 1
+
+    def _loop(self):
+        interval = _setting('TRACING_EXPORT_INTERVAL', 2.0)
+        while True:
+            time.sleep(interval)
+            self.flush()
+
+    def flush(self):
+        batch_size = _setting('TRACING_BATCH_SIZE', 512)
+        with self._send_lock:
+            while True:
+                batch = []
+                while len(batch) < batch_size:
+                    try:
+                        batch.append(self.queue.get_nowait())
+                    except queue.Empty:
+                        break
+                if not batch:
+                    return
+                try:
+                    requests.post(self.endpoint, json=otlp_payload(batch), timeout=_setting('TRACING_EXPORT_TIMEOUT', 5))
+                except requests.RequestException as e:
+                    logger.warning('Trace export failed, dropped %d spans: %s', len(batch), e)
+
+
+_exporter = {'endpoint': None, 'instance': None}
+_exporter_lock = threading.Lock()
+
+
+def _batch_exporter():
+    endpoint = _setting('TRACING_OTLP_ENDPOINT', None)
+    if not endpoint:
+        return None
+    with _exporter_lock:
+        if _exporter['endpoint'] != endpoint or _exporter['instance'] is None:
+            _exporter.update(endpoint=endpoint, instance=_BatchExporter(endpoint))
+        return _exporter['instance']
+
+
+def export(span_):
+    path = _setting('TRACING_FILE', None)
+    if path:
+        _write_file(path, [span_])
+    exporter = _batch_exporter()
+    if exporter:
+        exporter.add(span_)
+
+
+def flush():
+    """Send every queued span now"""
+    exporter = _exporter['instance']
+    if exporter:
+        exporter.flush()
+
+
+def _after_fork():
+    # The export thread doesn't survive a fork; the child starts its own
+    _exporter.update(endpoint=None, instance=None)
+
+
+os.register_at_fork(after_in_child=_after_fork)
+atexit.register(flush)
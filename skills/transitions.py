@@ -0,0 +1,224 @@
+# Status transitions that also maintain the denormalized profile counters.
+# Each transition is a conditional UPDATE ... WHERE status=..., so only the
+# caller that actually moves the row bumps the counters, using F() increments
+# inside the same transaction.
+from django.core.exceptions import ValidationError
+from django.db import IntegrityError, transaction
+from django.db.models import Case, Count, DateTimeField, DurationField, ExpressionWrapper, F, Value, When
+from django.utils import timezone
+
+from .inbox import invalidate_inbox_counts
+from .notes_buffer import flush_notes
+from .models import UserProfile, SkillRequest, Session, SessionParticipant, EducatorSearchDoc
+from .ranking import refresh_ranking_scores
+from .rooms import forget_room
+from .search import refresh_search_docs
+
+
+def refresh_educators(user_ids):
+    """Propagate counter/aggregate changes made with queryset updates"""
+    profile_ids = list(UserProfile.objects.filter(user_id__in=set(user_ids)).values_list('pk', flat=True))
+    if profile_ids:
+        refresh_ranking_scores(profile_ids)
+        refresh_search_docs(profile_ids)
+
+
+# Allowed SkillRequest status moves: from -> targets
+REQUEST_TRANSITIONS = {
+    'pending': ('accepted', 'rejected'),
+    'accepted': ('completed', 'rejected'),
+}
+
+
+def create_skill_request(learner, teachable_skill, is_payment_offer=True, offered_amount=None,
+                         offered_skill='', message=''):
+    """Create a request with a single INSERT.
+
+    The partial unique constraint on pending (learner, requested_skill)
+    rejects duplicates even when two submissions race; that surfaces as
+    a ValidationError.
+    """
+    if teachable_skill.user_profile.user_id == learner.pk:
+        raise ValidationError('You cannot request your own skill.')
+    try:
+        with transaction.atomic():
+            return SkillRequest.objects.create(
+                learner=learner,
+                educator_id=teachable_skill.user_profile.user_id,
+                requested_skill=teachable_skill,
+                is_payment_offer=is_payment_offer,
+                offered_amount=offered_amount if is_payment_offer else None,
+                offered_skill=None if is_payment_offer else offered_skill,
+                message=message,
+            )
+    except IntegrityError:
+        if SkillRequest.objects.filter(learner=learner, requested_skill=teachable_skill, status='pending').exists():
+            raise ValidationError('You already have a pending request for this skill.')
+        raise
+
+
+def transition_skill_request(skill_request, to_status):
+    """Move a request from the status it was loaded with to ``to_status``.
+
+    Uses UPDATE ... WHERE status=<loaded status>, so if someone else moved
+    the row first nothing is written and False is returned. Side effects
+    (counters, inbox counts) only run for the caller that won.
+    """
+    from_status = skill_request.status
+    if to_status not in REQUEST_TRANSITIONS.get(from_status, ()):
+        raise ValidationError(f'Cannot change a {from_status} request to {to_status}.')
+
+    with transaction.atomic():
+        if to_status == 'completed':
+            # Serialise completions for one educator so two requests from the
+            # same new learner can't both count them as a new student.
+            list(UserProfile.objects.select_for_update().filter(user_id=skill_request.educator_id).values_list('pk'))
+
+        updated = SkillRequest.objects.filter(pk=skill_request.pk, status=from_status).update(
+            status=to_status, updated_at=timezone.now()
+        )
+        if not updated:
+            return False
+        skill_request.status = to_status
+        invalidate_inbox_counts(skill_request.educator_id, skill_request.learner_id)
+
+        if to_status == 'completed':
+            returning_learner = SkillRequest.objects.filter(
+                educator_id=skill_request.educator_id,
+                learner_id=skill_request.learner_id,
+                status='completed',
+            ).exclude(pk=skill_request.pk).exists()
+            if not returning_learner:
+                UserProfile.objects.filter(user_id=skill_request.educator_id).update(
+                    total_students=F('total_students') + 1
+                )
+                refresh_educators([skill_request.educator_id])
+    return True
+
+
+def complete_skill_request(skill_request):
+    """Mark an accepted request completed; counts the learner as a new student of the educator.
+
+    Returns False if the request was no longer accepted.
+    """
+    return transition_skill_request(skill_request, 'completed')
+
+
+def _elapsed(ended_at):
+    return ExpressionWrapper(ended_at - F('started_at'), output_field=DurationField())
+
+
+def end_session(session, status='completed', ended_at=None):
+    """Close an active session; a completed session counts as a lesson for its host.
+
+    Returns False if the session was no longer active.
+    """
+    ended_at = ended_at or timezone.now()
+    with transaction.atomic():
+        updated = Session.objects.filter(pk=session.pk, status='active').update(
+            status=status, ended_at=ended_at, last_activity_at=ended_at,
+            duration=_elapsed(Value(ended_at, output_field=DateTimeField())),
+        )
+        if not updated:
+            return False
+        session.status = status
+        session.ended_at = ended_at
+        session.duration = ended_at - session.started_at
+        forget_room(session.room_name)
+        flush_notes([session.pk])
+
+        if status == 'completed':
+            UserProfile.objects.filter(user_id=session.user_id).update(total_lessons=F('total_lessons') + 1)
+            refresh_educators([session.user_id])
+    return True
+
+
+def reap_idle_sessions(ttl, batch_size=500, stdout=None, now=None):
+    """Close active sessions with no activity for ``ttl``, a chunk at a time.
+
+    ended_at is the last activity, so durations exclude the idle tail.
+    Sessions someone other than the host joined count as completed
+    lessons; the rest are cancelled. Returns the number closed.
+    """
+    cutoff = (now or timezone.now()) - ttl
+    stale = Session.objects.filter(status='active', last_activity_at__lt=cutoff)
+    closed = 0
+    while True:
+        with transaction.atomic():
+            # Re-checked under the lock so a heartbeat that lands now keeps its session
+            chunk = list(
+                stale.select_for_update().order_by('last_activity_at')
+                .values_list('pk', 'user_id', 'room_name')[:batch_size]
+            )
+            if not chunk:
+                break
+            ids = [pk for pk, _user_id, _room in chunk]
+            attended = set(
+                SessionParticipant.objects.filter(session_id__in=ids).exclude(role='host')
+                .values_list('session_id', flat=True)
+            )
+            ended = {'ended_at': F('last_activity_at'), 'duration': _elapsed(F('last_activity_at'))}
+            Session.objects.filter(pk__in=attended).update(status='completed', **ended)
+            Session.objects.filter(pk__in=set(ids) - attended).update(status='cancelled', **ended)
+
+            lessons = {}
+            for pk, user_id, _room in chunk:
+                if pk in attended:
+                    lessons[user_id] = lessons.get(user_id, 0) + 1
+            if lessons:
+                UserProfile.objects.filter(user_id__in=lessons).update(total_lessons=F('total_lessons') + Case(
+                    *[When(user_id=user_id, then=Value(n)) for user_id, n in lessons.items()], default=Value(0)
+                ))
+                refresh_educators(lessons)
+
+        for _pk, _user_id, room_name in chunk:
+            forget_room(room_name)
+        flush_notes(ids)
+        closed += len(chunk)
+        if stdout:
+            stdout.write(f'Closed {closed} idle sessions so far...')
+    return closed
+
+
+def reconcile_counters(batch_size=1000, stdout=None):
+    """Recompute total_students and total_lessons from the source tables in batches.
+
+    Returns the number of profiles whose counters were corrected.
+    """
+    fixed = 0
+    rows = UserProfile.objects.order_by('pk').values_list('pk', 'user_id', 'total_students', 'total_lessons')
+    last_pk = 0
+    while True:
+        chunk = list(rows.filter(pk__gt=last_pk)[:batch_size])
+        if not chunk:
+            break
+        last_pk = chunk[-1][0]
+        user_ids = [user_id for _pk, user_id, _s, _l in chunk]
+
+        students = dict(
+            SkillRequest.objects.filter(status='completed', educator_id__in=user_ids)
+            .values('educator_id').annotate(n=Count('learner_id', distinct=True))
+            .values_list('educator_id', 'n')
+        )
+        lessons = dict(
+            Session.objects.filter(status='completed', user_id__in=user_ids)
+            .values('user_id').annotate(n=Count('id'))
+            .values_list('user_id', 'n')
+        )
+        stale = [
+            UserProfile(pk=pk, total_students=students.get(user_id, 0), total_lessons=lessons.get(user_id, 0))
+            for pk, user_id, current_students, current_lessons in chunk
+            if (current_students, current_lessons) != (students.get(user_id, 0), lessons.get(user_id, 0))
+        ]
+        if stale:
+            with transaction.atomic():
+                UserProfile.objects.bulk_update(stale, ['total_students', 'total_lessons'])
+                EducatorSearchDoc.objects.bulk_update(
+                    [EducatorSearchDoc(pk=p.pk, total_students=p.total_students) for p in stale],
+                    ['total_students'],
+                )
+                refresh_ranking_scores([p.pk for p in stale])
+            fixed += len(stale)
+        if stdout:
+            stdout.write(f'Checked profiles up to id {last_pk}, corrected {fixed} so far...')
+    return fixed
@@ -13,6 +13,15 @@ urlpatterns = [
     path('search/', views.search_results, name='search_results'),
     path('educator/<int:user_id>/', views.view_profile, name='view_profile'),
     path('request/<int:teachable_skill_id>/', views.make_skill_request, name='make_skill_request'),
+    path('request/<int:skill_request_id>/review/', views.review_skill_request, name='review_skill_request'),
+    path('inbox/', views.inbox, name='inbox'),
+    path('request/<int:skill_request_id>/status/', views.update_skill_request_status, name='update_skill_request_status'),
+    path('api/inbox/', views.inbox_api, name='inbox_api'),
+    path('api/educators/<int:user_id>/slots/', views.educator_slots_api, name='educator_slots_api'),
+    path('api/bookings/', views.book_session_api, name='book_session_api'),
+    path('api/bookings/<int:booking_id>/cancel/', views.cancel_booking_api, name='cancel_booking_api'),
+    path('api/barter-suggestions/', views.barter_suggestions_api, name='barter_suggestions_api'),
+    path('metrics', views.metrics, name='metrics'),
     
     # Session URLs
     path('session/start/', session_views.start_session, name='start_session'),
@@ -28,5 +37,11 @@ urlpatterns = [
     # Session API endpoints
     path('api/generate-summary/', session_views.generate_summary_api, name='generate_summary_api'),
     path('api/process-recording/', session_views.process_recording_api, name='process_recording_api'),
+    path('api/jobs/<str:job_id>/', session_views.job_status_api, name='job_status_api'),
+    path('api/jobs/<str:job_id>/events/', session_views.job_events, name='job_events'),
+    path('api/sessions/<int:session_id>/events/', session_views.session_job_events, name='session_job_events'),
+    path('api/sessions/<int:session_id>/export.<str:fmt>', session_views.export_session, name='export_session'),
     path('api/save-session-notes/', session_views.save_session_notes_api, name='save_session_notes_api'),
+    path('api/end-session/', session_views.end_session_api, name='end_session_api'),
+    path('api/session-heartbeat/', session_views.session_heartbeat_api, name='session_heartbeat_api'),
 ]
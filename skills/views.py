@@ -1,11 +1,26 @@
+import json
+
 from django.shortcuts import render, get_object_or_404, redirect
 from django.contrib.auth.decorators import login_required
 from django.contrib.auth import login, authenticate, logout
 from django.contrib.auth.models import User
+from django.conf import settings
 from django.contrib import messages
-from django.db.models import Q
-from .models import UserProfile, Skill, TeachableSkill, Certification, SkillRequest
+from django.core.exceptions import ValidationError
+from django.http import HttpResponse, JsonResponse
+from django.urls import reverse
+from django.utils import timezone
+from django.utils.dateparse import parse_datetime
+from django.views.decorators.http import require_POST
+from .models import UserProfile, Skill, TeachableSkill, Certification, SkillRequest, EducatorSearchDoc, Review, Booking
 from .forms import UserProfileForm, TeachableSkillForm, CertificationForm, SkillRequestForm
+from .inbox import BOXES, STATUSES, inbox_counts, inbox_page, mark_read
+from .matching import barter_suggestions
+from . import metrics as app_metrics
+from .reviews import submit_review
+from .scheduling import available_slots, cancel_booking, reserve_slot
+from .search import filter_educators, get_facets
+from .transitions import create_skill_request, transition_skill_request
 
 
 def login_view(request):
@@ -121,9 +136,10 @@ def home(request):
         )[:4]
         
         # Get recently joined educators
-        recent_educators = UserProfile.objects.select_related('user').filter(
-            teachable_skills__isnull=False
-        ).distinct().order_by('-created_at')[:6]
+        recent_educators = EducatorSearchDoc.objects.filter(skill_count__gt=0).order_by('-created_at')[:6]
+        
+        # Best educators by precomputed ranking score (index scan)
+        top_educators = EducatorSearchDoc.objects.filter(skill_count__gt=0).order_by('-ranking_score')[:6]
         
         context.update({
             'user_profile': user_profile,
@@ -131,6 +147,7 @@ def home(request):
             'mid_range_skills': mid_range_skills,
             'premium_skills': premium_skills,
             'recent_educators': recent_educators,
+            'top_educators': top_educators,
             'is_personalized': True,
         })
     else:
@@ -231,31 +248,12 @@ def search_results(request):
     skill_filter = request.GET.get('skill', '')
     rate_filter = request.GET.get('rate', '')
     
-    # Get UserProfile objects (educators) with their teachable skills
-    educators = UserProfile.objects.select_related('user').prefetch_related('teachable_skills__skill').all()
-    
-    if query:
-        educators = educators.filter(
-            Q(teachable_skills__skill__name__icontains=query) |
-            Q(user__first_name__icontains=query) |
-            Q(user__last_name__icontains=query) |
-            Q(bio__icontains=query)
-        ).distinct()
-    
-    if skill_filter:
-        educators = educators.filter(teachable_skills__skill__name__icontains=skill_filter).distinct()
-    
-    # Filter by rate range
-    if rate_filter:
-        if rate_filter == 'low':
-            educators = educators.filter(hourly_rate__lte=30)
-        elif rate_filter == 'mid':
-            educators = educators.filter(hourly_rate__gt=30, hourly_rate__lte=60)
-        elif rate_filter == 'high':
-            educators = educators.filter(hourly_rate__gt=60)
+    # Educators come from the flattened search projection (one row each)
+    educators = filter_educators(request.GET)
     
     context = {
         'educators': educators,
+        'facets': get_facets(request.GET, educators),
         'query': query,
         'skill_filter': skill_filter,
         'rate_filter': rate_filter,
@@ -268,11 +266,13 @@ def view_profile(request, user_id):
     user_profile = get_object_or_404(UserProfile, user__id=user_id)
     teachable_skills = user_profile.teachable_skills.all()
     certifications = user_profile.certifications.all()
+    recent_reviews = Review.objects.select_related('reviewer').filter(educator_id=user_id).order_by('-created_at')[:5]
     
     context = {
         'user_profile': user_profile,
         'teachable_skills': teachable_skills,
         'certifications': certifications,
+        'recent_reviews': recent_reviews,
     }
     return render(request, 'skills/view_profile.html', context)
 
@@ -286,21 +286,21 @@ def make_skill_request(request, teachable_skill_id):
         request_type = request.POST.get('request_type')
         next_url = request.POST.get('next')
         
-        skill_request = SkillRequest.objects.create(
-            learner=request.user,
-            educator=teachable_skill.user_profile.user,
-            requested_skill=teachable_skill,
-        )
-        
-        if request_type == 'payment':
-            skill_request.is_payment_offer = True
-            skill_request.offered_amount = request.POST.get('offered_amount', 0)
-        else:
-            skill_request.is_payment_offer = False
-            skill_request.offered_skill = request.POST.get('offered_skill', '')
-        
-        skill_request.message = request.POST.get('message', '')
-        skill_request.save()
+        is_payment_offer = request_type == 'payment'
+        try:
+            create_skill_request(
+                request.user,
+                teachable_skill,
+                is_payment_offer=is_payment_offer,
+                offered_amount=request.POST.get('offered_amount') or 0,
+                offered_skill=request.POST.get('offered_skill', ''),
+                message=request.POST.get('message', ''),
+            )
+        except ValidationError as e:
+            messages.error(request, e.messages[0])
+            if next_url:
+                return redirect(next_url)
+            return redirect('view_profile', user_id=teachable_skill.user_profile.user.id)
         
         messages.success(request, 'Your request has been sent to the educator!')
         if next_url:
@@ -313,6 +313,225 @@ def make_skill_request(request, teachable_skill_id):
     return render(request, 'skills/request_skill.html', context)
 
 
+@login_required
+@require_POST
+def review_skill_request(request, skill_request_id):
+    """Rate the educator of a completed skill request"""
+    skill_request = get_object_or_404(SkillRequest, id=skill_request_id, learner=request.user)
+    
+    try:
+        submit_review(
+            request.user,
+            rating=request.POST.get('rating', 0),
+            comment=request.POST.get('comment', ''),
+            skill_request=skill_request,
+        )
+        messages.success(request, 'Thanks for your review!')
+    except (ValidationError, ValueError) as e:
+        messages.error(request, e.messages[0] if isinstance(e, ValidationError) else 'Please choose a rating from 1 to 5.')
+    
+    return redirect('view_profile', user_id=skill_request.educator_id)
+
+
+def _inbox_params(request):
+    box = request.GET.get('box', 'received')
+    status = request.GET.get('status', 'pending')
+    if box not in BOXES:
+        box = 'received'
+    if status not in STATUSES:
+        status = 'pending'
+    try:
+        limit = int(request.GET.get('limit', 20))
+    except ValueError:
+        limit = 20
+    return box, status, request.GET.get('cursor'), limit
+
+
+@login_required
+def inbox(request):
+    """Incoming (educator) and outgoing (learner) skill requests by status"""
+    box, status, cursor, limit = _inbox_params(request)
+    skill_requests, next_cursor = inbox_page(request.user, box, status, cursor, limit)
+    counts = inbox_counts(request.user, box)
+    if box == 'received':
+        mark_read(request.user, skill_requests)
+    
+    context = {
+        'box': box,
+        'status': status,
+        'statuses': [(value, counts[value]) for value in STATUSES],
+        'unread_count': counts['unread'],
+        'skill_requests': skill_requests,
+        'next_cursor': next_cursor,
+    }
+    return render(request, 'skills/inbox.html', context)
+
+
+@login_required
+@require_POST
+def update_skill_request_status(request, skill_request_id):
+    """Educator accepts, rejects or completes a received request"""
+    skill_request = get_object_or_404(SkillRequest, id=skill_request_id, educator=request.user)
+    
+    try:
+        if transition_skill_request(skill_request, request.POST.get('status', '')):
+            messages.success(request, f'Request {skill_request.status}.')
+        else:
+            messages.error(request, 'This request was already updated.')
+    except ValidationError as e:
+        messages.error(request, e.messages[0])
+    
+    return redirect(f"{reverse('inbox')}?box=received&status={skill_request.status}")
+
+
+@login_required
+def inbox_api(request):
+    """JSON version of the inbox for incremental loading"""
+    box, status, cursor, limit = _inbox_params(request)
+    skill_requests, next_cursor = inbox_page(request.user, box, status, cursor, limit)
+    other_field = BOXES[box][1]
+    
+    return JsonResponse({
+        'box': box,
+        'status': status,
+        'counts': inbox_counts(request.user, box),
+        'next_cursor': next_cursor,
+        'results': [
+            {
+                'id': r.id,
+                'other_user': getattr(r, other_field).get_full_name() or getattr(r, other_field).username,
+                'skill': r.requested_skill.skill.name,
+                'is_payment_offer': r.is_payment_offer,
+                'offered_amount': str(r.offered_amount) if r.offered_amount is not None else None,
+                'offered_skill': r.offered_skill,
+                'message': r.message,
+                'status': r.status,
+                'is_read': r.is_read,
+                'created_at': r.created_at.isoformat(),
+            }
+            for r in skill_requests
+        ],
+    })
+
+
 def test_session_page(request):
     """Test page for session functionality"""
     return render(request, 'skills/test_session.html')
+
+
+@login_required
+def barter_suggestions_api(request):
+    """Multi-party skill swaps the current user could join"""
+    cycles = barter_suggestions(request.user)
+    user_ids = {user_id for cycle in cycles for step in cycle for user_id in step[:2]}
+    skill_ids = {skill_id for cycle in cycles for _l, _e, skill_id in cycle}
+    users = {u.id: u.get_full_name() or u.username for u in User.objects.filter(id__in=user_ids)}
+    skills = dict(Skill.objects.filter(id__in=skill_ids).values_list('id', 'name'))
+    
+    return JsonResponse({
+        'suggestions': [
+            {
+                'size': len(cycle),
+                'steps': [
+                    {
+                        'learner': users.get(learner_id),
+                        'learner_id': learner_id,
+                        'educator': users.get(educator_id),
+                        'educator_id': educator_id,
+                        'skill': skills.get(skill_id),
+                    }
+                    for learner_id, educator_id, skill_id in cycle
+                ],
+            }
+            for cycle in cycles
+        ],
+    })
+
+
+def _booking_json(booking):
+    return {
+        'id': booking.id,
+        'educator_id': booking.educator_id,
+        'learner_id': booking.learner_id,
+        'start': booking.start_at.isoformat(),
+        'end': booking.end_at.isoformat(),
+        'status': booking.status,
+    }
+
+
+def educator_slots_api(request, user_id):
+    """Free session slots for an educator over the next few days"""
+    profile = get_object_or_404(UserProfile, user_id=user_id)
+    try:
+        days = int(request.GET.get('days', 7))
+        duration = int(request.GET.get('duration', 30))
+        slots = available_slots(profile, days=days, duration=duration)
+    except ValueError:
+        return JsonResponse({'error': 'days and duration must be numbers'}, status=400)
+    except ValidationError as e:
+        return JsonResponse({'error': e.messages[0]}, status=400)
+    
+    return JsonResponse({
+        'educator_id': profile.user_id,
+        'duration': duration,
+        'slots': [{'start': start.isoformat(), 'end': end.isoformat()} for start, end in slots],
+    })
+
+
+@login_required
+@require_POST
+def book_session_api(request):
+    """Reserve a slot with an educator"""
+    try:
+        data = json.loads(request.body)
+        if not isinstance(data, dict):
+            return JsonResponse({'error': 'Expected a JSON object'}, status=400)
+        try:
+            duration = int(data.get('duration', 30))
+        except (ValueError, TypeError):
+            return JsonResponse({'error': 'duration must be a whole number of minutes'}, status=400)
+        educator = get_object_or_404(User, id=data.get('educator_id'))
+        start = parse_datetime(data.get('start', ''))
+        if start is None:
+            return JsonResponse({'error': 'start must be an ISO 8601 datetime'}, status=400)
+        if timezone.is_naive(start):
+            start = timezone.make_aware(start)
+        skill_request = None
+        if data.get('skill_request_id'):
+            skill_request = get_object_or_404(SkillRequest, id=data['skill_request_id'], learner=request.user)
+        booking = reserve_slot(educator, request.user, start, duration=duration, skill_request=skill_request)
+    except (ValueError, TypeError):
+        return JsonResponse({'error': 'Invalid booking request'}, status=400)
+    except ValidationError as e:
+        return JsonResponse({'error': e.messages[0]}, status=409)
+    
+    return JsonResponse({'success': True, 'booking': _booking_json(booking)}, status=201)
+
+
+@login_required
+@require_POST
+def cancel_booking_api(request, booking_id):
+    """Either party can cancel a booking"""
+    booking = get_object_or_404(Booking, id=booking_id)
+    if request.user.id not in (booking.educator_id, booking.learner_id):
+        return JsonResponse({'error': 'Not your booking'}, status=403)
+    cancelled = cancel_booking(booking)
+    return JsonResponse({'success': True, 'cancelled': cancelled, 'booking': _booking_json(booking)})
+
+
+def metrics(request):
+    """Prometheus scrape endpoint.
+
+    With METRICS_TOKEN set, scrapers must send it as a bearer token;
+    otherwise only addresses in METRICS_ALLOWED_IPS may read it. With
+    neither set nobody may: behind a local proxy every request comes from
+    127.0.0.1, so loopback can't stand in for "internal".
+    """
+    token = getattr(settings, 'METRICS_TOKEN', None)
+    if token:
+        allowed = request.headers.get('Authorization') == f'Bearer {token}'
+    else:
+        allowed = request.META.get('REMOTE_ADDR') in getattr(settings, 'METRICS_ALLOWED_IPS', ())
+    if not allowed:
+        return HttpResponse('Forbidden', status=403, content_type='text/plain')
+    return HttpResponse(app_metrics.render(), content_type='text/plain; version=0.0.4; charset=utf-8')
@@ -21,6 +21,7 @@ class SessionManager {
         this.initializeElements();
         this.setupEventListeners();
         this.startTimer();
+        this.startNotesAutosave();
         this.loadMockTranscript(); // Load mock transcript immediately
         // Disable Daily.co for testing
         // this.initializeDaily();
@@ -486,7 +487,8 @@ Please provide the summary in this format:
             body: JSON.stringify({
                 transcript: fullTranscript,
                 session_id: window.sessionConfig.sessionId,
-                room_name: window.sessionConfig.roomName
+                room_name: window.sessionConfig.roomName,
+                async: true
             })
         });
 
@@ -494,10 +496,11 @@ Please provide the summary in this format:
             throw new Error(`Backend API error: ${response.status}`);
         }
 
-        const data = await response.json();
+        const job = await response.json();
+        const data = await this.followJob(job.events_url);
         
-        if (data.summary) {
-            this.displaySummary(data.summary);
+        if (data.result?.summary) {
+            this.displaySummary(data.result.summary);
             this.showNotification('Summary generated via backend!', 'success');
             return true;
         }
@@ -505,6 +508,27 @@ Please provide the summary in this format:
         return false;
     }
 
+    followJob(eventsUrl) {
+        // One streaming connection instead of a long blocking request;
+        // EventSource reconnects by itself and resumes from the last event.
+        return new Promise((resolve, reject) => {
+            const source = new EventSource(eventsUrl);
+            source.addEventListener('progress', (event) => {
+                const progress = JSON.parse(event.data);
+                const percent = progress.progress !== null ? ` ${progress.progress}%` : '';
+                this.elements.getSummaryBtn.textContent = `${progress.stage}${percent}...`;
+            });
+            source.addEventListener('done', (event) => {
+                source.close();
+                resolve(JSON.parse(event.data));
+            });
+            source.addEventListener('failed', (event) => {
+                source.close();
+                reject(new Error(JSON.parse(event.data).error || 'Background job failed'));
+            });
+        });
+    }
+
     async saveSummaryToBackend(transcript, summary) {
         // Try to save to Django backend (non-blocking)
         try {
@@ -586,10 +610,62 @@ Please provide the summary in this format:
             .replace(/\*(.*?)\*/g, '<em>$1</em>');
     }
 
-    async saveNotes() {
-        const notes = this.elements.notesArea.value.trim();
-        if (!notes) {
-            this.showNotification('No notes to save', 'warning');
+    diffNotes(before, after) {
+        // One replacement between the common prefix and suffix, in code points to match the server
+        const a = Array.from(before);
+        const b = Array.from(after);
+        let start = 0;
+        while (start < a.length && start < b.length && a[start] === b[start]) start++;
+        let endA = a.length;
+        let endB = b.length;
+        while (endA > start && endB > start && a[endA - 1] === b[endB - 1]) {
+            endA--;
+            endB--;
+        }
+        return { start: start, end: endA, text: b.slice(start, endB).join('') };
+    }
+
+    mergeNotes(base, mine, theirs) {
+        // Three-way merge of our edit and theirs, both made against the last saved text
+        const ours = this.diffNotes(base, mine);
+        const other = this.diffNotes(base, theirs);
+        if (ours.start === ours.end && !ours.text) return { text: theirs, conflict: false };
+        if (mine === theirs) return { text: theirs, conflict: false };
+        if (ours.end > other.start && other.end > ours.start || ours.start === other.start && ours.end !== other.end) {
+            // Both changed the same stretch: keep theirs and put ours underneath for the user to sort out
+            return {
+                text: ours.text ? `${theirs}\n\n--- Your conflicting edit ---\n${ours.text}` : theirs,
+                conflict: true
+            };
+        }
+        // Disjoint edits: splice both into the base in order, theirs first at a tie
+        const chars = Array.from(base);
+        const [first, second] = other.start <= ours.start ? [other, ours] : [ours, other];
+        return {
+            text: chars.slice(0, first.start).join('') + first.text + chars.slice(first.end, second.start).join('')
+                + second.text + chars.slice(second.end).join(''),
+            conflict: false
+        };
+    }
+
+    resolveNotesConflict(theirs, version) {
+        // Someone saved a newer version first: merge it into the textarea and rebase on it
+        const area = this.elements.notesArea;
+        const merged = this.mergeNotes(this.savedNotes, area ? area.value : this.savedNotes, theirs);
+        this.savedNotes = theirs;
+        this.notesVersion = version;
+        if (area) area.value = merged.text;
+        if (merged.conflict) {
+            this.showNotification('Someone else edited the same part of the notes; your edit is at the end', 'warning');
+        }
+    }
+
+    async saveNotes(silent = false, retries = 2) {
+        const notes = this.elements.notesArea.value;
+        if (notes === this.savedNotes) {
+            if (!silent) {
+                this.showNotification(notes ? 'Notes already saved' : 'No notes to save', 'warning');
+            }
             return;
         }
 
@@ -602,25 +678,47 @@ Please provide the summary in this format:
                 },
                 body: JSON.stringify({
                     session_id: window.sessionConfig.sessionId,
-                    notes: notes
+                    base_version: this.notesVersion,
+                    diffs: [this.diffNotes(this.savedNotes, notes)]
                 })
             });
+            const data = await response.json();
 
-            if (response.ok) {
+            if (response.status === 409 && retries > 0) {
+                this.resolveNotesConflict(data.notes, data.version);
+                return this.saveNotes(silent, retries - 1);
+            }
+            if (!response.ok) {
+                throw new Error(data.error || 'Failed to save notes');
+            }
+            this.savedNotes = notes;
+            this.notesVersion = data.version;
+            if (!silent) {
                 this.showNotification('Notes saved successfully!', 'success');
-            } else {
-                throw new Error('Failed to save notes');
             }
         } catch (error) {
             console.error('Error saving notes:', error);
-            this.showNotification('Failed to save notes', 'error');
+            if (!silent) {
+                this.showNotification('Failed to save notes', 'error');
+            }
         }
     }
 
+    startNotesAutosave() {
+        // Sends only what changed since the last save. Only when the server
+        // buffers notes in a shared cache: otherwise every tick is a database
+        // write, and notes are saved with the button and on leaving instead.
+        this.notesVersion = 0;
+        this.savedNotes = '';
+        if (!window.sessionConfig.sessionId || !window.sessionConfig.notesAutosave) return;
+        setInterval(() => this.saveNotes(true), 10000);
+    }
+
     async leaveSession() {
         if (confirm('Are you sure you want to leave the session?')) {
             try {
                 this.recognition?.stop();
+                await this.saveNotes(true);
                 if (this.callFrame) {
                     await this.callFrame.leave();
                 }
@@ -2,14 +2,18 @@
 class SessionManager {
     constructor() {
         this.transcripts = [];
+        this.pendingSegments = [];
         this.sessionStartTime = Date.now();
         
         this.initializeElements();
         this.setupEventListeners();
         this.startTimer();
+        this.startNotesAutosave();
+        this.startHeartbeat();
     this.loadMockTranscript();
     this.mockVideoConnection();
     this.bindDailyTranscript();
+        this.connectLive();
         
         console.log('Session Manager initialized for AI testing');
     }
@@ -28,6 +32,9 @@ class SessionManager {
                 speaker: speaker
             };
             this.transcripts.push(transcript);
+            if (!detail.remote) {
+                this.pendingSegments.push({ speaker: speaker, text: text, ts: transcript.timestamp });
+            }
 
             const entry = document.createElement('div');
             entry.className = 'transcript-entry';
@@ -54,7 +61,8 @@ class SessionManager {
             closeModalBtn: document.querySelector('.close-button'),
             connectionStatus: document.getElementById('connectionStatus'),
             notesArea: document.getElementById('notesArea'),
-            saveNotesBtn: document.getElementById('saveNotesBtn')
+            saveNotesBtn: document.getElementById('saveNotesBtn'),
+            leaveBtn: document.getElementById('leaveBtn')
         };
     }
 
@@ -77,6 +85,31 @@ class SessionManager {
         if (this.elements.saveNotesBtn) {
             this.elements.saveNotesBtn.addEventListener('click', () => this.saveNotes());
         }
+
+        if (this.elements.leaveBtn) {
+            this.elements.leaveBtn.addEventListener('click', () => this.leaveSession());
+        }
+    }
+
+    async leaveSession() {
+        if (!confirm('Are you sure you want to leave the session?')) return;
+        const sessionId = window.sessionConfig?.sessionId;
+        if (sessionId) {
+            await this.saveNotes(true);
+            try {
+                await fetch('/api/end-session/', {
+                    method: 'POST',
+                    headers: {
+                        'Content-Type': 'application/json',
+                        'X-CSRFToken': window.sessionConfig?.csrfToken || ''
+                    },
+                    body: JSON.stringify({ session_id: sessionId })
+                });
+            } catch (error) {
+                console.error('Error ending session:', error);
+            }
+        }
+        window.location.href = '/';
     }
 
     mockVideoConnection() {
@@ -151,6 +184,88 @@ Student: Thank you for this comprehensive overview! I feel much more confident a
         });
     }
 
+    connectLive(retryDelay = 1000) {
+        // One WebSocket per call page: transcript segments go up in small
+        // batches, notes and summaries from other participants come down.
+        const sessionId = window.sessionConfig?.sessionId;
+        if (!sessionId || !('WebSocket' in window)) return;
+
+        const scheme = window.location.protocol === 'https:' ? 'wss' : 'ws';
+        const socket = new WebSocket(`${scheme}://${window.location.host}/ws/session/${sessionId}/`);
+
+        socket.addEventListener('open', () => {
+            this.liveSocket = socket;
+            retryDelay = 1000;
+        });
+        socket.addEventListener('message', (event) => {
+            const message = JSON.parse(event.data);
+            const messages = message.type === 'batch' ? message.messages : [message];
+            messages.forEach((m) => this.handleLiveMessage(m));
+        });
+        socket.addEventListener('close', () => {
+            this.liveSocket = null;
+            setTimeout(() => this.connectLive(Math.min(retryDelay * 2, 30000)), retryDelay);
+        });
+
+        if (!this.liveFlushTimer) {
+            this.liveFlushTimer = setInterval(() => this.flushSegments(), 500);
+        }
+    }
+
+    liveReady() {
+        return this.liveSocket && this.liveSocket.readyState === WebSocket.OPEN;
+    }
+
+    flushSegments() {
+        if (!this.liveReady() || this.pendingSegments.length === 0) return;
+        const segments = this.pendingSegments.splice(0, 100);
+        this.liveSocket.send(JSON.stringify({ type: 'transcript', segments: segments }));
+    }
+
+    applyDiffs(text, diffs) {
+        let chars = Array.from(text);
+        diffs.forEach((d) => {
+            chars = chars.slice(0, d.start).concat(Array.from(d.text || ''), chars.slice(d.end));
+        });
+        return chars.join('');
+    }
+
+    handleLiveMessage(message) {
+        switch (message.type) {
+            case 'transcript':
+                message.segments.forEach((segment) => {
+                    window.dispatchEvent(new CustomEvent('daily-transcript-line', {
+                        detail: { text: segment.text, speaker: segment.speaker, remote: true }
+                    }));
+                });
+                break;
+            case 'notes': {
+                // Someone else's edit: apply it if we have nothing unsaved
+                const area = this.elements.notesArea;
+                if (message.version === this.notesVersion + 1 && area && area.value === this.savedNotes) {
+                    this.savedNotes = this.applyDiffs(this.savedNotes, message.diffs);
+                    this.notesVersion = message.version;
+                    area.value = this.savedNotes;
+                }
+                break;
+            }
+            case 'notes_saved':
+                this.savedNotes = this.sendingNotes;
+                this.notesVersion = message.version;
+                break;
+            case 'notes_conflict':
+                this.resolveNotesConflict(message.notes, message.version);
+                this.saveNotes(true);
+                break;
+            case 'summary':
+                this.displaySummary(message.summary);
+                break;
+            case 'error':
+                console.error('Live session error:', message.error);
+                break;
+        }
+    }
+
     async generateSummary() {
         if (this.transcripts.length === 0) {
             this.showNotification('No transcript available for summary generation', 'warning');
@@ -258,6 +373,11 @@ Please provide a detailed summary in this format:
     }
 
     async saveSummaryToBackend(transcript, summary) {
+        if (this.liveReady() && this.pendingSegments.length === 0) {
+            // The server already has the streamed transcript; send just the summary
+            this.liveSocket.send(JSON.stringify({ type: 'summary', summary: summary }));
+            return;
+        }
         try {
             const response = await fetch('/api/generate-summary/', {
                 method: 'POST',
@@ -313,10 +433,75 @@ Please provide a detailed summary in this format:
         this.elements.modal.style.display = 'none';
     }
 
-    async saveNotes() {
-        const notes = this.elements.notesArea?.value?.trim();
-        if (!notes) {
-            this.showNotification('No notes to save', 'warning');
+    diffNotes(before, after) {
+        // One replacement between the common prefix and suffix, in code points to match the server
+        const a = Array.from(before);
+        const b = Array.from(after);
+        let start = 0;
+        while (start < a.length && start < b.length && a[start] === b[start]) start++;
+        let endA = a.length;
+        let endB = b.length;
+        while (endA > start && endB > start && a[endA - 1] === b[endB - 1]) {
+            endA--;
+            endB--;
+        }
+        return { start: start, end: endA, text: b.slice(start, endB).join('') };
+    }
+
+    mergeNotes(base, mine, theirs) {
+        // Three-way merge of our edit and theirs, both made against the last saved text
+        const ours = this.diffNotes(base, mine);
+        const other = this.diffNotes(base, theirs);
+        if (ours.start === ours.end && !ours.text) return { text: theirs, conflict: false };
+        if (mine === theirs) return { text: theirs, conflict: false };
+        if (ours.end > other.start && other.end > ours.start || ours.start === other.start && ours.end !== other.end) {
+            // Both changed the same stretch: keep theirs and put ours underneath for the user to sort out
+            return {
+                text: ours.text ? `${theirs}\n\n--- Your conflicting edit ---\n${ours.text}` : theirs,
+                conflict: true
+            };
+        }
+        // Disjoint edits: splice both into the base in order, theirs first at a tie
+        const chars = Array.from(base);
+        const [first, second] = other.start <= ours.start ? [other, ours] : [ours, other];
+        return {
+            text: chars.slice(0, first.start).join('') + first.text + chars.slice(first.end, second.start).join('')
+                + second.text + chars.slice(second.end).join(''),
+            conflict: false
+        };
+    }
+
+    resolveNotesConflict(theirs, version) {
+        // Someone saved a newer version first: merge it into the textarea and rebase on it
+        const area = this.elements.notesArea;
+        const merged = this.mergeNotes(this.savedNotes, area ? area.value : this.savedNotes, theirs);
+        this.savedNotes = theirs;
+        this.notesVersion = version;
+        if (area) area.value = merged.text;
+        if (merged.conflict) {
+            this.showNotification('Someone else edited the same part of the notes; your edit is at the end', 'warning');
+        }
+    }
+
+    async saveNotes(silent = false, retries = 2) {
+        const notes = this.elements.notesArea?.value ?? '';
+        if (notes === this.savedNotes) {
+            if (!silent) {
+                this.showNotification(notes ? 'Notes already saved' : 'No notes to save', 'warning');
+            }
+            return;
+        }
+
+        if (this.liveReady()) {
+            this.sendingNotes = notes;
+            this.liveSocket.send(JSON.stringify({
+                type: 'notes',
+                base_version: this.notesVersion,
+                diffs: [this.diffNotes(this.savedNotes, notes)]
+            }));
+            if (!silent) {
+                this.showNotification('Notes saved successfully!', 'success');
+            }
             return;
         }
 
@@ -329,18 +514,42 @@ Please provide a detailed summary in this format:
                 },
                 body: JSON.stringify({
                     session_id: window.sessionConfig?.sessionId,
-                    notes: notes
+                    base_version: this.notesVersion,
+                    diffs: [this.diffNotes(this.savedNotes, notes)]
                 })
             });
+            const data = await response.json();
 
-            if (response.ok) {
+            if (response.status === 409 && retries > 0) {
+                this.resolveNotesConflict(data.notes, data.version);
+                return this.saveNotes(silent, retries - 1);
+            }
+            if (!response.ok) {
+                throw new Error(data.error || 'Failed to save notes');
+            }
+            this.savedNotes = notes;
+            this.notesVersion = data.version;
+            if (!silent) {
                 this.showNotification('Notes saved successfully!', 'success');
             }
         } catch (error) {
-            this.showNotification('Failed to save notes', 'error');
+            console.error('Error saving notes:', error);
+            if (!silent) {
+                this.showNotification('Failed to save notes', 'error');
+            }
         }
     }
 
+    startNotesAutosave() {
+        // Sends only what changed since the last save. Only when the server
+        // buffers notes in a shared cache: otherwise every tick is a database
+        // write, and notes are saved with the button and on leaving instead.
+        this.notesVersion = 0;
+        this.savedNotes = '';
+        if (!window.sessionConfig?.sessionId || !window.sessionConfig.notesAutosave) return;
+        setInterval(() => this.saveNotes(true), 10000);
+    }
+
     updateConnectionStatus(status, message) {
         if (this.elements.connectionStatus) {
             this.elements.connectionStatus.className = `connection-status ${status}`;
@@ -366,6 +575,22 @@ Please provide a detailed summary in this format:
         }, 1000);
     }
 
+    startHeartbeat() {
+        // Keeps the session marked active while the page is open
+        const sessionId = window.sessionConfig?.sessionId;
+        if (!sessionId) return;
+        setInterval(() => {
+            fetch('/api/session-heartbeat/', {
+                method: 'POST',
+                headers: {
+                    'Content-Type': 'application/json',
+                    'X-CSRFToken': window.sessionConfig?.csrfToken || ''
+                },
+                body: JSON.stringify({ session_id: sessionId })
+            }).catch((error) => console.error('Heartbeat failed:', error));
+        }, 60000);
+    }
+
     showNotification(message, type = 'info') {
         const notification = document.createElement('div');
         notification.className = `notification notification-${type}`;